@@ -0,0 +1,220 @@
+"""
+api.py
+
+Async HTTP API for the recipe pipeline, an alternate entry point to st_app.py.
+
+Endpoints:
+    POST /v1/process, /v1/revise, /v1/graph   Request/response: run the stage and return its result.
+    POST /v1/jobs/{kind}                      Job submission: queue the stage and return a job ID (202).
+    GET  /v1/jobs/{job_id}                    Job status, progress and result.
+    GET  /v1/jobs/{job_id}/events             Server-sent events stream of progress until the job finishes.
+    POST /v1/jobs/{job_id}/cancel             Cancel a job: it stops before its next stage (202).
+    GET  /v1/runs?q=&limit=&offset=           Catalogued graph runs (recipe-name prefix search, newest first).
+    GET  /v1/stats, /healthz                  Queue and model-call statistics, and liveness.
+
+Pipeline calls run on worker threads and reuse the process-wide GenAI/GCS clients.
+Concurrent calls per model are bounded (R2G_API_PROCESS_CONCURRENCY for the text model,
+R2G_API_GRAPH_CONCURRENCY for the graph model), for both styles of request.
+
+Run with:
+    uvicorn r2g_app.api:app --host 0.0.0.0 --port 8080
+or  python -m r2g_app.api
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from . import metrics
+from .aux_funs import configure_logging
+from .catalog import DEFAULT_PAGE_SIZE, get_catalog
+from .dedup import index_stats
+from .results import get_artifact_cache
+from .deadlines import DeadlineExceededError
+from .genai_funs import PROCESS_TEXT_MODEL_NAME, TEXT_TO_GRAPH_MODEL_NAME
+from .jobs import JobQueueFullError, get_job_queue
+from .main import RUN_DEADLINE_SECONDS, process_text, revise_recipe, text_to_graph
+from .startup import prewarm_in_background
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ID = os.getenv("PROJECT_ID")
+API_PORT = int(os.getenv("PORT", "8080"))
+# Maximum number of in-flight pipeline calls per model on this instance
+MODEL_CONCURRENCY: Dict[str, int] = {
+    PROCESS_TEXT_MODEL_NAME: int(os.getenv("R2G_API_PROCESS_CONCURRENCY", "16")),
+    TEXT_TO_GRAPH_MODEL_NAME: int(os.getenv("R2G_API_GRAPH_CONCURRENCY", "4")),
+}
+# Interval at which the events stream checks a job for new progress
+EVENT_POLL_INTERVAL_SECONDS = float(os.getenv("R2G_API_EVENT_POLL_INTERVAL_SECONDS", "0.25"))
+
+
+class ProcessRequest(BaseModel):
+    recipe_draft_text: str
+    deadline: Optional[float] = None  # Seconds; defaults to the pipeline's default deadline
+
+
+class ReviseRequest(BaseModel):
+    original_draft: str
+    current_standardised_recipe: str
+    user_feedback: str
+    deadline: Optional[float] = None
+
+
+class GraphRequest(BaseModel):
+    standardised_recipe: str
+    recipe_name: str
+    gcs_bucket_name: str
+    deadline: Optional[float] = None
+
+
+# Stage name -> (pipeline function, request model, model whose concurrency bound applies)
+STAGES: Dict[str, Any] = {
+    "process_text": (process_text, ProcessRequest, PROCESS_TEXT_MODEL_NAME),
+    "revise_recipe": (revise_recipe, ReviseRequest, PROCESS_TEXT_MODEL_NAME),
+    "text_to_graph": (text_to_graph, GraphRequest, TEXT_TO_GRAPH_MODEL_NAME),
+}
+
+_model_semaphores = {model: threading.BoundedSemaphore(limit) for model, limit in MODEL_CONCURRENCY.items()}
+# Threads that wait on the model semaphores; sized so that every model can be saturated at once.
+_executor = ThreadPoolExecutor(max_workers=sum(MODEL_CONCURRENCY.values()) * 2, thread_name_prefix="r2g-api")
+
+
+def _limited(model_name: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wraps a pipeline function so it holds the model's concurrency slot while running."""
+    def run(**kwargs):
+        with _model_semaphores[model_name]:
+            return fn(**kwargs)
+    return run
+
+
+async def _run_stage(stage: str, request: BaseModel) -> Any:
+    fn, _, model_name = STAGES[stage]
+    loop = asyncio.get_running_loop()
+    kwargs = dict(request.model_dump(), project_id=PROJECT_ID)
+    try:
+        return await loop.run_in_executor(_executor, lambda: _limited(model_name, fn)(**kwargs))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Stage '{stage}' failed: {e}")
+        raise HTTPException(status_code=502, detail=str(e))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    prewarm_in_background()  # no-op unless R2G_PREWARM=1
+    yield
+
+
+app = FastAPI(title="Recipe to Graph API", lifespan=lifespan)
+
+
+@app.get("/healthz")
+async def healthz() -> Dict[str, str]:
+    return {"status": "ok"}
+
+
+@app.get("/v1/stats")
+async def stats() -> Dict[str, Any]:
+    return {"jobs": get_job_queue().stats(), "model_concurrency": MODEL_CONCURRENCY, "metrics": metrics.snapshot(),
+            "dedup": index_stats(), "artifact_cache": get_artifact_cache().stats()}
+
+
+@app.get("/v1/runs")
+async def list_runs(q: str = "", limit: int = DEFAULT_PAGE_SIZE, offset: int = 0) -> Dict[str, Any]:
+    catalog = get_catalog()
+    runs = catalog.search_runs(q, limit=limit, offset=offset)
+    return {"total": catalog.count_runs(q), "offset": offset, "runs": [run.to_dict() for run in runs]}
+
+
+@app.post("/v1/process")
+async def process_endpoint(request: ProcessRequest) -> Dict[str, str]:
+    return {"standardised_recipe": await _run_stage("process_text", request)}
+
+
+@app.post("/v1/revise")
+async def revise_endpoint(request: ReviseRequest) -> Dict[str, str]:
+    return {"standardised_recipe": await _run_stage("revise_recipe", request)}
+
+
+@app.post("/v1/graph")
+async def graph_endpoint(request: GraphRequest) -> Dict[str, Any]:
+    result = await _run_stage("text_to_graph", request)
+    return result.to_dict(include_content=True)
+
+
+@app.post("/v1/jobs/{kind}", status_code=202)
+async def submit_job(kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    if kind not in STAGES:
+        raise HTTPException(status_code=404, detail=f"Unknown job kind '{kind}'. Expected one of {sorted(STAGES)}.")
+    fn, request_model, model_name = STAGES[kind]
+    try:
+        request = request_model(**payload)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    deadline_s = request.deadline if request.deadline is not None else RUN_DEADLINE_SECONDS[kind]
+    try:
+        # The queue passes the run a Deadline of its own, so POST /v1/jobs/{job_id}/cancel can stop it
+        job = get_job_queue().submit(
+            kind, _limited(model_name, fn), dict(request.model_dump(), project_id=PROJECT_ID),
+            deadline_arg="deadline", timeout_s=deadline_s
+        )
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job.job_id, "status": job.status}
+
+
+@app.get("/v1/jobs/{job_id}")
+async def get_job(job_id: str) -> Dict[str, Any]:
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found or expired.")
+    return job.to_dict()
+
+
+@app.post("/v1/jobs/{job_id}/cancel", status_code=202)
+async def cancel_job(job_id: str) -> Dict[str, Any]:
+    job = get_job_queue().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found or expired.")
+    return {"job_id": job.job_id, "status": job.status, "cancel_requested": job.cancel_requested}
+
+
+@app.get("/v1/jobs/{job_id}/events")
+async def job_events(job_id: str) -> StreamingResponse:
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found or expired.")
+
+    async def stream():
+        sent = 0
+        while True:
+            finished = job.done  # read before progress so no final message is missed
+            progress = list(job.progress)
+            for timestamp, message in progress[sent:]:
+                yield f"event: progress\ndata: {json.dumps({'time': timestamp, 'message': message})}\n\n"
+            sent = len(progress)
+            if finished:
+                yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+                return
+            await asyncio.sleep(EVENT_POLL_INTERVAL_SECONDS)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=API_PORT)
@@ -1,20 +1,37 @@
+from __future__ import annotations
+
+import functools
 import logging
 import re # Import regular expressions module
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 import os
 
-# Import the Google Cloud Storage library
-from google.cloud import storage
+# The Google Cloud Storage library is imported on first use to keep cold starts fast.
+if TYPE_CHECKING:
+    from google.cloud import storage
 
 # Configure logger for this module
 logger = logging.getLogger(__name__)
-# Ensure logging is configured at the application entry point or here if standalone
-if not logger.handlers:
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """Configures root logging for an application entry point (no-op if already configured)."""
+    logging.basicConfig(level=level, format=LOG_FORMAT)
 
 
-def upload_to_gcs(bucket_name: str, destination_blob_name: str, source_file_name: Optional[str] = None, source_content_string: Optional[str] = None, content_type: str = 'application/octet-stream'):
+@functools.lru_cache(maxsize=1)
+def get_storage_client() -> storage.Client:
+    """Returns the process-wide Google Cloud Storage client, creating it on first use."""
+    from google.cloud import storage
+
+    logger.info("Initializing Google Cloud Storage client.")
+    return storage.Client()
+
+
+def upload_to_gcs(bucket_name: str, destination_blob_name: str, source_file_name: Optional[str] = None, source_content_string: Optional[str] = None, content_type: str = 'application/octet-stream', timeout: Optional[float] = None):
     """Uploads a file or content string to the specified Google Cloud Storage bucket.
 
     Args:
@@ -23,6 +40,7 @@ def upload_to_gcs(bucket_name: str, destination_blob_name: str, source_file_name
         source_file_name: The path to the local file to upload.
         source_content_string: The string content to upload.
         content_type: The content type of the string to upload. Defaults to 'application/octet-stream'.
+        timeout: Request timeout in seconds. Defaults to the storage library's default (60s).
 
     Raises:
         ValueError: If both source_file_name and source_content_string are provided, or if neither is provided.
@@ -38,18 +56,21 @@ def upload_to_gcs(bucket_name: str, destination_blob_name: str, source_file_name
         logger.error("ValueError: Either source_file_name or source_content_string must be provided.")
         raise ValueError("Either source_file_name or source_content_string must be provided.")
 
+    from google.cloud import storage
+
+    timeout_kwargs = {"timeout": timeout} if timeout is not None else {}
     try:
-        storage_client = storage.Client()
+        storage_client = get_storage_client()
         bucket = storage_client.bucket(bucket_name)
         blob = bucket.blob(destination_blob_name)
 
         if source_file_name:
             logger.info(f"Uploading {source_file_name} to gs://{bucket_name}/{destination_blob_name}...")
-            blob.upload_from_filename(source_file_name)
+            blob.upload_from_filename(source_file_name, **timeout_kwargs)
             logger.info(f"Successfully uploaded {source_file_name} to gs://{bucket_name}/{destination_blob_name}.")
         elif source_content_string:
             logger.info(f"Uploading content string to gs://{bucket_name}/{destination_blob_name}...")
-            blob.upload_from_string(source_content_string, content_type=content_type)
+            blob.upload_from_string(source_content_string, content_type=content_type, **timeout_kwargs)
             logger.info(f"Successfully uploaded content string to gs://{bucket_name}/{destination_blob_name}.")
 
     except FileNotFoundError:
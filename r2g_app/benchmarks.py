@@ -0,0 +1,593 @@
+"""
+benchmarks.py
+
+Replay benchmarks for the pipeline's model calls.
+
+Each benchmark replays the same recipe inputs through several configurations of a stage
+and reports, per configuration: wall-clock latency (p50/mean), input/output/thinking tokens
+(from the responses' usage_metadata) and parse success of the output.
+
+Subcommands:
+    prompts   Compare registered prompt variants of a stage (see prompts.py).
+    profiles  Compare generation profiles (thinking budget, thought inclusion, output ceiling) of a stage.
+    grounding Compare Google Search grounding policies (off / on / auto) of a stage side by side.
+    strategies Compare graph strategies (two_pass: generate then improve; best_of_n: concurrent candidates
+              picked by local score): latency and model calls per run, and the local graph score of
+              the output (see graph_selection.py).
+    video     Compare video sampling presets (clipping, frame rate, media resolution) on recipe videos:
+              token and latency savings against the "default" preset, and how much of the default
+              preset's recipe (ingredients, steps) each preset still extracts.
+
+Usage:
+    python -m r2g_app.benchmarks prompts --stage generate --variants default,no_example --repeats 3
+    python -m r2g_app.benchmarks profiles --stage rewrite --profiles legacy,configured,low_thinking
+    python -m r2g_app.benchmarks --recipe-files recipe_draft.txt,dummy_recipe.txt grounding --stage draft
+    python -m r2g_app.benchmarks prompts --stage draft --fake      # offline, fake backends
+    python -m r2g_app.benchmarks video --video-files clip.mp4,long.mp4 --bucket my-bucket
+    python -m r2g_app.benchmarks --fake video --synthetic-durations 120,1800
+    python -m r2g_app.benchmarks --repeats 3 strategies --candidates 3
+"""
+import argparse
+import contextvars
+import json
+import re
+import statistics
+import struct
+import time
+from contextlib import nullcontext
+from dataclasses import asdict, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from . import metrics, prompts
+from .grounding import GROUNDING_POLICIES, should_ground
+from .aux_funs import configure_logging, parse_code_string
+from .fake_backends import FAKE_GRAPH_CODE, fake_backends
+from .genai_funs import (
+    PROJECT_ID, DEFAULT_VERTEX_LOCATION, DEFAULT_MAX_TOKENS,
+    PROCESS_TEXT_MODEL_NAME, TEXT_TO_GRAPH_MODEL_NAME,
+    GenerationProfile, get_generation_profile, VIDEO_PRESETS, resolve_video_options,
+    draft_to_recipe, re_write_recipe, generate_graph, improve_graph, repair_graph, complete_graph_code,
+    improve_graph_patch, generate_graph_candidates,
+)
+from .graph_validation import extract_script_block, format_issues, validate_script
+from .graph_patch import apply_patch, check_patched, parse_patch
+from .graph_recovery import inspect_graph_code, truncated_graph_code
+from .graph_selection import BEST_OF_N_CANDIDATES, candidate_settings, score_graph_code, select_candidate
+from .media_upload import guess_video_mime_type, mp4_duration_s, upload_media_file
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_RECIPE_FILES = [REPO_ROOT / "dummy_recipe.txt"]
+DEFAULT_REPEATS = 1
+GRAPH_STAGES = ("generate", "improve", "improve_patch", "repair", "complete")
+GRAPH_STRATEGIES = ("two_pass", "best_of_n")
+# Feedback used when replaying the "revise" stage
+BENCHMARK_REVISION_FEEDBACK = "Halve all the quantities."
+
+# Stage -> model the pipeline uses for it
+STAGE_MODELS: Dict[str, str] = {
+    "draft": PROCESS_TEXT_MODEL_NAME,
+    "rewrite": PROCESS_TEXT_MODEL_NAME,
+    "revise": PROCESS_TEXT_MODEL_NAME,
+    "generate": TEXT_TO_GRAPH_MODEL_NAME,
+    "improve": TEXT_TO_GRAPH_MODEL_NAME,
+    "improve_patch": TEXT_TO_GRAPH_MODEL_NAME,
+    "repair": TEXT_TO_GRAPH_MODEL_NAME,
+    "complete": TEXT_TO_GRAPH_MODEL_NAME,
+}
+# Smallest thinking budget each model accepts (models not listed can disable thinking with 0)
+MIN_THINKING_BUDGET: Dict[str, int] = {TEXT_TO_GRAPH_MODEL_NAME: 128}
+
+
+def output_parses(stage: str, output: Optional[str]) -> bool:
+    """Whether a stage's output is usable: three code blocks with HTML for graph stages, non-empty text otherwise."""
+    if not output:
+        return False
+    if stage in GRAPH_STAGES:
+        if stage == "repair":
+            return bool(extract_script_block(output))
+        if stage == "complete":
+            return bool(parse_code_string(output).get("script.js"))
+        if stage == "improve_patch":
+            return _patch_applies(output)
+        return bool(parse_code_string(output).get("index.html"))
+    return bool(output.strip())
+
+
+def _patch_applies(output: str) -> bool:
+    """Whether an improve_patch answer parses and applies cleanly to the reference graph code."""
+    files = parse_code_string(FAKE_GRAPH_CODE)
+    try:
+        patched, _ = apply_patch(files, parse_patch(output))
+    except ValueError:  # PatchError, ElementsExtractionError
+        return False
+    return not check_patched(files, patched)
+
+
+def call_stage(stage: str, recipe_text: str, system_instruction: str, project_id: Optional[str],
+               model_name: Optional[str] = None, **overrides: Any) -> str:
+    """
+    Runs a single stage's agent on a recipe, as the pipeline would.
+
+    Args:
+        stage: Pipeline stage name.
+        recipe_text: Raw draft (draft stage) or standardized recipe (all other stages).
+        system_instruction: System prompt to use.
+        project_id: Google Cloud project ID.
+        model_name: Model to use. Defaults to the pipeline's model for the stage.
+        **overrides: Extra keyword arguments passed to the agent function.
+
+    Returns:
+        The model's response text.
+    """
+    common = dict(system_instruction=system_instruction, project_id=project_id,
+                  location=DEFAULT_VERTEX_LOCATION, model_name=model_name or STAGE_MODELS[stage])
+    if stage == "draft":
+        return draft_to_recipe(recipe_draft=recipe_text, **common, **overrides)
+    if stage == "rewrite":
+        overrides.setdefault("input_type", "txt")  # "youtube" for video URIs
+        return re_write_recipe(recipe_input=recipe_text, **common, **overrides)
+    if stage == "revise":
+        revision_input = (f"User Feedback:\n---\n{BENCHMARK_REVISION_FEEDBACK}\n---\n\n"
+                          f"Current Standardized Recipe:\n---\n{recipe_text}\n---\n")
+        return re_write_recipe(recipe_input=revision_input, input_type="txt", stage="revise", **common, **overrides)
+    if stage == "generate":
+        return generate_graph(standardised_recipe=recipe_text, **common, **overrides)
+    if stage == "improve":
+        return improve_graph(standardised_recipe=recipe_text, graph_code=FAKE_GRAPH_CODE, **common, **overrides)
+    if stage == "improve_patch":
+        return improve_graph_patch(standardised_recipe=recipe_text, graph_code=FAKE_GRAPH_CODE, **common, **overrides)
+    if stage == "repair":
+        script_js = parse_code_string(FAKE_GRAPH_CODE)["script.js"].replace("target: 'bake'", "target: 'baking'")
+        return repair_graph(standardised_recipe=recipe_text, script_js=script_js,
+                            issues=format_issues(validate_script(script_js)), **common, **overrides)
+    if stage == "complete":
+        # The graph code cut off halfway through script.js, as at max_output_tokens
+        states = inspect_graph_code(truncated_graph_code(FAKE_GRAPH_CODE))
+        return complete_graph_code(standardised_recipe=recipe_text,
+                                   files={file_name: state.content for file_name, state in states.items()},
+                                   truncated=["script.js"], missing=[], **common, **overrides)
+    raise ValueError(f"Unknown stage '{stage}'. Must be one of {prompts.STAGES}.")
+
+
+# Stages that have had their discarded warm-up call in this process (see replay)
+_warmed_up_stages = set()
+
+
+def replay(label: str, stage: str, inputs: List[str], repeats: int,
+           run: Callable[[str], str], outputs: Optional[List[Optional[str]]] = None) -> Dict[str, Any]:
+    """
+    Replays every input `repeats` times through `run` and aggregates latency, tokens and parse success.
+
+    The first replay of a stage starts with one discarded warm-up call, so the process's cold start
+    (SDK imports, clients, connections) is not charged to whichever configuration is measured first.
+
+    Args:
+        label: Name of the configuration being measured.
+        stage: Pipeline stage the configuration belongs to (decides how outputs are parsed).
+        inputs: Recipe texts to replay.
+        repeats: Number of times each input is replayed.
+        run: Callable taking one input and returning the model output.
+        outputs: If given, receives every output (None for failed calls), in replay order.
+
+    Returns:
+        A JSON-friendly dict of aggregated results.
+    """
+    if stage not in _warmed_up_stages and inputs:
+        _warmed_up_stages.add(stage)
+        try:
+            # An empty context: the warm-up's calls must not reach any enclosing metrics.collect_usage()
+            contextvars.Context().run(run, inputs[0])
+        except Exception as e:
+            print(f"[{label}] warm-up call failed: {e}")
+    latencies: List[float] = []
+    parsed = failures = 0
+    with metrics.collect_usage() as calls:
+        for _ in range(repeats):
+            for recipe_text in inputs:
+                start = time.perf_counter()
+                try:
+                    output = run(recipe_text)
+                except Exception as e:
+                    failures += 1
+                    print(f"[{label}] call failed: {e}")
+                    if outputs is not None:
+                        outputs.append(None)
+                    continue
+                finally:
+                    latencies.append(time.perf_counter() - start)
+                parsed += output_parses(stage, output)
+                if outputs is not None:
+                    outputs.append(output)
+    runs = repeats * len(inputs)
+    usage = metrics.summarize_usage(calls)
+    return {
+        "label": label,
+        "runs": runs,
+        "failures": failures,
+        "parse_success_rate": round(parsed / runs, 3) if runs else None,
+        "p50_latency_s": round(statistics.median(latencies), 3) if latencies else None,
+        "mean_latency_s": round(statistics.mean(latencies), 3) if latencies else None,
+        "prompt_tokens_per_run": round(usage["prompt_token_count"] / runs) if runs else None,
+        "output_tokens_per_run": round(usage["candidates_token_count"] / runs) if runs else None,
+        "thought_tokens_per_run": round(usage["thoughts_token_count"] / runs) if runs else None,
+        "grounded_calls": sum(1 for call in calls if call.get("grounded")),
+    }
+
+
+def benchmark_prompts(stage: str, variant_names: Optional[List[str]], inputs: List[str], repeats: int,
+                      project_id: Optional[str], count_tokens: bool = False) -> List[Dict[str, Any]]:
+    """
+    Compares prompt variants of a stage on the same inputs.
+
+    Args:
+        stage: Pipeline stage name.
+        variant_names: Variants to compare. Defaults to all registered variants of the stage.
+        inputs: Recipe texts to replay.
+        repeats: Number of times each input is replayed per variant.
+        project_id: Google Cloud project ID.
+        count_tokens: Also count each variant's system prompt tokens with the count_tokens API.
+
+    Returns:
+        One result dict per variant (see replay), with the variant key, hash and prompt size added.
+    """
+    variants = ([prompts.get_prompt_variant(stage, name) for name in variant_names] if variant_names
+                else prompts.list_variants(stage))
+    results = []
+    for variant in variants:
+        print(f"Replaying {len(inputs)} input(s) x{repeats} through {variant.key}...")
+        result = replay(variant.key, stage, inputs, repeats,
+                        lambda text: call_stage(stage, text, variant.text, project_id))
+        result["prompt_sha"] = variant.sha
+        result["system_prompt_tokens_est"] = variant.estimated_tokens
+        if count_tokens:
+            result["system_prompt_tokens"] = prompts.count_prompt_tokens(variant, STAGE_MODELS[stage], project_id)
+        results.append(result)
+    return results
+
+
+def profile_presets(stage: str) -> Dict[str, GenerationProfile]:
+    """
+    Named profiles to compare for a stage.
+
+    configured     The stage's profile as configured (defaults plus overrides).
+    legacy         The settings used before per-stage profiles: thoughts included, dynamic thinking,
+                   DEFAULT_MAX_TOKENS ceiling.
+    dynamic        The configured profile with a model-chosen thinking budget.
+    low_thinking   The configured profile with the smallest thinking budget the stage's model accepts.
+    """
+    configured = get_generation_profile(stage)
+    return {
+        "configured": configured,
+        "legacy": replace(configured, max_output_tokens=DEFAULT_MAX_TOKENS, thinking_budget=None, include_thoughts=True),
+        "dynamic": replace(configured, thinking_budget=None),
+        "low_thinking": replace(configured, thinking_budget=MIN_THINKING_BUDGET.get(STAGE_MODELS[stage], 0)),
+    }
+
+
+def benchmark_profiles(stage: str, profile_names: Optional[List[str]], inputs: List[str], repeats: int,
+                       project_id: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Compares generation profiles of a stage on the same inputs, with the stage's configured prompt.
+
+    Args:
+        stage: Pipeline stage name.
+        profile_names: Names from profile_presets(). Defaults to all of them.
+        inputs: Recipe texts to replay.
+        repeats: Number of times each input is replayed per profile.
+        project_id: Google Cloud project ID.
+
+    Returns:
+        One result dict per profile (see replay), with the profile's settings added.
+    """
+    presets = profile_presets(stage)
+    unknown = set(profile_names or []) - set(presets)
+    if unknown:
+        raise ValueError(f"Unknown profiles {sorted(unknown)}. Available: {sorted(presets)}.")
+    system_instruction = prompts.get_prompt(stage)
+    results = []
+    for name in profile_names or list(presets):
+        profile = presets[name]
+        print(f"Replaying {len(inputs)} input(s) x{repeats} through {stage} profile '{name}' ({profile})...")
+        result = replay(f"{stage}/{name}", stage, inputs, repeats,
+                        lambda text: call_stage(stage, text, system_instruction, project_id, profile=profile))
+        result.update(asdict(profile))
+        results.append(result)
+    return results
+
+
+def benchmark_grounding(stage: str, policies: Optional[List[str]], inputs: List[str], repeats: int,
+                        project_id: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Compares grounding policies of a stage on the same inputs (only draft, generate and improve can be grounded).
+
+    Args:
+        stage: Pipeline stage name.
+        policies: Policies to compare. Defaults to all of GROUNDING_POLICIES.
+        inputs: Recipe texts to replay.
+        repeats: Number of times each input is replayed per policy.
+        project_id: Google Cloud project ID.
+
+    Returns:
+        One result dict per policy (see replay); "grounded_calls" shows how often "auto" grounded.
+    """
+    if stage not in ("draft", "generate", "improve"):
+        raise ValueError(f"Stage '{stage}' has no grounding tool to toggle.")
+    system_instruction = prompts.get_prompt(stage)
+    results = []
+    for policy in policies or list(GROUNDING_POLICIES):
+        print(f"Replaying {len(inputs)} input(s) x{repeats} through {stage} with grounding '{policy}'...")
+        results.append(replay(
+            f"{stage}/grounding={policy}", stage, inputs, repeats,
+            lambda text: call_stage(stage, text, system_instruction, project_id,
+                                    grounding=should_ground(stage, text, policy=policy)),
+        ))
+    return results
+
+
+def synthetic_mp4(duration_s: float, size_bytes: int = 1 << 20) -> bytes:
+    """An MP4 container with only a movie header of the given duration, padded to `size_bytes`."""
+    mvhd = struct.pack(">I4sB3xIIII", 108, b"mvhd", 0, 0, 0, 1000, int(duration_s * 1000)) + bytes(80)
+    ftyp = struct.pack(">I4s4sI4s", 20, b"ftyp", b"isom", 0, b"isom")
+    moov = struct.pack(">I4s", 8 + len(mvhd), b"moov") + mvhd
+    padding = max(8, size_bytes - len(ftyp) - len(moov))
+    return ftyp + moov + struct.pack(">I4s", padding, b"mdat") + bytes(padding - 8)
+
+
+_INGREDIENT_LINE_RE = re.compile(r"^\s*[-*•]\s+(.+?)\s*$", re.MULTILINE)
+_STEP_LINE_RE = re.compile(r"^\s*\d+[.)]\s+\S", re.MULTILINE)
+
+
+def _ingredient_lines(recipe: str) -> set:
+    return {" ".join(line.lower().split()) for line in _INGREDIENT_LINE_RE.findall(recipe)}
+
+
+def extraction_quality(output: Optional[str], reference: Optional[str]) -> Dict[str, Optional[float]]:
+    """Share of the reference recipe's ingredient lines found in `output`, and their step-count ratio."""
+    if not output or not reference:
+        return {"ingredient_recall": None, "step_ratio": None}
+    reference_ingredients = _ingredient_lines(reference)
+    reference_steps = len(_STEP_LINE_RE.findall(reference))
+    return {
+        "ingredient_recall": (round(len(reference_ingredients & _ingredient_lines(output)) / len(reference_ingredients), 3)
+                              if reference_ingredients else None),
+        "step_ratio": round(len(_STEP_LINE_RE.findall(output)) / reference_steps, 3) if reference_steps else None,
+    }
+
+
+def benchmark_video(preset_names: Optional[List[str]], videos: List[Dict[str, Any]], repeats: int,
+                    project_id: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Compares video sampling presets on the same recipe videos (rewrite stage, as process_video runs it).
+
+    The "default" preset (model defaults) is always replayed first and is the reference: every other
+    preset reports its prompt-token and latency savings against it, and the ingredient recall and
+    step ratio of its recipes against the default preset's recipe of the same video.
+
+    Args:
+        preset_names: Presets to compare ("auto" and names from VIDEO_PRESETS). Defaults to all presets.
+        videos: Dicts with the video "uri", "mime_type" and "duration_s" (None if unknown).
+        repeats: Number of times each video is replayed per preset.
+        project_id: Google Cloud project ID.
+
+    Returns:
+        One result dict per preset (see replay), with the savings and quality fields added.
+    """
+    names = ["default"] + [name for name in preset_names or list(VIDEO_PRESETS) if name != "default"]
+    system_instruction = prompts.get_prompt("rewrite")
+    video_by_uri = {video["uri"]: video for video in videos}
+    results = []
+    reference_outputs: List[Optional[str]] = []
+    for name in names:
+        print(f"Replaying {len(videos)} video(s) x{repeats} through rewrite with video preset '{name}'...")
+        outputs: List[Optional[str]] = []
+        result = replay(
+            f"rewrite/video={name}", "rewrite", list(video_by_uri), repeats,
+            lambda uri: call_stage("rewrite", uri, system_instruction, project_id, input_type="youtube",
+                                   mime_type=video_by_uri[uri]["mime_type"],
+                                   video_options=resolve_video_options(name, video_by_uri[uri]["duration_s"])),
+            outputs=outputs,
+        )
+        if name == "default":
+            reference_outputs = outputs
+        reference = results[0] if results else result
+        for key, baseline_key in (("prompt_token_savings_pct", "prompt_tokens_per_run"),
+                                  ("latency_savings_pct", "mean_latency_s")):
+            baseline = reference.get(baseline_key)
+            result[key] = (round(100 * (1 - result[baseline_key] / baseline), 1)
+                           if baseline and result.get(baseline_key) is not None else None)
+        qualities = [extraction_quality(output, ref) for output, ref in zip(outputs, reference_outputs)]
+        for key in ("ingredient_recall", "step_ratio"):
+            values = [quality[key] for quality in qualities if quality[key] is not None]
+            result[key] = round(statistics.mean(values), 3) if values else None
+        results.append(result)
+    return results
+
+
+def run_graph_strategy(strategy: str, recipe_text: str, project_id: Optional[str],
+                       candidates: int = BEST_OF_N_CANDIDATES) -> str:
+    """
+    Produces the graph code of a recipe with one graph strategy, as text_to_graph would before
+    recovery, validation and upload.
+
+    Args:
+        strategy: "two_pass" or "best_of_n".
+        recipe_text: Standardized recipe.
+        project_id: Google Cloud project ID.
+        candidates: Candidates generated concurrently by "best_of_n".
+
+    Returns:
+        The graph code (fenced html/css/javascript blocks).
+    """
+    if strategy == "two_pass":
+        first_pass = call_stage("generate", recipe_text, prompts.get_prompt("generate"), project_id)
+        return improve_graph(standardised_recipe=recipe_text, graph_code=first_pass,
+                             system_instruction=prompts.get_prompt("improve"), project_id=project_id,
+                             location=DEFAULT_VERTEX_LOCATION, model_name=STAGE_MODELS["improve"])
+    if strategy == "best_of_n":
+        settings = candidate_settings(candidates, get_generation_profile("generate").temperature)
+        outputs = generate_graph_candidates(
+            standardised_recipe=recipe_text, system_instruction=prompts.get_prompt("generate"),
+            settings=[(setting.temperature, setting.seed) for setting in settings], project_id=project_id,
+            location=DEFAULT_VERTEX_LOCATION, model_name=STAGE_MODELS["generate"])
+        winner, _ = select_candidate(outputs)
+        if winner is None:
+            raise RuntimeError(f"All {len(settings)} graph candidates failed.")
+        return outputs[winner]
+    raise ValueError(f"Unknown graph strategy '{strategy}'. Must be one of {GRAPH_STRATEGIES}.")
+
+
+def benchmark_strategies(strategies: Optional[List[str]], inputs: List[str], repeats: int,
+                         project_id: Optional[str], candidates: int = BEST_OF_N_CANDIDATES) -> List[Dict[str, Any]]:
+    """
+    Compares graph strategies on the same recipes: wall-clock latency, model calls and tokens per
+    run, and the local score of the graph code produced (see graph_selection.py).
+
+    The first strategy (two_pass unless only others are given) is the reference for latency_savings_pct.
+
+    Returns:
+        One result dict per strategy (see replay), with model_calls_per_run, mean_graph_score,
+        min_graph_score and latency_savings_pct added.
+    """
+    results = []
+    for strategy in strategies or list(GRAPH_STRATEGIES):
+        label = f"{strategy}/n={candidates}" if strategy == "best_of_n" else strategy
+        print(f"Replaying {len(inputs)} input(s) x{repeats} through graph strategy {label}...")
+        outputs: List[Optional[str]] = []
+        with metrics.collect_usage() as calls:
+            result = replay(label, "generate", inputs, repeats,
+                            lambda text: run_graph_strategy(strategy, text, project_id, candidates), outputs=outputs)
+        graph_scores = [score_graph_code(output).value for output in outputs if output]
+        result["model_calls_per_run"] = round(len(calls) / result["runs"], 2) if result["runs"] else None
+        result["mean_graph_score"] = round(statistics.mean(graph_scores), 3) if graph_scores else None
+        result["min_graph_score"] = min(graph_scores) if graph_scores else None
+        baseline = results[0]["mean_latency_s"] if results else result["mean_latency_s"]
+        result["latency_savings_pct"] = (round(100 * (1 - result["mean_latency_s"] / baseline), 1)
+                                         if baseline and result["mean_latency_s"] is not None else None)
+        results.append(result)
+    return results
+
+
+def _prepare_videos(video_files: List[str], synthetic_durations: List[float], bucket_name: Optional[str],
+                    storage=None) -> List[Dict[str, Any]]:
+    """
+    Video inputs for benchmark_video: gs:// URIs as they are, local files uploaded to `bucket_name`,
+    and synthetic MP4 containers written to the fake storage (fake backends only).
+    """
+    videos = []
+    for source in video_files:
+        if source.startswith("gs://"):
+            videos.append({"uri": source, "mime_type": guess_video_mime_type(source), "duration_s": None})
+            continue
+        if not bucket_name:
+            raise ValueError("--bucket is required to benchmark local video files.")
+        mime_type = guess_video_mime_type(source)
+        upload = upload_media_file(source, bucket_name, f"benchmarks/{Path(source).name}", content_type=mime_type)
+        videos.append({"uri": upload.uri, "mime_type": mime_type, "duration_s": mp4_duration_s(source)})
+    for duration_s in synthetic_durations:
+        if storage is None:
+            raise ValueError("Synthetic videos need the fake backends (--fake).")
+        blob_name = f"benchmarks/synthetic_{duration_s:g}s.mp4"
+        storage.put(bucket_name or "r2g-benchmarks", blob_name, synthetic_mp4(duration_s))
+        videos.append({"uri": f"gs://{bucket_name or 'r2g-benchmarks'}/{blob_name}", "mime_type": "video/mp4",
+                       "duration_s": duration_s})
+    if not videos:
+        raise ValueError("No videos to benchmark: pass --video-files or --synthetic-durations.")
+    return videos
+
+
+def print_results(title: str, results: List[Dict[str, Any]]) -> None:
+    """Prints benchmark results as an aligned table, one row per configuration."""
+    print(f"\n{title}")
+    if not results:
+        return
+    columns = [key for key in results[0] if key != "label"]
+    width = max(len(r["label"]) for r in results)
+    print(f"{'config':<{width}}  " + "  ".join(columns))
+    for result in results:
+        print(f"{result['label']:<{width}}  " +
+              "  ".join(f"{str(result.get(column)):>{len(column)}}" for column in columns))
+
+
+def _load_inputs(recipe_files: Optional[List[str]]) -> List[str]:
+    paths = [Path(p) for p in recipe_files] if recipe_files else DEFAULT_RECIPE_FILES
+    return [path.read_text(encoding="utf-8") for path in paths]
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Replay benchmarks for the recipe pipeline's model calls.")
+    parser.add_argument("--recipe-files", help="Comma-separated recipe text files to replay (default: dummy_recipe.txt).")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Replays per input and configuration.")
+    parser.add_argument("--fake", action="store_true", help="Use the in-process fake GenAI/GCS backends.")
+    parser.add_argument("--latency-scale", type=float, default=0.1, help="Fake backend latency multiplier.")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    prompts_parser = subparsers.add_parser("prompts", help="Compare prompt variants of a stage.")
+    prompts_parser.add_argument("--stage", choices=prompts.STAGES, default="generate")
+    prompts_parser.add_argument("--variants", help="Comma-separated variant names (default: all registered).")
+    prompts_parser.add_argument("--count-tokens", action="store_true",
+                                help="Count system prompt tokens with the count_tokens API.")
+
+    profiles_parser = subparsers.add_parser("profiles", help="Compare generation profiles of a stage.")
+    profiles_parser.add_argument("--stage", choices=prompts.STAGES, default="rewrite")
+    profiles_parser.add_argument("--profiles", help="Comma-separated profile names (default: all presets).")
+
+    grounding_parser = subparsers.add_parser("grounding", help="Compare grounding policies of a stage.")
+    grounding_parser.add_argument("--stage", choices=("draft", "generate", "improve"), default="draft")
+    grounding_parser.add_argument("--policies", help="Comma-separated policies (default: off,on,auto).")
+
+    strategies_parser = subparsers.add_parser("strategies", help="Compare two-pass and best-of-N graph generation.")
+    strategies_parser.add_argument("--strategies", help="Comma-separated strategies (default: two_pass,best_of_n).")
+    strategies_parser.add_argument("--candidates", type=int, default=BEST_OF_N_CANDIDATES,
+                                   help="Candidates generated concurrently by best_of_n.")
+
+    video_parser = subparsers.add_parser("video", help="Compare video sampling presets on recipe videos.")
+    video_parser.add_argument("--video-files", help="Comma-separated local video files or gs:// URIs.")
+    video_parser.add_argument("--synthetic-durations",
+                              help="Comma-separated durations (s) of synthetic videos (fake backends only).")
+    video_parser.add_argument("--presets", help="Comma-separated presets, including 'auto' (default: all presets).")
+    video_parser.add_argument("--bucket", help="GCS bucket local video files are uploaded to.")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    inputs = _load_inputs(args.recipe_files.split(",") if args.recipe_files else None)
+    # Import the SDK up front so the first configuration measured does not pay for it.
+    from google.genai import types  # noqa: F401
+    backends = fake_backends(args.latency_scale) if args.fake else nullcontext()
+    with backends as storage:
+        if args.benchmark == "prompts":
+            variant_names = args.variants.split(",") if args.variants else None
+            results = benchmark_prompts(args.stage, variant_names, inputs, args.repeats, PROJECT_ID,
+                                        count_tokens=args.count_tokens and not args.fake)
+            print_results(f"Prompt variants for stage '{args.stage}'", results)
+        elif args.benchmark == "profiles":
+            profile_names = args.profiles.split(",") if args.profiles else None
+            results = benchmark_profiles(args.stage, profile_names, inputs, args.repeats, PROJECT_ID)
+            print_results(f"Generation profiles for stage '{args.stage}'", results)
+        elif args.benchmark == "grounding":
+            policies = args.policies.split(",") if args.policies else None
+            results = benchmark_grounding(args.stage, policies, inputs, args.repeats, PROJECT_ID)
+            print_results(f"Grounding policies for stage '{args.stage}'", results)
+        elif args.benchmark == "strategies":
+            strategies = args.strategies.split(",") if args.strategies else None
+            results = benchmark_strategies(strategies, inputs, args.repeats, PROJECT_ID, args.candidates)
+            print_results("Graph strategies", results)
+        elif args.benchmark == "video":
+            videos = _prepare_videos(
+                args.video_files.split(",") if args.video_files else [],
+                [float(d) for d in args.synthetic_durations.split(",")] if args.synthetic_durations else [],
+                args.bucket, storage,
+            )
+            preset_names = args.presets.split(",") if args.presets else None
+            results = benchmark_video(preset_names, videos, args.repeats, PROJECT_ID)
+            print_results("Video presets for stage 'rewrite'", results)
+
+    report = {"benchmark": args.benchmark, "results": results}
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return report
+
+
+if __name__ == "__main__":
+    main()
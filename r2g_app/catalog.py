@@ -0,0 +1,203 @@
+"""
+catalog.py
+
+Local catalog of graph runs, so history views and duplicate checks do not list the bucket.
+
+Every successful text_to_graph run adds one row to a SQLite database (R2G_CATALOG_PATH, default
+"r2g_catalog.sqlite3" in the working directory; point it at a mounted volume to keep it across
+container restarts). A row holds the recipe name, content hashes of the recipe and the generated
+files, their GCS URIs, the models used, token usage and timings.
+
+Lookups are indexed: recipe-name prefix search (case-insensitive) with limit/offset pagination,
+most recent first, and runs by recipe content hash.
+
+Configuration:
+    R2G_CATALOG       "1" (default) to record runs, "0" to disable the catalog.
+    R2G_CATALOG_PATH  SQLite file path.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CATALOG_ENABLED = os.getenv("R2G_CATALOG", "1") == "1"
+CATALOG_PATH = os.getenv("R2G_CATALOG_PATH", "r2g_catalog.sqlite3")
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipe_name TEXT NOT NULL COLLATE NOCASE,
+    created_at REAL NOT NULL,
+    bucket TEXT,
+    recipe_sha256 TEXT NOT NULL,
+    html_sha256 TEXT,
+    css_sha256 TEXT,
+    js_sha256 TEXT,
+    recipe_uri TEXT,
+    html_uri TEXT,
+    css_uri TEXT,
+    js_uri TEXT,
+    graph_model TEXT,
+    models TEXT NOT NULL DEFAULT '[]',
+    model_calls INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    thoughts_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    model_latency_s REAL NOT NULL DEFAULT 0,
+    duration_s REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS runs_by_name ON runs (recipe_name, created_at);
+CREATE INDEX IF NOT EXISTS runs_by_recipe_hash ON runs (recipe_sha256);
+CREATE INDEX IF NOT EXISTS runs_by_time ON runs (created_at);
+"""
+
+
+def content_hash(text: Optional[str]) -> Optional[str]:
+    """SHA-256 hex digest of a text (None for missing or empty content)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest() if text else None
+
+
+@dataclass
+class RunRecord:
+    """One catalogued text_to_graph run."""
+    recipe_name: str
+    recipe_sha256: str
+    created_at: float = field(default_factory=time.time)
+    bucket: Optional[str] = None
+    html_sha256: Optional[str] = None
+    css_sha256: Optional[str] = None
+    js_sha256: Optional[str] = None
+    recipe_uri: Optional[str] = None
+    html_uri: Optional[str] = None
+    css_uri: Optional[str] = None
+    js_uri: Optional[str] = None
+    graph_model: Optional[str] = None
+    models: List[str] = field(default_factory=list)
+    model_calls: int = 0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    thoughts_tokens: int = 0
+    total_tokens: int = 0
+    model_latency_s: float = 0.0
+    duration_s: float = 0.0
+    run_id: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+_COLUMNS = [f.name for f in fields(RunRecord) if f.name != "run_id"]
+
+
+def _record_from_row(row: sqlite3.Row) -> RunRecord:
+    values = dict(row)
+    values["models"] = json.loads(values.get("models") or "[]")
+    return RunRecord(**values)
+
+
+def _prefix_pattern(query: str) -> str:
+    """LIKE pattern matching names that start with `query` (wildcards in the query are literal)."""
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%"
+
+
+class Catalog:
+    """
+    SQLite-backed run catalog. Safe to share between threads.
+
+    Args:
+        path: Database file path (":memory:" for a throwaway catalog).
+    """
+
+    def __init__(self, path: str = CATALOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def add_run(self, record: RunRecord) -> int:
+        """Stores a run and returns its run_id."""
+        values = [json.dumps(record.models) if name == "models" else getattr(record, name) for name in _COLUMNS]
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"INSERT INTO runs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})", values
+            )
+        record.run_id = cursor.lastrowid
+        return record.run_id
+
+    def get_run(self, run_id: int) -> Optional[RunRecord]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return _record_from_row(row) if row else None
+
+    def search_runs(self, query: str = "", limit: int = DEFAULT_PAGE_SIZE, offset: int = 0) -> List[RunRecord]:
+        """
+        Runs whose recipe name starts with `query` (all runs for an empty query), most recent first.
+
+        Args:
+            query: Case-insensitive recipe-name prefix.
+            limit: Page size (capped at MAX_PAGE_SIZE).
+            offset: Number of matching runs to skip.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        where, params = self._name_filter(query)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM runs {where} ORDER BY created_at DESC, run_id DESC LIMIT ? OFFSET ?",
+                (*params, limit, max(0, offset)),
+            ).fetchall()
+        return [_record_from_row(row) for row in rows]
+
+    def count_runs(self, query: str = "") -> int:
+        """Number of runs search_runs() pages through for `query`."""
+        where, params = self._name_filter(query)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM runs {where}", params).fetchone()[0]
+
+    def find_by_recipe_hash(self, recipe_sha256: str, limit: int = DEFAULT_PAGE_SIZE) -> List[RunRecord]:
+        """Runs of the same standardized recipe text (see content_hash), most recent first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM runs WHERE recipe_sha256 = ? ORDER BY created_at DESC LIMIT ?", (recipe_sha256, limit)
+            ).fetchall()
+        return [_record_from_row(row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _name_filter(query: str):
+        query = (query or "").strip()
+        if not query:
+            return "", ()
+        return "WHERE recipe_name LIKE ? ESCAPE '\\'", (_prefix_pattern(query),)
+
+
+_catalog: Optional[Catalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> Catalog:
+    """Returns the process-wide catalog, opening CATALOG_PATH on first use."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = Catalog(CATALOG_PATH)
+                logger.info(f"Run catalog opened at {CATALOG_PATH}.")
+    return _catalog
@@ -0,0 +1,120 @@
+"""
+deadlines.py
+
+End-to-end deadlines for pipeline runs.
+
+A Deadline is created when a run starts (process_text, text_to_graph, revise_recipe) and
+passed down to every stage. Before each stage the run checks it (cooperative cancellation:
+a run that can no longer finish in time stops instead of doing work nobody will see), and
+the stage gets a share of the remaining time, proportional to its weight among the stages
+still to run, which is passed to the SDK call as its request timeout.
+
+A run is cancelled through its Deadline: cancel() (e.g. jobs.JobQueue.cancel) or a
+`cancel_when` condition (e.g. nobody polled the job recently) makes the next check fail.
+"""
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Union
+
+# Relative cost of each stage, used to split the remaining budget
+STAGE_BUDGET_WEIGHTS: Dict[str, float] = {
+    "draft": 2.0,
+    "rewrite": 1.0,
+    "revise": 1.0,
+    "generate": 4.0,
+    "improve": 4.0,
+    "improve_patch": 2.0,
+    "repair": 2.0,
+    "complete": 2.0,
+    "upload": 0.5,
+}
+# Stages are not started with less time than this; the run stops instead.
+MIN_STAGE_BUDGET_S = 2.0
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a run's deadline has passed (or it was cancelled) before a stage could start."""
+
+
+class Deadline:
+    """
+    Absolute deadline of a run, with an optional cancellation flag.
+
+    Args:
+        timeout_s: Seconds from now until the deadline, or None for no time limit.
+        cancel_when: Condition evaluated at each check; once it returns True the run is cancelled.
+    """
+
+    def __init__(self, timeout_s: Optional[float] = None, cancel_when: Optional[Callable[[], bool]] = None):
+        self.timeout_s = timeout_s
+        self._expires_at = time.monotonic() + timeout_s if timeout_s is not None else None
+        self._cancelled = threading.Event()
+        self._cancel_when = cancel_when
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (never negative), or None without a time limit."""
+        if self._expires_at is None:
+            return None
+        return max(0.0, self._expires_at - time.monotonic())
+
+    def cancel(self) -> None:
+        """Asks the run to stop at its next check."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._cancelled.is_set() and self._cancel_when is not None and self._cancel_when():
+            self._cancelled.set()
+        return self._cancelled.is_set()
+
+    def check(self, stage: str) -> None:
+        """
+        Raises if `stage` should not start.
+
+        Raises:
+            DeadlineExceededError: If the run was cancelled or less than MIN_STAGE_BUDGET_S is left.
+        """
+        if self.cancelled:
+            raise DeadlineExceededError(f"Run cancelled before stage '{stage}'.")
+        remaining = self.remaining()
+        if remaining is not None and remaining < MIN_STAGE_BUDGET_S:
+            raise DeadlineExceededError(
+                f"Deadline of {self.timeout_s:.0f}s reached before stage '{stage}' ({remaining:.1f}s left)."
+            )
+
+    def budget(self, stage: str, remaining_stages: Iterable[str] = ()) -> Optional[float]:
+        """
+        Checks the deadline and returns the time allotted to `stage`.
+
+        Args:
+            stage: The stage about to run.
+            remaining_stages: Stages that still have to run after it.
+
+        Returns:
+            The stage's timeout in seconds (its weighted share of the remaining time), or None
+            without a time limit.
+
+        Raises:
+            DeadlineExceededError: See check().
+        """
+        self.check(stage)
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+        weights = [STAGE_BUDGET_WEIGHTS.get(s, 1.0) for s in (stage, *remaining_stages)]
+        share = remaining * weights[0] / sum(weights)
+        return max(MIN_STAGE_BUDGET_S, share)
+
+
+def as_deadline(deadline: Union[Deadline, float, None], default_s: Optional[float] = None) -> Deadline:
+    """
+    Normalizes a deadline argument.
+
+    Args:
+        deadline: A Deadline (returned as is, so nested calls share it), seconds from now, or None.
+        default_s: Seconds to use when `deadline` is None (None or 0 for no time limit).
+    """
+    if isinstance(deadline, Deadline):
+        return deadline
+    timeout_s = deadline if deadline is not None else default_s
+    return Deadline(timeout_s if timeout_s else None)
@@ -0,0 +1,247 @@
+"""
+dedup.py
+
+Near-duplicate detection of recipe drafts and standardized recipes, to reuse earlier results.
+
+Texts are normalized (case, bullets, numbering, markdown and punctuation removed, whitespace
+collapsed) and cut into character shingles. A MinHash signature of the shingles estimates the
+Jaccard similarity of two texts; locality-sensitive hashing over bands of the signature finds
+candidate matches without comparing against every entry. No external embedding service is used.
+
+Two kinds of entries are kept in memory, per process:
+    draft  recipe draft        -> standardized recipe (reused by process_text)
+    graph  standardized recipe -> text_to_graph result, scoped to the GCS bucket and recipe name
+
+A match needs an estimated similarity of at least R2G_DEDUP_THRESHOLD, exactly the same set of
+words and exactly the same numbers (quantities, times, temperatures) as the new text. Only
+reformatting, reordering and repeated words are treated as duplicates: an edited ingredient, step
+or quantity is never answered with the old result, however similar the texts are overall.
+
+Configuration:
+    R2G_DEDUP              "1" (default) to enable, "0" to disable.
+    R2G_DEDUP_THRESHOLD    Minimum estimated Jaccard similarity (default 0.9).
+    R2G_DEDUP_MAX_ENTRIES  Entries kept per kind; the oldest are evicted first (default 500).
+
+Index sizes, lookup latencies and hit rates are reported by index_stats() (in /v1/stats).
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Deque, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from . import metrics
+
+# numpy is imported on the first signature, not with the module: main imports dedup at startup.
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEDUP_ENABLED = os.getenv("R2G_DEDUP", "1") == "1"
+SIMILARITY_THRESHOLD = float(os.getenv("R2G_DEDUP_THRESHOLD", "0.9"))
+MAX_ENTRIES_PER_KIND = int(os.getenv("R2G_DEDUP_MAX_ENTRIES", "500"))
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 16  # 16 bands of 8 rows: texts with a similarity above ~0.7 become candidates
+DEDUP_KINDS = ("draft", "graph")
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_PERMUTATION_SEED = 20240601  # Fixed seed: signatures must be comparable across processes
+_ROWS_PER_BAND = NUM_PERMUTATIONS // LSH_BANDS
+
+_MARKUP_RE = re.compile(r"^\s*(?:#+|[-*•]|\d+[.)])\s+", re.MULTILINE)
+_PUNCTUATION_RE = re.compile(r"[^\w\s/.]|(?<!\d)[./]|[./](?!\d)")
+_NUMBER_RE = re.compile(r"\d+(?:[./]\d+)?|[½⅓⅔¼¾⅛]")
+
+
+def normalize_text(text: str) -> str:
+    """Lower-cases a recipe text and removes list markup, punctuation and extra whitespace."""
+    text = _MARKUP_RE.sub(" ", text.lower())
+    text = _PUNCTUATION_RE.sub(" ", text)
+    return " ".join(text.split())
+
+
+def _numbers(normalized: str) -> Tuple[str, ...]:
+    return tuple(sorted(_NUMBER_RE.findall(normalized)))
+
+
+def _words(normalized: str) -> FrozenSet[str]:
+    return frozenset(word for word in normalized.split() if not _NUMBER_RE.fullmatch(word))
+
+
+@lru_cache(maxsize=1)
+def _permutations() -> Tuple[np.ndarray, np.ndarray]:
+    """Coefficients (a, b) of the NUM_PERMUTATIONS hash permutations (a * x + b) mod p."""
+    import numpy as np
+
+    rng = np.random.RandomState(_PERMUTATION_SEED)
+    perm_a = rng.randint(1, _MERSENNE_PRIME, size=NUM_PERMUTATIONS).astype(np.uint64)
+    perm_b = rng.randint(0, _MERSENNE_PRIME, size=NUM_PERMUTATIONS).astype(np.uint64)
+    return perm_a, perm_b
+
+
+def minhash_signature(normalized: str) -> np.ndarray:
+    """MinHash signature (NUM_PERMUTATIONS uint64 values) of a normalized text's character shingles."""
+    import numpy as np
+
+    perm_a, perm_b = _permutations()
+    shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(max(1, len(normalized) - SHINGLE_SIZE + 1))}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+        dtype=np.uint64, count=len(shingles),
+    )
+    # (a * x + b) mod p for every permutation (rows) and shingle hash (columns); all values stay below 2^63
+    permuted = (np.outer(perm_a, hashes) + perm_b[:, None]) % np.uint64(_MERSENNE_PRIME)
+    return permuted.min(axis=1)
+
+
+def estimate_similarity(signature_a: np.ndarray, signature_b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    return float((signature_a == signature_b).mean())
+
+
+@dataclass
+class DedupMatch:
+    """An earlier result whose input is a near duplicate of the new one."""
+    kind: str
+    similarity: float
+    result: Any
+
+
+@dataclass
+class _Entry:
+    signature: np.ndarray
+    words: FrozenSet[str]
+    numbers: Tuple[str, ...]
+    scope: str
+    result: Any
+
+
+class DedupIndex:
+    """
+    In-memory MinHash/LSH index of earlier inputs and their results. Safe to share between threads.
+
+    Args:
+        threshold: Minimum estimated similarity of a match.
+        max_entries: Entries kept per kind (oldest evicted first).
+    """
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, max_entries: int = MAX_ENTRIES_PER_KIND):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[str, "OrderedDict[int, _Entry]"] = defaultdict(OrderedDict)
+        self._buckets: Dict[Tuple[str, int, bytes], Set[int]] = defaultdict(set)
+        self._next_id = 0
+        self._lookups: Dict[str, int] = defaultdict(int)
+        self._hits: Dict[str, int] = defaultdict(int)
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=metrics.LATENCY_WINDOW))
+
+    @staticmethod
+    def _band_keys(kind: str, signature: np.ndarray) -> List[Tuple[str, int, bytes]]:
+        return [(kind, band, signature[band * _ROWS_PER_BAND:(band + 1) * _ROWS_PER_BAND].tobytes())
+                for band in range(LSH_BANDS)]
+
+    def add(self, kind: str, text: str, result: Any, scope: str = "") -> None:
+        """
+        Indexes an input text and its result.
+
+        Args:
+            kind: Entry kind (see DEDUP_KINDS).
+            text: The input the result was produced from.
+            result: The result to return for near duplicates.
+            scope: Lookups only match entries of the same scope (e.g. the GCS bucket and recipe name).
+        """
+        normalized = normalize_text(text)
+        if not normalized:
+            return
+        entry = _Entry(minhash_signature(normalized), _words(normalized), _numbers(normalized), scope, result)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[kind][entry_id] = entry
+            for key in self._band_keys(kind, entry.signature):
+                self._buckets[key].add(entry_id)
+            while len(self._entries[kind]) > self.max_entries:
+                old_id, old_entry = self._entries[kind].popitem(last=False)
+                for key in self._band_keys(kind, old_entry.signature):
+                    self._buckets[key].discard(old_id)
+                    if not self._buckets[key]:
+                        del self._buckets[key]
+
+    def lookup(self, kind: str, text: str, scope: str = "") -> Optional[DedupMatch]:
+        """
+        Finds the most similar earlier input of `kind` and `scope` at or above the threshold, with
+        the same words and numbers as `text`.
+
+        Returns:
+            The match, or None. Every lookup is counted for index_stats() and in metrics ("dedup").
+        """
+        start_time = time.perf_counter()
+        normalized = normalize_text(text)
+        match = None
+        if normalized:
+            signature = minhash_signature(normalized)
+            words, numbers = _words(normalized), _numbers(normalized)
+            with self._lock:
+                candidates = set()
+                for key in self._band_keys(kind, signature):
+                    candidates |= self._buckets.get(key, set())
+                entries = self._entries[kind]
+                for entry_id in candidates:
+                    entry = entries[entry_id]
+                    if entry.scope != scope or entry.words != words or entry.numbers != numbers:
+                        continue
+                    similarity = estimate_similarity(signature, entry.signature)
+                    if similarity >= self.threshold and (match is None or similarity > match.similarity):
+                        match = DedupMatch(kind, similarity, entry.result)
+        latency_s = time.perf_counter() - start_time
+        with self._lock:
+            self._lookups[kind] += 1
+            self._hits[kind] += match is not None
+            self._latencies[kind].append(latency_s)
+        metrics.increment("dedup", f"{kind}/{'hit' if match else 'miss'}")
+        return match
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per kind: entries, lookups, hits, hit rate and lookup latency percentiles."""
+        with self._lock:
+            report = {}
+            for kind in sorted(set(DEDUP_KINDS) | set(self._entries) | set(self._lookups)):
+                lookups, latencies = self._lookups[kind], list(self._latencies[kind])
+                report[kind] = {
+                    "entries": len(self._entries[kind]),
+                    "lookups": lookups,
+                    "hits": self._hits[kind],
+                    "hit_rate": round(self._hits[kind] / lookups, 3) if lookups else None,
+                    "p50_lookup_ms": round(metrics.percentile(latencies, 50) * 1000, 3) if latencies else None,
+                    "p95_lookup_ms": round(metrics.percentile(latencies, 95) * 1000, 3) if latencies else None,
+                }
+            return report
+
+
+_index: Optional[DedupIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_dedup_index() -> DedupIndex:
+    """Returns the process-wide index."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = DedupIndex()
+    return _index
+
+
+def index_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats of the process-wide index (empty when deduplication is disabled)."""
+    return get_dedup_index().stats() if DEDUP_ENABLED else {}
@@ -0,0 +1,347 @@
+"""
+fake_backends.py
+
+In-process stand-ins for the Vertex AI (GenAI) and Google Cloud Storage backends.
+
+They let the real pipeline code in main.py and genai_funs.py run end to end
+without credentials or network access, with a configurable simulated latency
+per model. Used by the load-test harness (load_harness.py).
+"""
+import base64
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Dict, Iterator, Optional, Union
+
+from .prompts import stage_of_prompt
+
+logger = logging.getLogger(__name__)
+
+# Simulated wall-clock latency (seconds) of a single generate_content call per model.
+FAKE_MODEL_LATENCY_S: Dict[str, float] = {
+    "gemini-2.5-flash": 0.5,
+    "gemini-2.5-pro": 2.0,
+}
+DEFAULT_FAKE_LATENCY_S = 1.0
+# Extra simulated latency of a call with the Google Search tool attached (retrieval round trips).
+FAKE_GROUNDING_LATENCY_S = 1.0
+# Simulated video input: tokens per sampled frame by media resolution, audio tokens per second,
+# the default sampling rate, and the extra latency per 1000 prompt tokens of video.
+FAKE_VIDEO_FRAME_TOKENS: Dict[Optional[str], int] = {None: 258, "high": 258, "medium": 258, "low": 66}
+FAKE_VIDEO_AUDIO_TOKENS_PER_S = 32
+FAKE_VIDEO_DEFAULT_FPS = 1.0
+FAKE_VIDEO_LATENCY_S_PER_1K_TOKENS = 0.05
+
+FAKE_STANDARDISED_RECIPE = """Ingredients:
+
+Batter
+* 1 cup flour
+* 1/2 cup sugar
+* 1 egg
+
+Steps:
+
+## Prepare Batter
+1. Combine the flour and sugar in a large bowl.
+2. Beat the egg and fold it into the dry mixture.
+
+## Bake
+1. After `## Prepare Batter` Step 2 is complete, bake at 350F for 20 minutes.
+"""
+
+FAKE_GRAPH_CODE = """```html filename="index.html"
+<!DOCTYPE html>
+<html lang="en">
+<head>
+ <meta charset="UTF-8">
+ <title>Recipe Flow - Test Recipe</title>
+ <link rel="stylesheet" href="style.css">
+</head>
+<body>
+ <div id="cy"></div>
+ <div id="node-details-display"></div>
+ <script src="https://unpkg.com/cytoscape/dist/cytoscape.min.js"></script>
+ <script src="https://unpkg.com/dagre@0.8.5/dist/dagre.min.js"></script>
+ <script src="https://unpkg.com/cytoscape-dagre@2.5.0/cytoscape-dagre.js"></script>
+ <script src="script.js"></script>
+</body>
+</html>
+```
+
+```css filename="style.css"
+body { font-family: sans-serif; margin: 0; padding: 20px; background-color: #f4f4f4; }
+#cy { width: 100%; height: 80vh; display: block; border: 1px solid #ccc; }
+#node-details-display { padding: 10px; }
+```
+
+```javascript filename="script.js"
+document.addEventListener('DOMContentLoaded', () => {
+ if (typeof cytoscape === 'undefined' || typeof dagre === 'undefined' || typeof cytoscapeDagre === 'undefined') {
+  document.getElementById('cy').innerHTML = '<p>Error: Core graph libraries failed to load.</p>';
+  return;
+ }
+ cytoscape.use(cytoscapeDagre);
+
+ const elements = [
+  { group: 'nodes', data: { id: "flour", label: "1 cup Flour", type: 'ingredient' } },
+  { group: 'nodes', data: { id: "sugar", label: "1/2 cup Sugar", type: 'ingredient' } },
+  { group: 'nodes', data: { id: "egg", label: "1 Egg", type: 'ingredient' } },
+  { group: 'nodes', data: { id: "PrepareBatter", label: "1. Prepare Batter", type: 'section' }, classes: 'parent-node' },
+  { group: 'nodes', data: { id: "Bake", label: "2. Bake", type: 'section' }, classes: 'parent-node' },
+  { group: 'nodes', data: { id: "mix_dry", label: "Mix Dry", type: 'action', parent: "PrepareBatter", details: "Combine the flour and sugar in a large bowl." } },
+  { group: 'nodes', data: { id: "fold_egg", label: "Fold in Egg", type: 'action', parent: "PrepareBatter", details: "Beat the egg and fold it into the dry mixture." } },
+  { group: 'nodes', data: { id: "bake", label: "Bake", type: 'action', parent: "Bake", details: "Bake at 350F for 20 minutes." } },
+  { group: 'edges', data: { id: 'e_flour_mix', source: 'flour', target: 'mix_dry', type: 'material' } },
+  { group: 'edges', data: { id: 'e_sugar_mix', source: 'sugar', target: 'mix_dry', type: 'material' } },
+  { group: 'edges', data: { id: 'e_egg_fold', source: 'egg', target: 'fold_egg', type: 'material' } },
+  { group: 'edges', data: { id: 'e_mix_fold', source: 'mix_dry', target: 'fold_egg', type: 'material', label: 'Add egg' } },
+  { group: 'edges', data: { id: 'e_fold_bake', source: 'fold_egg', target: 'bake', type: 'time', label: '20 min' } },
+ ];
+
+ const cy = cytoscape({
+  container: document.getElementById('cy'),
+  elements: elements,
+  style: [
+   { selector: 'node', style: { 'label': 'data(label)', 'text-wrap': 'wrap', 'text-max-width': '80px', 'font-size': '9px' } },
+   { selector: 'node[type="ingredient"]', style: { 'shape': 'ellipse', 'background-color': '#DDEEFF' } },
+   { selector: 'node[type="action"]', style: { 'shape': 'round-rectangle', 'background-color': '#e0f7fa' } },
+   { selector: 'edge', style: { 'curve-style': 'bezier', 'target-arrow-shape': 'triangle', 'label': 'data(label)' } },
+   { selector: 'edge[type="time"]', style: { 'line-style': 'dashed' } },
+  ],
+  layout: { name: 'dagre', rankDir: 'TB', nodeSep: 40, rankSep: 60, padding: 20, fit: true }
+ });
+
+ cy.on('tap', 'node', function(evt) {
+  const node = evt.target;
+  document.getElementById('node-details-display').innerHTML = `<h3>${node.data('label')}</h3><p>${node.data('details') || ''}</p>`;
+ });
+});
+```
+"""
+
+FAKE_REPAIRED_SCRIPT = FAKE_GRAPH_CODE[FAKE_GRAPH_CODE.index("```javascript"):]
+
+# Style edits for the improve_patch stage (see graph_patch.py): one replaced CSS rule, one replaced
+# and one added Cytoscape style entry, and a class added to an ingredient
+FAKE_GRAPH_PATCH = json.dumps({
+    "css_rules": [{"selector": "body", "declarations": "font-family: 'Helvetica Neue', Arial, sans-serif; "
+                                                       "margin: 0; padding: 20px; background-color: #fafafa"}],
+    "style_entries": [
+        {"selector": "node[type=\"ingredient\"]",
+         "style": {"shape": "ellipse", "background-color": "#FFF5E1", "border-width": 2, "border-color": "#E0C9A6"}},
+        {"selector": ".grain-ingredient", "style": {"background-color": "#F3E5AB"}},
+    ],
+    "node_classes": [{"id": "flour", "classes": "grain-ingredient"}],
+}, indent=1)
+
+# Canned responses per pipeline stage; the stage is recognised from the system prompt (any registered variant).
+_FAKE_RESPONSES_BY_STAGE: Dict[str, str] = {
+    "draft": FAKE_STANDARDISED_RECIPE,
+    "rewrite": FAKE_STANDARDISED_RECIPE,
+    "revise": FAKE_STANDARDISED_RECIPE,
+    "generate": FAKE_GRAPH_CODE,
+    "improve": FAKE_GRAPH_CODE,
+    "improve_patch": FAKE_GRAPH_PATCH,
+    "repair": FAKE_REPAIRED_SCRIPT,
+    "complete": FAKE_GRAPH_CODE,
+}
+
+
+def _system_prompt_of(config) -> str:
+    """Returns the system instruction text of a GenerateContentConfig, or an empty string."""
+    parts = getattr(config, "system_instruction", None) or []
+    return "".join(getattr(part, "text", "") or "" for part in parts)
+
+
+def _offset_seconds(offset: Optional[str]) -> Optional[float]:
+    return float(offset.rstrip("s")) if offset else None
+
+
+class _FakeModels:
+    """Mimics the `client.models` namespace of genai.Client."""
+
+    def __init__(self, latency_scale: float, storage: Optional["FakeStorage"] = None):
+        self._latency_scale = latency_scale
+        self._storage = storage
+
+    def _video_tokens(self, contents, config) -> int:
+        """Estimated prompt tokens of the gs:// videos in `contents` stored in the fake storage."""
+        from .media_upload import mp4_duration_s
+
+        resolution = getattr(config, "media_resolution", None)
+        resolution = resolution.name.rsplit("_", 1)[-1].lower() if resolution is not None else None
+        tokens = 0
+        for content in contents or []:
+            for part in getattr(content, "parts", None) or []:
+                uri = getattr(getattr(part, "file_data", None), "file_uri", None) or ""
+                if not uri.startswith("gs://") or self._storage is None:
+                    continue
+                bucket_name, _, blob_name = uri[len("gs://"):].partition("/")
+                data = self._storage.get(bucket_name, blob_name)
+                duration_s = mp4_duration_s(data) if isinstance(data, bytes) else None
+                if duration_s is None:
+                    continue
+                metadata = getattr(part, "video_metadata", None)
+                start_s = _offset_seconds(getattr(metadata, "start_offset", None)) or 0.0
+                end_s = _offset_seconds(getattr(metadata, "end_offset", None))
+                clip_s = max(0.0, min(duration_s, end_s if end_s is not None else duration_s) - start_s)
+                fps = getattr(metadata, "fps", None) or FAKE_VIDEO_DEFAULT_FPS
+                tokens += int(clip_s * (fps * FAKE_VIDEO_FRAME_TOKENS[resolution] + FAKE_VIDEO_AUDIO_TOKENS_PER_S))
+        return tokens
+
+    def generate_content(self, model: str, contents, config=None):
+        system_prompt = _system_prompt_of(config)
+        text = _FAKE_RESPONSES_BY_STAGE.get(stage_of_prompt(system_prompt), FAKE_STANDARDISED_RECIPE)
+        video_tokens = self._video_tokens(contents, config)
+        latency = FAKE_MODEL_LATENCY_S.get(model, DEFAULT_FAKE_LATENCY_S)
+        latency += video_tokens / 1000 * FAKE_VIDEO_LATENCY_S_PER_1K_TOKENS
+        if getattr(config, "tools", None):
+            latency += FAKE_GROUNDING_LATENCY_S
+        latency *= self._latency_scale
+        timeout_ms = getattr(getattr(config, "http_options", None), "timeout", None)
+        if timeout_ms is not None and latency > timeout_ms / 1000:
+            time.sleep(timeout_ms / 1000)
+            raise TimeoutError(f"Fake request to '{model}' timed out after {timeout_ms} ms.")
+        time.sleep(latency)
+        usage = SimpleNamespace(
+            prompt_token_count=len(system_prompt) // 4 + len(str(contents)) // 4 + video_tokens,
+            candidates_token_count=len(text) // 4,
+            thoughts_token_count=0,
+            total_token_count=(len(system_prompt) + len(str(contents)) + len(text)) // 4 + video_tokens,
+        )
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+class FakeGenAIClient:
+    """
+    Drop-in replacement for genai.Client that returns canned agent outputs.
+
+    Video inputs stored in `storage` add estimated video prompt tokens (and latency), following
+    their clipping, frame rate and media resolution.
+    """
+
+    def __init__(self, latency_scale: float = 1.0, storage: Optional["FakeStorage"] = None):
+        self.models = _FakeModels(latency_scale, storage)
+
+
+def _fake_crc32c(data) -> str:
+    import google_crc32c
+
+    raw = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+    return base64.b64encode(google_crc32c.Checksum(raw).digest()).decode("ascii")
+
+
+class _FakeBlob:
+    def __init__(self, storage: "FakeStorage", bucket_name: str, name: str):
+        self._storage = storage
+        self.bucket_name = bucket_name
+        self.name = name
+        self.content_type = None
+
+    @property
+    def crc32c(self) -> Optional[str]:
+        data = self._storage.get(self.bucket_name, self.name)
+        return _fake_crc32c(data) if data is not None else None
+
+    def upload_from_string(self, data, content_type: str = "application/octet-stream", **kwargs):
+        self._storage.put(self.bucket_name, self.name, data)
+
+    def upload_from_filename(self, filename: str, content_type: Optional[str] = None, **kwargs):
+        with open(filename, "rb") as f:
+            self._storage.put(self.bucket_name, self.name, f.read())
+
+    def compose(self, sources, **kwargs):
+        parts = [self._storage.get(self.bucket_name, source.name) for source in sources]
+        self._storage.put(self.bucket_name, self.name,
+                          b"".join(p.encode("utf-8") if isinstance(p, str) else p for p in parts))
+
+    def delete(self, **kwargs):
+        self._storage.delete(self.bucket_name, self.name)
+
+    def download_as_text(self, **kwargs) -> str:
+        return self._storage.get(self.bucket_name, self.name)
+
+    def exists(self, **kwargs) -> bool:
+        return self._storage.get(self.bucket_name, self.name) is not None
+
+
+class _FakeBucket:
+    def __init__(self, storage: "FakeStorage", name: str):
+        self._storage = storage
+        self.name = name
+
+    def blob(self, blob_name: str) -> _FakeBlob:
+        return _FakeBlob(self._storage, self.name, blob_name)
+
+    def get_blob(self, blob_name: str, **kwargs) -> Optional[_FakeBlob]:
+        blob = self.blob(blob_name)
+        return blob if blob.exists() else None
+
+    def exists(self, **kwargs) -> bool:
+        return True
+
+
+class FakeStorage:
+    """Thread-safe in-memory object store standing in for GCS."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._objects: Dict[str, Union[str, bytes]] = {}
+
+    def put(self, bucket_name: str, blob_name: str, data) -> None:
+        with self._lock:
+            self._objects[f"gs://{bucket_name}/{blob_name}"] = data
+
+    def get(self, bucket_name: str, blob_name: str) -> Optional[Union[str, bytes]]:
+        with self._lock:
+            return self._objects.get(f"gs://{bucket_name}/{blob_name}")
+
+    def delete(self, bucket_name: str, blob_name: str) -> None:
+        with self._lock:
+            self._objects.pop(f"gs://{bucket_name}/{blob_name}", None)
+
+    def bucket(self, bucket_name: str) -> _FakeBucket:
+        return _FakeBucket(self, bucket_name)
+
+    def upload_to_gcs(self, bucket_name: str, destination_blob_name: str, source_file_name: Optional[str] = None,
+                      source_content_string: Optional[str] = None, content_type: str = 'application/octet-stream',
+                      timeout: Optional[float] = None):
+        """Same signature as aux_funs.upload_to_gcs, writing into memory instead."""
+        self.put(bucket_name, destination_blob_name, source_content_string)
+
+
+@contextmanager
+def fake_backends(latency_scale: float = 1.0) -> Iterator[FakeStorage]:
+    """
+    Routes the pipeline's GenAI and GCS calls to in-memory fakes for the duration of the block.
+
+    Args:
+        latency_scale: Multiplier applied to FAKE_MODEL_LATENCY_S (0 disables the simulated latency).
+
+    Yields:
+        The FakeStorage instance receiving all uploads.
+    """
+    # Imported here so that importing this module never pulls in the SDKs on its own.
+    from . import genai_funs, main, media_upload, results
+
+    storage = FakeStorage()
+    patches = [
+        (genai_funs, "_get_genai_client", lambda *args, **kwargs: FakeGenAIClient(latency_scale, storage)),
+        (main, "_get_gcs_bucket", lambda bucket_name, timeout=None: storage.bucket(bucket_name)),
+        (main, "upload_to_gcs", storage.upload_to_gcs),
+        (media_upload, "_get_bucket", storage.bucket),
+        (results, "_get_bucket", storage.bucket),
+    ]
+    originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, replacement in patches:
+        setattr(module, name, replacement)
+    logger.info(f"Fake GenAI/GCS backends enabled (latency scale {latency_scale}).")
+    try:
+        yield storage
+    finally:
+        for module, name, original in originals:
+            setattr(module, name, original)
+        logger.info("Fake GenAI/GCS backends disabled.")
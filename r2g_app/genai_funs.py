@@ -1,14 +1,30 @@
+from __future__ import annotations
+
+import contextvars
+import json
 import logging
 import os
-from typing import List, Optional, Dict, Any, Literal
-from google import genai
-from google.genai import types
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, fields, replace
+from typing import TYPE_CHECKING, List, Optional, Dict, Any, Literal, Tuple, Union
+
+# The GenAI SDK takes most of a second to import, so it is only imported on first use
+# (see _get_genai_client and the agent functions) to keep container cold starts fast.
+if TYPE_CHECKING:
+    from google import genai
+    from google.genai import types
+
+from . import metrics
+from .grounding import should_ground
 
 # --- Centralized Configuration Constants ---
 PROJECT_ID = os.getenv("PROJECT_ID")
 DEFAULT_VERTEX_LOCATION = "us-central1"
 PROCESS_TEXT_MODEL_NAME = "gemini-2.5-flash"
 TEXT_TO_GRAPH_MODEL_NAME = "gemini-2.5-pro"
+FAST_GRAPH_MODEL_NAME = "gemini-2.5-flash"  # Used for simple recipes (see routing.py)
 DEFAULT_TOP_P = 1.0
 DEFAULT_MAX_TOKENS = 33333
 
@@ -18,27 +34,194 @@ RECIPE_REWRITE_TEMP = 0.8
 RECIPE_REVISE_TEMP = 0.8  # Assuming revision might need similar creativity
 GRAPH_GEN_TEMP = 0.2
 GRAPH_IMPROVE_TEMP = 0.2
+GRAPH_REPAIR_TEMP = 0.0
+GRAPH_COMPLETE_TEMP = 0.0
+
+# Hedged requests (see _call_generate_content)
+HEDGING_ENABLED = os.getenv("R2G_HEDGING", "0") == "1"
+HEDGE_SECONDARY_LOCATION = os.getenv("R2G_HEDGE_SECONDARY_LOCATION", "us-east4")
+HEDGE_PERCENTILE = float(os.getenv("R2G_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("R2G_HEDGE_MIN_SAMPLES", "20"))  # Latencies needed before the deadline is learned
+HEDGE_DEFAULT_DEADLINE_S = float(os.getenv("R2G_HEDGE_DEFAULT_DEADLINE_SECONDS", "60"))
+HEDGE_MIN_DEADLINE_S = float(os.getenv("R2G_HEDGE_MIN_DEADLINE_SECONDS", "2"))
+HEDGE_MAX_WORKERS = int(os.getenv("R2G_HEDGE_WORKERS", "32"))
+# Latency SLO per model; past it, the same request is also sent to SLO_FALLBACK_MODEL (unset = no fallback)
+MODEL_SLO_SECONDS: Dict[str, float] = {
+    TEXT_TO_GRAPH_MODEL_NAME: float(os.environ["R2G_PRO_SLO_SECONDS"])
+} if os.getenv("R2G_PRO_SLO_SECONDS") else {}
+SLO_FALLBACK_MODEL = os.getenv("R2G_SLO_FALLBACK_MODEL", FAST_GRAPH_MODEL_NAME)
 # --- End of Configuration Constants ---
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+
+# --- Per-stage Generation Profiles ---
+@dataclass(frozen=True)
+class GenerationProfile:
+    """
+    Generation settings for one pipeline stage.
+
+    thinking_budget is the maximum number of thinking tokens (None lets the model decide;
+    0 disables thinking on models that allow it). Thinking tokens count towards
+    max_output_tokens. include_thoughts returns thought summaries in the response, which
+    the pipeline never reads, so it is off by default.
+    """
+    temperature: float
+    max_output_tokens: int
+    thinking_budget: Optional[int] = None
+    include_thoughts: bool = False
+
+
+# Defaults: the text stages are light rewrites with a small thinking budget and output
+# ceiling; the graph stages keep dynamic thinking and the full output ceiling.
+DEFAULT_GENERATION_PROFILES: Dict[str, GenerationProfile] = {
+    "draft": GenerationProfile(temperature=RECIPE_DRAFT_TEMP, max_output_tokens=16384, thinking_budget=2048),
+    "rewrite": GenerationProfile(temperature=RECIPE_REWRITE_TEMP, max_output_tokens=12288, thinking_budget=1024),
+    "revise": GenerationProfile(temperature=RECIPE_REVISE_TEMP, max_output_tokens=12288, thinking_budget=1024),
+    "generate": GenerationProfile(temperature=GRAPH_GEN_TEMP, max_output_tokens=DEFAULT_MAX_TOKENS),
+    "improve": GenerationProfile(temperature=GRAPH_IMPROVE_TEMP, max_output_tokens=DEFAULT_MAX_TOKENS),
+    "improve_patch": GenerationProfile(temperature=GRAPH_IMPROVE_TEMP, max_output_tokens=16384, thinking_budget=2048),
+    "repair": GenerationProfile(temperature=GRAPH_REPAIR_TEMP, max_output_tokens=DEFAULT_MAX_TOKENS, thinking_budget=2048),
+    "complete": GenerationProfile(temperature=GRAPH_COMPLETE_TEMP, max_output_tokens=DEFAULT_MAX_TOKENS, thinking_budget=1024),
+}
+
+
+def _parse_profile_field(name: str, value: Any) -> Any:
+    if name == "thinking_budget":
+        return None if value in (None, "", "dynamic") else int(value)
+    if name == "include_thoughts":
+        return value if isinstance(value, bool) else str(value).lower() in ("1", "true", "yes")
+    if name == "max_output_tokens":
+        return int(value)
+    return float(value)
+
+
+def load_generation_profiles(environ: Optional[Dict[str, str]] = None) -> Dict[str, GenerationProfile]:
+    """
+    Builds the per-stage profiles from the defaults and overrides.
+
+    Overrides are applied in order:
+        1. R2G_GENERATION_PROFILES_FILE: path to a JSON file of {stage: {field: value}}.
+        2. R2G_PROFILE_<STAGE>_<FIELD> environment variables, e.g. R2G_PROFILE_REWRITE_THINKING_BUDGET=0
+           (use "dynamic" for a model-chosen thinking budget).
+
+    Args:
+        environ: Environment to read. Defaults to os.environ.
+
+    Returns:
+        A dict of stage name -> GenerationProfile.
+    """
+    environ = os.environ if environ is None else environ
+    overrides: Dict[str, Dict[str, Any]] = {}
+    profiles_file = environ.get("R2G_GENERATION_PROFILES_FILE")
+    if profiles_file:
+        with open(profiles_file, encoding="utf-8") as f:
+            overrides = json.load(f)
+    profiles = {}
+    for stage, profile in DEFAULT_GENERATION_PROFILES.items():
+        changes = dict(overrides.get(stage, {}))
+        for field in fields(GenerationProfile):
+            env_value = environ.get(f"R2G_PROFILE_{stage.upper()}_{field.name.upper()}")
+            if env_value is not None:
+                changes[field.name] = env_value
+        unknown = set(changes) - {field.name for field in fields(GenerationProfile)}
+        if unknown:
+            raise ValueError(f"Unknown generation profile fields for stage '{stage}': {sorted(unknown)}.")
+        profiles[stage] = replace(profile, **{name: _parse_profile_field(name, value) for name, value in changes.items()})
+    return profiles
+
+
+GENERATION_PROFILES = load_generation_profiles()
+
+
+# --- Video Sampling Options ---
+MEDIA_RESOLUTIONS = ("low", "medium", "high")
+# Videos at least this long use the "long_video" preset under the "auto" preset
+LONG_VIDEO_SECONDS = float(os.getenv("R2G_LONG_VIDEO_SECONDS", "600"))
+VIDEO_PRESET = os.getenv("R2G_VIDEO_PRESET", "auto")
+
+
+@dataclass(frozen=True)
+class VideoOptions:
+    """
+    How the model samples a video input.
+
+    start_offset_s/end_offset_s clip the video, fps sets the sampled frame rate (the model's
+    default is 1 frame per second) and media_resolution the tokens spent per frame ("low" is
+    about a quarter of the default). None keeps the model's default for that setting.
+    """
+    start_offset_s: Optional[float] = None
+    end_offset_s: Optional[float] = None
+    fps: Optional[float] = None
+    media_resolution: Optional[str] = None
+
+    def __post_init__(self):
+        if self.media_resolution is not None and self.media_resolution not in MEDIA_RESOLUTIONS:
+            raise ValueError(f"Invalid media_resolution '{self.media_resolution}'. Must be one of {MEDIA_RESOLUTIONS}.")
+        if self.fps is not None and not 0 < self.fps <= 24:
+            raise ValueError(f"Invalid fps {self.fps}. Must be in (0, 24].")
+        if (self.start_offset_s is not None and self.end_offset_s is not None
+                and self.end_offset_s <= self.start_offset_s):
+            raise ValueError("end_offset_s must be after start_offset_s.")
+
+
+# Recipes are mostly told through narration and on-screen text that changes slowly, so long
+# cooking videos lose little from a few low-resolution frames per minute.
+VIDEO_PRESETS: Dict[str, VideoOptions] = {
+    "default": VideoOptions(),
+    "balanced": VideoOptions(fps=0.5, media_resolution="medium"),
+    "long_video": VideoOptions(fps=0.2, media_resolution="low"),
+}
+
+
+def resolve_video_options(options: Union[VideoOptions, str, None] = None,
+                          duration_s: Optional[float] = None) -> VideoOptions:
+    """
+    Returns the video options for a request.
+
+    Args:
+        options: Explicit options, a preset name from VIDEO_PRESETS, "auto", or None for VIDEO_PRESET.
+        duration_s: Video duration, used by "auto" ("long_video" from LONG_VIDEO_SECONDS on, else "default").
+
+    Raises:
+        ValueError: If the preset name is unknown.
+    """
+    if isinstance(options, VideoOptions):
+        return options
+    name = options or VIDEO_PRESET
+    if name == "auto":
+        name = "long_video" if duration_s is not None and duration_s >= LONG_VIDEO_SECONDS else "default"
+    if name not in VIDEO_PRESETS:
+        raise ValueError(f"Unknown video preset '{name}'. Must be 'auto' or one of {sorted(VIDEO_PRESETS)}.")
+    return VIDEO_PRESETS[name]
+
+
+def get_generation_profile(stage: str) -> GenerationProfile:
+    """Returns the configured generation profile for a pipeline stage."""
+    if stage not in GENERATION_PROFILES:
+        raise ValueError(f"Unknown stage '{stage}'. Must be one of {sorted(GENERATION_PROFILES)}.")
+    return GENERATION_PROFILES[stage]
+# --- End of Per-stage Generation Profiles ---
+
+# Process-wide client cache: one genai.Client per (project, location), shared by all callers.
+_GENAI_CLIENTS: Dict[Tuple[str, str], genai.Client] = {}
+_GENAI_CLIENTS_LOCK = threading.Lock()
+# Worker threads running hedged calls (each hedged call occupies one per in-flight request)
+_HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix="r2g-hedge")
+
 def _get_genai_client(
     project_id: Optional[str] = PROJECT_ID,
     location: str = DEFAULT_VERTEX_LOCATION
 ) -> genai.Client:
     """
-    Initializes and returns the Generative AI client for Vertex AI.
+    Returns the process-wide Generative AI client for Vertex AI, creating it on first use.
 
     Args:
         project_id: Google Cloud project ID. Defaults to env variable 'PROJECT_ID'.
         location: Google Cloud location for the Vertex AI endpoint.
 
     Returns:
-        An initialized genai.Client instance.
+        An initialized genai.Client instance, shared across calls with the same project and location.
 
     Raises:
         ValueError: If project_id is not provided or found.
@@ -47,13 +230,21 @@ def _get_genai_client(
     if not project_id:
         logger.error("Project ID not provided or found in environment variables.")
         raise ValueError("Project ID is required.")
-    try:
-        client = genai.Client(vertexai=True, project=project_id, location=location)
-        logger.info(f"Initialized GenAI client for project '{project_id}' in '{location}'.")
+    from google import genai
+
+    key = (project_id, location)
+    with _GENAI_CLIENTS_LOCK:
+        client = _GENAI_CLIENTS.get(key)
+        if client is not None:
+            return client
+        try:
+            client = genai.Client(vertexai=True, project=project_id, location=location)
+            logger.info(f"Initialized GenAI client for project '{project_id}' in '{location}'.")
+        except Exception as e:
+            logger.exception(f"Failed to initialize GenAI client: {e}")
+            raise
+        _GENAI_CLIENTS[key] = client
         return client
-    except Exception as e:
-        logger.exception(f"Failed to initialize GenAI client: {e}")
-        raise
 
 def _build_generate_content_config(
     system_instruction_text: Optional[str] = None,
@@ -61,6 +252,12 @@ def _build_generate_content_config(
     temperature: Optional[float] = None,  # Explicit temperature required
     top_p: float = DEFAULT_TOP_P,
     max_output_tokens: int = DEFAULT_MAX_TOKENS,
+    thinking_budget: Optional[int] = None,
+    include_thoughts: bool = False,
+    timeout_s: Optional[float] = None,
+    media_resolution: Optional[str] = None,
+    response_mime_type: Optional[str] = None,
+    seed: Optional[int] = None,
 ) -> types.GenerateContentConfig:
     """
     Builds the GenerateContentConfig object for the API call.
@@ -70,7 +267,13 @@ def _build_generate_content_config(
         tools: A list of tools (e.g., GoogleSearch) for the model, if any.
         temperature: Controls randomness (lower is more deterministic).
         top_p: Controls diversity via nucleus sampling.
-        max_output_tokens: Maximum number of tokens to generate.
+        max_output_tokens: Maximum number of tokens to generate (thinking included).
+        thinking_budget: Maximum thinking tokens, or None to let the model decide.
+        include_thoughts: Whether to return thought summaries in the response.
+        timeout_s: HTTP request timeout in seconds (None for the SDK default).
+        media_resolution: Resolution of image/video inputs ("low", "medium", "high"; None for the default).
+        response_mime_type: Output format, e.g. "application/json" (None for text).
+        seed: Sampling seed, to draw different (but reproducible) responses to the same request.
 
     Returns:
         A configured types.GenerateContentConfig object.
@@ -78,6 +281,7 @@ def _build_generate_content_config(
     if temperature is None:
         # Raise an error or default? Let's raise for now to enforce explicit setting.
         raise ValueError("Temperature must be explicitly provided to _build_generate_content_config.")
+    from google.genai import types
 
     safety_settings = [
         types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="BLOCK_NONE"),
@@ -97,24 +301,70 @@ def _build_generate_content_config(
         config_kwargs["system_instruction"] = [types.Part.from_text(text=system_instruction_text)]
     if tools:
         config_kwargs["tools"] = tools
-    config_kwargs["thinking_config"] = types.ThinkingConfig(include_thoughts=True)
+    config_kwargs["thinking_config"] = types.ThinkingConfig(
+        include_thoughts=include_thoughts, thinking_budget=thinking_budget
+    )
+    if timeout_s is not None:
+        config_kwargs["http_options"] = types.HttpOptions(timeout=int(timeout_s * 1000))
+    if media_resolution:
+        config_kwargs["media_resolution"] = types.MediaResolution[f"MEDIA_RESOLUTION_{media_resolution.upper()}"]
+    if response_mime_type:
+        config_kwargs["response_mime_type"] = response_mime_type
+    if seed is not None:
+        config_kwargs["seed"] = seed
 
     return types.GenerateContentConfig(**config_kwargs)
 
-def _call_generate_content(
+def _build_stage_config(
+    stage: str,
+    system_instruction_text: Optional[str],
+    tools: Optional[List[types.Tool]],
+    temperature: Optional[float],
+    max_output_tokens: Optional[int],
+    profile: Optional[GenerationProfile],
+    timeout_s: Optional[float] = None,
+    media_resolution: Optional[str] = None,
+    response_mime_type: Optional[str] = None,
+    seed: Optional[int] = None,
+) -> types.GenerateContentConfig:
+    """Builds the config for a stage from its generation profile; explicit arguments take precedence."""
+    profile = profile or get_generation_profile(stage)
+    return _build_generate_content_config(
+        system_instruction_text=system_instruction_text,
+        tools=tools,
+        temperature=profile.temperature if temperature is None else temperature,
+        max_output_tokens=max_output_tokens or profile.max_output_tokens,
+        thinking_budget=profile.thinking_budget,
+        include_thoughts=profile.include_thoughts,
+        timeout_s=timeout_s,
+        media_resolution=media_resolution,
+        response_mime_type=response_mime_type,
+        seed=seed,
+    )
+
+def _generate_content_once(
     client: genai.Client,
     model_name: str,
     contents: List[types.Content],
-    config: types.GenerateContentConfig
+    config: types.GenerateContentConfig,
+    stage: str = "unknown",
+    hedge: bool = False,
+    location: Optional[str] = None
 ) -> str:
     """
-    Calls the generate_content API, handles errors, and returns the text response.
+    Calls the generate_content API once, handles errors, and returns the text response.
+
+    Latency and token usage of every call are recorded in `metrics` under the given stage (and,
+    for the hedging deadline, the location).
 
     Args:
         client: The initialized genai.Client.
         model_name: The name of the model to use.
         contents: The list of content parts (user input).
         config: The generation configuration.
+        stage: Pipeline stage name used for metrics (e.g. "draft", "generate").
+        hedge: Whether this is a duplicate (hedge/fallback) request; its tokens are counted as hedging cost.
+        location: Region of `client`.
 
     Returns:
         The text part of the model's response.
@@ -123,6 +373,9 @@ def _call_generate_content(
         RuntimeError: If the API call fails or returns an empty response.
         Exception: For other unexpected errors during the API call.
     """
+    start = time.perf_counter()
+    response = None
+    grounded = bool(getattr(config, "tools", None))
     try:
         logger.info(f"Calling model '{model_name}' with contents: {contents}") # Log input
         # logger.debug(f"Calling model '{model_name}' with config: {config}") # Keep debug for config if needed
@@ -134,21 +387,160 @@ def _call_generate_content(
         if not hasattr(response, 'text') or not response.text:
              logger.warning(f"GenAI response for model '{model_name}' was empty or lacked text.")
              raise RuntimeError("Received empty response from AI model.")
+        usage = metrics.usage_from_response(response)
+        metrics.record_model_call(stage, model_name, time.perf_counter() - start, usage, grounded=grounded,
+                                  location=location)
+        if hedge:
+            metrics.increment("hedge_cost_tokens", stage, usage["total_token_count"])
         # logger.debug(f"Received response text (length {len(response.text)}) from model '{model_name}'.") # Replaced by info below
         logger.info(f"Received response text from model '{model_name}': {response.text}") # Log output
         return response.text
     except Exception as e:
+        metrics.record_model_call(stage, model_name, time.perf_counter() - start,
+                                  metrics.usage_from_response(response), success=False, grounded=grounded)
         logger.exception(f"GenAI API call to model '{model_name}' failed: {e}")
         raise RuntimeError(f"GenAI API call failed: {e}") from e
 
+def _hedge_deadline(stage: str, model_name: str, location: str) -> float:
+    """
+    Seconds to wait for a call before hedging: a high percentile of the recent latencies in the
+    call's region (so slow hedges to the secondary region do not move it), once enough are known.
+    """
+    latencies = metrics.recent_latencies(stage, model_name, location)
+    if len(latencies) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DEADLINE_S
+    return max(HEDGE_MIN_DEADLINE_S, metrics.percentile(latencies, HEDGE_PERCENTILE))
+
+
+def _hedged_generate_content(
+    client: genai.Client,
+    model_name: str,
+    contents: List[types.Content],
+    config: types.GenerateContentConfig,
+    stage: str,
+    project_id: str,
+    location: str,
+) -> str:
+    """
+    Runs a call with hedging: first success of the primary, a secondary-region duplicate and a fallback model.
+
+    - The secondary-region request is sent when the primary has not completed within the learned
+      deadline (_hedge_deadline), or straight away if the primary fails.
+    - When the model has an SLO (MODEL_SLO_SECONDS) and it is missed, the fallback model is also tried.
+    - Both are measured from when the primary request starts, so time spent waiting for a free
+      _HEDGE_EXECUTOR worker under load does not trigger hedges.
+    - The first successful response is returned. The SDK calls are blocking, so losing requests
+      cannot be aborted mid-flight: queued ones are cancelled, running ones finish in the background
+      and their results are discarded.
+    """
+    deadline = _hedge_deadline(stage, model_name, location)
+    slo = MODEL_SLO_SECONDS.get(model_name)
+    fallback_model = SLO_FALLBACK_MODEL if slo and SLO_FALLBACK_MODEL != model_name else None
+    primary_started = threading.Event()
+    start = time.perf_counter()
+
+    def run_primary(*args: Any) -> str:
+        nonlocal start
+        start = time.perf_counter()
+        primary_started.set()
+        return _generate_content_once(*args)
+
+    def submit(label: str, call_client: genai.Client, call_model: str, hedge: bool, call_location: str) -> None:
+        # copy_context keeps metrics.collect_usage() working across the worker threads.
+        call = _generate_content_once if hedge else run_primary
+        future = _HEDGE_EXECUTOR.submit(contextvars.copy_context().run, call,
+                                        call_client, call_model, contents, config, stage, hedge, call_location)
+        pending[future] = label
+        if hedge:
+            metrics.increment("hedge_requests", f"{stage}/{label}")
+            logger.info(f"Hedging '{stage}' call to '{model_name}' with {label} "
+                        f"after {time.perf_counter() - start:.1f}s (deadline {deadline:.1f}s).")
+
+    def launch_secondary() -> None:
+        try:
+            secondary_client = _get_genai_client(project_id, HEDGE_SECONDARY_LOCATION)
+        except Exception as e:
+            logger.warning(f"Could not create client for hedge region '{HEDGE_SECONDARY_LOCATION}': {e}")
+            return
+        submit(f"region:{HEDGE_SECONDARY_LOCATION}", secondary_client, model_name, True, HEDGE_SECONDARY_LOCATION)
+
+    pending: Dict[Any, str] = {}
+    submit("primary", client, model_name, False, location)
+    primary_started.wait()  # The deadlines count from here, not from the submission
+    secondary_sent = fallback_sent = False
+    last_error: Optional[BaseException] = None
+    while pending:
+        elapsed = time.perf_counter() - start
+        triggers = ([deadline] if not secondary_sent else []) + ([slo] if fallback_model and not fallback_sent else [])
+        timeout = max(0.0, min(triggers) - elapsed) if triggers else None
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            label = pending.pop(future)
+            try:
+                text = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            for other in pending:
+                other.cancel()
+            metrics.increment("hedge_winners", f"{stage}/{label}")
+            return text
+        elapsed = time.perf_counter() - start
+        if not secondary_sent and (elapsed >= deadline or (done and not pending)):
+            secondary_sent = True
+            launch_secondary()
+        if fallback_model and not fallback_sent and elapsed >= slo:
+            fallback_sent = True
+            submit(f"model:{fallback_model}", client, fallback_model, True, location)
+    raise last_error if last_error else RuntimeError("GenAI API call failed: no hedged request could be sent.")
+
+
+def _call_generate_content(
+    client: genai.Client,
+    model_name: str,
+    contents: List[types.Content],
+    config: types.GenerateContentConfig,
+    stage: str = "unknown",
+    project_id: Optional[str] = None,
+    location: str = DEFAULT_VERTEX_LOCATION
+) -> str:
+    """
+    Calls the generate_content API, handles errors, and returns the text response.
+
+    With R2G_HEDGING=1 (and a project ID to create the secondary-region client), slow or failed
+    calls are hedged to HEDGE_SECONDARY_LOCATION and, past the model's SLO, to a faster model
+    (see _hedged_generate_content). Latency and token usage of every call are recorded in `metrics`.
+
+    Args:
+        client: The initialized genai.Client.
+        model_name: The name of the model to use.
+        contents: The list of content parts (user input).
+        config: The generation configuration.
+        stage: Pipeline stage name used for metrics (e.g. "draft", "generate").
+        project_id: Google Cloud project ID, needed to hedge to another region.
+        location: Location of `client`; hedging is skipped if it already is the secondary region.
+
+    Returns:
+        The text part of the model's response.
+
+    Raises:
+        RuntimeError: If the API call fails or returns an empty response.
+    """
+    if not HEDGING_ENABLED or not project_id or location == HEDGE_SECONDARY_LOCATION:
+        return _generate_content_once(client, model_name, contents, config, stage, location=location)
+    return _hedged_generate_content(client, model_name, contents, config, stage, project_id, location)
+
 def draft_to_recipe(
     recipe_draft: str,
     system_instruction: str,
     project_id: Optional[str] = PROJECT_ID,
     location: str = DEFAULT_VERTEX_LOCATION,
     model_name: str = PROCESS_TEXT_MODEL_NAME,
-    temperature: float = RECIPE_DRAFT_TEMP, # Use specific constant
-    max_output_tokens: int = DEFAULT_MAX_TOKENS
+    temperature: Optional[float] = None,  # Defaults to the stage's generation profile
+    max_output_tokens: Optional[int] = None,
+    profile: Optional[GenerationProfile] = None,
+    grounding: Optional[bool] = None,
+    timeout_s: Optional[float] = None
 ) -> str:
     """
     Transforms a recipe draft into a standardized recipe using a GenAI model.
@@ -159,6 +551,11 @@ def draft_to_recipe(
         project_id: Google Cloud project ID for Vertex AI. Defaults to env variable.
         location: Google Cloud location for Vertex AI endpoint.
         model_name: The specific GenAI model to use.
+        temperature: Overrides the generation profile's temperature.
+        max_output_tokens: Overrides the generation profile's output ceiling.
+        profile: Generation profile to use instead of the stage's configured one.
+        grounding: Whether to attach the Google Search tool. Defaults to the stage's grounding policy.
+        timeout_s: Request timeout in seconds, usually the stage's share of the run's deadline.
 
     Returns:
         The standardized recipe text generated by the AI.
@@ -169,18 +566,18 @@ def draft_to_recipe(
     """
     logger.info("Running the draft-to-recipe agent...")
     client = _get_genai_client(project_id, location) # Uses PROJECT_ID by default now
+    from google.genai import types
 
     text_part = types.Part.from_text(text=recipe_draft)
     contents = [types.Content(role="user", parts=[text_part])]
-    tools = [types.Tool(google_search=types.GoogleSearch())]
-    config = _build_generate_content_config(
-        system_instruction_text=system_instruction,
-        tools=tools,
-        temperature=temperature,
-        max_output_tokens=max_output_tokens
-    )
+    if grounding is None:
+        grounding = should_ground("draft", recipe_draft)
+    tools = [types.Tool(google_search=types.GoogleSearch())] if grounding else None
+    config = _build_stage_config("draft", system_instruction, tools, temperature, max_output_tokens, profile,
+                                 timeout_s)
 
-    response_text = _call_generate_content(client, model_name, contents, config)
+    response_text = _call_generate_content(client, model_name, contents, config, stage="draft",
+                                           project_id=project_id, location=location)
 
     logger.info("Finished the draft-to-recipe agent.")
     return response_text
@@ -192,8 +589,13 @@ def re_write_recipe(
     project_id: Optional[str] = PROJECT_ID,
     location: str = DEFAULT_VERTEX_LOCATION,
     model_name: str = PROCESS_TEXT_MODEL_NAME,
-    temperature: float = RECIPE_REWRITE_TEMP, # Use specific constant
-    max_output_tokens: int = DEFAULT_MAX_TOKENS
+    temperature: Optional[float] = None,  # Defaults to the stage's generation profile
+    max_output_tokens: Optional[int] = None,
+    stage: str = "rewrite",
+    profile: Optional[GenerationProfile] = None,
+    timeout_s: Optional[float] = None,
+    mime_type: str = "video/*",
+    video_options: Optional[VideoOptions] = None
 ) -> str:
     """
     Rewrites a recipe from text or a YouTube video URI into a standardized format.
@@ -205,6 +607,14 @@ def re_write_recipe(
         project_id: Google Cloud project ID for Vertex AI. Defaults to env variable.
         location: Google Cloud location for Vertex AI endpoint.
         model_name: The specific GenAI model to use.
+        temperature: Overrides the generation profile's temperature.
+        max_output_tokens: Overrides the generation profile's output ceiling.
+        stage: Pipeline stage name ("rewrite", or "revise" when applying user feedback); selects
+            the generation profile and labels metrics.
+        profile: Generation profile to use instead of the stage's configured one.
+        timeout_s: Request timeout in seconds, usually the stage's share of the run's deadline.
+        mime_type: MIME type of the video (input_type "youtube"), e.g. "video/mp4" for a GCS object.
+        video_options: Clipping, frame rate and media resolution of the video (model defaults when None).
 
     Returns:
         The rewritten, standardized recipe text.
@@ -215,6 +625,7 @@ def re_write_recipe(
     """
     logger.info(f"Running the re-writing agent for input type: {input_type}...")
     client = _get_genai_client(project_id, location) # Uses PROJECT_ID by default now
+    from google.genai import types
 
     parts: List[types.Part] = []
     if input_type == "txt":
@@ -224,8 +635,15 @@ def re_write_recipe(
         try:
             video_part = types.Part.from_uri(
                 file_uri=recipe_input,
-                mime_type="video/*",
+                mime_type=mime_type,
             )
+            if video_options and any(value is not None for value in (
+                    video_options.start_offset_s, video_options.end_offset_s, video_options.fps)):
+                video_part.video_metadata = types.VideoMetadata(
+                    start_offset=f"{video_options.start_offset_s:g}s" if video_options.start_offset_s is not None else None,
+                    end_offset=f"{video_options.end_offset_s:g}s" if video_options.end_offset_s is not None else None,
+                    fps=video_options.fps,
+                )
             text_part = types.Part.from_text(
                 text="Generate a standardized recipe from the following video:"
             )
@@ -238,13 +656,11 @@ def re_write_recipe(
         raise ValueError(f"Invalid input_type: '{input_type}'. Must be 'txt' or 'youtube'.")
 
     contents = [types.Content(role="user", parts=parts)]
-    config = _build_generate_content_config(
-        system_instruction_text=system_instruction,
-        temperature=temperature,
-        max_output_tokens=max_output_tokens
-    )
+    config = _build_stage_config(stage, system_instruction, None, temperature, max_output_tokens, profile,
+                                 timeout_s, media_resolution=video_options.media_resolution if video_options else None)
 
-    response_text = _call_generate_content(client, model_name, contents, config)
+    response_text = _call_generate_content(client, model_name, contents, config, stage=stage,
+                                           project_id=project_id, location=location)
 
     logger.info("Finished the re-writing agent.")
     return response_text
@@ -255,8 +671,12 @@ def generate_graph(
     project_id: Optional[str] = PROJECT_ID,
     location: str = DEFAULT_VERTEX_LOCATION,
     model_name: str = TEXT_TO_GRAPH_MODEL_NAME,
-    temperature: float = GRAPH_GEN_TEMP, # Use specific constant
-    max_output_tokens: int = DEFAULT_MAX_TOKENS
+    temperature: Optional[float] = None,  # Defaults to the stage's generation profile
+    max_output_tokens: Optional[int] = None,
+    profile: Optional[GenerationProfile] = None,
+    grounding: Optional[bool] = None,
+    timeout_s: Optional[float] = None,
+    seed: Optional[int] = None
 ) -> str:
     """
     Generates initial Graphviz Python code from a standardized recipe.
@@ -267,6 +687,12 @@ def generate_graph(
         project_id: Google Cloud project ID for Vertex AI. Defaults to env variable.
         location: Google Cloud location for Vertex AI endpoint.
         model_name: The specific GenAI model to use.
+        temperature: Overrides the generation profile's temperature.
+        max_output_tokens: Overrides the generation profile's output ceiling.
+        profile: Generation profile to use instead of the stage's configured one.
+        grounding: Whether to attach the Google Search tool. Defaults to the stage's grounding policy.
+        timeout_s: Request timeout in seconds, usually the stage's share of the run's deadline.
+        seed: Sampling seed (best-of-N candidates use one each).
 
     Returns:
         The generated Python code string for Graphviz.
@@ -277,22 +703,77 @@ def generate_graph(
     """
     logger.info("Running the graph generation agent...")
     client = _get_genai_client(project_id, location) # Uses PROJECT_ID by default now
+    from google.genai import types
 
     text_part = types.Part.from_text(text=standardised_recipe)
     contents = [types.Content(role="user", parts=[text_part])]
-    tools = [types.Tool(google_search=types.GoogleSearch())]
-    config = _build_generate_content_config(
-        system_instruction_text=system_instruction,
-        tools=tools,
-        temperature=temperature,
-        max_output_tokens=max_output_tokens
-    )
+    if grounding is None:
+        grounding = should_ground("generate")
+    tools = [types.Tool(google_search=types.GoogleSearch())] if grounding else None
+    config = _build_stage_config("generate", system_instruction, tools, temperature, max_output_tokens, profile,
+                                 timeout_s, seed=seed)
 
-    response_text = _call_generate_content(client, model_name, contents, config)
+    response_text = _call_generate_content(client, model_name, contents, config, stage="generate",
+                                           project_id=project_id, location=location)
 
     logger.info("Finished the graph generation agent.")
     return response_text
 
+def generate_graph_candidates(
+    standardised_recipe: str,
+    system_instruction: str,
+    settings: List[Tuple[Optional[float], Optional[int]]],
+    project_id: Optional[str] = PROJECT_ID,
+    location: str = DEFAULT_VERTEX_LOCATION,
+    model_name: str = TEXT_TO_GRAPH_MODEL_NAME,
+    timeout_s: Optional[float] = None
+) -> List[Optional[str]]:
+    """
+    Runs the graph generation agent several times concurrently, once per (temperature, seed) setting,
+    for best-of-N selection (see graph_selection.py).
+
+    Separate requests are sent rather than one request with candidate_count > 1: each candidate
+    gets its own seed, hedging and usage accounting, and thinking models do not all support
+    multiple candidates.
+
+    Args:
+        standardised_recipe: The recipe text in a standardized format.
+        system_instruction: The system prompt guiding the AI's behavior.
+        settings: (temperature, seed) per candidate; None keeps the generation profile's temperature
+            or leaves the seed unset.
+        project_id: Google Cloud project ID for Vertex AI. Defaults to env variable.
+        location: Google Cloud location for Vertex AI endpoint.
+        model_name: The specific GenAI model to use.
+        timeout_s: Request timeout of every candidate in seconds.
+
+    Returns:
+        The response of every candidate, in the order of `settings`; None for candidates that failed (logged).
+
+    Raises:
+        ValueError: If project_id is not provided.
+    """
+    _get_genai_client(project_id, location)  # Fail fast on configuration errors, before any thread starts
+    logger.info(f"Generating {len(settings)} graph candidates concurrently...")
+
+    def generate(temperature: Optional[float], seed: Optional[int]) -> str:
+        return generate_graph(standardised_recipe=standardised_recipe, system_instruction=system_instruction,
+                              project_id=project_id, location=location, model_name=model_name,
+                              temperature=temperature, timeout_s=timeout_s, seed=seed)
+
+    # A pool of its own: the candidates' hedged calls use _HEDGE_EXECUTOR and must not wait on it.
+    with ThreadPoolExecutor(max_workers=max(1, len(settings)), thread_name_prefix="r2g-candidates") as pool:
+        # copy_context keeps metrics.collect_usage() working across the worker threads.
+        futures = [pool.submit(contextvars.copy_context().run, generate, temperature, seed)
+                   for temperature, seed in settings]
+    responses: List[Optional[str]] = []
+    for index, future in enumerate(futures):
+        try:
+            responses.append(future.result())
+        except Exception as e:
+            logger.warning(f"Graph candidate {index} failed: {e}")
+            responses.append(None)
+    return responses
+
 def improve_graph(
     standardised_recipe: str,
     graph_code: str,
@@ -300,8 +781,11 @@ def improve_graph(
     project_id: Optional[str] = PROJECT_ID,
     location: str = DEFAULT_VERTEX_LOCATION,
     model_name: str = TEXT_TO_GRAPH_MODEL_NAME,
-    temperature: float = GRAPH_IMPROVE_TEMP, # Use specific constant
-    max_output_tokens: int = DEFAULT_MAX_TOKENS
+    temperature: Optional[float] = None,  # Defaults to the stage's generation profile
+    max_output_tokens: Optional[int] = None,
+    profile: Optional[GenerationProfile] = None,
+    grounding: Optional[bool] = None,
+    timeout_s: Optional[float] = None
 ) -> str:
     """
     Improves existing Graphviz Python code based on the recipe and instructions.
@@ -313,6 +797,11 @@ def improve_graph(
         project_id: Google Cloud project ID for Vertex AI. Defaults to env variable.
         location: Google Cloud location for Vertex AI endpoint.
         model_name: The specific GenAI model to use.
+        temperature: Overrides the generation profile's temperature.
+        max_output_tokens: Overrides the generation profile's output ceiling.
+        profile: Generation profile to use instead of the stage's configured one.
+        grounding: Whether to attach the Google Search tool. Defaults to the stage's grounding policy.
+        timeout_s: Request timeout in seconds, usually the stage's share of the run's deadline.
 
     Returns:
         The improved Python code string for Graphviz.
@@ -323,6 +812,7 @@ def improve_graph(
     """
     logger.info("Running the graph improvement agent...")
     client = _get_genai_client(project_id, location) # Uses PROJECT_ID by default now
+    from google.genai import types
 
     recipe_part = types.Part.from_text(
         text=f"## Standardized Recipe Context:\n\n{standardised_recipe}\n\n"
@@ -332,15 +822,193 @@ def improve_graph(
         + "Improve the above Python code based on the recipe context and the system instructions."
     )
     contents = [types.Content(role="user", parts=[recipe_part, graph_code_part])]
-    tools = [types.Tool(google_search=types.GoogleSearch())]
-    config = _build_generate_content_config(
-        system_instruction_text=system_instruction,
-        tools=tools,
-        temperature=temperature,
-        max_output_tokens=max_output_tokens
-    )
+    if grounding is None:
+        grounding = should_ground("improve")
+    tools = [types.Tool(google_search=types.GoogleSearch())] if grounding else None
+    config = _build_stage_config("improve", system_instruction, tools, temperature, max_output_tokens, profile,
+                                 timeout_s)
 
-    response_text = _call_generate_content(client, model_name, contents, config)
+    response_text = _call_generate_content(client, model_name, contents, config, stage="improve",
+                                           project_id=project_id, location=location)
 
     logger.info("Finished the graph improvement agent.")
-    return response_text
\ No newline at end of file
+    return response_text
+
+def improve_graph_patch(
+    standardised_recipe: str,
+    graph_code: str,
+    system_instruction: str,
+    project_id: Optional[str] = PROJECT_ID,
+    location: str = DEFAULT_VERTEX_LOCATION,
+    model_name: str = TEXT_TO_GRAPH_MODEL_NAME,
+    temperature: Optional[float] = None,  # Defaults to the stage's generation profile
+    max_output_tokens: Optional[int] = None,
+    profile: Optional[GenerationProfile] = None,
+    timeout_s: Optional[float] = None
+) -> str:
+    """
+    Asks for the styling improvements of the first-pass graph code as a JSON set of edits
+    (see graph_patch.py) instead of the three improved files.
+
+    Args:
+        standardised_recipe: The recipe text for context.
+        graph_code: The first-pass graph code (fenced html/css/javascript blocks).
+        system_instruction: The system prompt guiding the AI's behavior.
+        project_id: Google Cloud project ID for Vertex AI. Defaults to env variable.
+        location: Google Cloud location for Vertex AI endpoint.
+        model_name: The specific GenAI model to use.
+        temperature: Overrides the generation profile's temperature.
+        max_output_tokens: Overrides the generation profile's output ceiling.
+        profile: Generation profile to use instead of the stage's configured one.
+        timeout_s: Request timeout in seconds, usually the stage's share of the run's deadline.
+
+    Returns:
+        The model's response: a JSON object of edits.
+
+    Raises:
+        ValueError: If project_id is not provided.
+        RuntimeError: If the API call fails or returns an empty response.
+    """
+    logger.info("Running the graph improvement agent (patch mode)...")
+    client = _get_genai_client(project_id, location)
+    from google.genai import types
+
+    parts = [
+        types.Part.from_text(text=f"## Standardized Recipe Context:\n\n{standardised_recipe}\n\n"),
+        types.Part.from_text(text=f"## Current Graph Code:\n\n{graph_code}\n\n"
+                                  "Return the edits that improve the styling of this diagram."),
+    ]
+    contents = [types.Content(role="user", parts=parts)]
+    config = _build_stage_config("improve_patch", system_instruction, None, temperature, max_output_tokens,
+                                 profile, timeout_s, response_mime_type="application/json")
+
+    response_text = _call_generate_content(client, model_name, contents, config, stage="improve_patch",
+                                           project_id=project_id, location=location)
+
+    logger.info("Finished the graph improvement agent (patch mode).")
+    return response_text
+
+def repair_graph(
+    standardised_recipe: str,
+    script_js: str,
+    issues: str,
+    system_instruction: str,
+    project_id: Optional[str] = PROJECT_ID,
+    location: str = DEFAULT_VERTEX_LOCATION,
+    model_name: str = TEXT_TO_GRAPH_MODEL_NAME,
+    temperature: Optional[float] = None,  # Defaults to the stage's generation profile
+    max_output_tokens: Optional[int] = None,
+    profile: Optional[GenerationProfile] = None,
+    timeout_s: Optional[float] = None
+) -> str:
+    """
+    Fixes the structural errors reported by the local validator in a generated script.js.
+
+    Only the script and the issue list are sent (not the HTML/CSS), and only the script is
+    returned, so a repair is much cheaper than a new generation.
+
+    Args:
+        standardised_recipe: The recipe text for context.
+        script_js: The script.js content to repair.
+        issues: The validator's issue list (graph_validation.format_issues).
+        system_instruction: The system prompt guiding the AI's behavior.
+        project_id: Google Cloud project ID for Vertex AI. Defaults to env variable.
+        location: Google Cloud location for Vertex AI endpoint.
+        model_name: The specific GenAI model to use.
+        temperature: Overrides the generation profile's temperature.
+        max_output_tokens: Overrides the generation profile's output ceiling.
+        profile: Generation profile to use instead of the stage's configured one.
+        timeout_s: Request timeout in seconds, usually the stage's share of the run's deadline.
+
+    Returns:
+        The model's response, containing the corrected script.js in a fenced code block.
+
+    Raises:
+        ValueError: If project_id is not provided.
+        RuntimeError: If the API call fails or returns an empty response.
+    """
+    logger.info("Running the graph repair agent...")
+    client = _get_genai_client(project_id, location)
+    from google.genai import types
+
+    parts = [
+        types.Part.from_text(text=f"## Standardized Recipe Context:\n\n{standardised_recipe}\n\n"),
+        types.Part.from_text(text=f"## script.js:\n\n```javascript\n{script_js}\n```\n\n"),
+        types.Part.from_text(text=f"## Validator Errors to Fix:\n\n{issues}\n"),
+    ]
+    contents = [types.Content(role="user", parts=parts)]
+    config = _build_stage_config("repair", system_instruction, None, temperature, max_output_tokens, profile,
+                                 timeout_s)
+
+    response_text = _call_generate_content(client, model_name, contents, config, stage="repair",
+                                           project_id=project_id, location=location)
+
+    logger.info("Finished the graph repair agent.")
+    return response_text
+
+def complete_graph_code(
+    standardised_recipe: str,
+    files: Dict[str, str],
+    truncated: List[str],
+    missing: List[str],
+    system_instruction: str,
+    project_id: Optional[str] = PROJECT_ID,
+    location: str = DEFAULT_VERTEX_LOCATION,
+    model_name: str = TEXT_TO_GRAPH_MODEL_NAME,
+    temperature: Optional[float] = None,  # Defaults to the stage's generation profile
+    max_output_tokens: Optional[int] = None,
+    profile: Optional[GenerationProfile] = None,
+    timeout_s: Optional[float] = None
+) -> str:
+    """
+    Completes a graph response that was cut off or left files out (see graph_recovery.py).
+
+    Only the continuation of truncated files and the missing files are generated; the files that
+    were received are sent as context and not returned, so a completion costs a fraction of a new
+    generation.
+
+    Args:
+        standardised_recipe: The recipe text for context.
+        files: File name -> received content (complete, or the complete lines of a truncated file).
+        truncated: Files whose continuation is requested.
+        missing: Files requested in full.
+        system_instruction: The system prompt guiding the AI's behavior.
+        project_id: Google Cloud project ID for Vertex AI. Defaults to env variable.
+        location: Google Cloud location for Vertex AI endpoint.
+        model_name: The specific GenAI model to use.
+        temperature: Overrides the generation profile's temperature.
+        max_output_tokens: Overrides the generation profile's output ceiling.
+        profile: Generation profile to use instead of the stage's configured one.
+        timeout_s: Request timeout in seconds, usually the stage's share of the run's deadline.
+
+    Returns:
+        The model's response, with one fenced code block per requested file.
+
+    Raises:
+        ValueError: If project_id is not provided.
+        RuntimeError: If the API call fails or returns an empty response.
+    """
+    logger.info(f"Running the graph completion agent (truncated: {truncated}, missing: {missing})...")
+    client = _get_genai_client(project_id, location)
+    from google.genai import types
+
+    languages = {"index.html": "html", "style.css": "css", "script.js": "javascript"}
+    parts = [types.Part.from_text(text=f"## Standardized Recipe Context:\n\n{standardised_recipe}\n\n")]
+    for file_name, content in files.items():
+        if not content:
+            continue
+        state = "truncated, ends at its last complete line" if file_name in truncated else "complete"
+        parts.append(types.Part.from_text(
+            text=f"## {file_name} ({state}):\n\n```{languages[file_name]} filename=\"{file_name}\"\n{content}\n```\n\n"))
+    requested = [f"- {file_name}: continue from the line after its last line" for file_name in truncated]
+    requested += [f"- {file_name}: the whole file" for file_name in missing]
+    parts.append(types.Part.from_text(text="## Files to Deliver:\n\n" + "\n".join(requested) + "\n"))
+    contents = [types.Content(role="user", parts=parts)]
+    config = _build_stage_config("complete", system_instruction, None, temperature, max_output_tokens, profile,
+                                 timeout_s)
+
+    response_text = _call_generate_content(client, model_name, contents, config, stage="complete",
+                                           project_id=project_id, location=location)
+
+    logger.info("Finished the graph completion agent.")
+    return response_text
@@ -0,0 +1,257 @@
+"""
+graph_layout.py
+
+Server-side layered layout of the recipe graph, embedded in script.js as Cytoscape `preset` positions.
+
+The generated pages otherwise run dagre (and the expand-collapse relayout) in the viewer's browser
+on every load, which is slow for large recipes on phones. compute_layout() places the nodes once,
+at generation time:
+
+1. Ranks: edges between leaf nodes (edges to or from a section are mapped to the section's entry or
+   exit steps) are made acyclic by dropping DFS back edges, and every node gets its longest-path
+   rank. Source nodes (ingredients) are then pulled down to the rank just above their first use.
+2. Bands: every top-level section gets its own band of columns, so section boxes never overlap.
+   Nodes outside any section join the band of the section they feed (or are fed by), in gutter
+   columns to the left of the section's steps. Bands whose rank ranges do not overlap (sections
+   that follow each other) are stacked in the same lane.
+3. Order: within each band and rank, nodes are sorted by the barycenter of their predecessors.
+
+Only leaf nodes get positions; Cytoscape sizes compound (section) nodes around their children.
+apply_preset_layout() prepends the positions to script.js and switches its layouts to `preset`.
+"""
+import json
+import logging
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .graph_validation import extract_elements
+
+logger = logging.getLogger(__name__)
+
+NODE_SEPARATION = 120  # Horizontal distance between node centres in a band (px)
+RANK_SEPARATION = 100  # Vertical distance between ranks (px)
+BAND_SEPARATION = 80   # Extra horizontal gap between neighbouring bands (px)
+POSITIONS_VARIABLE = "R2G_PRESET_POSITIONS"
+
+# Layout names replaced by the preset layout (the generated pages use dagre; the rest are fallbacks)
+_LAYOUT_NAME_RE = re.compile(r"""name\s*:\s*(['"])(dagre|breadthfirst|cose|klay|elk|grid)\1""")
+_LOOSE_BAND = "\0loose"  # Band of the nodes of a graph with no sections
+
+Position = Dict[str, float]
+
+
+def _acyclic_edges(nodes: List[str], edges: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """The edges without self loops, duplicates and the back edges of a DFS (in element order)."""
+    adjacency: Dict[str, List[str]] = defaultdict(list)
+    for source, target in dict.fromkeys(edges):
+        if source != target:
+            adjacency[source].append(target)
+    state: Dict[str, int] = {}  # 1 = on the DFS stack, 2 = done
+    kept = []
+    for root in nodes:
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(adjacency[root]))]
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                state[node] = 2
+                stack.pop()
+            elif state.get(child) != 1:
+                kept.append((node, child))
+                if child not in state:
+                    state[child] = 1
+                    stack.append((child, iter(adjacency[child])))
+    return kept
+
+
+def _ranks(nodes: List[str], edges: List[Tuple[str, str]]) -> Dict[str, int]:
+    """Longest-path ranks of an acyclic graph, with sources moved down next to their first successor."""
+    predecessors: Dict[str, List[str]] = defaultdict(list)
+    successors: Dict[str, List[str]] = defaultdict(list)
+    for source, target in edges:
+        successors[source].append(target)
+        predecessors[target].append(source)
+    in_degree = {node: len(predecessors[node]) for node in nodes}
+    queue = [node for node in nodes if in_degree[node] == 0]
+    rank = {node: 0 for node in nodes}
+    for node in queue:  # Kahn's algorithm; the queue grows while it is iterated
+        for child in successors[node]:
+            rank[child] = max(rank[child], rank[node] + 1)
+            in_degree[child] -= 1
+            if in_degree[child] == 0:
+                queue.append(child)
+    for node in nodes:
+        if not predecessors[node] and successors[node]:
+            rank[node] = max(0, min(rank[child] for child in successors[node]) - 1)
+    return rank
+
+
+def compute_layout(elements: List[Dict[str, Any]]) -> Dict[str, Position]:
+    """
+    Computes preset positions for the leaf nodes of extracted Cytoscape elements.
+
+    Args:
+        elements: Elements as returned by graph_validation.extract_elements().
+
+    Returns:
+        Node id -> {"x": ..., "y": ...}, for every node without children.
+    """
+    node_data = {str(e["data"]["id"]): e["data"] for e in elements
+                 if e["group"] == "nodes" and e["data"].get("id") not in (None, "")}
+    parent = {node_id: str(data["parent"]) for node_id, data in node_data.items()
+              if data.get("parent") is not None and str(data["parent"]) in node_data}
+    children: Dict[str, List[str]] = defaultdict(list)
+    for node_id, parent_id in parent.items():
+        children[parent_id].append(node_id)
+    leaves = [node_id for node_id in node_data if node_id not in children]
+
+    def top_level(node_id: str) -> Optional[str]:
+        seen = set()
+        while node_id in parent and node_id not in seen:
+            seen.add(node_id)
+            node_id = parent[node_id]
+        return node_id if seen else None
+
+    def leaf_descendants(node_id: str) -> List[str]:
+        if node_id not in children:
+            return [node_id]
+        found, stack, seen = [], [node_id], set()
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            if current in children:
+                stack.extend(children[current])
+            else:
+                found.append(current)
+        return found
+
+    # Edges between leaves; a section endpoint stands for its entry (as target) or exit (as source) steps
+    leaf_edges = [(str(e["data"].get("source")), str(e["data"].get("target"))) for e in elements
+                  if e["group"] == "edges" and str(e["data"].get("source")) in node_data
+                  and str(e["data"].get("target")) in node_data]
+    internal = [(s, t) for s, t in leaf_edges if s not in children and t not in children]
+    has_internal_pred = {t for _, t in internal}
+    has_internal_succ = {s for s, _ in internal}
+    expanded_edges = []
+    for source, target in leaf_edges:
+        sources = [n for n in leaf_descendants(source) if n not in has_internal_succ] or leaf_descendants(source)
+        targets = [n for n in leaf_descendants(target) if n not in has_internal_pred] or leaf_descendants(target)
+        expanded_edges.extend((s, t) for s in sources for t in targets if s != t)
+    edges = _acyclic_edges(leaves, expanded_edges)
+    rank = _ranks(leaves, edges)
+    predecessors: Dict[str, List[str]] = defaultdict(list)
+    successors: Dict[str, List[str]] = defaultdict(list)
+    for source, target in edges:
+        predecessors[target].append(source)
+        successors[source].append(target)
+
+    # Bands: one per top-level section; loose nodes join a neighbouring section's band (gutter column)
+    section_of = {leaf: top_level(leaf) for leaf in leaves}
+    band_of: Dict[str, str] = {}
+    in_gutter: Set[str] = set()
+    for leaf in leaves:
+        if section_of[leaf] is not None:
+            band_of[leaf] = section_of[leaf]
+    for leaf in sorted((l for l in leaves if section_of[l] is None), key=lambda l: -rank[l]):
+        # Only a section's band takes gutter nodes; in a graph without sections all stay in the loose band
+        neighbours = [n for n in successors[leaf] + predecessors[leaf]
+                      if band_of.get(n, _LOOSE_BAND) != _LOOSE_BAND]
+        if neighbours:
+            band_of[leaf] = band_of[neighbours[0]]
+            in_gutter.add(leaf)
+        else:
+            band_of[leaf] = _LOOSE_BAND
+    # Slots within each band, rank by rank, ordered by the barycenter of already placed predecessors
+    slot: Dict[str, float] = {}
+    columns: Dict[Tuple[str, bool], int] = defaultdict(int)  # (band, gutter) -> number of columns
+    element_index = {leaf: i for i, leaf in enumerate(leaves)}
+    by_rank: Dict[int, List[str]] = defaultdict(list)
+    for leaf in leaves:
+        by_rank[rank[leaf]].append(leaf)
+    for current_rank in sorted(by_rank):
+        groups: Dict[Tuple[str, bool], List[str]] = defaultdict(list)
+        for leaf in by_rank[current_rank]:
+            groups[(band_of[leaf], leaf in in_gutter)].append(leaf)
+        for key, group in groups.items():
+            def barycenter(node: str) -> Tuple[float, int]:
+                placed = [slot[p] for p in predecessors[node] if p in slot and band_of[p] == band_of[node]]
+                if not placed:
+                    placed = [slot[s] for s in successors[node] if s in slot]
+                return (sum(placed) / len(placed) if placed else float(element_index[node]), element_index[node])
+            for i, leaf in enumerate(sorted(group, key=barycenter)):
+                slot[leaf] = i
+            columns[key] = max(columns[key], len(group))
+
+    # Lanes: bands whose rank ranges do not overlap (e.g. consecutive sections) share a horizontal lane
+    band_ranks: Dict[str, Tuple[int, int]] = {}
+    for leaf in leaves:
+        low, high = band_ranks.get(band_of[leaf], (rank[leaf], rank[leaf]))
+        band_ranks[band_of[leaf]] = (min(low, rank[leaf]), max(high, rank[leaf]))
+    lane_of: Dict[str, int] = {}
+    lane_ends: List[int] = []
+    for band in sorted(band_ranks, key=lambda b: band_ranks[b]):
+        low, high = band_ranks[band]
+        lane = next((i for i, end in enumerate(lane_ends) if end < low), len(lane_ends))
+        if lane == len(lane_ends):
+            lane_ends.append(high)
+        lane_ends[lane] = high
+        lane_of[band] = lane
+
+    def gutter_width(band: str) -> float:
+        return columns[(band, True)] * NODE_SEPARATION + BAND_SEPARATION / 2 if columns[(band, True)] else 0.0
+
+    lane_widths = [0.0] * len(lane_ends)
+    for band, lane in lane_of.items():
+        width = gutter_width(band) + max(columns[(band, False)], 1) * NODE_SEPARATION + BAND_SEPARATION
+        lane_widths[lane] = max(lane_widths[lane], width)
+    lane_offsets = [sum(lane_widths[:i]) for i in range(len(lane_widths))]
+
+    positions: Dict[str, Position] = {}
+    for leaf in leaves:
+        band = band_of[leaf]
+        x = lane_offsets[lane_of[band]] + slot[leaf] * NODE_SEPARATION + (0.0 if leaf in in_gutter else gutter_width(band))
+        positions[leaf] = {"x": round(x, 1), "y": float(rank[leaf] * RANK_SEPARATION)}
+    return positions
+
+
+def apply_preset_layout(js_content: str, positions: Dict[str, Position]) -> str:
+    """
+    Embeds preset positions in script.js and switches its layouts to `preset`.
+
+    The positions are declared once at the top of the script; every dagre (or fallback) layout
+    definition, including the expand-collapse `layoutBy`, is replaced by the preset layout reading them.
+
+    Returns:
+        The modified script, or the unmodified one if it defines no layout that could be replaced.
+    """
+    replaced, count = _LAYOUT_NAME_RE.subn(f"name: 'preset', positions: {POSITIONS_VARIABLE}", js_content)
+    if not count:
+        return js_content
+    declaration = f"const {POSITIONS_VARIABLE} = {json.dumps(positions, separators=(',', ':'))};\n"
+    return declaration + replaced
+
+
+def precompute_layout(js_content: str) -> str:
+    """
+    Extracts the elements of script.js, lays them out and embeds the positions (see module docstring).
+
+    Returns:
+        The script with a preset layout.
+
+    Raises:
+        graph_validation.ElementsExtractionError: If the elements cannot be extracted.
+        ValueError: If the script has no nodes or is already laid out.
+    """
+    if POSITIONS_VARIABLE in js_content:
+        raise ValueError("script.js already has preset positions.")
+    elements = extract_elements(js_content)
+    positions = compute_layout(elements)
+    if not positions:
+        raise ValueError("script.js has no nodes to lay out.")
+    return apply_preset_layout(js_content, positions)
@@ -0,0 +1,325 @@
+"""
+graph_patch.py
+
+Patch-style graph improvement: the improvement agent returns a small set of edits instead of
+all three files again, and the edits are applied here.
+
+The improvement pass mostly restyles the diagram, so re-emitting index.html and the elements
+array spends output tokens (the dominant latency factor) on copying unchanged code. With
+R2G_IMPROVE_MODE=patch the "improve_patch" stage answers with a JSON object:
+
+    {
+      "css_rules":      [{"selector": "body", "declarations": "margin: 0; background: #fafafa"}],
+      "style_entries":  [{"selector": "node[type='ingredient']", "style": {"shape": "ellipse"}}],
+      "node_classes":   [{"id": "flour", "classes": "grain-ingredient"}]
+    }
+
+    css_rules      Replace the top-level style.css rule with the same selector, or are appended.
+    style_entries  Replace the entry with the same selector in the Cytoscape `style` array of
+                   script.js, or are appended to it (later entries win in Cytoscape).
+    node_classes   Add classes to the element with that data.id.
+
+apply_patch() applies the edits to the first-pass files and check_patched() verifies the result:
+all blocks complete, the style array and elements still parse, the same element ids, and no new
+validator issues. A patch that cannot be parsed or fails the checks is rejected, and the caller
+falls back to the full improvement call.
+"""
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import metrics
+from .graph_recovery import BLOCK_OK, check_files
+from .graph_validation import (
+    ElementsExtractionError, _JSLiteralParser, _array_start, extract_elements, validate_script,
+)
+
+logger = logging.getLogger(__name__)
+
+PATCH_EDIT_KINDS = ("css_rules", "style_entries", "node_classes")
+_STYLE_ARRAY_RE = re.compile(r"\bstyle\s*:\s*(\[|[A-Za-z_$][\w$]*)")
+_CLASSES_RE = re.compile(r"""\bclasses\s*:\s*(['"])(.*?)\1""")
+_JSON_FENCE_RE = re.compile(r"```(?:json)?\s*\n(.*?)\n```", re.DOTALL | re.IGNORECASE)
+
+
+class PatchError(ValueError):
+    """Raised when a patch response cannot be parsed."""
+
+
+@dataclass
+class GraphPatch:
+    """Edits returned by the improve_patch stage (see module docstring)."""
+    css_rules: List[Dict[str, str]] = field(default_factory=list)
+    style_entries: List[Dict[str, Any]] = field(default_factory=list)
+    node_classes: List[Dict[str, str]] = field(default_factory=list)
+
+    @property
+    def edit_count(self) -> int:
+        return len(self.css_rules) + len(self.style_entries) + len(self.node_classes)
+
+
+def parse_patch(response_text: str) -> GraphPatch:
+    """
+    Parses the improve_patch stage's JSON answer (bare or in a ```json block).
+
+    Raises:
+        PatchError: If the answer is not a JSON object of the expected edit lists.
+    """
+    text = (response_text or "").strip()
+    fenced = _JSON_FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise PatchError(f"Patch is not valid JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise PatchError("Patch is not a JSON object.")
+    patch = GraphPatch()
+    for kind, required in (("css_rules", ("selector", "declarations")), ("style_entries", ("selector", "style")),
+                           ("node_classes", ("id", "classes"))):
+        edits = data.get(kind) or []
+        if not isinstance(edits, list):
+            raise PatchError(f"'{kind}' is not a list.")
+        for edit in edits:
+            if not isinstance(edit, dict) or any(key not in edit for key in required):
+                raise PatchError(f"Malformed '{kind}' edit: {edit!r}.")
+            if kind == "style_entries" and not isinstance(edit["style"], dict):
+                raise PatchError(f"The style of '{edit['selector']}' is not an object.")
+        setattr(patch, kind, edits)
+    return patch
+
+
+def _normalize_selector(selector: str) -> str:
+    selector = re.sub(r"\s*,\s*", ", ", " ".join(str(selector).split()))
+    return selector.replace('"', "'")
+
+
+# --- style.css ---
+
+def css_rules(css: str) -> List[Tuple[str, int, int]]:
+    """(selector, start, end) of the top-level rules of a stylesheet (comments and strings skipped)."""
+    rules = []
+    depth = 0
+    rule_start = 0
+    selector = ""
+    i = 0
+    while i < len(css):
+        char = css[i]
+        if css.startswith("/*", i):
+            end = css.find("*/", i + 2)
+            i = len(css) if end == -1 else end + 2
+            if depth == 0 and not css[rule_start:i].strip(" \t\n/*").strip():
+                rule_start = i
+            continue
+        if char in "'\"":
+            end = css.find(char, i + 1)
+            i = len(css) if end == -1 else end + 1
+            continue
+        if char == "{":
+            if depth == 0:
+                selector = re.sub(r"/\*.*?\*/", "", css[rule_start:i], flags=re.DOTALL).strip()
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                start = rule_start + len(css[rule_start:]) - len(css[rule_start:].lstrip())
+                rules.append((selector, start, i + 1))
+                rule_start = i + 1
+        elif char == ";" and depth == 0:  # @import and similar statements
+            rule_start = i + 1
+        i += 1
+    return rules
+
+
+def _format_css_rule(selector: str, declarations: str) -> str:
+    lines = [part.strip() for part in str(declarations).strip().strip("{}").split(";") if part.strip()]
+    return f"{selector} {{\n" + "".join(f"  {line};\n" for line in lines) + "}"
+
+
+def _apply_css_rules(css: str, edits: List[Dict[str, str]]) -> Tuple[str, int]:
+    rules = {_normalize_selector(selector): (start, end) for selector, start, end in css_rules(css)}
+    replacements, appended, applied = [], [], 0
+    for edit in edits:
+        rule = _format_css_rule(edit["selector"], edit["declarations"])
+        span = rules.get(_normalize_selector(edit["selector"]))
+        if span:
+            replacements.append((span[0], span[1], rule))
+        else:
+            appended.append(rule)
+        applied += 1
+    for start, end, text in sorted(replacements, reverse=True):
+        css = css[:start] + text + css[end:]
+    if appended:
+        css = css.rstrip() + "\n\n" + "\n\n".join(appended) + "\n"
+    return css, applied
+
+
+# --- script.js ---
+
+def array_items(text: str, start: int) -> Tuple[List[Tuple[int, int, Any]], int]:
+    """
+    Spans of the items of the array literal starting at text[start] ("[").
+
+    Returns:
+        A list of (start, end, parsed value) per item, and the offset of the closing "]".
+
+    Raises:
+        ElementsExtractionError: If the array cannot be parsed.
+    """
+    parser = _JSLiteralParser(text, start + 1)
+    items = []
+    while True:
+        char = parser._peek()
+        if char == "]":
+            return items, parser.pos
+        if not char:
+            raise ElementsExtractionError("Unterminated array literal.")
+        item_start = parser.pos
+        if char == ".":  # spread (...other): kept as is
+            parser._skip_expression()
+        else:
+            value = parser.parse_value()
+            items.append((item_start, parser.pos, value))
+        if parser._peek() == ",":
+            parser.pos += 1
+
+
+def style_array_start(js_content: str) -> Optional[int]:
+    """Offset of the "[" of the Cytoscape style array (inline or through a variable), or None."""
+    for match in _STYLE_ARRAY_RE.finditer(js_content):
+        start = match.start(1)
+        if match.group(1) != "[":
+            variable = re.search(rf"\b(?:const|let|var)\s+{re.escape(match.group(1))}\s*=\s*\[", js_content)
+            if not variable:
+                continue
+            start = variable.end() - 1
+        try:
+            items, _ = array_items(js_content, start)
+        except ElementsExtractionError:
+            continue
+        if items and all(isinstance(value, dict) and "selector" in value for _, _, value in items):
+            return start
+    return None
+
+
+def _line_indent(text: str, offset: int) -> str:
+    line_start = text.rfind("\n", 0, offset) + 1
+    return re.match(r"[ \t]*", text[line_start:]).group(0)
+
+
+def _style_entry_literal(edit: Dict[str, Any]) -> str:
+    return f"{{ selector: {json.dumps(edit['selector'])}, style: {json.dumps(edit['style'])} }}"
+
+
+def _apply_style_entries(js_content: str, edits: List[Dict[str, Any]]) -> Tuple[str, int]:
+    start = style_array_start(js_content)
+    if start is None:
+        logger.info("No Cytoscape style array found in script.js; style entries not applied.")
+        return js_content, 0
+    items, end = array_items(js_content, start)
+    spans = {_normalize_selector(value["selector"]): (item_start, item_end)
+             for item_start, item_end, value in items if isinstance(value.get("selector"), str)}
+    indent = _line_indent(js_content, items[-1][0]) if items else "  "
+    replacements, appended = [], []
+    for edit in edits:
+        span = spans.get(_normalize_selector(edit["selector"]))
+        if span:
+            replacements.append((span[0], span[1], _style_entry_literal(edit)))
+        else:
+            appended.append(_style_entry_literal(edit))
+    if appended:
+        insert_at = items[-1][1] if items else start + 1
+        text = "".join(f"{',' if items or i else ''}\n{indent}{entry}" for i, entry in enumerate(appended))
+        replacements.append((insert_at, insert_at, text))
+    for span_start, span_end, text in sorted(replacements, reverse=True):
+        js_content = js_content[:span_start] + text + js_content[span_end:]
+    return js_content, len(edits)
+
+
+def _apply_node_classes(js_content: str, edits: List[Dict[str, str]]) -> Tuple[str, int]:
+    start = _array_start(js_content)
+    if start is None or js_content[start] != "[":
+        logger.info("No elements array literal found in script.js; node classes not applied.")
+        return js_content, 0
+    classes_by_id: Dict[str, List[str]] = {}
+    for edit in edits:
+        classes_by_id.setdefault(str(edit["id"]), []).extend(str(edit["classes"]).split())
+    items, _ = array_items(js_content, start)
+    replacements, applied = [], 0
+    for item_start, item_end, value in items:
+        element_id = value.get("data", {}).get("id") if isinstance(value, dict) and isinstance(value.get("data"), dict) else None
+        added = classes_by_id.get(element_id) if isinstance(element_id, str) else None
+        if not added:
+            continue
+        item = js_content[item_start:item_end]
+        existing = _CLASSES_RE.search(item)
+        if existing:
+            classes = list(dict.fromkeys(existing.group(2).split() + added))
+            item = item[:existing.start(2)] + " ".join(classes) + item[existing.end(2):]
+        else:
+            closing = item.rstrip().rfind("}")
+            item = item[:closing].rstrip() + f", classes: {json.dumps(' '.join(dict.fromkeys(added)))} " + item[closing:]
+        replacements.append((item_start, item_end, item))
+        applied += 1
+    for span_start, span_end, text in sorted(replacements, reverse=True):
+        js_content = js_content[:span_start] + text + js_content[span_end:]
+    return js_content, applied
+
+
+def apply_patch(files: Dict[str, str], patch: GraphPatch) -> Tuple[Dict[str, str], Dict[str, int]]:
+    """
+    Applies a patch to the first-pass files.
+
+    Returns:
+        The patched files (index.html unchanged) and the number of edits applied per kind.
+    """
+    css, css_applied = _apply_css_rules(files.get("style.css", ""), patch.css_rules)
+    js, style_applied = _apply_style_entries(files.get("script.js", ""), patch.style_entries)
+    js, classes_applied = _apply_node_classes(js, patch.node_classes)
+    patched = dict(files, **{"style.css": css, "script.js": js})
+    return patched, {"css_rules": css_applied, "style_entries": style_applied, "node_classes": classes_applied}
+
+
+def _element_ids(js_content: str) -> List[str]:
+    return sorted(str(element["data"].get("id")) for element in extract_elements(js_content))
+
+
+def check_patched(original: Dict[str, str], patched: Dict[str, str]) -> List[str]:
+    """
+    Parse and structural checks of patched files against the originals.
+
+    Returns:
+        The problems found (empty if the patched files can be used).
+    """
+    problems = [f"{state.file_name} is {state.status}" for state in check_files(patched).values()
+                if state.status != BLOCK_OK and original.get(state.file_name)]
+    js = patched.get("script.js", "")
+    if style_array_start(original.get("script.js", "")) is not None and style_array_start(js) is None:
+        problems.append("the Cytoscape style array no longer parses")
+    try:
+        if _element_ids(js) != _element_ids(original.get("script.js", "")):
+            problems.append("the element ids changed")
+    except ElementsExtractionError as e:
+        problems.append(f"the elements no longer parse ({e})")
+        return problems
+    if len(validate_script(js)) > len(validate_script(original.get("script.js", ""))):
+        problems.append("the validator finds new issues")
+    return problems
+
+
+def format_graph_code(files: Dict[str, str]) -> str:
+    """Fenced html/css/javascript blocks of the files, as the generation stages return them."""
+    languages = {"index.html": "html", "style.css": "css", "script.js": "javascript"}
+    return "\n\n".join(f"```{languages[file_name]} filename=\"{file_name}\"\n{content}\n```"
+                       for file_name, content in files.items() if content)
+
+
+def record_patch(model_name: str, outcome: str, applied: Optional[Dict[str, int]] = None) -> None:
+    """Counts a patch outcome ("applied", "empty", "invalid", "rejected" or "failed") and the edits applied."""
+    metrics.increment("improve_patch", f"{model_name}/{outcome}")
+    for kind, count in (applied or {}).items():
+        if count:
+            metrics.increment("improve_patch_edits", kind, count)
@@ -0,0 +1,170 @@
+"""
+graph_recovery.py
+
+Detection and merging of incomplete graph code, for the targeted completion call in text_to_graph.
+
+A graph response is expected to hold three fenced blocks (index.html, style.css, script.js). When
+the output stops at max_output_tokens, the last block is cut off without its closing fence, and
+the blocks after it are missing entirely; parse_code_string then drops the cut-off block too.
+Instead of discarding the response, inspect_graph_code() reports the state of every file:
+    ok         A closed block whose content looks complete.
+    truncated  The block was opened but not closed, or its content stops mid-structure
+               (unbalanced braces in CSS/JS, no closing </html>). Its complete lines are kept.
+    missing    No block for the file.
+The completion stage (genai_funs.complete_graph_code) is then asked for just the continuation of
+truncated files and the full text of missing ones, and merge_completion() joins the answer with
+the partial content.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from . import metrics
+from .aux_funs import parse_code_string
+
+logger = logging.getLogger(__name__)
+
+BLOCK_OK = "ok"
+BLOCK_TRUNCATED = "truncated"
+BLOCK_MISSING = "missing"
+
+# Fence language of each file, for the prompt and for locating an unclosed block
+FILE_LANGUAGES = {"index.html": "html", "style.css": "css", "script.js": "javascript"}
+_OPENING_FENCE_RES = {
+    "index.html": re.compile(r"```(?:html)\s*filename\s*=\s*['\"]index\.html['\"][^\n]*\n", re.IGNORECASE),
+    "style.css": re.compile(r"```(?:css)\s*filename\s*=\s*['\"]style\.css['\"][^\n]*\n", re.IGNORECASE),
+    "script.js": re.compile(r"```(?:javascript|js)\s*filename\s*=\s*['\"]script\.js['\"][^\n]*\n", re.IGNORECASE),
+}
+# Strings and comments, removed before counting braces
+_JS_NOISE_RE = re.compile(r"//[^\n]*|/\*.*?\*/|'(?:\\.|[^'\\\n])*'|\"(?:\\.|[^\"\\\n])*\"|`(?:\\.|[^`\\])*`", re.DOTALL)
+_CSS_NOISE_RE = re.compile(r"/\*.*?\*/|'(?:\\.|[^'\\\n])*'|\"(?:\\.|[^\"\\\n])*\"", re.DOTALL)
+# Most lines of a partial block the model may repeat at the start of its continuation
+MAX_OVERLAP_LINES = 20
+MIN_OVERLAP_CHARS = 12
+
+
+@dataclass(frozen=True)
+class BlockState:
+    """State of one expected file in a graph response."""
+    file_name: str
+    status: str   # BLOCK_OK, BLOCK_TRUNCATED or BLOCK_MISSING
+    content: str  # Complete content, the partial content of a truncated block, or ""
+
+
+def _looks_incomplete(file_name: str, content: str) -> bool:
+    if file_name == "index.html":
+        return "<html" in content.lower() and "</html>" not in content.lower()
+    noise_re = _JS_NOISE_RE if file_name == "script.js" else _CSS_NOISE_RE
+    code = noise_re.sub("", content)
+    return code.count("{") > code.count("}") or (file_name == "script.js" and code.count("[") > code.count("]"))
+
+
+def inspect_graph_code(code_string: str, parsed: Optional[Dict[str, str]] = None) -> Dict[str, BlockState]:
+    """
+    Reports which of index.html, style.css and script.js a graph response holds complete,
+    truncated or not at all (see module docstring).
+
+    Args:
+        code_string: The model response.
+        parsed: The response's parse_code_string result, if already computed.
+    """
+    parsed = parse_code_string(code_string or "") if parsed is None else parsed
+    states = {}
+    for file_name, opening_re in _OPENING_FENCE_RES.items():
+        content = parsed.get(file_name, "")
+        if content:
+            status = BLOCK_TRUNCATED if _looks_incomplete(file_name, content) else BLOCK_OK
+            states[file_name] = BlockState(file_name, status, content)
+            continue
+        # The last opened block is unclosed if no fence follows it
+        openings = list(opening_re.finditer(code_string or ""))
+        if openings and "```" not in code_string[openings[-1].end():]:
+            # Keep complete lines only: the continuation starts at the line that was cut off
+            partial = code_string[openings[-1].end():].rpartition("\n")[0].rstrip()
+            if partial.strip():
+                states[file_name] = BlockState(file_name, BLOCK_TRUNCATED, partial)
+                continue
+        states[file_name] = BlockState(file_name, BLOCK_MISSING, "")
+    return states
+
+
+def check_files(files: Dict[str, str]) -> Dict[str, BlockState]:
+    """Block states of already separated file contents (e.g. after merge_completion)."""
+    states = {}
+    for file_name in _OPENING_FENCE_RES:
+        content = files.get(file_name, "")
+        if not content:
+            status = BLOCK_MISSING
+        else:
+            status = BLOCK_TRUNCATED if _looks_incomplete(file_name, content) else BLOCK_OK
+        states[file_name] = BlockState(file_name, status, content)
+    return states
+
+
+def incomplete_blocks(states: Dict[str, BlockState]) -> List[BlockState]:
+    """The truncated and missing files, in file order."""
+    return [state for state in states.values() if state.status != BLOCK_OK]
+
+
+def _join_continuation(partial: str, continuation: str) -> str:
+    """Appends a continuation to a partial block, dropping lines the model repeated from the partial's end."""
+    partial_lines = partial.rstrip("\n").split("\n")
+    continuation_lines = continuation.strip("\n").split("\n")
+    for overlap in range(min(len(partial_lines), len(continuation_lines), MAX_OVERLAP_LINES), 0, -1):
+        repeated = [line.strip() for line in continuation_lines[:overlap]]
+        # A short match ("}", "});") may be legitimate new code rather than a repeat
+        if [line.strip() for line in partial_lines[-overlap:]] == repeated and len("".join(repeated)) >= MIN_OVERLAP_CHARS:
+            continuation_lines = continuation_lines[overlap:]
+            break
+    return "\n".join(partial_lines + continuation_lines)
+
+
+def merge_completion(states: Dict[str, BlockState], completion_text: str) -> Dict[str, str]:
+    """
+    Merges the completion stage's answer into the inspected blocks.
+
+    For a truncated file the answer is normally the continuation and is appended to the partial
+    content; an answer that restates the file from its start replaces it. A missing file takes
+    the answer as is.
+
+    Returns:
+        File name -> content for all three files ("" for files still missing).
+    """
+    answers = parse_code_string(completion_text or "")
+    merged = {}
+    for file_name, state in states.items():
+        answer = answers.get(file_name, "")
+        if state.status == BLOCK_OK or not answer:
+            merged[file_name] = state.content
+        elif state.status == BLOCK_MISSING or answer.startswith(state.content.strip()[:200]):
+            merged[file_name] = answer
+        else:
+            merged[file_name] = _join_continuation(state.content, answer)
+    return merged
+
+
+def truncated_graph_code(code_string: str, fraction: float = 0.5) -> str:
+    """
+    Cuts a graph response off partway through its script.js block, as an output limit would
+    (for benchmarks and checks of the recovery path).
+    """
+    opening = _OPENING_FENCE_RES["script.js"].search(code_string)
+    if not opening:
+        return code_string[:int(len(code_string) * fraction)]
+    block_end = code_string.find("```", opening.end())
+    block_end = len(code_string) if block_end == -1 else block_end
+    return code_string[:opening.end() + int((block_end - opening.end()) * fraction)]
+
+
+def record_recovery(model_name: str, outcome: str, states: Dict[str, BlockState],
+                    tokens_saved: Optional[int] = None) -> None:
+    """
+    Counts a recovery attempt ("recovered", "partial", "failed" or "skipped"), the files it
+    concerned, and the tokens saved compared with regenerating the graph.
+    """
+    metrics.increment("graph_recovery", f"{model_name}/{outcome}")
+    for state in incomplete_blocks(states):
+        metrics.increment("graph_recovery_blocks", f"{state.file_name}/{state.status}")
+    if tokens_saved is not None:
+        metrics.increment("graph_recovery_tokens_saved", model_name, tokens_saved)
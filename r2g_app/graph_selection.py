@@ -0,0 +1,151 @@
+"""
+graph_selection.py
+
+Local scoring of graph code candidates, for the best-of-N generation strategy.
+
+The default strategy ("two_pass") runs generate_graph and then improve_graph: two sequential calls
+to the pro model. With R2G_GRAPH_STRATEGY=best_of_n, N generate_graph calls are instead sent
+concurrently in one round (genai_funs.generate_graph_candidates), each with its own temperature and
+seed (candidate_settings), and the candidate that scores highest here is kept. This trades N
+concurrent requests of quota for about half the wall-clock time.
+
+The score needs no model call and ranges from 0 to 1:
+    parse      (PARSE_WEIGHT)      Share of index.html, style.css and script.js present and complete
+                                   (see graph_recovery.check_files).
+    structure  (STRUCTURE_WEIGHT)  1 / (1 + validator issues) of the Cytoscape elements, 0 if they do
+                                   not parse (see graph_validation.validate_script).
+    style      (STYLE_WEIGHT)      CSS richness: style.css rules, Cytoscape style entries and distinct
+                                   style properties, each relative to a target and capped at 1.
+Ties go to the earlier candidate, i.e. the one sampled with the stage's configured temperature.
+
+Configuration:
+    R2G_BEST_OF_N_CANDIDATES   Candidates generated per run (default 3).
+    R2G_BEST_OF_N_TEMPERATURE_SPREAD  Temperature added to the last candidate; the others are spread
+                                      evenly in between (default 0.6).
+"""
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from . import metrics
+from .aux_funs import parse_code_string
+from .graph_patch import array_items, css_rules, style_array_start
+from .graph_recovery import BLOCK_OK, check_files
+from .graph_validation import ElementsExtractionError, validate_script
+
+BEST_OF_N_CANDIDATES = int(os.getenv("R2G_BEST_OF_N_CANDIDATES", "3"))
+BEST_OF_N_TEMPERATURE_SPREAD = float(os.getenv("R2G_BEST_OF_N_TEMPERATURE_SPREAD", "0.6"))
+MAX_TEMPERATURE = 2.0
+
+PARSE_WEIGHT = 0.5
+STRUCTURE_WEIGHT = 0.3
+STYLE_WEIGHT = 0.2
+# Style counts at which a candidate gets the full style score
+TARGET_CSS_RULES = 8
+TARGET_STYLE_ENTRIES = 10
+TARGET_STYLE_PROPERTIES = 25
+
+_CSS_PROPERTY_RE = re.compile(r"([\w-]+)\s*:")
+
+
+@dataclass(frozen=True)
+class CandidateSetting:
+    """Sampling settings of one best-of-N candidate."""
+    temperature: float
+    seed: int
+
+
+@dataclass(frozen=True)
+class GraphScore:
+    """Local quality score of one graph code candidate (see module docstring)."""
+    complete_blocks: int    # Files present and complete, out of 3
+    elements_parsed: bool
+    issues: int             # Validator issues of the elements (0 if they did not parse)
+    css_rules: int
+    style_entries: int
+    style_properties: int   # Distinct properties set in style.css and the Cytoscape style array
+
+    @property
+    def value(self) -> float:
+        parse = self.complete_blocks / 3
+        structure = 1 / (1 + self.issues) if self.elements_parsed else 0.0
+        style = (min(1.0, self.css_rules / TARGET_CSS_RULES) + min(1.0, self.style_entries / TARGET_STYLE_ENTRIES)
+                 + min(1.0, self.style_properties / TARGET_STYLE_PROPERTIES)) / 3
+        return round(PARSE_WEIGHT * parse + STRUCTURE_WEIGHT * structure + STYLE_WEIGHT * style, 4)
+
+
+def candidate_settings(count: int, base_temperature: float,
+                       spread: float = BEST_OF_N_TEMPERATURE_SPREAD) -> List[CandidateSetting]:
+    """
+    Temperatures and seeds of `count` candidates: the first uses `base_temperature`, the others are
+    spread evenly up to `base_temperature + spread` (capped at MAX_TEMPERATURE).
+
+    Raises:
+        ValueError: If count is less than 1.
+    """
+    if count < 1:
+        raise ValueError(f"Invalid R2G_BEST_OF_N_CANDIDATES '{count}'. Must be at least 1.")
+    step = spread / (count - 1) if count > 1 else 0.0
+    return [CandidateSetting(round(min(MAX_TEMPERATURE, base_temperature + i * step), 3), seed=i + 1)
+            for i in range(count)]
+
+
+def _style_array_items(js_content: str) -> List[dict]:
+    start = style_array_start(js_content)
+    if start is None:
+        return []
+    try:
+        items, _ = array_items(js_content, start)
+    except ElementsExtractionError:
+        return []
+    return [value for _, _, value in items if isinstance(value, dict)]
+
+
+def score_graph_code(graph_code: str) -> GraphScore:
+    """Scores a graph response (fenced html/css/javascript blocks) without calling a model."""
+    files = parse_code_string(graph_code or "")
+    complete = sum(1 for state in check_files(files).values() if state.status == BLOCK_OK)
+    css = files.get("style.css", "")
+    js = files.get("script.js", "")
+    issues = validate_script(js) if js else []
+    elements_parsed = bool(js) and not any(issue.code == "extraction_failed" for issue in issues)
+    rules = css_rules(css)
+    entries = _style_array_items(js)
+    properties = set()
+    for _, start, end in rules:
+        properties.update(name.lower() for name in _CSS_PROPERTY_RE.findall(css[css.find("{", start) + 1:end]))
+    for entry in entries:
+        if isinstance(entry.get("style"), dict):
+            properties.update(entry["style"])
+    return GraphScore(
+        complete_blocks=complete,
+        elements_parsed=elements_parsed,
+        issues=len(issues) if elements_parsed else 0,
+        css_rules=len(rules),
+        style_entries=len(entries),
+        style_properties=len(properties),
+    )
+
+
+def select_candidate(candidates: Sequence[Optional[str]]) -> Tuple[Optional[int], List[Optional[GraphScore]]]:
+    """
+    Scores the candidates and picks the best one.
+
+    Args:
+        candidates: Graph responses, None (or empty) for candidates whose call failed.
+
+    Returns:
+        The index of the highest-scoring candidate (the earliest on ties; None if all failed) and
+        the score of every candidate (None for failed ones).
+    """
+    scores = [score_graph_code(code) if code else None for code in candidates]
+    ranked = [(score.value, -index) for index, score in enumerate(scores) if score is not None]
+    return (-max(ranked)[1] if ranked else None), scores
+
+
+def record_selection(model_name: str, winner: Optional[int], scores: Sequence[Optional[GraphScore]]) -> None:
+    """Counts the candidates generated ("ok"/"failed") and which candidate won (metrics "best_of_n")."""
+    for score in scores:
+        metrics.increment("best_of_n_candidates", f"{model_name}/{'ok' if score else 'failed'}")
+    metrics.increment("best_of_n", f"{model_name}/{'failed' if winner is None else f'candidate_{winner}'}")
@@ -0,0 +1,341 @@
+"""
+graph_validation.py
+
+Python-side extraction and structural validation of the Cytoscape `elements` in a generated script.js.
+
+extract_elements() finds the elements array (`const elements = [...]`, `elements: [...]`, or a
+variable passed as `elements: graphData`) and parses the JavaScript object literals into dicts.
+validate_elements() then reports, in milliseconds, the structural errors that would otherwise only
+show up in the browser:
+
+    missing_id        node or edge without a data.id
+    duplicate_id      several elements sharing an id
+    dangling_edge     edge whose source or target is not a node id
+    bad_parent        node whose `parent` is not an existing section node
+    material_cycle    cycle in the material-flow edges (type 'material')
+    orphan_ingredient ingredient node with no outgoing edge
+
+The issues are formatted for a targeted repair call (genai_funs.repair_graph) and counted per model
+in metrics ("graph_validation_errors").
+"""
+import logging
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+ISSUE_CODES = ("extraction_failed", "missing_id", "duplicate_id", "dangling_edge", "bad_parent",
+               "material_cycle", "orphan_ingredient")
+# Maximum number of issues listed in a repair request (the rest are summarized by count)
+MAX_REPORTED_ISSUES = 40
+
+
+class ElementsExtractionError(ValueError):
+    """Raised when no parsable elements array is found in script.js."""
+
+
+@dataclass(frozen=True)
+class ValidationIssue:
+    code: str
+    message: str
+    element_id: Optional[str] = None
+
+
+# --- JavaScript literal parsing ---
+
+_RAW = object()  # Marker for values that are expressions rather than literals
+
+
+class _JSLiteralParser:
+    """Parses the JSON-like subset of JavaScript used for Cytoscape element literals."""
+
+    def __init__(self, text: str, pos: int = 0):
+        self.text = text
+        self.pos = pos
+
+    def _skip_space(self) -> None:
+        text = self.text
+        while self.pos < len(text):
+            if text[self.pos].isspace():
+                self.pos += 1
+            elif text.startswith("//", self.pos):
+                end = text.find("\n", self.pos)
+                self.pos = len(text) if end == -1 else end + 1
+            elif text.startswith("/*", self.pos):
+                end = text.find("*/", self.pos + 2)
+                self.pos = len(text) if end == -1 else end + 2
+            else:
+                break
+
+    def _peek(self) -> str:
+        self._skip_space()
+        return self.text[self.pos] if self.pos < len(self.text) else ""
+
+    def parse_value(self) -> Any:
+        char = self._peek()
+        if char == "[":
+            return self._parse_array()
+        if char == "{":
+            return self._parse_object()
+        if char in "'\"`":
+            value = self._parse_string()
+        else:
+            match = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?|[A-Za-z_$][\w$]*").match(self.text, self.pos)
+            if not match:
+                raise ElementsExtractionError(f"Unexpected character {char!r} at offset {self.pos}.")
+            self.pos = match.end()
+            token = match.group(0)
+            value = {"true": True, "false": False, "null": None, "undefined": None}.get(token, _RAW)
+            if value is _RAW and (token[0].isdigit() or token[0] == "-"):
+                value = float(token) if any(c in token for c in ".eE") else int(token)
+        if self._peek() not in (",", "]", "}", ""):
+            # An expression such as 'a' + b or fn(x): skip it, its value is not a literal.
+            self._skip_expression()
+            return _RAW
+        return value
+
+    def _skip_expression(self) -> None:
+        depth = 0
+        while self.pos < len(self.text):
+            char = self._peek()
+            if char in "'\"`":
+                self._parse_string()
+                continue
+            if char in "([{":
+                depth += 1
+            elif char in ")]}":
+                if depth == 0:
+                    return
+                depth -= 1
+            elif char == "," and depth == 0:
+                return
+            self.pos += 1
+
+    def _parse_string(self) -> str:
+        quote = self.text[self.pos]
+        self.pos += 1
+        chars = []
+        while self.pos < len(self.text):
+            char = self.text[self.pos]
+            if char == "\\":
+                chars.append(self.text[self.pos + 1: self.pos + 2])
+                self.pos += 2
+                continue
+            self.pos += 1
+            if char == quote:
+                return "".join(chars)
+            chars.append(char)
+        raise ElementsExtractionError("Unterminated string literal.")
+
+    def _parse_array(self) -> List[Any]:
+        self.pos += 1
+        items = []
+        while True:
+            char = self._peek()
+            if char == "]":
+                self.pos += 1
+                return items
+            if not char:
+                raise ElementsExtractionError("Unterminated array literal.")
+            if char == ".":  # spread (...other): not a literal
+                self._skip_expression()
+            else:
+                items.append(self.parse_value())
+            if self._peek() == ",":
+                self.pos += 1
+
+    def _parse_object(self) -> Dict[str, Any]:
+        self.pos += 1
+        obj: Dict[str, Any] = {}
+        while True:
+            char = self._peek()
+            if char == "}":
+                self.pos += 1
+                return obj
+            if not char:
+                raise ElementsExtractionError("Unterminated object literal.")
+            if char in "'\"":
+                key = self._parse_string()
+            else:
+                match = re.compile(r"[\w$]+").match(self.text, self.pos)
+                if not match:
+                    self._skip_expression()  # spread or computed key
+                    if self._peek() == ",":
+                        self.pos += 1
+                    continue
+                key = match.group(0)
+                self.pos = match.end()
+            if self._peek() == ":":
+                self.pos += 1
+                obj[key] = self.parse_value()
+            else:
+                obj[key] = _RAW  # shorthand property
+            if self._peek() == ",":
+                self.pos += 1
+
+
+def _array_start(js_content: str) -> Optional[int]:
+    """Offset of the `[` (or `{` for {nodes, edges}) that starts the elements, or None."""
+    match = re.search(r"\belements\s*[:=]\s*([\[{]|[A-Za-z_$][\w$]*)", js_content)
+    if match:
+        if match.group(1) in ("[", "{"):
+            return match.start(1)
+        variable = re.search(rf"\b(?:const|let|var)\s+{re.escape(match.group(1))}\s*=\s*([\[{{])", js_content)
+        if variable:
+            return variable.start(1)
+    # Fall back to the first array literal that looks like Cytoscape elements
+    for candidate in re.finditer(r"\b(?:const|let|var)\s+[\w$]+\s*=\s*\[", js_content):
+        if re.match(r"\s*\{\s*(?:group|data)\s*:", js_content[candidate.end():]):
+            return candidate.end() - 1
+    return None
+
+
+def extract_elements(js_content: str) -> List[Dict[str, Any]]:
+    """
+    Extracts the Cytoscape elements from script.js.
+
+    Returns:
+        The element dicts, each with "group" ("nodes"/"edges") and "data" (values that are JS
+        expressions rather than literals are omitted).
+
+    Raises:
+        ElementsExtractionError: If no elements literal is found or it cannot be parsed.
+    """
+    start = _array_start(js_content or "")
+    if start is None:
+        raise ElementsExtractionError("No Cytoscape elements array found in script.js.")
+    value = _JSLiteralParser(js_content, start).parse_value()
+    if isinstance(value, dict):  # { nodes: [...], edges: [...] }
+        value = ([dict(e, group="nodes") for e in value.get("nodes") or [] if isinstance(e, dict)] +
+                 [dict(e, group="edges") for e in value.get("edges") or [] if isinstance(e, dict)])
+    if not isinstance(value, list):
+        raise ElementsExtractionError("The elements value is not an array literal.")
+    elements = []
+    for element in value:
+        if not isinstance(element, dict) or not isinstance(element.get("data"), dict):
+            continue
+        data = {k: v for k, v in element["data"].items() if v is not _RAW}
+        group = element.get("group")
+        if group not in ("nodes", "edges"):
+            group = "edges" if "source" in data or "target" in data else "nodes"
+        elements.append({"group": group, "data": data, "classes": element.get("classes")})
+    return elements
+
+
+# --- Validation ---
+
+def _find_cycle(adjacency: Dict[str, List[str]]) -> Optional[List[str]]:
+    """Returns one cycle (as a node list) in a directed graph, or None."""
+    white, grey, black = 0, 1, 2
+    color: Dict[str, int] = defaultdict(int)
+    for root in list(adjacency):
+        if color[root] != white:
+            continue
+        stack: List[Tuple[str, int]] = [(root, 0)]
+        path = [root]
+        color[root] = grey
+        while stack:
+            node, index = stack[-1]
+            children = adjacency.get(node, [])
+            if index < len(children):
+                stack[-1] = (node, index + 1)
+                child = children[index]
+                if color[child] == grey:
+                    return path[path.index(child):] + [child]
+                if color[child] == white:
+                    color[child] = grey
+                    stack.append((child, 0))
+                    path.append(child)
+            else:
+                color[node] = black
+                stack.pop()
+                path.pop()
+    return None
+
+
+def validate_elements(elements: List[Dict[str, Any]]) -> List[ValidationIssue]:
+    """Checks extracted elements for structural errors (see the module docstring for the codes)."""
+    issues: List[ValidationIssue] = []
+    nodes = [e["data"] for e in elements if e["group"] == "nodes"]
+    edges = [e["data"] for e in elements if e["group"] == "edges"]
+
+    id_counts = Counter(str(d["id"]) for d in nodes + edges if d.get("id") not in (None, ""))
+    for data in nodes + edges:
+        if data.get("id") in (None, ""):
+            issues.append(ValidationIssue("missing_id", f"Element without an id: {data}"))
+    for element_id, count in id_counts.items():
+        if count > 1:
+            issues.append(ValidationIssue("duplicate_id", f"Id '{element_id}' is used by {count} elements.", element_id))
+
+    node_ids = {str(d["id"]) for d in nodes if d.get("id") not in (None, "")}
+    section_ids = {str(d["id"]) for d in nodes if d.get("type") == "section"}
+    has_children = {str(d["parent"]) for d in nodes if d.get("parent")}
+    for data in nodes:
+        parent = data.get("parent")
+        if parent is None:
+            continue
+        if str(parent) not in node_ids:
+            issues.append(ValidationIssue("bad_parent", f"Node '{data.get('id')}' has parent '{parent}', "
+                                          "which is not a node.", data.get("id")))
+        elif section_ids and str(parent) not in section_ids:
+            issues.append(ValidationIssue("bad_parent", f"Node '{data.get('id')}' has parent '{parent}', "
+                                          "which is not a section node.", data.get("id")))
+
+    sources = set()
+    material_adjacency: Dict[str, List[str]] = defaultdict(list)
+    for data in edges:
+        source, target = data.get("source"), data.get("target")
+        for end, value in (("source", source), ("target", target)):
+            if value is None or str(value) not in node_ids:
+                issues.append(ValidationIssue("dangling_edge", f"Edge '{data.get('id')}' has {end} '{value}', "
+                                              "which is not a node id.", data.get("id")))
+        if source is not None:
+            sources.add(str(source))
+        if data.get("type") == "material" and source is not None and target is not None:
+            material_adjacency[str(source)].append(str(target))
+
+    cycle = _find_cycle(material_adjacency)
+    if cycle:
+        issues.append(ValidationIssue("material_cycle", f"Material flow has a cycle: {' -> '.join(cycle)}.", cycle[0]))
+
+    for data in nodes:
+        node_id = str(data.get("id"))
+        if data.get("type") == "ingredient" and node_id not in sources and node_id not in has_children:
+            issues.append(ValidationIssue("orphan_ingredient", f"Ingredient '{node_id}' has no outgoing edge.", node_id))
+    return issues
+
+
+def validate_script(js_content: str) -> List[ValidationIssue]:
+    """Extracts and validates the elements of a script.js; an unparsable script is a single issue."""
+    try:
+        elements = extract_elements(js_content)
+    except ElementsExtractionError as e:
+        return [ValidationIssue("extraction_failed", str(e))]
+    if not elements:
+        return [ValidationIssue("extraction_failed", "The elements array is empty.")]
+    return validate_elements(elements)
+
+
+def record_validation(model_name: str, issues: List[ValidationIssue], stage: str = "generated") -> None:
+    """Counts a validation run and its issues per model (metrics "graph_validation_runs"/"..._errors")."""
+    metrics.increment("graph_validation_runs", f"{model_name}/{stage}/{'clean' if not issues else 'invalid'}")
+    for code, count in Counter(issue.code for issue in issues).items():
+        metrics.increment("graph_validation_errors", f"{model_name}/{code}", count)
+
+
+def extract_script_block(response_text: str) -> str:
+    """Returns the content of the (last) fenced javascript block of a model response, or an empty string."""
+    blocks = re.findall(r"```(?:javascript|js)[^\n]*\n(.*?)\n```", response_text or "", re.DOTALL | re.IGNORECASE)
+    return blocks[-1].strip() if blocks else ""
+
+
+def format_issues(issues: List[ValidationIssue]) -> str:
+    """Human-readable issue list for logs and the repair prompt."""
+    lines = [f"- [{issue.code}] {issue.message}" for issue in issues[:MAX_REPORTED_ISSUES]]
+    if len(issues) > MAX_REPORTED_ISSUES:
+        lines.append(f"- ... and {len(issues) - MAX_REPORTED_ISSUES} more issues of the same kinds.")
+    return "\n".join(lines)
@@ -0,0 +1,150 @@
+"""
+grounding.py
+
+Per-stage policy for Google Search grounding of model calls.
+
+Grounding adds retrieval round trips to a call, so it is only worth it when the model is
+missing information. Policies (environment variable R2G_GROUNDING_<STAGE>):
+    on    Always attach the GoogleSearch tool.
+    off   Never attach it.
+    auto  Attach it when needs_grounding() finds gaps in the input (draft stage only;
+          other stages treat "auto" as "off").
+
+Defaults: "auto" for draft, "off" for every other stage (the graph stages only transform
+a standardized recipe they already have).
+"""
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+GROUNDING_POLICIES = ("on", "off", "auto")
+DEFAULT_GROUNDING_POLICIES: Dict[str, str] = {
+    "draft": "auto",
+    "rewrite": "off",
+    "revise": "off",
+    "generate": "off",
+    "improve": "off",
+    "improve_patch": "off",
+    "repair": "off",
+    "complete": "off",
+}
+# A draft with no recognisable ingredient lines and fewer words than this is treated as a dish
+# name or short description that the model has to look up.
+MIN_SELF_CONTAINED_DRAFT_WORDS = int(os.getenv("R2G_GROUNDING_MIN_DRAFT_WORDS", "40"))
+
+_UNITS = (r"cups?|tbsps?|tablespoons?|tsps?|teaspoons?|g|grams?|kg|ml|l|litres?|liters?|oz|ounces?|lbs?|"
+          r"pounds?|pinch(?:es)?|dash(?:es)?|handfuls?|cloves?|cans?|sticks?|bunch(?:es)?|slices?|pieces?")
+# A number, fraction or number word ("2", "1/2", "½", "two"), a unit ("a pinch of", "some grams"),
+# or an explicit amount ("to taste"). "a", "an" or "some" alone are not quantities.
+_QUANTITY_RE = re.compile(
+    rf"(\d|[½⅓⅔¼¾⅛]|\b(?:one|two|three|four|five|six|half|dozen)\b|\b(?:{_UNITS})\b|\b(?:to taste|as needed)\b)",
+    re.IGNORECASE,
+)
+_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(.*)$")
+_UNORDERED_BULLET_RE = re.compile(r"^\s*[-*•]\s+(.*)$")
+_INGREDIENTS_HEADER_RE = re.compile(r"^\s*#*\s*ingredients?\s*:?\s*$", re.IGNORECASE)
+_SECTION_HEADER_RE = re.compile(r"^\s*#*\s*(instructions|method|steps|directions|preparation)\s*:?\s*$",
+                                re.IGNORECASE)
+_WORD_RE = re.compile(r"[a-z]+")
+
+# Common ingredient words. An ingredient line without any of them is reported as unknown.
+KNOWN_INGREDIENT_WORDS = frozenset("""
+    flour sugar salt pepper egg eggs butter milk cream water oil olive vinegar yeast baking soda powder
+    honey syrup vanilla chocolate cocoa cinnamon nutmeg ginger garlic onion onions shallot shallots leek
+    carrot carrots celery potato potatoes tomato tomatoes paste pepper peppers chili chilli chilies
+    cumin coriander cilantro parsley basil oregano thyme rosemary sage mint dill bay leaf leaves paprika
+    turmeric cayenne saffron cardamom clove cloves mustard seed seeds sesame soy sauce stock broth
+    chicken beef pork lamb bacon ham sausage fish salmon tuna cod shrimp prawns prawn mussels turkey
+    rice pasta noodles vermicelli spaghetti bread breadcrumbs oats quinoa couscous lentils chickpeas beans
+    peas corn cornstarch cornflour cheese parmesan mozzarella cheddar feta ricotta yogurt yoghurt
+    lemon lime orange apple apples banana bananas berries strawberries blueberries raspberries
+    almonds walnuts pecans pistachios nuts peanut peanuts coconut raisins dates
+    spinach kale lettuce cabbage broccoli cauliflower zucchini courgette eggplant aubergine mushroom
+    mushrooms cucumber avocado pumpkin squash beet beetroot radish asparagus
+    wine beer juice zest gelatin tofu tahini mayonnaise ketchup worcestershire capers olives anchovies
+    herbs spices spice seasoning buttermilk margarine shortening lard ghee stockcube sugarcane molasses
+""".split())
+
+
+def grounding_policy(stage: str) -> str:
+    """The configured grounding policy for a stage ("on", "off" or "auto")."""
+    policy = os.getenv(f"R2G_GROUNDING_{stage.upper()}", DEFAULT_GROUNDING_POLICIES.get(stage, "off")).lower()
+    if policy not in GROUNDING_POLICIES:
+        raise ValueError(f"Invalid grounding policy '{policy}' for stage '{stage}'. Must be one of {GROUNDING_POLICIES}.")
+    return policy
+
+
+def _ingredient_lines(draft: str) -> List[str]:
+    """Lines of the draft's ingredient list (or every bulleted line when there is no "Ingredients" header)."""
+    lines = draft.splitlines()
+    in_ingredients = False
+    found_header = False
+    ingredient_lines = []
+    for line in lines:
+        if _INGREDIENTS_HEADER_RE.match(line):
+            in_ingredients = found_header = True
+            continue
+        if _SECTION_HEADER_RE.match(line):
+            in_ingredients = False
+            continue
+        if in_ingredients and line.strip():
+            match = _BULLET_RE.match(line)
+            ingredient_lines.append((match.group(1) if match else line).strip())
+    if found_header:
+        return ingredient_lines
+    return [m.group(1).strip() for m in map(_UNORDERED_BULLET_RE.match, lines) if m]
+
+
+def needs_grounding(draft: str) -> Tuple[bool, List[str]]:
+    """
+    Cheap local check of whether a recipe draft is missing information a search could fill in.
+
+    Flags ingredient lines without any quantity, ingredient lines with no known ingredient
+    word, and short drafts with no ingredient list at all.
+
+    Returns:
+        (needs grounding, reasons).
+    """
+    reasons = []
+    ingredients = _ingredient_lines(draft)
+    if not ingredients:
+        if len(draft.split()) < MIN_SELF_CONTAINED_DRAFT_WORDS:
+            reasons.append("no ingredient list in a short draft")
+        return bool(reasons), reasons
+    missing_quantity = [line for line in ingredients if not _QUANTITY_RE.search(line)]
+    unknown = [line for line in ingredients if not set(_WORD_RE.findall(line.lower())) & KNOWN_INGREDIENT_WORDS]
+    if missing_quantity:
+        reasons.append(f"{len(missing_quantity)} ingredient(s) without quantity")
+    if unknown:
+        reasons.append(f"{len(unknown)} unknown ingredient(s): {', '.join(unknown[:3])}")
+    return bool(reasons), reasons
+
+
+def should_ground(stage: str, input_text: Optional[str] = None, policy: Optional[str] = None) -> bool:
+    """
+    Decides whether a call for `stage` gets the GoogleSearch tool, and counts the decision.
+
+    Args:
+        stage: Pipeline stage name.
+        input_text: The call's input, inspected by the "auto" policy of the draft stage.
+        policy: Policy to apply instead of the configured one.
+
+    Returns:
+        True if the call should be grounded.
+    """
+    policy = policy or grounding_policy(stage)
+    reasons: List[str] = []
+    if policy == "auto":
+        grounded, reasons = needs_grounding(input_text or "") if stage == "draft" else (False, [])
+    else:
+        grounded = policy == "on"
+    metrics.increment("grounding", f"{stage}/{'grounded' if grounded else 'ungrounded'}")
+    if policy == "auto":
+        logger.info(f"Grounding for '{stage}' {'enabled' if grounded else 'skipped'} (auto): "
+                    f"{'; '.join(reasons) or 'draft looks self-contained'}.")
+    return grounded
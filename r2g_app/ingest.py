@@ -0,0 +1,225 @@
+"""
+ingest.py
+
+Cookbook ingestion: streams a long multi-recipe text (a cookbook chapter, a scraped page) and
+splits it locally into recipe-sized chunks, so each recipe goes through the pipeline on its own.
+
+Splitting reads the text line by line and keeps only the current chunk in memory. A recipe is
+recognised by its markers: an ingredients part (an "Ingredients" heading or quantity lines such
+as "2 cups flour") followed by a steps part (a "Method"/"Steps"/... heading or numbered lines).
+When a new ingredients part starts after the current chunk already has steps, the chunk is cut
+just before the new recipe's title (the last heading or short title line before the ingredients).
+Text without markers is cut at paragraph boundaries once a chunk reaches R2G_INGEST_MAX_CHUNK_CHARS.
+
+map_ordered() runs a function over the chunks on a bounded thread pool and yields the results
+in source order, with at most a fixed window of chunks in flight, so memory stays constant
+regardless of the document size (see main.process_cookbook).
+
+Configuration:
+    R2G_INGEST_MAX_CHUNK_CHARS  Soft size limit of a chunk (default 24000 characters).
+    R2G_INGEST_WORKERS          Chunks processed concurrently (default 4).
+"""
+import logging
+import os
+import re
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Deque, Iterable, Iterator, List, Optional, TextIO, Tuple, TypeVar, Union
+
+logger = logging.getLogger(__name__)
+
+MAX_CHUNK_CHARS = int(os.getenv("R2G_INGEST_MAX_CHUNK_CHARS", "24000"))
+INGEST_WORKERS = int(os.getenv("R2G_INGEST_WORKERS", "4"))
+MIN_CHUNK_CHARS = 40  # Shorter chunks (stray headings, page footers) are merged into the next one
+MAX_TITLE_CHARS = 80
+
+_UNITS = (r"cups?|c\.|tbsps?|tablespoons?|tsps?|teaspoons?|g|grams?|kg|ml|l|litres?|liters?|oz|ounces?|"
+          r"lbs?|pounds?|pinch|cloves?|cans?|sticks?|bunch|handful|slices?|pieces?|large|medium|small|whole")
+_INGREDIENTS_HEADING_RE = re.compile(r"^\s*#*\s*(ingredients?|you will need|what you need)\b.{0,40}$", re.IGNORECASE)
+_STEPS_HEADING_RE = re.compile(
+    r"^\s*#*\s*(method|directions?|instructions?|steps?|preparation|how to make( it)?)\s*:?\s*$", re.IGNORECASE)
+# "2 leeks", "1/2 cup sugar", "- 3-4 cloves garlic", "a pinch of salt" (but not "1. Heat the oil")
+_QUANTITY_LINE_RE = re.compile(
+    rf"^\s*(?:[-*•]\s*)?(?:(?:\d+(?:[.,/]\d+)?|[½⅓⅔¼¾⅛])\s*(?:-\s*\d+\s*)?[^\W\d]|(?:a|an|one|two|three)\s+(?:{_UNITS})\b)",
+    re.IGNORECASE)
+_NUMBERED_STEP_RE = re.compile(r"^\s*(?:step\s+)?\d+[.):]\s+\S", re.IGNORECASE)
+_MARKDOWN_HEADING_RE = re.compile(r"^\s*#{1,6}\s+\S")
+_LIST_ITEM_RE = re.compile(r"^\s*(?:[-*•]|\d+[.):])\s")
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass(frozen=True)
+class RecipeChunk:
+    """A recipe-sized part of a longer document."""
+    index: int       # Position in the document (0-based)
+    title: str       # Heading or first line of the chunk
+    text: str
+    start_line: int  # 1-based line number of the chunk's first line in the document
+
+
+def _is_title_line(line: str) -> bool:
+    """A heading, or a short line that reads like a recipe title (no list marker, no sentence end)."""
+    stripped = line.strip()
+    if not stripped or len(stripped) > MAX_TITLE_CHARS:
+        return False
+    if _MARKDOWN_HEADING_RE.match(stripped):
+        return True
+    return (not _LIST_ITEM_RE.match(stripped) and not _QUANTITY_LINE_RE.match(stripped)
+            and not stripped.endswith((".", ",", ";", "!", "?")) and not _STEPS_HEADING_RE.match(stripped))
+
+
+def recipe_slug(title: str, max_length: int = 40) -> str:
+    """A file-name friendly version of a recipe title ("Leek & Potato Soup" -> "leek_potato_soup")."""
+    return re.sub(r"[^a-z0-9]+", "_", title.lower()).strip("_")[:max_length].rstrip("_") or "recipe"
+
+
+def _chunk_title(lines: List[str]) -> str:
+    for line in lines:
+        if line.strip():
+            return line.strip().lstrip("#").strip()[:MAX_TITLE_CHARS]
+    return ""
+
+
+class _ChunkState:
+    """Lines of the chunk being read and the recipe markers seen in it."""
+
+    def __init__(self, start_line: int):
+        self.start_line = start_line
+        self.lines: List[str] = []
+        self.chars = 0
+        self.has_ingredients = False
+        self.has_steps = False
+        self.title_at: Optional[int] = None  # Index of the last title line seen after the steps started
+        self.title: Optional[str] = None     # Last title line before the ingredients
+
+    def append(self, line: str) -> None:
+        self.lines.append(line)
+        self.chars += len(line)
+
+    def split_at(self, position: int) -> Tuple[List[str], "_ChunkState"]:
+        """Removes lines[position:] into a new state and returns the lines before it."""
+        head, tail = self.lines[:position], self.lines[position:]
+        rest = _ChunkState(self.start_line + position)
+        for line in tail:
+            rest.append(line)
+            if rest.title is None and _is_title_line(line):
+                rest.title = _chunk_title([line])
+        return head, rest
+
+
+def iter_recipe_chunks(lines: Iterable[str], max_chars: int = MAX_CHUNK_CHARS) -> Iterator[RecipeChunk]:
+    """
+    Splits a stream of lines into recipe chunks (see module docstring). Lazy: only the current
+    chunk is kept in memory.
+
+    Args:
+        lines: The document's lines (e.g. an open text file), with or without line endings.
+        max_chars: Soft size limit of a chunk; a chunk without recipe boundaries is cut at the
+            next blank line after reaching it.
+
+    Yields:
+        The chunks in document order.
+    """
+    state = _ChunkState(start_line=1)
+    index = 0
+    carry: List[str] = []  # Too-short chunk text merged into the next chunk
+    carry_start = 1
+
+    def emit(chunk_lines: List[str], start_line: int, title: Optional[str]) -> Iterator[RecipeChunk]:
+        nonlocal index, carry, carry_start
+        if carry:
+            chunk_lines, start_line = carry + chunk_lines, carry_start
+            carry = []
+        text = "".join(chunk_lines).strip("\n")
+        if not text.strip():
+            return
+        if len(text) < MIN_CHUNK_CHARS:
+            carry, carry_start = chunk_lines, start_line
+            return
+        yield RecipeChunk(index, title or _chunk_title(chunk_lines), text + "\n", start_line)
+        index += 1
+
+    previous_blank = True
+    for line_number, line in enumerate(lines, start=1):
+        if not line.endswith("\n"):
+            line += "\n"
+        stripped = line.strip()
+        starts_ingredients = bool(_INGREDIENTS_HEADING_RE.match(stripped) or (
+            _QUANTITY_LINE_RE.match(stripped) and (not state.lines or not _QUANTITY_LINE_RE.match(state.lines[-1]))))
+        if starts_ingredients and state.has_steps:
+            # A new recipe starts: cut before its title if one was seen since the steps began
+            position = state.title_at if state.title_at is not None else len(state.lines)
+            head_start, head_title = state.start_line, state.title
+            head, state = state.split_at(position)
+            yield from emit(head, head_start, head_title)
+        elif not stripped and state.chars >= max_chars:
+            yield from emit(state.lines, state.start_line, state.title)
+            state = _ChunkState(start_line=line_number)
+        if starts_ingredients:
+            state.has_ingredients = True
+        elif state.has_ingredients and (_STEPS_HEADING_RE.match(stripped) or _NUMBERED_STEP_RE.match(line)):
+            state.has_steps = True
+        elif previous_blank and _is_title_line(line):
+            if state.has_steps:
+                state.title_at = len(state.lines)
+            elif not state.has_ingredients:
+                state.title = _chunk_title([line])
+        state.append(line)
+        previous_blank = not stripped
+    yield from emit(state.lines, state.start_line, state.title)
+    if carry:  # Trailing fragment with nothing left to merge into
+        text = "".join(carry).strip("\n")
+        if text.strip():
+            yield RecipeChunk(index, _chunk_title(carry), text + "\n", carry_start)
+
+
+def split_recipes(source: Union[str, os.PathLike, TextIO], max_chars: int = MAX_CHUNK_CHARS) -> Iterator[RecipeChunk]:
+    """
+    Streams recipe chunks from a text file path or an open text stream (see iter_recipe_chunks).
+
+    The file stays open while the iterator is consumed.
+    """
+    if hasattr(source, "read"):
+        yield from iter_recipe_chunks(source, max_chars)
+        return
+    with open(source, "r", encoding="utf-8", errors="replace") as f:
+        yield from iter_recipe_chunks(f, max_chars)
+
+
+def map_ordered(fn: Callable[[T], R], items: Iterable[T], max_workers: int = INGEST_WORKERS,
+                window: Optional[int] = None) -> Iterator[Tuple[T, "Future[R]"]]:
+    """
+    Runs `fn` over `items` on a bounded thread pool and yields (item, finished future) in input order.
+
+    At most `window` items (default twice `max_workers`) are read ahead of the one being yielded,
+    so a lazy input is consumed at the pace of its processing and memory stays bounded. Errors of
+    `fn` are left in the futures for the caller to inspect.
+
+    Args:
+        fn: Function applied to every item.
+        items: Input items (consumed lazily).
+        max_workers: Items processed concurrently.
+        window: Maximum items submitted but not yet yielded.
+    """
+    max_workers = max(1, max_workers)
+    window = max(max_workers, window or 2 * max_workers)
+    pending: Deque[Tuple[T, Future]] = deque()
+    iterator = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="r2g-ingest") as pool:
+        try:
+            for item in iterator:
+                pending.append((item, pool.submit(fn, item)))
+                if len(pending) >= window:
+                    item, future = pending.popleft()
+                    future.exception()  # Waits without raising
+                    yield item, future
+            while pending:
+                item, future = pending.popleft()
+                future.exception()
+                yield item, future
+        finally:
+            for _, future in pending:  # Consumer stopped early: drop what has not started
+                future.cancel()
@@ -0,0 +1,254 @@
+"""
+jobs.py
+
+In-process background job queue for the recipe pipeline.
+
+Long-running pipeline calls (process_text, revise_recipe, text_to_graph) are submitted as
+jobs and executed on a bounded worker pool, so callers such as the Streamlit script thread
+can poll for status, progress and results instead of blocking. The queue lives for the
+whole process, so jobs survive Streamlit reruns and browser reconnects (the caller only
+needs to keep the job ID).
+
+Jobs whose function takes a deadline get one from the queue (see deadlines.py), through which
+cancel() stops them before their next stage; a queued job is cancelled without running. A job
+submitted with `abandon_after_s` is cancelled the same way once nobody has polled it (`get`)
+for that long, e.g. when the browser session that started it is gone.
+
+Configuration (per instance, via environment variables):
+    R2G_JOB_WORKERS: Number of worker threads (default 4).
+    R2G_JOB_QUEUE_DEPTH: Maximum number of jobs waiting for a worker (default 32).
+    R2G_JOB_RETENTION_SECONDS: How long finished jobs are kept for polling (default 3600).
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .deadlines import Deadline
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("R2G_JOB_WORKERS", "4"))
+JOB_QUEUE_DEPTH = int(os.getenv("R2G_JOB_QUEUE_DEPTH", "32"))
+JOB_RETENTION_SECONDS = float(os.getenv("R2G_JOB_RETENTION_SECONDS", "3600"))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when a job is submitted while the queue already holds its maximum number of waiting jobs."""
+
+
+@dataclass
+class Job:
+    """A unit of background work and its observable state."""
+    job_id: str
+    kind: str
+    context: Dict[str, Any] = field(default_factory=dict)
+    status: str = JOB_QUEUED
+    progress: List[Tuple[float, str]] = field(default_factory=list)
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    last_polled_at: float = field(default_factory=time.time)
+    cancel_requested: bool = False
+    deadline: Optional[Deadline] = None  # Passed to the job's function, if it takes one
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the job was asked to stop (cancel() or abandonment)."""
+        return self.cancel_requested or (self.deadline is not None and self.deadline.cancelled)
+
+    @property
+    def latest_progress(self) -> Optional[str]:
+        return self.progress[-1][1] if self.progress else None
+
+    def add_progress(self, message: str) -> None:
+        """Appends a progress message; passed to pipeline functions as their progress callback."""
+        self.progress.append((time.time(), message))
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        """JSON-friendly snapshot of the job."""
+        snapshot = {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": [{"time": t, "message": m} for t, m in list(self.progress)],
+            "error": self.error,
+            "cancel_requested": self.cancel_requested,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if include_result:
+            # Typed results (e.g. results.GraphResult) are converted with their to_dict, bodies included
+            to_dict = getattr(self.result, "to_dict", None)
+            snapshot["result"] = to_dict(include_content=True) if callable(to_dict) else self.result
+        return snapshot
+
+
+class JobQueue:
+    """
+    Bounded worker pool running pipeline functions as jobs with IDs, status, progress and results.
+
+    Args:
+        workers: Number of worker threads.
+        max_queue_depth: Maximum number of jobs waiting for a free worker; further submissions
+            raise JobQueueFullError until the backlog drains.
+        retention_seconds: How long finished jobs remain available to `get`.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queue_depth: int = JOB_QUEUE_DEPTH,
+                 retention_seconds: float = JOB_RETENTION_SECONDS):
+        self.workers = workers
+        self.max_queue_depth = max_queue_depth
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="r2g-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable[..., Any], kwargs: Optional[Dict[str, Any]] = None,
+               context: Optional[Dict[str, Any]] = None,
+               progress_arg: Optional[str] = "progress_callback",
+               deadline_arg: Optional[str] = None, timeout_s: Optional[float] = None,
+               abandon_after_s: Optional[float] = None) -> Job:
+        """
+        Queues `fn(**kwargs)` as a job.
+
+        Args:
+            kind: Job type label (e.g. "process_text"), used by callers to interpret the result.
+            fn: The function to run on a worker thread.
+            kwargs: Keyword arguments for `fn`.
+            context: Free-form caller data stored with the job (e.g. what to restore on reconnect).
+            progress_arg: Name of the keyword argument through which `fn` accepts a progress
+                callback, or None if it takes none.
+            deadline_arg: Name of the keyword argument through which `fn` accepts a Deadline, or
+                None if it takes none (the job can then only be cancelled while queued).
+            timeout_s: The run's time limit (None or 0 for none), if `fn` takes a deadline.
+            abandon_after_s: Cancel the job once it has not been polled for this many seconds.
+
+        Returns:
+            The queued Job.
+
+        Raises:
+            JobQueueFullError: If the number of waiting jobs has reached max_queue_depth.
+        """
+        job = Job(job_id=uuid.uuid4().hex, kind=kind, context=dict(context or {}))
+        call_kwargs = dict(kwargs or {})
+        if progress_arg:
+            call_kwargs[progress_arg] = job.add_progress
+        if deadline_arg:
+            abandoned = (lambda: time.time() - job.last_polled_at > abandon_after_s) if abandon_after_s else None
+            job.deadline = call_kwargs[deadline_arg] = Deadline(timeout_s or None, cancel_when=abandoned)
+        with self._lock:
+            self._prune_locked()
+            waiting = sum(1 for j in self._jobs.values() if j.status == JOB_QUEUED)
+            if waiting >= self.max_queue_depth:
+                raise JobQueueFullError(
+                    f"Job queue is full ({waiting} jobs waiting, limit {self.max_queue_depth}). Please retry shortly."
+                )
+            self._jobs[job.job_id] = job
+        logger.info(f"Queued job {job.job_id} ({kind}).")
+        self._executor.submit(self._run, job, fn, call_kwargs)
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any], kwargs: Dict[str, Any]) -> None:
+        job.started_at = time.time()
+        if job.cancelled:
+            job.error = "Cancelled before it started."
+            job.status = JOB_CANCELLED
+            job.finished_at = time.time()
+            logger.info(f"Skipped cancelled job {job.job_id} ({job.kind}).")
+            return
+        job.status = JOB_RUNNING
+        logger.info(f"Started job {job.job_id} ({job.kind}).")
+        try:
+            job.result = fn(**kwargs)
+            job.status = JOB_SUCCEEDED
+        except Exception as e:
+            if job.cancelled:
+                logger.info(f"Job {job.job_id} ({job.kind}) stopped after cancellation: {e}")
+            else:
+                logger.exception(f"Job {job.job_id} ({job.kind}) failed: {e}")
+            job.error = str(e)
+            job.status = JOB_FAILED
+        finally:
+            if job.cancelled:
+                job.result = None  # Nobody is waiting for it
+                job.error = job.error or "Cancelled."
+                job.status = JOB_CANCELLED
+            job.finished_at = time.time()
+        logger.info(f"Finished job {job.job_id} ({job.kind}) with status '{job.status}' "
+                    f"in {job.finished_at - job.started_at:.2f}s.")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Returns the job with the given ID, or None if it is unknown or has expired. Counts as a poll."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            job.last_polled_at = time.time()
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Asks a job to stop: a queued job will not run, a running one stops before its next stage
+        (if its function takes a deadline; otherwise its result is discarded when it finishes).
+
+        Returns:
+            The job (unchanged if already finished), or None if it is unknown or has expired.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.done:
+            return job
+        job.cancel_requested = True
+        if job.deadline is not None:
+            job.deadline.cancel()
+        logger.info(f"Cancellation requested for job {job.job_id} ({job.kind}).")
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        """Counts of jobs by status plus the configured limits."""
+        with self._lock:
+            counts = {status: 0 for status in (JOB_QUEUED, JOB_RUNNING, *FINISHED_STATUSES)}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        counts.update({"workers": self.workers, "max_queue_depth": self.max_queue_depth})
+        return counts
+
+    def _prune_locked(self) -> None:
+        """Drops finished jobs older than the retention window. Caller must hold the lock."""
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.done and job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+_default_queue: Optional[JobQueue] = None
+_default_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Returns the process-wide JobQueue, creating it with the environment configuration on first use."""
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue()
+            logger.info(f"Created job queue with {JOB_WORKERS} workers and queue depth {JOB_QUEUE_DEPTH}.")
+        return _default_queue
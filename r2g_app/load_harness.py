@@ -0,0 +1,296 @@
+"""
+load_harness.py
+
+Headless multi-user load-test harness for st_app.py.
+
+Each simulated user is a Streamlit AppTest session walking through the full UI flow
+(process -> review -> revise -> generate graph) while the GenAI and GCS backends are
+replaced with the in-process fakes from fake_backends.py. Sessions are run concurrently
+at increasing concurrency levels to find where throughput stops scaling.
+
+Every session submits its own variant of the draft, and the app's shared result cache and the
+near-duplicate reuse of dedup.py are turned off (R2G_RESULT_CACHE=0, R2G_DEDUP=0): with the fakes
+every draft standardizes to the same recipe, so reused results would answer all sessions after the
+first and hide the load. Pass --shared-caches to measure the cached path instead.
+
+Usage:
+    python -m r2g_app.load_harness --sessions 1,2,4,8,16 --latency-scale 0.5
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .aux_funs import configure_logging
+from .fake_backends import fake_backends
+from .session_memory import approx_size
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_APP_PATH = REPO_ROOT / "st_app.py"
+DEFAULT_DRAFT_PATH = REPO_ROOT / "dummy_recipe.txt"
+DEFAULT_SESSION_LEVELS = [1, 2, 4, 8, 16]
+DEFAULT_SCRIPT_TIMEOUT_S = 120.0
+# A concurrency level is considered saturated when doubling the number of sessions
+# improves throughput by less than this fraction.
+SATURATION_MIN_GAIN = 0.10
+RUN_COUNTER_KEY = "_load_test_runs"
+# How often a session re-runs the page while its background job is running
+JOB_POLL_INTERVAL_S = 0.05
+INTERACTIONS = ["initial", "process", "revise", "generate_graph"]
+# Environment of the app under test unless --shared-caches is given
+ISOLATED_SESSION_ENV = {"R2G_RESULT_CACHE": "0", "R2G_DEDUP": "0"}
+_session_numbers = itertools.count(1)
+
+
+def _instrumented_app(app_path: str):
+    """AppTest entry point: counts script runs in session state, then executes the real app."""
+    import runpy
+    import streamlit as st
+
+    st.session_state["_load_test_runs"] = st.session_state.get("_load_test_runs", 0) + 1
+    runpy.run_path(app_path, run_name="__main__")
+
+
+@contextmanager
+def _shared_streamlit_runtime():
+    """
+    Keeps a Streamlit Runtime visible to every concurrent AppTest session.
+
+    AppTest installs a mock Runtime singleton at the start of each run and clears it when the
+    run finishes, so with several sessions running at once the others would find it missing
+    mid-script. While this is active, Runtime.instance() falls back to the last mock installed.
+    """
+    from streamlit.runtime import Runtime
+
+    original_instance = Runtime.__dict__["instance"]
+    last_runtime = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last_runtime["runtime"] = cls._instance
+        if "runtime" in last_runtime:
+            return last_runtime["runtime"]
+        return original_instance.__func__(cls)
+
+    Runtime.instance = classmethod(instance)
+    try:
+        yield
+    finally:
+        Runtime.instance = original_instance
+
+
+@contextmanager
+def _environment(overrides: Dict[str, str]):
+    """Sets environment variables for the duration of the block."""
+    saved = {name: os.environ.get(name) for name in overrides}
+    os.environ.update(overrides)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _session_state_bytes(at) -> int:
+    """Approximate size of all user-visible session state values of an AppTest session."""
+    return sum(approx_size(value) for value in at.session_state.to_dict().values())
+
+
+def _click(at, label: str):
+    """Clicks the first button with the given label."""
+    for button in at.button:
+        if button.label == label:
+            return button.click()
+    raise RuntimeError(f"Button '{label}' not found; page errors: {[e.value for e in at.error]}")
+
+
+def run_session(app_path: str, recipe_draft: str, session_index: int,
+                timeout: float = DEFAULT_SCRIPT_TIMEOUT_S) -> Dict[str, Any]:
+    """
+    Drives one simulated user through the whole app flow.
+
+    Args:
+        app_path: Path to the Streamlit script under test.
+        recipe_draft: Draft text pasted into the "Recipe Draft" box.
+        session_index: Index of the session, used to make recipe names unique.
+        timeout: Per-interaction script timeout in seconds.
+
+    Returns:
+        A dict with per-interaction latencies and rerun counts, final session state size,
+        and an `error` entry (None on success).
+    """
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_function(_instrumented_app, args=(app_path,), default_timeout=timeout)
+    latencies: Dict[str, float] = {}
+    reruns: Dict[str, int] = {}
+    error = None
+
+    def interact(name: str, action) -> None:
+        runs_before = at.session_state[RUN_COUNTER_KEY] if RUN_COUNTER_KEY in at.session_state else 0
+        start = time.perf_counter()
+        action()
+        at.run()
+        # AppTest does not run the job status fragment's timer: poll like the browser would
+        while "active_job_id" in at.session_state and at.session_state["active_job_id"]:
+            time.sleep(JOB_POLL_INTERVAL_S)
+            at.run()
+        latencies[name] = time.perf_counter() - start
+        reruns[name] = at.session_state[RUN_COUNTER_KEY] - runs_before
+        if at.exception:
+            raise RuntimeError(f"Uncaught exception during '{name}': {at.exception[0].value}")
+
+    def fill_inputs() -> None:
+        at.text_area[0].input(recipe_draft)
+        at.text_input[0].input(f"load_test_recipe_{session_index}")
+        at.text_input[1].input("load-test-bucket")
+        _click(at, "Process Recipe")
+
+    def request_changes() -> None:
+        at.text_area(key="user_feedback_input").input("Use half the sugar.")
+        _click(at, "Submit Changes")
+
+    try:
+        interact("initial", lambda: None)
+        interact("process", fill_inputs)
+        interact("revise", request_changes)
+        interact("generate_graph", lambda: _click(at, "Generate Graph"))
+        if not at.success:
+            raise RuntimeError(f"Graph results were not displayed; page errors: {[e.value for e in at.error]}")
+    except Exception as e:
+        error = str(e)
+
+    return {
+        "latencies_s": latencies,
+        "reruns": reruns,
+        "session_state_bytes": _session_state_bytes(at),
+        "error": error,
+    }
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_level(app_path: str, recipe_draft: str, sessions: int, timeout: float) -> Dict[str, Any]:
+    """Runs `sessions` concurrent simulated users and aggregates their measurements."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        # A distinct draft per session, across all levels, so no session is answered with another's results
+        drafts = [f"{recipe_draft}\n\n(Load-test session {next(_session_numbers)})" for _ in range(sessions)]
+        results = list(pool.map(lambda i: run_session(app_path, drafts[i], i, timeout), range(sessions)))
+    wall_time = time.perf_counter() - start
+
+    completed = [r for r in results if not r["error"]]
+    summary: Dict[str, Any] = {
+        "sessions": sessions,
+        "completed": len(completed),
+        "errors": [r["error"] for r in results if r["error"]],
+        "wall_time_s": round(wall_time, 3),
+        "throughput_sessions_per_s": round(len(completed) / wall_time, 4) if wall_time else 0.0,
+        "interactions": {},
+    }
+    for name in INTERACTIONS:
+        values = [r["latencies_s"][name] for r in completed if name in r["latencies_s"]]
+        if not values:
+            continue
+        summary["interactions"][name] = {
+            "p50_s": round(statistics.median(values), 3),
+            "p95_s": round(_percentile(values, 95), 3),
+            "max_s": round(max(values), 3),
+            "mean_reruns": round(statistics.mean(r["reruns"][name] for r in completed), 2),
+        }
+    state_sizes = [r["session_state_bytes"] for r in completed]
+    if state_sizes:
+        summary["session_state_bytes"] = {"mean": int(statistics.mean(state_sizes)), "max": max(state_sizes)}
+    return summary
+
+
+def find_saturation_point(levels: List[Dict[str, Any]]) -> Optional[int]:
+    """
+    Returns the first session count at which throughput stopped scaling, or None if it never did.
+
+    A level is saturated when its throughput is less than (1 + SATURATION_MIN_GAIN) times the
+    throughput of the previous level, or when any of its sessions failed.
+    """
+    for previous, current in zip(levels, levels[1:]):
+        if current["errors"]:
+            return current["sessions"]
+        if current["throughput_sessions_per_s"] < previous["throughput_sessions_per_s"] * (1 + SATURATION_MIN_GAIN):
+            return current["sessions"]
+    return None
+
+
+def _print_report(levels: List[Dict[str, Any]], saturation: Optional[int]) -> None:
+    print(f"{'sessions':>8} {'done':>5} {'wall_s':>8} {'sess/s':>8} " +
+          " ".join(f"{name + '_p95':>18}" for name in INTERACTIONS) + f" {'state_kb':>9}")
+    for level in levels:
+        p95s = " ".join(
+            f"{level['interactions'].get(name, {}).get('p95_s', float('nan')):>18.3f}" for name in INTERACTIONS
+        )
+        state_kb = level.get("session_state_bytes", {}).get("mean", 0) / 1024
+        print(f"{level['sessions']:>8} {level['completed']:>5} {level['wall_time_s']:>8.2f} "
+              f"{level['throughput_sessions_per_s']:>8.3f} {p95s} {state_kb:>9.1f}")
+        for error in level["errors"][:3]:
+            print(f"         error: {error}")
+    if saturation is None:
+        print("Throughput kept scaling across all tested levels (no saturation found).")
+    else:
+        print(f"Throughput saturates at {saturation} concurrent sessions.")
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Multi-user load test for the Streamlit app against fake backends.")
+    parser.add_argument("--sessions", default=",".join(str(n) for n in DEFAULT_SESSION_LEVELS),
+                        help="Comma-separated concurrency levels to test, e.g. 1,2,4,8.")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Multiplier for the fake model latencies (0 for no simulated latency).")
+    parser.add_argument("--recipe-file", default=str(DEFAULT_DRAFT_PATH), help="Draft recipe pasted by each session.")
+    parser.add_argument("--app", default=str(DEFAULT_APP_PATH), help="Streamlit script to test.")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_SCRIPT_TIMEOUT_S, help="Per-interaction timeout (s).")
+    parser.add_argument("--shared-caches", action="store_true",
+                        help="Keep the cross-session result cache and near-duplicate reuse on "
+                             "(all sessions after the first hit them).")
+    parser.add_argument("--json", dest="json_path", help="Optional path to write the full report as JSON.")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    # st_app.py imports r2g_app by package name, so the repo root must be importable.
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+
+    recipe_draft = Path(args.recipe_file).read_text(encoding="utf-8")
+    session_levels = [int(n) for n in args.sessions.split(",") if n.strip()]
+
+    levels = []
+    # The environment comes first: fake_backends imports the pipeline modules, which read it at import
+    with _environment({} if args.shared_caches else ISOLATED_SESSION_ENV), \
+            fake_backends(latency_scale=args.latency_scale), _shared_streamlit_runtime():
+        for sessions in session_levels:
+            print(f"Running {sessions} concurrent session(s)...")
+            levels.append(run_level(args.app, recipe_draft, sessions, args.timeout))
+
+    saturation = find_saturation_point(levels)
+    _print_report(levels, saturation)
+    report = {"levels": levels, "saturation_sessions": saturation, "latency_scale": args.latency_scale}
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Saved report to {args.json_path}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,79 +1,163 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
 import os
 import re # Add import for regular expressions
-# Removed argparse import
-from .genai_funs import generate_graph, re_write_recipe, improve_graph, draft_to_recipe
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from .genai_funs import generate_graph, re_write_recipe, improve_graph, draft_to_recipe, repair_graph, complete_graph_code
+from .genai_funs import improve_graph_patch, generate_graph_candidates, get_generation_profile
+from .genai_funs import VIDEO_PRESETS, VideoOptions, resolve_video_options
 # Import constants from genai_funs
 from .genai_funs import (
     PROJECT_ID, DEFAULT_VERTEX_LOCATION,
-    PROCESS_TEXT_MODEL_NAME, TEXT_TO_GRAPH_MODEL_NAME,
-    RECIPE_DRAFT_TEMP, RECIPE_REWRITE_TEMP, RECIPE_REVISE_TEMP,
-    GRAPH_GEN_TEMP, GRAPH_IMPROVE_TEMP
+    PROCESS_TEXT_MODEL_NAME, TEXT_TO_GRAPH_MODEL_NAME
 )
+# Temperature, output ceiling and thinking budget come from each stage's generation profile
+# (genai_funs.GENERATION_PROFILES).
 from datetime import date # Import date from datetime
 # Updated import from aux_funs
-from .aux_funs import upload_to_gcs, parse_code_string
-# Import the new prompt along with existing ones
-from .aux_vars import (
-    GENERATE_GRAPH_SYS_PROMPT, IMPROVE_GRAPH_SYS_PROMPT,
-    RE_WRITE_SYS_PROMPT, DRAFT_TO_RECIPE_SYS_PROMPT, REVISE_RECIPE_SYS_PROMPT
+from .aux_funs import upload_to_gcs, parse_code_string, get_storage_client, save_files, configure_logging
+# System prompts come from the versioned registry (variant per stage via R2G_PROMPT_VARIANT_<STAGE>)
+from .prompts import get_prompt
+from .routing import record_routing_outcome, route_graph_model
+from .deadlines import Deadline, DeadlineExceededError, as_deadline
+from .graph_layout import precompute_layout
+from .graph_validation import ElementsExtractionError, extract_script_block, format_issues, record_validation, validate_script
+from .graph_selection import BEST_OF_N_CANDIDATES, candidate_settings, record_selection, select_candidate
+from .graph_patch import PatchError, apply_patch, check_patched, format_graph_code, parse_patch, record_patch
+from .graph_recovery import (
+    BLOCK_MISSING, BLOCK_OK, BLOCK_TRUNCATED, check_files, incomplete_blocks, inspect_graph_code, merge_completion,
+    record_recovery,
 )
+from . import metrics
+from .catalog import CATALOG_ENABLED, RunRecord, content_hash, get_catalog
+from .dedup import DEDUP_ENABLED, get_dedup_index
+from .media_upload import guess_video_mime_type, mp4_duration_s, upload_media_file
+from .ingest import INGEST_WORKERS, RecipeChunk, map_ordered, recipe_slug, split_recipes
+from .results import GraphResult
+from dataclasses import replace
 from pathlib import Path
-# Removed sys import
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Union
+
+# The Google Cloud Storage library is only needed for type hints here; the client
+# itself comes from aux_funs.get_storage_client, which imports it on first use.
+if TYPE_CHECKING:
+    from google.cloud.storage import Bucket
+
+
+# Optional callback receiving human-readable progress messages (e.g. from the job queue).
+ProgressCallback = Callable[[str], None]
+
+# Default end-to-end deadline of each run in seconds, when the caller does not pass one (0 = no limit)
+PROCESS_TEXT_DEADLINE_SECONDS = float(os.getenv("R2G_PROCESS_DEADLINE_SECONDS", "240"))
+TEXT_TO_GRAPH_DEADLINE_SECONDS = float(os.getenv("R2G_GRAPH_DEADLINE_SECONDS", "900"))
+REVISE_RECIPE_DEADLINE_SECONDS = float(os.getenv("R2G_REVISE_DEADLINE_SECONDS", "180"))
+PROCESS_VIDEO_DEADLINE_SECONDS = float(os.getenv("R2G_VIDEO_DEADLINE_SECONDS", "1800"))
+# Default deadline per run (job kind), for callers that create the run's Deadline themselves
+RUN_DEADLINE_SECONDS: Dict[str, float] = {
+    "process_text": PROCESS_TEXT_DEADLINE_SECONDS,
+    "process_video": PROCESS_VIDEO_DEADLINE_SECONDS,
+    "revise_recipe": REVISE_RECIPE_DEADLINE_SECONDS,
+    "text_to_graph": TEXT_TO_GRAPH_DEADLINE_SECONDS,
+}
+# Send script.js back for a targeted repair call when the local validator finds structural errors
+GRAPH_REPAIR_ENABLED = os.getenv("R2G_GRAPH_REPAIR", "1") == "1"
+# Complete truncated or missing code blocks with a targeted call instead of failing the attempt
+GRAPH_RECOVERY_ENABLED = os.getenv("R2G_GRAPH_RECOVERY", "1") == "1"
+# How the improvement pass returns its changes: "full" (all three files again) or "patch"
+# (a set of style edits applied locally, see graph_patch.py; falls back to "full" if unusable)
+IMPROVE_MODES = ("full", "patch")
+IMPROVE_MODE = os.getenv("R2G_IMPROVE_MODE", "full")
+if IMPROVE_MODE not in IMPROVE_MODES:
+    raise ValueError(f"Invalid R2G_IMPROVE_MODE '{IMPROVE_MODE}'. Must be one of {IMPROVE_MODES}.")
+# How the graph code is produced: "two_pass" (generate, then improve) or "best_of_n" (candidates
+# generated concurrently in one round, the best by local score kept; see graph_selection.py)
+GRAPH_STRATEGIES = ("two_pass", "best_of_n")
+GRAPH_STRATEGY = os.getenv("R2G_GRAPH_STRATEGY", "two_pass")
+if GRAPH_STRATEGY not in GRAPH_STRATEGIES:
+    raise ValueError(f"Invalid R2G_GRAPH_STRATEGY '{GRAPH_STRATEGY}'. Must be one of {GRAPH_STRATEGIES}.")
+# Compute node positions at generation time and embed them as a Cytoscape preset layout
+PRECOMPUTED_LAYOUT_ENABLED = os.getenv("R2G_PRECOMPUTED_LAYOUT", "1") == "1"
+
 
-# Import the Google Cloud Storage library
-from google.cloud import storage
-# Import Blob and Bucket for uploading string data and bucket operations
-from google.cloud.storage import Blob, Bucket
+def _report_progress(progress_callback: Optional[ProgressCallback], message: str) -> None:
+    """Prints a progress message for the server logs and forwards it to the callback, if any."""
+    print(message)
+    if progress_callback:
+        progress_callback(message)
 
 
 # --- New Function: process_text ---
-def process_text(recipe_draft_text: str, project_id: str) -> str:
+def process_text(recipe_draft_text: str, project_id: str, progress_callback: Optional[ProgressCallback] = None,
+                 deadline: Union[Deadline, float, None] = None) -> str:
     """
     Processes raw recipe draft text into a standardized format using AI.
 
     Args:
         recipe_draft_text: The raw text of the recipe draft.
         project_id: Google Cloud Project ID for Vertex AI calls.
+        progress_callback: Optional callable receiving progress messages.
+        deadline: Overall deadline, as seconds from now or a Deadline shared with the caller.
+            Defaults to PROCESS_TEXT_DEADLINE_SECONDS.
 
     Returns:
-        The standardized recipe text as a string.
+        The standardized recipe text as a string (that of an earlier near-duplicate draft when
+        dedup.py finds one).
 
     Raises:
         ValueError: If input text is empty.
+        DeadlineExceededError: If the deadline is reached (or the run cancelled) before a stage.
         RuntimeError: If AI processing fails.
     """
     # --- Input Validation ---
     if not recipe_draft_text:
         raise ValueError("Recipe draft text cannot be empty.")
 
+    # --- Reuse the result of a near-duplicate draft (see dedup.py) ---
+    if DEDUP_ENABLED:
+        match = get_dedup_index().lookup("draft", recipe_draft_text)
+        if match:
+            _report_progress(progress_callback, "Reusing the standardized recipe of a near-duplicate draft "
+                                                f"(similarity {match.similarity:.2f}).")
+            return match.result
+
     standardised_recipe = None
-    print("Processing recipe text...") # Keep print for server logs
+    deadline = as_deadline(deadline, PROCESS_TEXT_DEADLINE_SECONDS)
+    _report_progress(progress_callback, "Processing recipe text...")
 
     # --- AI Processing: Draft -> Structured -> Standardized ---
     try:
-        print("Converting draft to structured recipe...") # Keep print for server logs
+        _report_progress(progress_callback, "Converting draft to structured recipe...")
         # Use imported constants
         recipe = draft_to_recipe(
             recipe_draft=recipe_draft_text,
-            system_instruction=DRAFT_TO_RECIPE_SYS_PROMPT,
+            system_instruction=get_prompt("draft"),
             project_id=project_id,  # Pass explicitly
             location=DEFAULT_VERTEX_LOCATION, # Use imported constant
             model_name=PROCESS_TEXT_MODEL_NAME, # Use imported constant
-            temperature=RECIPE_DRAFT_TEMP # Use imported constant
+            timeout_s=deadline.budget("draft", ["rewrite"])
         )
 
-        print("Standardizing structured recipe...") # Keep print for server logs
+        _report_progress(progress_callback, "Standardizing structured recipe...")
         # Use imported constants
         standardised_recipe = re_write_recipe(
             recipe_input=recipe,
             input_type="txt",
-            system_instruction=RE_WRITE_SYS_PROMPT,
+            system_instruction=get_prompt("rewrite"),
             project_id=project_id,  # Pass explicitly
             location=DEFAULT_VERTEX_LOCATION, # Use imported constant
             model_name=PROCESS_TEXT_MODEL_NAME, # Use imported constant
-            temperature=RECIPE_REWRITE_TEMP # Use imported constant
+            timeout_s=deadline.budget("rewrite")
         )
 
+    except DeadlineExceededError:
+        raise
     except Exception as e:
         # Catch errors during AI calls (draft_to_recipe, re_write_recipe)
         raise RuntimeError(f"AI processing failed during recipe standardization: {e}") from e
@@ -84,18 +168,171 @@ def process_text(recipe_draft_text: str, project_id: str) -> str:
         # but kept as a safeguard.
         raise RuntimeError("Standardized recipe could not be generated (empty result).")
 
-    print("Recipe text processing finished.")
+    if DEDUP_ENABLED:
+        get_dedup_index().add("draft", recipe_draft_text, standardised_recipe)
+    _report_progress(progress_callback, "Recipe text processing finished.")
     return standardised_recipe
 # --- End process_text ---
 
 
+def process_video(video_source: str, project_id: str, gcs_bucket_name: Optional[str] = None,
+                  recipe_name: Optional[str] = None, progress_callback: Optional[ProgressCallback] = None,
+                  deadline: Union[Deadline, float, None] = None,
+                  video_options: Union[VideoOptions, str, None] = None) -> str:
+    """
+    Processes a recipe video into a standardized recipe using AI.
+
+    A local video file is first uploaded to `{recipe_name}/{date}/source_video.<ext>` in the bucket
+    (parallel composite upload with CRC32C verification, resumable; see media_upload.py). GCS URIs
+    and YouTube URLs are passed to the model as they are.
+
+    Args:
+        video_source: Local video file path, gs:// URI or YouTube URL.
+        project_id: Google Cloud Project ID for Vertex AI calls.
+        gcs_bucket_name: Bucket to upload a local video to (required for local files).
+        recipe_name: Base name of the upload path. Defaults to the file name without extension.
+        progress_callback: Optional callable receiving progress messages (including upload progress).
+        deadline: Overall deadline, as seconds from now or a Deadline shared with the caller.
+            Defaults to PROCESS_VIDEO_DEADLINE_SECONDS.
+        video_options: Clipping, frame rate and media resolution, or a preset name from VIDEO_PRESETS.
+            Defaults to the R2G_VIDEO_PRESET preset ("auto": the cheap "long_video" preset for local
+            videos of LONG_VIDEO_SECONDS or more, the model defaults otherwise).
+
+    Returns:
+        The standardized recipe text as a string.
+
+    Raises:
+        ValueError: If the source is empty, a local file is given without a bucket, or the preset is unknown.
+        FileNotFoundError: If the local video file does not exist.
+        DeadlineExceededError: If the deadline is reached (or the run cancelled) before a stage.
+        RuntimeError: If the upload or AI processing fails.
+    """
+    if not video_source:
+        raise ValueError("Video source cannot be empty.")
+    deadline = as_deadline(deadline, PROCESS_VIDEO_DEADLINE_SECONDS)
+    _report_progress(progress_callback, "Processing recipe video...")
+
+    duration_s = None
+    if re.match(r"^(gs|https?)://", video_source):
+        video_uri = video_source
+        mime_type = guess_video_mime_type(video_source) if video_source.startswith("gs://") else "video/*"
+    else:
+        if not gcs_bucket_name:
+            raise ValueError("GCS bucket name is required to process a local video file.")
+        local_path = Path(video_source)
+        if not local_path.is_file():
+            raise FileNotFoundError(f"Video file not found: {video_source}")
+        today_str = date.today().strftime("%Y_%m_%d")
+        destination_blob_name = f"{recipe_name or local_path.stem}/{today_str}/source_video{local_path.suffix.lower()}"
+        mime_type = guess_video_mime_type(video_source)
+        duration_s = mp4_duration_s(str(local_path))
+        try:
+            upload = upload_media_file(str(local_path), gcs_bucket_name, destination_blob_name,
+                                       content_type=mime_type, progress_callback=progress_callback,
+                                       timeout=deadline.budget("upload", ["rewrite"]))
+        except (FileNotFoundError, DeadlineExceededError):
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Failed to upload video to GCS bucket '{gcs_bucket_name}': {e}") from e
+        video_uri = upload.uri
+
+    options = resolve_video_options(video_options, duration_s)
+    preset = next((name for name, preset_options in VIDEO_PRESETS.items() if preset_options == options), "custom")
+    if duration_s is not None:
+        print(f"Video duration {duration_s:.0f}s; using video options '{preset}' ({options}).")
+    metrics.increment("video_preset", preset)
+
+    try:
+        _report_progress(progress_callback, "Standardizing recipe from video...")
+        standardised_recipe = re_write_recipe(
+            recipe_input=video_uri,
+            input_type="youtube",
+            system_instruction=get_prompt("rewrite"),
+            project_id=project_id,
+            location=DEFAULT_VERTEX_LOCATION,
+            model_name=PROCESS_TEXT_MODEL_NAME,
+            timeout_s=deadline.budget("rewrite"),
+            mime_type=mime_type,
+            video_options=options
+        )
+    except DeadlineExceededError:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"AI processing failed during video recipe standardization: {e}") from e
+
+    if not standardised_recipe:
+        raise RuntimeError("Standardized recipe could not be generated from the video (empty result).")
+    _report_progress(progress_callback, "Recipe video processing finished.")
+    return standardised_recipe
+
+
+def process_cookbook(source: Union[str, Path, TextIO], project_id: str, gcs_bucket_name: Optional[str] = None,
+                     book_name: Optional[str] = None, progress_callback: Optional[ProgressCallback] = None,
+                     max_workers: int = INGEST_WORKERS) -> Iterator[dict]:
+    """
+    Splits a long multi-recipe text into recipes and runs the pipeline on each, concurrently.
+
+    The document is streamed and split locally (see ingest.py); at most `max_workers` recipes are
+    processed at a time and only a bounded window of them is held in memory. Each recipe runs
+    process_text and, when a bucket is given, text_to_graph, with their own default deadlines.
+    A failed recipe is reported in its result and does not stop the others.
+
+    Args:
+        source: Path of a text file, or an open text stream.
+        project_id: Google Cloud Project ID for Vertex AI calls.
+        gcs_bucket_name: Bucket for the graphs; None to only standardize the recipes.
+        book_name: Prefix of the recipe names ("{book_name}_{index:03d}_{title}"). Defaults to the
+            file name without extension (or "cookbook" for streams).
+        progress_callback: Optional callable receiving progress messages, prefixed with the recipe.
+        max_workers: Recipes processed concurrently.
+
+    Yields:
+        One dict per recipe, in source order: "index", "title", "start_line", "recipe_name",
+        "standardised_recipe", "graph" (the text_to_graph result, or None) and "error" (None on success).
+    """
+    if book_name is None:
+        book_name = Path(source).stem if isinstance(source, (str, Path)) else "cookbook"
+
+    def run_chunk(chunk: RecipeChunk) -> dict:
+        label = f"Recipe {chunk.index + 1} ({chunk.title})"
+
+        def chunk_progress(message: str) -> None:
+            if progress_callback:
+                progress_callback(f"{label}: {message}")
+
+        recipe_name = f"{book_name}_{chunk.index:03d}_{recipe_slug(chunk.title)}"
+        standardised_recipe = process_text(chunk.text, project_id, progress_callback=chunk_progress)
+        graph = None
+        if gcs_bucket_name:
+            graph = text_to_graph(standardised_recipe, recipe_name, gcs_bucket_name, project_id,
+                                  progress_callback=chunk_progress)
+        return {"recipe_name": recipe_name, "standardised_recipe": standardised_recipe, "graph": graph}
+
+    _report_progress(progress_callback, f"Processing cookbook '{book_name}' with {max_workers} worker(s)...")
+    processed = failed = 0
+    for chunk, future in map_ordered(run_chunk, split_recipes(source), max_workers=max_workers):
+        result = {"index": chunk.index, "title": chunk.title, "start_line": chunk.start_line,
+                  "recipe_name": None, "standardised_recipe": None, "graph": None, "error": None}
+        error = future.exception()
+        if error is None:
+            result.update(future.result())
+        else:
+            failed += 1
+            result["error"] = str(error)
+            print(f"Recipe {chunk.index + 1} ({chunk.title}) failed: {error}")
+        metrics.increment("cookbook_recipes", "failed" if error else "ok")
+        processed += 1
+        yield result
+    _report_progress(progress_callback, f"Cookbook '{book_name}' finished: {processed} recipe(s), {failed} failed.")
+
+
 # Function to get GCS bucket (moved outside process_recipe for clarity)
-def _get_gcs_bucket(bucket_name: str) -> Bucket:
-    """Gets the GCS bucket object."""
+def _get_gcs_bucket(bucket_name: str, timeout: Optional[float] = None) -> Bucket:
+    """Gets the GCS bucket object (timeout in seconds applies to the existence check)."""
     try:
-        storage_client = storage.Client()
+        storage_client = get_storage_client()
         bucket = storage_client.bucket(bucket_name)
-        if not bucket.exists():
+        if not bucket.exists(**({"timeout": timeout} if timeout is not None else {})):
              # Basic check, more robust checks might be needed (e.g., permissions)
             raise ValueError(f"GCS Bucket '{bucket_name}' not found or accessible.")
         return bucket
@@ -104,7 +341,9 @@ def _get_gcs_bucket(bucket_name: str) -> Bucket:
 
 
 # --- New Function: text_to_graph ---
-def text_to_graph(standardised_recipe: str, recipe_name: str, gcs_bucket_name: str, project_id: str) -> dict:
+def text_to_graph(standardised_recipe: str, recipe_name: str, gcs_bucket_name: str, project_id: str,
+                  progress_callback: Optional[ProgressCallback] = None,
+                  deadline: Union[Deadline, float, None] = None) -> GraphResult:
     """
     Generates a graph from standardized recipe text, uploads recipe text and graph PDF to GCS,
     and cleans up intermediate files.
@@ -114,12 +353,18 @@ def text_to_graph(standardised_recipe: str, recipe_name: str, gcs_bucket_name: s
         recipe_name: Base name for output files.
         gcs_bucket_name: Name of the GCS bucket to upload results.
         project_id: Google Cloud Project ID for Vertex AI calls.
+        progress_callback: Optional callable receiving progress messages.
+        deadline: Overall deadline, as seconds from now or a Deadline shared with the caller.
+            Defaults to TEXT_TO_GRAPH_DEADLINE_SECONDS.
 
     Returns:
-        A dictionary containing the GCS URIs of the generated recipe text and graph PDF.
+        A GraphResult with the GCS URIs and content hashes of the recipe text and graph files,
+        the model that produced the graph, the run's catalog entry and, for a result reused from
+        a near-duplicate recipe, its similarity. The file bodies are loaded lazily (see results.py).
 
     Raises:
         ValueError: If input or configuration is invalid (empty text, name, bucket).
+        DeadlineExceededError: If the deadline is reached (or the run cancelled) before a stage.
         RuntimeError: If GCS operations, AI graph generation, or graph script execution fail.
         Exception: For other unexpected errors.
     """
@@ -131,13 +376,24 @@ def text_to_graph(standardised_recipe: str, recipe_name: str, gcs_bucket_name: s
     if not gcs_bucket_name:
         raise ValueError("GCS bucket name cannot be empty.")
 
+    # --- Reuse the graph of a near-duplicate recipe of the same name and bucket (see dedup.py) ---
+    dedup_scope = f"{gcs_bucket_name}/{recipe_name}"
+    if DEDUP_ENABLED:
+        match = get_dedup_index().lookup("graph", standardised_recipe, scope=dedup_scope)
+        if match:
+            _report_progress(progress_callback, "Reusing the graph of a near-duplicate recipe "
+                                                f"(similarity {match.similarity:.2f}).")
+            return replace(match.result, dedup_similarity=match.similarity)
+
+    deadline = as_deadline(deadline, TEXT_TO_GRAPH_DEADLINE_SECONDS)
+    run_start = time.perf_counter()
     # Define date string early for use in all filenames
     today_str = date.today().strftime("%Y_%m_%d")
-    print("Processing standardized recipe for graph generation and GCS upload...")
+    _report_progress(progress_callback, "Processing standardized recipe for graph generation and GCS upload...")
 
     # --- Get GCS Bucket ---
     try:
-        bucket = _get_gcs_bucket(gcs_bucket_name)
+        bucket = _get_gcs_bucket(gcs_bucket_name, timeout=deadline.budget("upload", ["generate", "improve"]))
     except (ValueError, RuntimeError) as e:
         # Re-raise exceptions from _get_gcs_bucket
         raise e
@@ -152,7 +408,8 @@ def text_to_graph(standardised_recipe: str, recipe_name: str, gcs_bucket_name: s
         print(f"Uploading standardized recipe to GCS: gs://{gcs_bucket_name}/{output_recipe_filename}") # Keep print
         blob = bucket.blob(output_recipe_filename)
         # Upload directly from string
-        blob.upload_from_string(standardised_recipe, content_type='text/plain; charset=utf-8') # Specify encoding
+        blob.upload_from_string(standardised_recipe, content_type='text/plain; charset=utf-8', # Specify encoding
+                                timeout=deadline.budget("upload", ["generate", "improve"]))
         standardized_recipe_gcs_uri = f"gs://{gcs_bucket_name}/{output_recipe_filename}"
         print(f"Successfully uploaded standardized recipe to {standardized_recipe_gcs_uri}") # Keep print
 
@@ -163,60 +420,54 @@ def text_to_graph(standardised_recipe: str, recipe_name: str, gcs_bucket_name: s
 
 
     # --- AI Processing: Graph Generation & Improvement ---
-    first_pass_graph_code = None
-    improved_graph_code = None
-    try:
-        print("Generating initial graph code...") # Keep print
-        # Use imported constants
-        first_pass_graph_code = generate_graph(
-            standardised_recipe=standardised_recipe,
-            system_instruction=GENERATE_GRAPH_SYS_PROMPT,
-            project_id=project_id,  # Pass explicitly
-            location=DEFAULT_VERTEX_LOCATION, # Use imported constant
-            model_name=TEXT_TO_GRAPH_MODEL_NAME, # Use imported constant
-            temperature=GRAPH_GEN_TEMP # Use imported constant
-        )
-        print("Initial graph code generated.") # Keep print
-
-        # Validate that first pass code was generated before improving
-        if not first_pass_graph_code:
-             raise RuntimeError("Initial graph code generation returned empty result.")
+    # Simple recipes are routed to the fast model; if it does not produce usable graph code,
+    # the pro model gets one more attempt before the request fails.
+    decision = route_graph_model(standardised_recipe)
+    _report_progress(progress_callback, f"Routing graph generation to {decision.model_name}: {decision.reason}.")
+    graph_models = [decision.model_name]
+    if decision.model_name != TEXT_TO_GRAPH_MODEL_NAME:
+        graph_models.append(TEXT_TO_GRAPH_MODEL_NAME)
 
-        print("Improving graph code...") # Keep print
-        # Use imported constants
-        improved_graph_code = improve_graph(
-                standardised_recipe=standardised_recipe,
-                graph_code=first_pass_graph_code,
-                system_instruction=IMPROVE_GRAPH_SYS_PROMPT,
-                project_id=project_id,  # Pass explicitly
-                location=DEFAULT_VERTEX_LOCATION, # Use imported constant
-                model_name=TEXT_TO_GRAPH_MODEL_NAME, # Use imported constant
-                temperature=GRAPH_IMPROVE_TEMP # Use imported constant
-        )
-        print("Graph code improvement finished.") # Keep print
+    html_content = css_content = js_content = ""
+    graph_model_name = None
+    with metrics.collect_usage() as model_calls:
+        for attempt, model_name in enumerate(graph_models):
+            if attempt:
+                _report_progress(progress_callback, f"Retrying graph generation with {model_name}...")
+            attempt_start = time.perf_counter()
+            try:
+                with metrics.collect_usage() as generation_calls:
+                    improved_graph_code = _generate_graph_code(standardised_recipe, project_id, model_name, deadline,
+                                                               progress_callback)
+                # --- Process Improved Graph Code ---
+                # Truncated or missing blocks are completed by a targeted call (see graph_recovery.py)
+                parsed_content = _recover_graph_code(standardised_recipe, improved_graph_code, project_id, model_name,
+                                                     deadline, progress_callback,
+                                                     metrics.summarize_usage(generation_calls)["total_token_count"])
+                html_content = parsed_content.get("index.html", "")
+                css_content = parsed_content.get("style.css", "")
+                js_content = parsed_content.get("script.js", "")
+                if not html_content:
+                    raise RuntimeError("HTML content could not be parsed from improved_graph_code.")
+            except RuntimeError as e:
+                record_routing_outcome(decision, model_name, False, time.perf_counter() - attempt_start, str(e))
+                if attempt == len(graph_models) - 1:
+                    raise
+                continue
+            record_routing_outcome(decision, model_name, True, time.perf_counter() - attempt_start)
+            graph_model_name = model_name
+            break
+        # --- End AI Processing: Graph ---
 
-        # Validate that improved code was generated
-        if not improved_graph_code:
-             raise RuntimeError("Graph code improvement returned empty result.")
-
-    except Exception as e:
-        # Catch errors during graph generation AI calls
-        raise RuntimeError(f"AI processing failed during graph generation/improvement: {e}") from e
-    # --- End AI Processing: Graph ---
-
-
-    # --- Process Improved Graph Code ---
-    # Call the imported function
-    parsed_content = parse_code_string(improved_graph_code)
-    html_content = parsed_content.get("index.html", "")
-    css_content = parsed_content.get("style.css", "")
-    js_content = parsed_content.get("script.js", "")
-
-    if not html_content:
-        # Or handle this more gracefully depending on requirements
-        raise RuntimeError("HTML content could not be parsed from improved_graph_code.")
+        # --- Validate the graph elements and repair them if needed ---
+        js_content = _validate_and_repair_script(standardised_recipe, js_content, project_id, graph_model_name,
+                                                 deadline, progress_callback)
+    if PRECOMPUTED_LAYOUT_ENABLED and js_content:
+        js_content = _apply_precomputed_layout(js_content, graph_model_name)
 
     # --- Upload HTML, CSS, JS directly to GCS ---
+    _report_progress(progress_callback, "Uploading graph files to GCS...")
+    upload_timeout = deadline.budget("upload")
     html_gcs_uri = None
     css_gcs_uri = None
     js_gcs_uri = None
@@ -229,7 +480,8 @@ def text_to_graph(standardised_recipe: str, recipe_name: str, gcs_bucket_name: s
             bucket_name=gcs_bucket_name,
             destination_blob_name=html_destination_blob_name,
             source_content_string=html_content,
-            content_type='text/html; charset=utf-8'
+            content_type='text/html; charset=utf-8',
+            timeout=upload_timeout
         )
         html_gcs_uri = f"gs://{gcs_bucket_name}/{html_destination_blob_name}"
         print(f"Successfully uploaded HTML to {html_gcs_uri}")
@@ -242,7 +494,8 @@ def text_to_graph(standardised_recipe: str, recipe_name: str, gcs_bucket_name: s
                 bucket_name=gcs_bucket_name,
                 destination_blob_name=css_destination_blob_name,
                 source_content_string=css_content,
-                content_type='text/css; charset=utf-8'
+                content_type='text/css; charset=utf-8',
+                timeout=upload_timeout
             )
             css_gcs_uri = f"gs://{gcs_bucket_name}/{css_destination_blob_name}"
             print(f"Successfully uploaded CSS to {css_gcs_uri}")
@@ -257,7 +510,8 @@ def text_to_graph(standardised_recipe: str, recipe_name: str, gcs_bucket_name: s
                 bucket_name=gcs_bucket_name,
                 destination_blob_name=js_destination_blob_name,
                 source_content_string=js_content,
-                content_type='application/javascript; charset=utf-8'
+                content_type='application/javascript; charset=utf-8',
+                timeout=upload_timeout
             )
             js_gcs_uri = f"gs://{gcs_bucket_name}/{js_destination_blob_name}"
             print(f"Successfully uploaded JS to {js_gcs_uri}")
@@ -275,21 +529,345 @@ def text_to_graph(standardised_recipe: str, recipe_name: str, gcs_bucket_name: s
     if not html_gcs_uri: # HTML is considered essential
         raise RuntimeError("HTML content GCS URI not found after direct GCS upload.")
 
-    return {
-        "recipe_uri": standardized_recipe_gcs_uri,
-        "html_gcs_uri": html_gcs_uri,
-        "css_gcs_uri": css_gcs_uri, # Will be None if no CSS content/upload
-        "js_gcs_uri": js_gcs_uri,   # Will be None if no JS content/upload
-        "html_content": html_content,
-        "css_content": css_content,
-        "js_content": js_content
-    }
+    usage = metrics.summarize_usage(model_calls)
+    run_id = _record_catalog_run(RunRecord(
+        recipe_name=recipe_name,
+        recipe_sha256=content_hash(standardised_recipe),
+        bucket=gcs_bucket_name,
+        html_sha256=content_hash(html_content),
+        css_sha256=content_hash(css_content),
+        js_sha256=content_hash(js_content),
+        recipe_uri=standardized_recipe_gcs_uri,
+        html_uri=html_gcs_uri,
+        css_uri=css_gcs_uri,
+        js_uri=js_gcs_uri,
+        graph_model=graph_model_name,
+        models=usage["models"],
+        model_calls=usage["calls"],
+        prompt_tokens=usage["prompt_token_count"],
+        output_tokens=usage["candidates_token_count"],
+        thoughts_tokens=usage["thoughts_token_count"],
+        total_tokens=usage["total_token_count"],
+        model_latency_s=usage["latency_s"],
+        duration_s=round(time.perf_counter() - run_start, 3),
+    ))
+
+    results = GraphResult.from_contents(
+        html_content, css_content, js_content,
+        recipe_uri=standardized_recipe_gcs_uri,
+        html_gcs_uri=html_gcs_uri,
+        css_gcs_uri=css_gcs_uri, # Will be None if no CSS content/upload
+        js_gcs_uri=js_gcs_uri,   # Will be None if no JS content/upload
+        graph_model=graph_model_name,
+        run_id=run_id # Catalog entry of this run (None if the catalog is disabled or unavailable)
+    )
+    if DEDUP_ENABLED:
+        get_dedup_index().add("graph", standardised_recipe, results, scope=dedup_scope)
+    return results
 # --- End text_to_graph ---
 
 
+def _generate_graph_code(standardised_recipe: str, project_id: str, model_name: str, deadline: Deadline,
+                         progress_callback: Optional[ProgressCallback] = None) -> str:
+    """
+    Runs the graph generation and improvement agents on a standardized recipe with one model
+    (or, with R2G_GRAPH_STRATEGY=best_of_n, generates candidates concurrently and keeps the best).
 
+    Returns:
+        The improved graph code (fenced html/css/javascript blocks).
+
+    Raises:
+        DeadlineExceededError: If the deadline does not leave time for a call.
+        RuntimeError: If either AI call fails or returns an empty result.
+    """
+    if GRAPH_STRATEGY == "best_of_n":
+        if IMPROVE_MODE == "patch":
+            # best_of_n has no improvement pass, so there is nothing to patch
+            print("Warning: R2G_IMPROVE_MODE=patch has no effect with R2G_GRAPH_STRATEGY=best_of_n.")
+        return _generate_best_of_n(standardised_recipe, project_id, model_name, deadline, progress_callback)
+    try:
+        _report_progress(progress_callback, "Generating initial graph code...")
+        # Use imported constants
+        first_pass_graph_code = generate_graph(
+            standardised_recipe=standardised_recipe,
+            system_instruction=get_prompt("generate"),
+            project_id=project_id,  # Pass explicitly
+            location=DEFAULT_VERTEX_LOCATION, # Use imported constant
+            model_name=model_name,
+            timeout_s=deadline.budget("generate", ["improve", "upload"])
+        )
+        _report_progress(progress_callback, "Initial graph code generated.")
+
+        # Validate that first pass code was generated before improving
+        if not first_pass_graph_code:
+             raise RuntimeError("Initial graph code generation returned empty result.")
 
-def revise_recipe(original_draft: str, current_standardised_recipe: str, user_feedback: str, project_id: str) -> str:
+        _report_progress(progress_callback, "Improving graph code...")
+        improved_graph_code = None
+        if IMPROVE_MODE == "patch":
+            improved_graph_code = _improve_graph_with_patch(standardised_recipe, first_pass_graph_code, project_id,
+                                                            model_name, deadline, progress_callback)
+        if improved_graph_code is None:
+            # Use imported constants
+            improved_graph_code = improve_graph(
+                    standardised_recipe=standardised_recipe,
+                    graph_code=first_pass_graph_code,
+                    system_instruction=get_prompt("improve"),
+                    project_id=project_id,  # Pass explicitly
+                    location=DEFAULT_VERTEX_LOCATION, # Use imported constant
+                    model_name=model_name,
+                    timeout_s=deadline.budget("improve", ["upload"])
+            )
+        _report_progress(progress_callback, "Graph code improvement finished.")
+
+        # Validate that improved code was generated
+        if not improved_graph_code:
+             raise RuntimeError("Graph code improvement returned empty result.")
+
+    except DeadlineExceededError:
+        raise
+    except Exception as e:
+        # Catch errors during graph generation AI calls
+        raise RuntimeError(f"AI processing failed during graph generation/improvement: {e}") from e
+    return improved_graph_code
+
+
+def _generate_best_of_n(standardised_recipe: str, project_id: str, model_name: str, deadline: Deadline,
+                        progress_callback: Optional[ProgressCallback] = None) -> str:
+    """
+    Generates BEST_OF_N_CANDIDATES first-pass graphs concurrently, each with its own temperature and
+    seed, and returns the one with the best local score (R2G_GRAPH_STRATEGY=best_of_n, see
+    graph_selection.py). There is no improvement pass, so the run waits for one round of calls
+    (and R2G_IMPROVE_MODE does not apply).
+
+    Returns:
+        The graph code of the selected candidate (fenced html/css/javascript blocks).
+
+    Raises:
+        DeadlineExceededError: If the deadline does not leave time for the calls.
+        RuntimeError: If every candidate fails or returns an empty result.
+    """
+    settings = candidate_settings(BEST_OF_N_CANDIDATES, get_generation_profile("generate").temperature)
+    _report_progress(progress_callback, f"Generating {len(settings)} graph code candidates...")
+    candidates = generate_graph_candidates(
+        standardised_recipe=standardised_recipe,
+        system_instruction=get_prompt("generate"),
+        settings=[(setting.temperature, setting.seed) for setting in settings],
+        project_id=project_id,
+        location=DEFAULT_VERTEX_LOCATION,
+        model_name=model_name,
+        timeout_s=deadline.budget("generate", ["upload"])
+    )
+    winner, scores = select_candidate(candidates)
+    record_selection(model_name, winner, scores)
+    if winner is None:
+        raise RuntimeError(f"AI processing failed during graph generation: all {len(settings)} candidates failed.")
+    print("Graph candidate scores: " + ", ".join(
+        f"#{index} (t={setting.temperature}) {'failed' if score is None else score.value}"
+        for index, (setting, score) in enumerate(zip(settings, scores))))
+    _report_progress(progress_callback, f"Selected graph candidate {winner + 1} of {len(settings)} "
+                                        f"(score {scores[winner].value:.2f}).")
+    return candidates[winner]
+
+
+def _improve_graph_with_patch(standardised_recipe: str, graph_code: str, project_id: str, model_name: str,
+                              deadline: Deadline, progress_callback: Optional[ProgressCallback] = None) -> Optional[str]:
+    """
+    Improves the first-pass graph code with a set of style edits applied locally (R2G_IMPROVE_MODE=patch,
+    see graph_patch.py), so unchanged code is never generated again.
+
+    Returns:
+        The improved graph code, or None if the patch could not be obtained, parsed or applied
+        cleanly; the caller then runs the full improvement call.
+
+    Raises:
+        DeadlineExceededError: If the deadline does not leave time for the call.
+    """
+    files = parse_code_string(graph_code)
+    if not files.get("index.html") or not files.get("script.js"):
+        return None  # Nothing reliable to patch: the full improvement call rebuilds the files
+    try:
+        response_text = improve_graph_patch(
+            standardised_recipe=standardised_recipe,
+            graph_code=graph_code,
+            system_instruction=get_prompt("improve_patch"),
+            project_id=project_id,
+            location=DEFAULT_VERTEX_LOCATION,
+            model_name=model_name,
+            timeout_s=deadline.budget("improve_patch", ["improve", "upload"])
+        )
+        patch = parse_patch(response_text)
+    except PatchError as e:
+        print(f"Graph improvement patch could not be parsed ({e}); running the full improvement.")
+        record_patch(model_name, "invalid")
+        return None
+    except RuntimeError as e:
+        print(f"Graph improvement patch failed ({e}); running the full improvement.")
+        record_patch(model_name, "failed")
+        return None
+    if not patch.edit_count:
+        record_patch(model_name, "empty")
+        return graph_code
+
+    try:
+        patched, applied = apply_patch(files, patch)
+        problems = check_patched(files, patched)
+    except ElementsExtractionError as e:
+        applied, problems = None, [f"the script could not be parsed ({e})"]
+    if problems:
+        print(f"Graph improvement patch rejected: {'; '.join(problems)}. Running the full improvement.")
+        record_patch(model_name, "rejected", applied)
+        return None
+    record_patch(model_name, "applied", applied)
+    _report_progress(progress_callback, f"Applied {sum(applied.values())} style edit(s) to the graph code.")
+    return format_graph_code(patched)
+
+
+def _recover_graph_code(standardised_recipe: str, graph_code: str, project_id: str, model_name: str,
+                        deadline: Deadline, progress_callback: Optional[ProgressCallback] = None,
+                        regeneration_tokens: int = 0) -> Dict[str, str]:
+    """
+    Parses the graph code and, if blocks are truncated (e.g. the output stopped at max_output_tokens)
+    or missing, asks the model to complete just those blocks and merges its answer.
+
+    A file the completion does not fix keeps its parsed content (empty for a block that was cut
+    off), so a failed or skipped completion (no time left, API error) behaves as before.
+
+    Args:
+        regeneration_tokens: Tokens spent on generating the graph code, i.e. what a full
+            regeneration would cost again; used to record the tokens a recovery saves.
+
+    Returns:
+        File name -> content of index.html, style.css and script.js.
+    """
+    parsed = parse_code_string(graph_code)
+    states = inspect_graph_code(graph_code, parsed)
+    incomplete = incomplete_blocks(states)
+    if not incomplete:
+        return parsed
+    _report_progress(progress_callback, "Graph code is incomplete ("
+                     + ", ".join(f"{state.file_name} {state.status}" for state in incomplete) + ").")
+    if not GRAPH_RECOVERY_ENABLED:
+        record_recovery(model_name, "skipped", states)
+        return parsed
+
+    _report_progress(progress_callback, "Completing the graph code...")
+    try:
+        with metrics.collect_usage() as recovery_calls:
+            response_text = complete_graph_code(
+                standardised_recipe=standardised_recipe,
+                files={file_name: state.content for file_name, state in states.items()},
+                truncated=[state.file_name for state in incomplete if state.status == BLOCK_TRUNCATED],
+                missing=[state.file_name for state in incomplete if state.status == BLOCK_MISSING],
+                system_instruction=get_prompt("complete"),
+                project_id=project_id,
+                location=DEFAULT_VERTEX_LOCATION,
+                model_name=model_name,
+                timeout_s=deadline.budget("complete", ["upload"])
+            )
+    except (DeadlineExceededError, RuntimeError) as e:
+        print(f"Graph completion skipped: {e}")
+        record_recovery(model_name, "failed", states)
+        return parsed
+
+    merged = check_files(merge_completion(states, response_text))
+    recovered = {file_name: state.content for file_name, state in merged.items() if state.status == BLOCK_OK}
+    remaining = [state.file_name for state in incomplete if state.file_name not in recovered]
+    outcome = "failed" if len(remaining) == len(incomplete) else "partial" if remaining else "recovered"
+    tokens_saved = None
+    if outcome != "failed":
+        tokens_saved = regeneration_tokens - metrics.summarize_usage(recovery_calls)["total_token_count"]
+    record_recovery(model_name, outcome, states, tokens_saved)
+    if remaining:
+        print(f"Graph completion left {', '.join(remaining)} incomplete.")
+    _report_progress(progress_callback, f"Graph code completion: {outcome}.")
+    return {file_name: recovered.get(file_name, parsed.get(file_name, "")) for file_name in states}
+
+
+def _validate_and_repair_script(standardised_recipe: str, js_content: str, project_id: str, model_name: str,
+                                deadline: Deadline, progress_callback: Optional[ProgressCallback] = None) -> str:
+    """
+    Validates the Cytoscape elements of script.js and, if there are structural errors, asks the
+    model for a targeted repair of the script.
+
+    The repaired script is only used if it has fewer issues than the original. A failed or
+    skipped repair (no time left, API error) keeps the original script.
+
+    Returns:
+        The script.js content to upload.
+    """
+    issues = validate_script(js_content)
+    record_validation(model_name, issues)
+    if not issues:
+        return js_content
+    _report_progress(progress_callback, f"Graph validator found {len(issues)} structural issue(s).")
+    print(format_issues(issues))
+    if not GRAPH_REPAIR_ENABLED:
+        return js_content
+
+    _report_progress(progress_callback, "Repairing graph structure...")
+    try:
+        response_text = repair_graph(
+            standardised_recipe=standardised_recipe,
+            script_js=js_content,
+            issues=format_issues(issues),
+            system_instruction=get_prompt("repair"),
+            project_id=project_id,
+            location=DEFAULT_VERTEX_LOCATION,
+            model_name=model_name,
+            timeout_s=deadline.budget("repair", ["upload"])
+        )
+    except (DeadlineExceededError, RuntimeError) as e:
+        print(f"Graph repair skipped: {e}")
+        metrics.increment("graph_repairs", f"{model_name}/failed")
+        return js_content
+
+    repaired_js = extract_script_block(response_text)
+    repaired_issues = validate_script(repaired_js)
+    record_validation(model_name, repaired_issues, stage="repaired")
+    if len(repaired_issues) >= len(issues):
+        print(f"Graph repair did not reduce the issues ({len(repaired_issues)} left); keeping the original script.")
+        metrics.increment("graph_repairs", f"{model_name}/unchanged")
+        return js_content
+    metrics.increment("graph_repairs", f"{model_name}/{'fixed' if not repaired_issues else 'improved'}")
+    _report_progress(progress_callback, f"Graph repaired ({len(repaired_issues)} issue(s) left).")
+    return repaired_js
+
+
+def _record_catalog_run(record: RunRecord) -> Optional[int]:
+    """Adds a finished run to the catalog. Catalog errors are logged, never raised: the run itself succeeded."""
+    if not CATALOG_ENABLED:
+        return None
+    try:
+        return get_catalog().add_run(record)
+    except sqlite3.Error as e:
+        print(f"Warning: could not record run of '{record.recipe_name}' in the catalog: {e}")
+        return None
+
+
+def _apply_precomputed_layout(js_content: str, model_name: str) -> str:
+    """
+    Replaces the browser-side dagre layout of script.js with precomputed preset positions.
+
+    Returns:
+        The script with a preset layout, or the original script if its elements cannot be laid out
+        (the page then keeps running dagre in the browser).
+    """
+    start_time = time.perf_counter()
+    try:
+        laid_out = precompute_layout(js_content)
+    except (ElementsExtractionError, ValueError) as e:
+        print(f"Precomputed layout skipped, keeping the client-side layout: {e}")
+        metrics.increment("graph_layout", f"{model_name}/skipped")
+        return js_content
+    metrics.increment("graph_layout", f"{model_name}/{'preset' if laid_out != js_content else 'no_layout_found'}")
+    print(f"Precomputed graph layout in {(time.perf_counter() - start_time) * 1000:.1f} ms.")
+    return laid_out
+
+
+def revise_recipe(original_draft: str, current_standardised_recipe: str, user_feedback: str, project_id: str,
+                  progress_callback: Optional[ProgressCallback] = None,
+                  deadline: Union[Deadline, float, None] = None) -> str:
     '''
     Revises a standardized recipe based on user feedback using an AI model.
 
@@ -298,14 +876,19 @@ def revise_recipe(original_draft: str, current_standardised_recipe: str, user_fe
         current_standardised_recipe: The recipe version the user reviewed.
         user_feedback: The changes requested by the user.
         project_id: Google Cloud Project ID.
+        progress_callback: Optional callable receiving progress messages.
+        deadline: Overall deadline, as seconds from now or a Deadline shared with the caller.
+            Defaults to REVISE_RECIPE_DEADLINE_SECONDS.
 
     Returns:
         The revised standardized recipe text.
 
     Raises:
+        DeadlineExceededError: If the deadline is reached (or the run cancelled) before the AI call.
         RuntimeError: If AI revision fails.
     '''
-    print("Revising recipe based on user feedback...") # Keep print for server logs
+    deadline = as_deadline(deadline, REVISE_RECIPE_DEADLINE_SECONDS)
+    _report_progress(progress_callback, "Revising recipe based on user feedback...")
 
     # Construct input text for the AI model
     # Consider if original_draft is needed contextually. If prompts handle revision well without it, it can be omitted.
@@ -336,19 +919,174 @@ Based *only* on the User Feedback provided above, please revise the Current Stan
         revised_text = re_write_recipe(
             recipe_input=input_text,
             input_type="txt",
-            system_instruction=REVISE_RECIPE_SYS_PROMPT, # Use the new prompt
+            system_instruction=get_prompt("revise"), # Use the new prompt
             project_id=project_id, # Pass explicitly
             location=DEFAULT_VERTEX_LOCATION, # Use imported constant
             model_name=PROCESS_TEXT_MODEL_NAME, # Use imported constant
-            temperature=RECIPE_REVISE_TEMP # Use imported constant
+            stage="revise",
+            timeout_s=deadline.budget("revise")
         )
         if not revised_text:
             raise RuntimeError("AI revision returned an empty result.")
 
-        print("Recipe revision finished.") # Keep print for server logs
+        _report_progress(progress_callback, "Recipe revision finished.")
         return revised_text
 
+    except DeadlineExceededError:
+        raise
     except Exception as e:
         print(f"Error during recipe revision: {e}") # Keep print for server logs
         # Re-raise the exception to be caught by the Streamlit app
         raise RuntimeError(f"AI processing failed during recipe revision: {e}") from e
+
+
+# --- Command line interface ---
+# Reads records from files or stdin (JSONL) and writes one JSON line per record to stdout as soon as
+# it finishes; progress messages go to stderr. Run `python -m r2g_app.main --help` for details.
+CLI_COMMANDS = ("process", "graph", "revise", "run")
+# Record field holding each command's main input (a file's content goes into this field)
+CLI_INPUT_FIELDS = {"process": "draft", "graph": "recipe", "revise": "recipe", "run": "draft"}
+CLI_DRY_RUN_BUCKET = "r2g-dry-run"
+
+
+def _read_cli_records(command: str, paths: List[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Yields input records: one per file (its content as the command's input field, its name as the
+    recipe name), or one per JSON line of stdin for no paths or "-". Stdin is read lazily. Unreadable
+    files and malformed lines become error records, so the other inputs still run.
+    """
+    input_field = CLI_INPUT_FIELDS[command]
+    for path in paths or ["-"]:
+        if path != "-":
+            try:
+                yield {"id": path, input_field: Path(path).read_text(encoding="utf-8"), "recipe_name": Path(path).stem}
+            except (OSError, UnicodeDecodeError) as e:
+                yield {"id": path, "error": f"Cannot read file: {e}"}
+            continue
+        for line_number, line in enumerate(sys.stdin, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"id": f"stdin:{line_number}", "error": f"Invalid JSON: {e}"}
+                continue
+            if not isinstance(record, dict):
+                record = {input_field: record} if isinstance(record, str) else {"error": "Expected a JSON object."}
+            record.setdefault("id", f"stdin:{line_number}")
+            yield record
+
+
+def _run_cli_record(command: str, record: Dict[str, Any], args: argparse.Namespace) -> Dict[str, Any]:
+    """Runs one record through the command and returns its output record (raises on failure)."""
+    if record.get("error"):
+        raise ValueError(record["error"])
+    input_text = record.get(CLI_INPUT_FIELDS[command])
+    if not isinstance(input_text, str) or not input_text.strip():
+        raise ValueError(f"Record has no '{CLI_INPUT_FIELDS[command]}' text.")
+    recipe_name = record.get("recipe_name") or recipe_slug(str(record["id"]))
+    output: Dict[str, Any] = {"id": record["id"], "recipe_name": recipe_name}
+    if command == "revise":
+        feedback = record.get("feedback") or args.feedback
+        if not feedback:
+            raise ValueError("Record has no 'feedback' (and no --feedback was given).")
+        output["standardised_recipe"] = revise_recipe(record.get("draft", ""), input_text, feedback, args.project_id)
+        return output
+    recipe = input_text
+    if command in ("process", "run"):
+        recipe = output["standardised_recipe"] = process_text(input_text, args.project_id)
+    if command in ("graph", "run"):
+        graph = text_to_graph(recipe, recipe_name, args.bucket, args.project_id)
+        if args.local_output:
+            directory = Path(args.local_output) / recipe_name
+            save_files(graph.files(), str(directory))
+            output["local_output"] = str(directory)
+        output.update(graph.to_dict())
+    elif args.local_output:
+        directory = Path(args.local_output) / recipe_name
+        save_files({"standardised_recipe.txt": recipe}, str(directory))
+        output["local_output"] = str(directory)
+    return output
+
+
+def _stream_cli(command: str, records: Iterable[Dict[str, Any]], args: argparse.Namespace, out: TextIO) -> int:
+    """Runs records on `args.concurrency` threads, writing each result as it completes. Returns the failure count."""
+    failures = 0
+    lock = threading.Lock()
+
+    def write(output: Dict[str, Any]) -> None:
+        with lock:
+            out.write(json.dumps(output, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="r2g-cli") as pool:
+        pending = {}
+        records = iter(records)
+        exhausted = False
+        while pending or not exhausted:
+            # Read ahead at most two records per worker, so stdin is consumed at the pace of the pipeline
+            while not exhausted and len(pending) < 2 * args.concurrency:
+                record = next(records, None)
+                if record is None:
+                    exhausted = True
+                    break
+                pending[pool.submit(_run_cli_record, command, record, args)] = record
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    write(future.result())
+                else:
+                    failures += 1
+                    write({"id": record.get("id"), "error": f"{type(error).__name__}: {error}"})
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point; returns the exit code (1 if any record failed)."""
+    parser = argparse.ArgumentParser(
+        prog="python -m r2g_app.main",
+        description="Run the recipe pipeline on files or JSONL records from stdin, writing JSONL results to stdout.",
+        epilog="Input records are JSON objects with the command's input field ('draft' for process and run, "
+               "'recipe' for graph and revise) and optionally 'id', 'recipe_name', 'feedback' and 'draft'.",
+    )
+    parser.add_argument("command", choices=CLI_COMMANDS,
+                        help="process: draft -> standardized recipe; graph: standardized recipe -> graph; "
+                             "revise: apply feedback to a standardized recipe; run: process, then graph.")
+    parser.add_argument("inputs", nargs="*", help="Input text files; none or '-' reads JSONL records from stdin.")
+    parser.add_argument("--concurrency", type=int, default=INGEST_WORKERS, help="Records processed in parallel.")
+    parser.add_argument("--bucket", help="GCS bucket for graph and run.")
+    parser.add_argument("--project-id", default=PROJECT_ID, help="Google Cloud project ID (default: PROJECT_ID).")
+    parser.add_argument("--feedback", help="Revision feedback for records without their own (revise).")
+    parser.add_argument("--local-output", help="Also save each result's files under DIR/<recipe_name>/.")
+    parser.add_argument("--dry-run", action="store_true", help="Use the in-process fake GenAI/GCS backends.")
+    parser.add_argument("--latency-scale", type=float, default=0.0, help="Fake backend latency multiplier (dry run).")
+    args = parser.parse_args(argv)
+
+    args.concurrency = max(1, args.concurrency)
+    args.bucket = args.bucket or (CLI_DRY_RUN_BUCKET if args.dry_run else None)
+    if args.command in ("graph", "run") and not args.bucket:
+        parser.error("--bucket is required for graph and run.")
+    if not args.project_id and not args.dry_run:
+        parser.error("--project-id (or PROJECT_ID) is required.")
+
+    configure_logging()
+    out = sys.stdout
+    if args.dry_run:
+        from .fake_backends import fake_backends
+        backends = fake_backends(args.latency_scale)
+    else:
+        backends = contextlib.nullcontext()
+    # The pipeline prints progress messages; keep stdout for the JSONL results
+    with contextlib.redirect_stdout(sys.stderr), backends:
+        failures = _stream_cli(args.command, _read_cli_records(args.command, args.inputs), args, out)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    # Run the package's copy of this module (not __main__), whose functions --dry-run patches
+    from . import main as package_main
+    sys.exit(package_main.main())
@@ -0,0 +1,337 @@
+"""
+media_upload.py
+
+Fast, verified and resumable upload of large local media files (recipe videos) to GCS.
+
+Files above COMPOSITE_THRESHOLD_BYTES are split into chunks that are uploaded in parallel as
+temporary part objects and then composed into the destination object (GCS parallel composite
+upload). Every part and the composed object are checked against locally computed CRC32C
+checksums; composite objects have no MD5, so CRC32C is the end-to-end check.
+
+Uploaded parts are recorded in a manifest next to the local file (`<file>.r2g-upload.json`). If an
+upload is interrupted, the next upload of the same, unchanged file to the same destination only
+sends the missing parts. The manifest and the part objects are removed once the upload is complete.
+
+Configuration:
+    R2G_UPLOAD_CHUNK_MB            Part size (default 16).
+    R2G_UPLOAD_WORKERS             Parallel part uploads (default 8).
+    R2G_COMPOSITE_THRESHOLD_MB     Smaller files are sent in a single request (default 32).
+    R2G_UPLOAD_CHUNK_RETRIES       Attempts per part (default 3).
+"""
+from __future__ import annotations
+
+import base64
+import io
+import json
+import logging
+import mimetypes
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Callable, Dict, List, Optional, Tuple, Union
+
+from . import metrics
+from .aux_funs import get_storage_client
+
+if TYPE_CHECKING:
+    from google.cloud.storage import Blob, Bucket
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE_BYTES = int(float(os.getenv("R2G_UPLOAD_CHUNK_MB", "16")) * 1024 * 1024)
+MAX_UPLOAD_WORKERS = int(os.getenv("R2G_UPLOAD_WORKERS", "8"))
+COMPOSITE_THRESHOLD_BYTES = int(float(os.getenv("R2G_COMPOSITE_THRESHOLD_MB", "32")) * 1024 * 1024)
+CHUNK_RETRIES = int(os.getenv("R2G_UPLOAD_CHUNK_RETRIES", "3"))
+MAX_COMPOSE_SOURCES = 32  # GCS limit per compose request
+MANIFEST_SUFFIX = ".r2g-upload.json"
+PARTS_SUFFIX = ".r2g-parts"
+# Progress is reported each time another PROGRESS_STEP_PERCENT of the file has been uploaded
+PROGRESS_STEP_PERCENT = 10
+
+ProgressCallback = Callable[[str], None]
+
+
+class ChecksumMismatchError(RuntimeError):
+    """Raised when an uploaded object's CRC32C does not match the local data."""
+
+
+@dataclass(frozen=True)
+class MediaUploadResult:
+    """Outcome of upload_media_file."""
+    uri: str
+    size_bytes: int
+    crc32c: str
+    parts: int
+    resumed_parts: int
+    elapsed_s: float
+
+    @property
+    def throughput_mb_s(self) -> float:
+        """Throughput of the bytes sent in this call (resumed parts excluded), in MB/s."""
+        sent = self.size_bytes if self.parts <= 1 else self.size_bytes * (self.parts - self.resumed_parts) / self.parts
+        return sent / (1024 * 1024) / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+
+def _crc32c_b64(checksum) -> str:
+    """GCS representation of a CRC32C: base64 of the big-endian 4-byte value."""
+    return base64.b64encode(checksum.digest()).decode("ascii")
+
+
+def _file_checksums(path: Path, chunk_size: int) -> Tuple[str, List[str]]:
+    """CRC32C of the whole file and of each chunk, computed in one pass."""
+    import google_crc32c
+
+    whole = google_crc32c.Checksum()
+    chunks = []
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            whole.update(data)
+            chunks.append(_crc32c_b64(google_crc32c.Checksum(data)))
+    return _crc32c_b64(whole), chunks
+
+
+def _timeout_kwargs(timeout: Optional[float]) -> Dict[str, float]:
+    return {"timeout": timeout} if timeout is not None else {}
+
+
+def _get_bucket(bucket_name: str) -> Bucket:
+    return get_storage_client().bucket(bucket_name)
+
+
+def guess_video_mime_type(path: str) -> str:
+    """MIME type of a video file from its extension ("video/mp4" when unknown)."""
+    mime_type, _ = mimetypes.guess_type(path)
+    return mime_type if mime_type and mime_type.startswith("video/") else "video/mp4"
+
+
+def _read_mp4_duration(f: BinaryIO, end: Optional[int] = None) -> Optional[float]:
+    """Walks MP4 boxes from the current position to `end` and returns the movie header's duration."""
+    while end is None or f.tell() < end:
+        start = f.tell()
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        size, box_type = struct.unpack(">I4s", header)
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+        elif size == 0:  # Box extends to the end of the file
+            size = (end if end is not None else f.seek(0, os.SEEK_END)) - start
+            f.seek(start + 8)
+        if size < 8:
+            return None
+        if box_type == b"moov":
+            return _read_mp4_duration(f, start + size)
+        if box_type == b"mvhd":
+            version = f.read(4)[0]
+            if version == 1:
+                f.seek(16, os.SEEK_CUR)
+                timescale, duration = struct.unpack(">IQ", f.read(12))
+            else:
+                f.seek(8, os.SEEK_CUR)
+                timescale, duration = struct.unpack(">II", f.read(8))
+            return duration / timescale if timescale else None
+        f.seek(start + size)
+    return None
+
+
+def mp4_duration_s(source: Union[str, bytes]) -> Optional[float]:
+    """
+    Duration of an MP4/MOV video in seconds, read from its movie header (no decoding, and only the
+    box headers are read, so large files are cheap), or None for other formats and unreadable files.
+
+    Args:
+        source: Local file path, or the file's bytes.
+    """
+    try:
+        if isinstance(source, (bytes, bytearray)):
+            return _read_mp4_duration(io.BytesIO(source))
+        with open(source, "rb") as f:
+            return _read_mp4_duration(f)
+    except (OSError, struct.error, IndexError):
+        return None
+
+
+class _Manifest:
+    """Parts of an interrupted upload, persisted next to the local file."""
+
+    def __init__(self, local_path: Path, key: Dict[str, object]):
+        self.path = local_path.with_name(local_path.name + MANIFEST_SUFFIX)
+        self.key = key
+        self.parts: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        try:
+            stored = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if stored.get("key") == key:
+            self.parts = {int(index): crc for index, crc in stored.get("parts", {}).items()}
+
+    def add(self, index: int, crc32c: str) -> None:
+        with self._lock:
+            self.parts[index] = crc32c
+            payload = json.dumps({"key": self.key, "parts": self.parts})
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            tmp_path.write_text(payload, encoding="utf-8")
+            os.replace(tmp_path, self.path)
+
+    def discard(self, index: int) -> None:
+        with self._lock:
+            self.parts.pop(index, None)
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def _upload_single(bucket: Bucket, path: Path, destination_blob_name: str, content_type: str,
+                   timeout: Optional[float]) -> str:
+    blob = bucket.blob(destination_blob_name)
+    blob.upload_from_filename(str(path), content_type=content_type, checksum="crc32c",
+                              **_timeout_kwargs(timeout))
+    return blob.crc32c
+
+
+def _compose(bucket: Bucket, destination_blob_name: str, sources: List[Blob], content_type: str,
+             timeout: Optional[float], intermediates: List[Blob]) -> Blob:
+    """Composes `sources` into the destination, through intermediate objects above MAX_COMPOSE_SOURCES."""
+    while len(sources) > MAX_COMPOSE_SOURCES:
+        level = []
+        for i in range(0, len(sources), MAX_COMPOSE_SOURCES):
+            intermediate = bucket.blob(f"{destination_blob_name}{PARTS_SUFFIX}/compose-{len(intermediates):05d}")
+            intermediate.content_type = content_type
+            intermediate.compose(sources[i:i + MAX_COMPOSE_SOURCES], **_timeout_kwargs(timeout))
+            intermediates.append(intermediate)
+            level.append(intermediate)
+        sources = level
+    destination = bucket.blob(destination_blob_name)
+    destination.content_type = content_type
+    destination.compose(sources, **_timeout_kwargs(timeout))
+    return destination
+
+
+def upload_media_file(local_path: str, bucket_name: str, destination_blob_name: str,
+                      content_type: Optional[str] = None, progress_callback: Optional[ProgressCallback] = None,
+                      chunk_size: int = CHUNK_SIZE_BYTES, max_workers: int = MAX_UPLOAD_WORKERS,
+                      timeout: Optional[float] = None) -> MediaUploadResult:
+    """
+    Uploads a local media file to GCS (parallel composite upload above COMPOSITE_THRESHOLD_BYTES).
+
+    Args:
+        local_path: Path of the local file.
+        bucket_name: Destination bucket.
+        destination_blob_name: Destination object name.
+        content_type: Object content type. Guessed from the file extension by default.
+        progress_callback: Optional callable receiving progress messages (parts, MB, MB/s).
+        chunk_size: Part size in bytes.
+        max_workers: Number of parts uploaded in parallel.
+        timeout: Per-request timeout in seconds (storage library default when None).
+
+    Returns:
+        The upload result (URI, size, CRC32C, part counts and timing).
+
+    Raises:
+        FileNotFoundError: If the local file does not exist.
+        ChecksumMismatchError: If an uploaded part or the composed object fails CRC32C verification.
+        RuntimeError: If a part cannot be uploaded after CHUNK_RETRIES attempts.
+    """
+    path = Path(local_path)
+    stat = path.stat()
+    size = stat.st_size
+    content_type = content_type or guess_video_mime_type(str(path))
+    uri = f"gs://{bucket_name}/{destination_blob_name}"
+    bucket = _get_bucket(bucket_name)
+    start_time = time.perf_counter()
+
+    def report(message: str) -> None:
+        logger.info(message)
+        if progress_callback:
+            progress_callback(message)
+
+    if size <= COMPOSITE_THRESHOLD_BYTES:
+        report(f"Uploading {path.name} ({size / 1024 / 1024:.1f} MB) to {uri}...")
+        crc32c, _ = _file_checksums(path, max(size, 1))
+        uploaded_crc32c = _upload_single(bucket, path, destination_blob_name, content_type, timeout)
+        if uploaded_crc32c != crc32c:
+            raise ChecksumMismatchError(f"CRC32C mismatch for {uri}: local {crc32c}, uploaded {uploaded_crc32c}.")
+        result = MediaUploadResult(uri, size, crc32c, 1, 0, time.perf_counter() - start_time)
+        metrics.increment("media_upload", "bytes_sent", size)
+        report(f"Uploaded {path.name} ({result.throughput_mb_s:.1f} MB/s).")
+        return result
+
+    crc32c, part_checksums = _file_checksums(path, chunk_size)
+    manifest = _Manifest(path, {"bucket": bucket_name, "destination": destination_blob_name, "size": size,
+                                "mtime_ns": stat.st_mtime_ns, "chunk_size": chunk_size, "crc32c": crc32c})
+    part_names = [f"{destination_blob_name}{PARTS_SUFFIX}/{index:05d}" for index in range(len(part_checksums))]
+
+    # Parts recorded by an interrupted upload count only if they are still in the bucket, unchanged
+    for index, part_crc32c in list(manifest.parts.items()):
+        existing = bucket.get_blob(part_names[index]) if index < len(part_names) else None
+        if existing is None or existing.crc32c != part_checksums[index] or part_crc32c != part_checksums[index]:
+            manifest.discard(index)
+    resumed_parts = len(manifest.parts)
+    pending = [index for index in range(len(part_checksums)) if index not in manifest.parts]
+    report(f"Uploading {path.name} ({size / 1024 / 1024:.1f} MB) to {uri} in {len(part_checksums)} parts"
+           + (f", resuming after {resumed_parts} uploaded parts" if resumed_parts else "") + "...")
+
+    progress_lock = threading.Lock()
+    done_bytes = [resumed_parts * chunk_size]
+    next_report = [PROGRESS_STEP_PERCENT]
+    sent_bytes = [0]
+
+    def upload_part(index: int) -> None:
+        with open(path, "rb") as f:
+            f.seek(index * chunk_size)
+            data = f.read(chunk_size)
+        blob = bucket.blob(part_names[index])
+        for attempt in range(1, CHUNK_RETRIES + 1):
+            try:
+                blob.upload_from_string(data, content_type="application/octet-stream", checksum="crc32c",
+                                        **_timeout_kwargs(timeout))
+                if blob.crc32c != part_checksums[index]:
+                    raise ChecksumMismatchError(f"CRC32C mismatch for part {index} of {uri}.")
+                break
+            except Exception as e:
+                if attempt == CHUNK_RETRIES:
+                    raise RuntimeError(f"Failed to upload part {index} of {uri} after {attempt} attempts: {e}") from e
+                logger.warning(f"Part {index} of {uri} failed (attempt {attempt}/{CHUNK_RETRIES}): {e}")
+        manifest.add(index, part_checksums[index])
+        with progress_lock:
+            done_bytes[0] += len(data)
+            sent_bytes[0] += len(data)
+            percent = min(100, done_bytes[0] * 100 // size)
+            if percent >= next_report[0]:
+                next_report[0] = (percent // PROGRESS_STEP_PERCENT + 1) * PROGRESS_STEP_PERCENT
+                elapsed = time.perf_counter() - start_time
+                report(f"Uploaded {percent}% of {path.name} "
+                       f"({sent_bytes[0] / 1024 / 1024 / elapsed if elapsed > 0 else 0.0:.1f} MB/s).")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending) or 1)),
+                            thread_name_prefix="r2g-upload") as executor:
+        list(executor.map(upload_part, pending))  # Re-raises the first failed part
+
+    parts = [bucket.blob(name) for name in part_names]
+    intermediates: List[Blob] = []
+    destination = _compose(bucket, destination_blob_name, parts, content_type, timeout, intermediates)
+    if destination.crc32c != crc32c:
+        raise ChecksumMismatchError(f"CRC32C mismatch for composed {uri}: local {crc32c}, "
+                                    f"uploaded {destination.crc32c}.")
+
+    for blob in parts + intermediates:
+        try:
+            blob.delete()
+        except Exception as e:  # Leftover parts only cost storage; the upload itself succeeded
+            logger.warning(f"Could not delete temporary part {blob.name}: {e}")
+    manifest.remove()
+
+    result = MediaUploadResult(uri, size, crc32c, len(parts), resumed_parts, time.perf_counter() - start_time)
+    metrics.increment("media_upload", "bytes_sent", sent_bytes[0])
+    metrics.increment("media_upload", "resumed_parts", resumed_parts)
+    report(f"Uploaded {path.name}: {len(parts)} parts ({resumed_parts} resumed), verified CRC32C, "
+           f"{result.throughput_mb_s:.1f} MB/s.")
+    return result
@@ -0,0 +1,166 @@
+"""
+metrics.py
+
+Lightweight in-process metrics for the recipe pipeline.
+
+- Model calls are recorded per (stage, model): call and failure counts, recent latencies
+  and token usage taken from the response's usage_metadata. Latencies are also kept per
+  stage for grounded and ungrounded (Google Search) calls, to compare the two side by side,
+  and per (stage, model, location) for calls whose region is known (hedging deadlines).
+- Named counters hold everything else (routing decisions, validation issues, hedges, ...).
+- collect_usage() captures the model calls made inside a block (e.g. one pipeline run),
+  including calls made from threads started with contextvars.copy_context().
+
+Everything is kept in memory for the life of the process and exposed through snapshot().
+"""
+import contextvars
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+# Number of most recent latencies kept per (stage, model) for percentile estimates
+LATENCY_WINDOW = 500
+USAGE_FIELDS = ("prompt_token_count", "candidates_token_count", "thoughts_token_count", "total_token_count")
+
+_lock = threading.Lock()
+_call_stats: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_counters: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+_grounding_latencies: Dict[Tuple[str, bool], Deque[float]] = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+_location_latencies: Dict[Tuple[str, str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+_usage_collector: contextvars.ContextVar[Optional[List[Dict[str, Any]]]] = contextvars.ContextVar(
+    "r2g_usage_collector", default=None
+)
+
+
+def usage_from_response(response: Any) -> Dict[str, int]:
+    """Extracts token counts from a GenAI response's usage_metadata (missing fields count as 0)."""
+    usage = getattr(response, "usage_metadata", None)
+    return {field: int(getattr(usage, field, 0) or 0) for field in USAGE_FIELDS}
+
+
+def _new_call_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = {"calls": 0, "failures": 0, "latencies_s": deque(maxlen=LATENCY_WINDOW)}
+    stats.update({field: 0 for field in USAGE_FIELDS})
+    return stats
+
+
+def record_model_call(stage: str, model_name: str, latency_s: float,
+                      usage: Optional[Dict[str, int]] = None, success: bool = True, grounded: bool = False,
+                      location: Optional[str] = None) -> None:
+    """
+    Records one generate_content call.
+
+    Args:
+        stage: Pipeline stage name (e.g. "draft", "generate").
+        model_name: Model that served the call.
+        latency_s: Wall-clock duration of the call in seconds.
+        usage: Token counts as returned by usage_from_response.
+        success: Whether the call returned a usable response.
+        grounded: Whether the call had the Google Search tool attached.
+        location: Region that served the call, if known.
+    """
+    usage = usage or {}
+    with _lock:
+        stats = _call_stats.setdefault((stage, model_name), _new_call_stats())
+        stats["calls"] += 1
+        if not success:
+            stats["failures"] += 1
+        stats["latencies_s"].append(latency_s)
+        for field in USAGE_FIELDS:
+            stats[field] += usage.get(field, 0)
+        if success:
+            _grounding_latencies[(stage, grounded)].append(latency_s)
+            if location:
+                _location_latencies[(stage, model_name, location)].append(latency_s)
+    collector = _usage_collector.get()
+    if collector is not None:
+        collector.append({"stage": stage, "model": model_name, "latency_s": latency_s, "success": success,
+                          "grounded": grounded, **{field: usage.get(field, 0) for field in USAGE_FIELDS}})
+
+
+def recent_latencies(stage: str, model_name: str, location: Optional[str] = None) -> List[float]:
+    """
+    Returns the most recent call latencies (seconds) for a stage and model, or only those of the
+    successful calls served by `location`.
+    """
+    with _lock:
+        if location:
+            return list(_location_latencies.get((stage, model_name, location), ()))
+        stats = _call_stats.get((stage, model_name))
+        return list(stats["latencies_s"]) if stats else []
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of `values`, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def increment(counter: str, key: str, amount: float = 1) -> None:
+    """Adds `amount` to counter[key] (e.g. increment("routing", "gemini-2.5-flash"))."""
+    with _lock:
+        _counters[counter][key] += amount
+
+
+def get_counter(counter: str) -> Dict[str, float]:
+    with _lock:
+        return dict(_counters.get(counter, {}))
+
+
+@contextmanager
+def collect_usage() -> Iterator[List[Dict[str, Any]]]:
+    """
+    Collects the model calls recorded inside the block. Blocks can be nested; the calls of an
+    inner block are also passed on to the enclosing one.
+
+    Yields:
+        A list that receives one dict per call (stage, model, latency_s, success and token counts).
+    """
+    calls: List[Dict[str, Any]] = []
+    parent = _usage_collector.get()
+    token = _usage_collector.set(calls)
+    try:
+        yield calls
+    finally:
+        _usage_collector.reset(token)
+        if parent is not None:
+            parent.extend(calls)
+
+
+def summarize_usage(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals a list of collected calls: call count, models used, latency and token sums."""
+    summary: Dict[str, Any] = {"calls": len(calls), "models": sorted({c["model"] for c in calls}),
+                               "latency_s": round(sum(c["latency_s"] for c in calls), 3)}
+    for field in USAGE_FIELDS:
+        summary[field] = sum(c.get(field, 0) for c in calls)
+    return summary
+
+
+def grounding_latency_report() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Successful-call latency per stage, grounded and ungrounded side by side."""
+    with _lock:
+        report: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (stage, grounded), latencies in _grounding_latencies.items():
+            values = list(latencies)
+            report.setdefault(stage, {})["grounded" if grounded else "ungrounded"] = {
+                "calls": len(values), "p50_latency_s": percentile(values, 50), "p95_latency_s": percentile(values, 95),
+            }
+        return report
+
+
+def snapshot() -> Dict[str, Any]:
+    """JSON-friendly view of all model-call statistics and counters."""
+    with _lock:
+        calls = {}
+        for (stage, model_name), stats in _call_stats.items():
+            latencies = list(stats["latencies_s"])
+            entry = {key: value for key, value in stats.items() if key != "latencies_s"}
+            entry["p50_latency_s"] = percentile(latencies, 50)
+            entry["p95_latency_s"] = percentile(latencies, 95)
+            calls[f"{stage}/{model_name}"] = entry
+        counters = {name: dict(values) for name, values in _counters.items()}
+    return {"model_calls": calls, "counters": counters, "grounding_latency": grounding_latency_report()}
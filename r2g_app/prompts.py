@@ -0,0 +1,215 @@
+"""
+prompts.py
+
+Versioned registry of the agent system prompts.
+
+Each pipeline stage ("draft", "rewrite", "revise", "generate", "improve", "improve_patch", "repair",
+"complete") has a "default" variant holding the prompt from aux_vars.py, plus derived variants
+that trade detail for input tokens:
+    compressed   Same instructions with markdown emphasis, indentation and blank lines squeezed out.
+    no_example   (generate only) Drops the full worked Harira example.
+    no_example_compressed   (generate only) Both of the above.
+
+The variant used by the pipeline is chosen per stage through the environment, e.g.
+R2G_PROMPT_VARIANT_GENERATE=no_example. Token counts per variant and model are recorded
+with count_prompt_tokens(); `python -m r2g_app.benchmarks prompts` replays recipes through
+the variants to compare latency, tokens and parse success.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from . import aux_vars
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("draft", "rewrite", "revise", "generate", "improve", "improve_patch", "repair", "complete")
+DEFAULT_VARIANT = "default"
+# Average characters per token, for offline estimates when the count_tokens API is not used
+CHARS_PER_TOKEN_ESTIMATE = 4
+# Non-breaking and other Unicode spaces (the prompts are indented with U+00A0)
+_UNICODE_SPACES_RE = re.compile(r"[\u00a0\u1680\u2000-\u200a\u202f\u205f\u3000]")
+
+
+@dataclass(frozen=True)
+class PromptVariant:
+    """One registered version of a stage's system prompt."""
+    stage: str
+    name: str
+    version: str
+    text: str
+
+    @property
+    def key(self) -> str:
+        """Stable identifier, e.g. "generate/no_example@1"."""
+        return f"{self.stage}/{self.name}@{self.version}"
+
+    @property
+    def sha(self) -> str:
+        """Short content hash, to tell apart edits that forgot to bump the version."""
+        return hashlib.sha256(self.text.encode("utf-8")).hexdigest()[:12]
+
+    @property
+    def estimated_tokens(self) -> int:
+        return len(self.text) // CHARS_PER_TOKEN_ESTIMATE
+
+
+def _compress_code_block(block: str) -> str:
+    """Drops indentation, trailing spaces and blank lines inside a fenced html/css/javascript block."""
+    fence, _, body = block.partition("\n")
+    if not body or not re.match(r"```(?:html|css|javascript|js)\b", fence, re.IGNORECASE):
+        return re.sub(r" +\n", "\n", block)
+    lines = [line.strip() for line in body.split("\n")]
+    return fence + "\n" + "\n".join(line for line in lines if line)
+
+
+def compress_prompt(text: str) -> str:
+    """
+    Squeezes formatting-only characters out of a prompt without changing its wording.
+
+    Turns non-breaking and other Unicode spaces into plain spaces, then removes markdown bold
+    markers, leading indentation, trailing spaces, runs of spaces and blank lines. Inside fenced
+    html/css/javascript blocks (the output examples) only indentation, trailing spaces and blank
+    lines are removed, as whitespace there carries no meaning; other fenced blocks keep their layout.
+    """
+    text = _UNICODE_SPACES_RE.sub(" ", text)
+    pieces = re.split(r"(```.*?```)", text, flags=re.DOTALL)
+    compressed = []
+    for piece in pieces:
+        if piece.startswith("```"):
+            compressed.append(_compress_code_block(piece))
+            continue
+        piece = piece.replace("**", "")
+        piece = re.sub(r"[ \t]+", " ", piece)
+        piece = re.sub(r"\n +", "\n", piece)
+        piece = re.sub(r" +\n", "\n", piece)
+        piece = re.sub(r"\n{2,}", "\n", piece)
+        compressed.append(piece)
+    return "".join(compressed).strip()
+
+
+def strip_worked_example(text: str) -> str:
+    """Removes the trailing "**Example:**" section (full input/output example) from a prompt."""
+    index = text.find("**Example:**")
+    return text[:index].rstrip() if index != -1 else text
+
+
+_registry: Dict[str, Dict[str, PromptVariant]] = {stage: {} for stage in STAGES}
+_token_counts: Dict[Tuple[str, str], int] = {}
+_lock = threading.Lock()
+
+
+def register_prompt(stage: str, name: str, text: str, version: str = "1") -> PromptVariant:
+    """Adds (or replaces) a prompt variant for a stage and returns it."""
+    if stage not in _registry:
+        raise ValueError(f"Unknown stage '{stage}'. Must be one of {STAGES}.")
+    variant = PromptVariant(stage=stage, name=name, version=version, text=text)
+    with _lock:
+        _registry[stage][name] = variant
+    return variant
+
+
+for _stage, _text in (
+    ("draft", aux_vars.DRAFT_TO_RECIPE_SYS_PROMPT),
+    ("rewrite", aux_vars.RE_WRITE_SYS_PROMPT),
+    ("revise", aux_vars.REVISE_RECIPE_SYS_PROMPT),
+    ("generate", aux_vars.GENERATE_GRAPH_SYS_PROMPT),
+    ("improve", aux_vars.IMPROVE_GRAPH_SYS_PROMPT),
+    ("improve_patch", aux_vars.IMPROVE_GRAPH_PATCH_SYS_PROMPT),
+    ("repair", aux_vars.REPAIR_GRAPH_SYS_PROMPT),
+    ("complete", aux_vars.COMPLETE_GRAPH_SYS_PROMPT),
+):
+    register_prompt(_stage, DEFAULT_VARIANT, _text)
+    register_prompt(_stage, "compressed", compress_prompt(_text), version="2")
+register_prompt("generate", "no_example", strip_worked_example(aux_vars.GENERATE_GRAPH_SYS_PROMPT))
+register_prompt("generate", "no_example_compressed",
+                compress_prompt(strip_worked_example(aux_vars.GENERATE_GRAPH_SYS_PROMPT)), version="2")
+
+
+def configured_variant_name(stage: str) -> str:
+    """Variant selected for a stage through R2G_PROMPT_VARIANT_<STAGE>, or "default"."""
+    return os.getenv(f"R2G_PROMPT_VARIANT_{stage.upper()}", DEFAULT_VARIANT)
+
+
+def get_prompt_variant(stage: str, name: Optional[str] = None) -> PromptVariant:
+    """
+    Returns a registered prompt variant.
+
+    Args:
+        stage: Pipeline stage name.
+        name: Variant name. Defaults to the configured variant for the stage.
+
+    Raises:
+        ValueError: If the stage or variant is unknown.
+    """
+    if stage not in _registry:
+        raise ValueError(f"Unknown stage '{stage}'. Must be one of {STAGES}.")
+    name = name or configured_variant_name(stage)
+    with _lock:
+        variant = _registry[stage].get(name)
+        available = sorted(_registry[stage])
+    if variant is None:
+        raise ValueError(f"Unknown prompt variant '{name}' for stage '{stage}'. Available: {available}.")
+    return variant
+
+
+def get_prompt(stage: str, name: Optional[str] = None) -> str:
+    """Returns the system prompt text the pipeline should use for a stage."""
+    variant = get_prompt_variant(stage, name)
+    if variant.name != DEFAULT_VARIANT:
+        logger.info(f"Using prompt variant {variant.key} ({variant.sha}).")
+    return variant.text
+
+
+def list_variants(stage: Optional[str] = None) -> List[PromptVariant]:
+    """All registered variants, optionally for a single stage."""
+    with _lock:
+        stages = [stage] if stage else list(STAGES)
+        return [variant for s in stages for variant in _registry[s].values()]
+
+
+def stage_of_prompt(text: str) -> Optional[str]:
+    """Returns the stage a prompt text is registered under, or None if it is not registered."""
+    for variant in list_variants():
+        if variant.text == text:
+            return variant.stage
+    return None
+
+
+def count_prompt_tokens(variant: PromptVariant, model_name: str, project_id: Optional[str] = None) -> int:
+    """
+    Counts a variant's input tokens for a model with the count_tokens API, caching the result.
+
+    Args:
+        variant: The prompt variant to count.
+        model_name: Model whose tokenizer to use.
+        project_id: Google Cloud project ID for the GenAI client. Defaults to the env variable.
+
+    Returns:
+        The number of tokens the prompt occupies as input to `model_name`.
+    """
+    from .genai_funs import DEFAULT_VERTEX_LOCATION, PROJECT_ID, _get_genai_client
+
+    cache_key = (f"{variant.key}#{variant.sha}", model_name)
+    with _lock:
+        if cache_key in _token_counts:
+            return _token_counts[cache_key]
+    client = _get_genai_client(project_id or PROJECT_ID, DEFAULT_VERTEX_LOCATION)
+    response = client.models.count_tokens(model=model_name, contents=variant.text)
+    with _lock:
+        _token_counts[cache_key] = response.total_tokens
+    logger.info(f"Prompt {variant.key} uses {response.total_tokens} input tokens on '{model_name}'.")
+    return response.total_tokens
+
+
+def token_counts() -> Dict[str, Dict[str, int]]:
+    """Recorded token counts, as {variant key: {model name: tokens}}."""
+    with _lock:
+        counts: Dict[str, Dict[str, int]] = {}
+        for (variant_key, model_name), tokens in _token_counts.items():
+            counts.setdefault(variant_key.split("#")[0], {})[model_name] = tokens
+        return counts
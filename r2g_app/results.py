@@ -0,0 +1,198 @@
+"""
+results.py
+
+Typed result of text_to_graph, with the generated files loaded lazily.
+
+A GraphResult holds only URIs, content hashes and run metadata, so results kept per session
+(st.session_state), in job records or in the dedup index stay small. The bodies of index.html,
+style.css and script.js live in one process-wide, size-bounded LRU cache keyed by content hash;
+a result's html_content/css_content/js_content properties read from the cache and, once an entry
+has been evicted, download the file from GCS again (and verify its hash).
+
+Configuration:
+    R2G_ARTIFACT_CACHE_MB  Size of the shared artifact cache (default 64 MB).
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from . import metrics
+from .aux_funs import get_storage_client
+
+if TYPE_CHECKING:
+    from google.cloud.storage import Bucket
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_CACHE_BYTES = int(float(os.getenv("R2G_ARTIFACT_CACHE_MB", "64")) * 1024 * 1024)
+# File name of each artifact in the graph directory and in downloads
+ARTIFACT_FILE_NAMES = {"html": "index.html", "css": "style.css", "js": "script.js"}
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ArtifactCache:
+    """
+    Thread-safe LRU cache of artifact bodies by SHA-256, bounded by their total UTF-8 size.
+
+    Args:
+        max_bytes: Total size of the cached bodies; the least recently used are evicted first.
+    """
+
+    def __init__(self, max_bytes: int = ARTIFACT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._evictions = 0
+
+    def put(self, content: str) -> str:
+        """Caches a body and returns its SHA-256."""
+        digest = _sha256(content)
+        size = len(content.encode("utf-8"))
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                return digest
+            if size > self.max_bytes:
+                return digest
+            self._entries[digest] = content
+            self._sizes[digest] = size
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                evicted, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(evicted)
+                self._evictions += 1
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        with self._lock:
+            content = self._entries.get(digest)
+            if content is not None:
+                self._entries.move_to_end(digest)
+            return content
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "evictions": self._evictions}
+
+
+_cache: Optional[ArtifactCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_artifact_cache() -> ArtifactCache:
+    """Returns the process-wide artifact cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ArtifactCache()
+    return _cache
+
+
+def _get_bucket(bucket_name: str) -> Bucket:
+    return get_storage_client().bucket(bucket_name)
+
+
+def load_artifact(digest: Optional[str], uri: Optional[str], cache: Optional[ArtifactCache] = None,
+                  counter: str = "artifact_cache") -> Optional[str]:
+    """
+    Returns an artifact body from the shared cache, or downloads it from its gs:// URI.
+
+    Args:
+        digest: SHA-256 of the body.
+        uri: gs:// URI to download the body from on a cache miss.
+        cache: Cache to use (default: the process-wide artifact cache).
+        counter: Metrics counter for hits, misses and "downloaded" bodies (misses reloaded from GCS).
+
+    Returns:
+        The body, or None if there is no artifact or it cannot be loaded (logged).
+    """
+    if not digest:
+        return None
+    cache = cache or get_artifact_cache()
+    content = cache.get(digest)
+    if content is not None:
+        metrics.increment(counter, "hit")
+        return content
+    metrics.increment(counter, "miss")
+    if not uri or not uri.startswith("gs://"):
+        return None
+    bucket_name, _, blob_name = uri[len("gs://"):].partition("/")
+    try:
+        content = _get_bucket(bucket_name).blob(blob_name).download_as_text()
+    except Exception as e:
+        logger.warning(f"Could not download artifact {uri}: {e}")
+        return None
+    if _sha256(content) != digest:
+        logger.warning(f"Artifact {uri} has changed since it was generated; not using it.")
+        return None
+    cache.put(content)
+    metrics.increment(counter, "downloaded")
+    return content
+
+
+@dataclass(frozen=True, slots=True)
+class GraphResult:
+    """
+    Outcome of text_to_graph: GCS URIs and content hashes of the generated files, the model that
+    generated the graph ("graph_model", see routing.py), the run's catalog entry ("run_id", see
+    catalog.py) and, for a result reused from a near-duplicate recipe, "dedup_similarity"
+    (see dedup.py). File bodies are loaded on access (see module docstring).
+    """
+    recipe_uri: str
+    html_gcs_uri: str
+    css_gcs_uri: Optional[str] = None
+    js_gcs_uri: Optional[str] = None
+    html_sha256: Optional[str] = None
+    css_sha256: Optional[str] = None
+    js_sha256: Optional[str] = None
+    graph_model: Optional[str] = None
+    run_id: Optional[int] = None
+    dedup_similarity: Optional[float] = None
+
+    @classmethod
+    def from_contents(cls, html_content: str, css_content: str, js_content: str, **fields: Any) -> "GraphResult":
+        """Creates a result from the generated files, adding their bodies to the shared cache."""
+        cache = get_artifact_cache()
+        return cls(
+            html_sha256=cache.put(html_content) if html_content else None,
+            css_sha256=cache.put(css_content) if css_content else None,
+            js_sha256=cache.put(js_content) if js_content else None,
+            **fields,
+        )
+
+    @property
+    def html_content(self) -> Optional[str]:
+        return load_artifact(self.html_sha256, self.html_gcs_uri)
+
+    @property
+    def css_content(self) -> Optional[str]:
+        return load_artifact(self.css_sha256, self.css_gcs_uri)
+
+    @property
+    def js_content(self) -> Optional[str]:
+        return load_artifact(self.js_sha256, self.js_gcs_uri)
+
+    def files(self) -> Dict[str, str]:
+        """File name -> body of every generated file that could be loaded."""
+        contents = {"html": self.html_content, "css": self.css_content, "js": self.js_content}
+        return {ARTIFACT_FILE_NAMES[kind]: content for kind, content in contents.items() if content}
+
+    def to_dict(self, include_content: bool = False) -> Dict[str, Any]:
+        """JSON-friendly dict of the fields, plus html_content/css_content/js_content if requested."""
+        result = asdict(self)
+        if include_content:
+            result.update(html_content=self.html_content, css_content=self.css_content, js_content=self.js_content)
+        return result
@@ -0,0 +1,136 @@
+"""
+routing.py
+
+Complexity-based model routing for graph generation.
+
+The standardized recipe format (see RE_WRITE_SYS_PROMPT) makes a recipe's size easy to
+measure locally: `## Section` headers, `*` ingredient bullets, numbered steps, and
+"After `## Other Section` ..." cross-section dependencies. Recipes at or below every
+threshold are sent to the fast model; anything larger goes to the pro model.
+
+Thresholds (environment variables):
+    R2G_GRAPH_ROUTING               "1" (default) to enable routing, "0" to always use the pro model.
+    R2G_ROUTE_MAX_SECTIONS          default 3
+    R2G_ROUTE_MAX_STEPS             default 12
+    R2G_ROUTE_MAX_INGREDIENTS       default 12
+    R2G_ROUTE_MAX_PARALLEL_BRANCHES default 1
+
+Every decision and its outcome is logged as a single JSON line ("graph_routing ...") and
+counted in metrics, so the thresholds can be tuned from production logs.
+"""
+import json
+import logging
+import os
+import re
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+from . import metrics
+from .genai_funs import FAST_GRAPH_MODEL_NAME, TEXT_TO_GRAPH_MODEL_NAME
+
+logger = logging.getLogger(__name__)
+
+ROUTING_ENABLED = os.getenv("R2G_GRAPH_ROUTING", "1") == "1"
+MAX_SIMPLE_SECTIONS = int(os.getenv("R2G_ROUTE_MAX_SECTIONS", "3"))
+MAX_SIMPLE_STEPS = int(os.getenv("R2G_ROUTE_MAX_STEPS", "12"))
+MAX_SIMPLE_INGREDIENTS = int(os.getenv("R2G_ROUTE_MAX_INGREDIENTS", "12"))
+MAX_SIMPLE_PARALLEL_BRANCHES = int(os.getenv("R2G_ROUTE_MAX_PARALLEL_BRANCHES", "1"))
+
+_SECTION_RE = re.compile(r"^\s*##\s+(.+?)\s*$", re.MULTILINE)
+_STEP_RE = re.compile(r"^\s*\d+[.)]\s+\S", re.MULTILINE)
+_INGREDIENT_RE = re.compile(r"^\s*[*\-•]\s+\S", re.MULTILINE)
+_SECTION_REF_RE = re.compile(r"`##\s*([^`]+?)\s*`")
+
+
+@dataclass(frozen=True)
+class RecipeComplexity:
+    """Size of a standardized recipe, as seen by the router."""
+    sections: int
+    steps: int
+    ingredients: int
+    parallel_branches: int
+
+
+@dataclass(frozen=True)
+class RoutingDecision:
+    """Model chosen for a recipe's graph generation, and why."""
+    model_name: str
+    complexity: RecipeComplexity
+    reason: str
+
+
+def measure_complexity(standardised_recipe: str) -> RecipeComplexity:
+    """
+    Measures a standardized recipe's complexity.
+
+    Parallel branches are the sections that do not wait on any other section (no
+    "After `## ...`" reference), i.e. the independent starting points of the flow.
+    A recipe without sections counts as one section and one branch.
+    """
+    headers = list(_SECTION_RE.finditer(standardised_recipe))
+    bodies = [
+        standardised_recipe[header.end(): headers[i + 1].start() if i + 1 < len(headers) else len(standardised_recipe)]
+        for i, header in enumerate(headers)
+    ]
+    independent = sum(1 for body in bodies if not _SECTION_REF_RE.search(body))
+    return RecipeComplexity(
+        sections=max(len(headers), 1),
+        steps=len(_STEP_RE.findall(standardised_recipe)),
+        ingredients=len(_INGREDIENT_RE.findall(standardised_recipe)),
+        parallel_branches=max(independent, 1),
+    )
+
+
+def route_graph_model(standardised_recipe: str, default_model: str = TEXT_TO_GRAPH_MODEL_NAME) -> RoutingDecision:
+    """
+    Picks the model for graph generation/improvement of a recipe.
+
+    Args:
+        standardised_recipe: The standardized recipe text.
+        default_model: Model for complex recipes (and for all recipes when routing is disabled).
+
+    Returns:
+        The routing decision. It is also logged and counted under metrics counter "graph_routing".
+    """
+    complexity = measure_complexity(standardised_recipe)
+    if not ROUTING_ENABLED:
+        decision = RoutingDecision(default_model, complexity, "routing disabled")
+    else:
+        exceeded = [
+            name for name, value, limit in (
+                ("sections", complexity.sections, MAX_SIMPLE_SECTIONS),
+                ("steps", complexity.steps, MAX_SIMPLE_STEPS),
+                ("ingredients", complexity.ingredients, MAX_SIMPLE_INGREDIENTS),
+                ("parallel_branches", complexity.parallel_branches, MAX_SIMPLE_PARALLEL_BRANCHES),
+            ) if value > limit
+        ]
+        if exceeded:
+            decision = RoutingDecision(default_model, complexity, f"complex ({', '.join(exceeded)} above threshold)")
+        else:
+            decision = RoutingDecision(FAST_GRAPH_MODEL_NAME, complexity, "simple (all metrics within thresholds)")
+    metrics.increment("graph_routing", decision.model_name)
+    _log_routing_event("decision", decision)
+    return decision
+
+
+def record_routing_outcome(decision: RoutingDecision, model_name: str, success: bool, latency_s: float,
+                           error: Optional[str] = None) -> None:
+    """
+    Records how a routed graph generation went, for threshold tuning.
+
+    Args:
+        decision: The routing decision the attempt was made under.
+        model_name: Model that actually ran (differs from the decision after an escalation).
+        success: Whether usable graph code was produced.
+        latency_s: Duration of the generate + improve calls in seconds.
+        error: Error message of a failed attempt.
+    """
+    metrics.increment("graph_routing_outcomes", f"{model_name}/{'ok' if success else 'failed'}")
+    _log_routing_event("outcome", decision, model_used=model_name, success=success,
+                       latency_s=round(latency_s, 3), error=error)
+
+
+def _log_routing_event(event: str, decision: RoutingDecision, **fields: Any) -> None:
+    record: Dict[str, Any] = {"event": event, "model": decision.model_name, "reason": decision.reason,
+                              **asdict(decision.complexity), **fields}
+    logger.info(f"graph_routing {json.dumps(record)}")
@@ -0,0 +1,174 @@
+"""
+session_memory.py
+
+Memory budget for Streamlit session state.
+
+Every session keeps its recipe texts (draft, standardized recipe, feedback) in st.session_state
+for as long as the session lives, so memory grows with concurrent and idle users. Texts larger
+than R2G_SESSION_INLINE_BYTES that are also stored in GCS (e.g. the uploaded standardized recipe)
+are instead put in one process-wide payload store (an LRU cache bounded by R2G_SESSION_STORE_MB,
+see results.ArtifactCache) and the session keeps a PayloadRef (hash, size and the text's gs://
+URI). Payloads of idle sessions are the least recently used and are evicted first, and an evicted
+payload is downloaded again on access (rehydrated). Texts without a GCS copy (the draft, a
+standardized recipe not yet approved) stay in session state, as eviction would lose them; they
+move to the store once attach_uri records their upload. A payload that cannot be downloaded again
+reads as None.
+
+track_session() records the approximate session-state size of every session seen recently, and
+instance_stats() reports them together with the store's size, evictions, rehydrations and lost
+payloads, and the process's peak RSS.
+
+Configuration:
+    R2G_SESSION_STORE_MB      Size of the shared payload store (default 128 MB).
+    R2G_SESSION_INLINE_BYTES  Texts up to this size stay in session state (default 2048 bytes).
+    R2G_SESSION_IDLE_SECONDS  Sessions not seen for this long leave the accounting (default 3600).
+"""
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, MutableMapping, Optional, Tuple
+
+from . import metrics
+from .results import ArtifactCache, load_artifact
+
+SESSION_STORE_BYTES = int(float(os.getenv("R2G_SESSION_STORE_MB", "128")) * 1024 * 1024)
+INLINE_PAYLOAD_BYTES = int(os.getenv("R2G_SESSION_INLINE_BYTES", "2048"))
+SESSION_IDLE_SECONDS = float(os.getenv("R2G_SESSION_IDLE_SECONDS", "3600"))
+
+
+@dataclass(frozen=True, slots=True)
+class PayloadRef:
+    """Session-state stand-in for a text kept in the shared payload store."""
+    sha256: str
+    size: int
+    uri: Optional[str] = None
+
+
+def approx_size(obj: Any, seen: Optional[set] = None) -> int:
+    """Approximate recursive size in bytes of an object graph (containers, strings, objects)."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, seen) + approx_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += approx_size(vars(obj), seen)
+    elif hasattr(obj, "__slots__"):
+        size += sum(approx_size(getattr(obj, slot), seen) for slot in obj.__slots__ if hasattr(obj, slot))
+    return size
+
+
+_store: Optional[ArtifactCache] = None
+_store_lock = threading.Lock()
+_sessions: Dict[str, Tuple[float, int]] = {}  # session id -> (last seen, approximate bytes)
+_sessions_lock = threading.Lock()
+
+
+def get_payload_store() -> ArtifactCache:
+    """Returns the process-wide payload store."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactCache(SESSION_STORE_BYTES)
+    return _store
+
+
+def put_text(state: MutableMapping[str, Any], key: str, text: Optional[str], uri: Optional[str] = None) -> None:
+    """
+    Stores a text in session state: inline if small (or empty) or without a URI, else in the payload
+    store behind a PayloadRef.
+
+    Args:
+        state: The session state (st.session_state, or any mapping).
+        key: Session-state key.
+        text: The text.
+        uri: gs:// URI holding the same text, to rehydrate it from after eviction.
+    """
+    size = len(text.encode("utf-8")) if text else 0
+    if size <= INLINE_PAYLOAD_BYTES or not uri:
+        state[key] = text or ""
+        return
+    state[key] = PayloadRef(get_payload_store().put(text), size, uri)
+    metrics.increment("session_store", "offloaded")
+
+
+def get_text(state: MutableMapping[str, Any], key: str, default: str = "") -> Optional[str]:
+    """
+    Returns a text stored with put_text: from the payload store, or rehydrated from its URI.
+
+    Returns:
+        The text, `default` if the key is not set, or None if the payload was evicted and could not
+        be downloaded again.
+    """
+    value = state.get(key, default)
+    if not isinstance(value, PayloadRef):
+        return value
+    text = load_artifact(value.sha256, value.uri, cache=get_payload_store(), counter="session_store")
+    if text is None:
+        metrics.increment("session_store", "lost")
+    return text
+
+
+def attach_uri(state: MutableMapping[str, Any], key: str, uri: Optional[str]) -> None:
+    """
+    Records the gs:// URI of a stored text (e.g. the uploaded standardized recipe) for rehydration;
+    a large inline text moves to the payload store.
+    """
+    value = state.get(key)
+    if not uri:
+        return
+    if isinstance(value, PayloadRef):
+        if value.uri != uri:
+            state[key] = PayloadRef(value.sha256, value.size, uri)
+    elif isinstance(value, str):
+        put_text(state, key, value, uri)
+
+
+def track_session(session_id: str, state: MutableMapping[str, Any]) -> int:
+    """
+    Records the approximate session-state size of a session (call once per script run).
+
+    Returns:
+        The approximate size in bytes.
+    """
+    size = sum(approx_size(value) for value in dict(state).values())
+    now = time.time()
+    with _sessions_lock:
+        _sessions[session_id] = (now, size)
+        for idle_id in [sid for sid, (seen, _) in _sessions.items() if now - seen > SESSION_IDLE_SECONDS]:
+            del _sessions[idle_id]
+    return size
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KiB
+
+
+def instance_stats() -> Dict[str, Any]:
+    """Per-instance session memory: tracked sessions and their sizes, the payload store, and peak RSS."""
+    with _sessions_lock:
+        sizes = [size for _, size in _sessions.values()]
+    counters = metrics.get_counter("session_store")
+    return {
+        "sessions": len(sizes),
+        "session_state_bytes": sum(sizes),
+        "max_session_state_bytes": max(sizes, default=0),
+        "payload_store": get_payload_store().stats(),
+        "offloaded": int(counters.get("offloaded", 0)),
+        "rehydrated": int(counters.get("downloaded", 0)),
+        "lost": int(counters.get("lost", 0)),
+        "peak_rss_bytes": _peak_rss_bytes(),
+    }
@@ -0,0 +1,159 @@
+"""
+startup.py
+
+Cold-start helpers for the container entry points.
+
+- prewarm_in_background(): imports the heavy SDKs and creates the shared GenAI and storage
+  clients on a daemon thread, so the first user request does not pay for them. Enabled by
+  setting R2G_PREWARM=1.
+- import_time_report(): runs a fresh interpreter with `-X importtime` and summarizes which
+  modules dominate import time, so cold-start regressions are visible.
+
+Usage:
+    python -m r2g_app.startup                      # report for st_app
+    python -m r2g_app.startup r2g_app.api --top 20
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PREWARM_ENABLED = os.getenv("R2G_PREWARM", "0") == "1"
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_REPORT_MODULE = "st_app"
+DEFAULT_REPORT_TOP = 15
+
+_prewarm_thread: Optional[threading.Thread] = None
+_prewarm_lock = threading.Lock()
+
+
+def _prewarm(project_id: Optional[str], location: Optional[str]) -> None:
+    start = time.perf_counter()
+    try:
+        from .aux_funs import get_storage_client
+        from .genai_funs import DEFAULT_VERTEX_LOCATION, _get_genai_client
+
+        from google.genai import types  # noqa: F401  (the slowest import of the SDK)
+        if project_id:
+            _get_genai_client(project_id, location or DEFAULT_VERTEX_LOCATION)
+        get_storage_client()
+        logger.info(f"Pre-warmed SDK imports and clients in {time.perf_counter() - start:.2f}s.")
+    except Exception as e:
+        # Pre-warming is best effort; the same work is retried lazily on first use.
+        logger.warning(f"Client pre-warming failed after {time.perf_counter() - start:.2f}s: {e}")
+
+
+def prewarm_in_background(project_id: Optional[str] = None, location: Optional[str] = None,
+                          force: bool = False) -> Optional[threading.Thread]:
+    """
+    Starts (once per process) a daemon thread that imports the SDKs and creates the shared clients.
+
+    Args:
+        project_id: Google Cloud project ID for the GenAI client. Defaults to the PROJECT_ID env variable.
+            Without a project ID only the imports and the storage client are warmed.
+        location: Vertex AI location. Defaults to genai_funs.DEFAULT_VERTEX_LOCATION.
+        force: Pre-warm even if R2G_PREWARM is not set.
+
+    Returns:
+        The pre-warm thread, or None if pre-warming is disabled.
+    """
+    global _prewarm_thread
+    if not (PREWARM_ENABLED or force):
+        return None
+    with _prewarm_lock:
+        if _prewarm_thread is None:
+            _prewarm_thread = threading.Thread(
+                target=_prewarm, args=(project_id or os.getenv("PROJECT_ID"), location),
+                name="r2g-prewarm", daemon=True
+            )
+            _prewarm_thread.start()
+        return _prewarm_thread
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, object]]:
+    """
+    Parses `python -X importtime` output.
+
+    Returns:
+        One dict per imported module with `module`, `self_us` and `cumulative_us`,
+        and `depth` (nesting level of the import).
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        entries.append({
+            "module": name.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            "depth": depth,
+        })
+    return entries
+
+
+def import_time_report(module: str = DEFAULT_REPORT_MODULE, top: int = DEFAULT_REPORT_TOP) -> Dict[str, object]:
+    """
+    Measures the import time of `module` in a fresh interpreter.
+
+    Args:
+        module: Module to import (e.g. "st_app", "r2g_app.api").
+        top: Number of modules to list, ordered by cumulative import time.
+
+    Returns:
+        A dict with the total import time in milliseconds and the `top` slowest modules.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=str(REPO_ROOT), capture_output=True, text=True,
+    )
+    entries = parse_importtime(completed.stderr)
+    # -X importtime lists children before their parent, so the module's own import tree is the run
+    # of deeper entries immediately preceding its line (interpreter start-up imports are excluded).
+    total_index = next((i for i in range(len(entries) - 1, -1, -1) if entries[i]["module"] == module), None)
+    total = entries[total_index] if total_index is not None else None
+    subtree = []
+    if total is not None:
+        subtree.append(total)
+        for entry in reversed(entries[:total_index]):
+            if entry["depth"] <= total["depth"]:
+                break
+            subtree.append(entry)
+    slowest = sorted(subtree or entries, key=lambda e: e["cumulative_us"], reverse=True)[:top]
+    return {
+        "module": module,
+        "total_ms": round(total["cumulative_us"] / 1000, 1) if total else None,
+        "import_ok": completed.returncode == 0,
+        "slowest": [
+            {"module": e["module"], "cumulative_ms": round(e["cumulative_us"] / 1000, 1),
+             "self_ms": round(e["self_us"] / 1000, 1)}
+            for e in slowest
+        ],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, object]:
+    parser = argparse.ArgumentParser(description="Import-time (cold start) report for an entry point module.")
+    parser.add_argument("module", nargs="?", default=DEFAULT_REPORT_MODULE, help="Module to import.")
+    parser.add_argument("--top", type=int, default=DEFAULT_REPORT_TOP, help="Number of slowest modules to list.")
+    args = parser.parse_args(argv)
+
+    report = import_time_report(args.module, args.top)
+    status = "" if report["import_ok"] else " (import FAILED, partial timings)"
+    print(f"Import of '{report['module']}': {report['total_ms']} ms{status}")
+    print(f"{'cumulative_ms':>14} {'self_ms':>9}  module")
+    for entry in report["slowest"]:
+        print(f"{entry['cumulative_ms']:>14} {entry['self_ms']:>9}  {entry['module']}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,37 @@
 import os
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import base64 # Import base64 for PDF embedding
 import datetime # Import datetime to generate date string
 # Updated import to use the new functions
 from r2g_app.main import process_text, text_to_graph
-from r2g_app.main import revise_recipe
+from r2g_app.main import revise_recipe, process_video, RUN_DEADLINE_SECONDS
+from r2g_app.genai_funs import MEDIA_RESOLUTIONS, VIDEO_PRESET, VIDEO_PRESETS, VideoOptions
+from r2g_app.jobs import get_job_queue, JobQueueFullError, JOB_CANCELLED, JOB_SUCCEEDED
+from r2g_app.aux_funs import configure_logging
+from r2g_app.startup import prewarm_in_background
+from r2g_app.catalog import CATALOG_ENABLED, get_catalog
+from r2g_app.session_memory import attach_uri, get_text, instance_stats, put_text, track_session
 import re # Import re for GCS link validation/parsing (optional but good practice)
+import hashlib
+import io
+import zipfile
+import tempfile
+from pathlib import Path
 
 st.set_page_config(layout="wide") # Set page layout to wide
 
+
+@st.cache_resource(show_spinner=False)
+def init_process():
+    """Runs once per server process: logging setup and optional client pre-warming (R2G_PREWARM=1)."""
+    configure_logging()
+    prewarm_in_background()
+    return True
+
+
+init_process()
+
 # Initialize session state variables
 if "standardized_recipe_text" not in st.session_state:
     st.session_state.standardized_recipe_text = ""
@@ -30,6 +53,113 @@ if 'gcs_bucket_name' not in st.session_state:
 PROJECT_ID = os.getenv("PROJECT_ID")
 # print('PROJECT ID IS: ', PROJECT_ID) # Optional: Comment out or remove print statements for cleaner logs
 
+# Shared (cross-session) result cache settings. Entries are keyed by a hash of the function arguments.
+CACHE_TTL_SECONDS = int(os.getenv("R2G_CACHE_TTL_SECONDS", str(6 * 60 * 60)))
+CACHE_MAX_ENTRIES = int(os.getenv("R2G_CACHE_MAX_ENTRIES", "256"))
+# "0" calls the pipeline for every request, e.g. in the load test where all sessions submit the same recipe
+RESULT_CACHE_ENABLED = os.getenv("R2G_RESULT_CACHE", "1") == "1"
+# How often a session re-checks its background job while waiting for it.
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("R2G_JOB_POLL_INTERVAL_SECONDS", "1.0"))
+# A job no session has polled for this long (its browser session is gone) is cancelled (0 = never)
+JOB_ABANDON_SECONDS = float(os.getenv("R2G_JOB_ABANDON_SECONDS", "120"))
+# Runs per page in the sidebar history
+HISTORY_PAGE_SIZE = int(os.getenv("R2G_HISTORY_PAGE_SIZE", "10"))
+# Graphs whose preview and zip are kept built (shared by all sessions)
+PREVIEW_CACHE_ENTRIES = int(os.getenv("R2G_PREVIEW_CACHE_ENTRIES", "32"))
+
+# Video files accepted by the uploader, and draft texts that are a video link rather than a recipe
+VIDEO_FILE_TYPES = ["mp4", "mov", "webm", "mkv", "avi", "mpeg", "mpg", "wmv", "3gp", "flv"]
+VIDEO_URL_PATTERN = re.compile(r"^\s*(gs://\S+\.(?:" + "|".join(VIDEO_FILE_TYPES) + r")|https?://(?:www\.|m\.)?(?:youtube\.com|youtu\.be)/\S+)\s*$", re.IGNORECASE)
+
+JOB_LABELS = {
+    "process_text": "Processing recipe text",
+    "process_video": "Processing recipe video",
+    "revise_recipe": "Revising recipe based on feedback",
+    "text_to_graph": "Generating graph and uploading results",
+}
+
+# The active job ID is also kept in the URL (?job=...), so a refreshed or reconnected
+# browser session picks up the same job instead of losing the work.
+if "active_job_id" not in st.session_state:
+    st.session_state.active_job_id = st.query_params.get("job")
+
+
+# --- Cached pipeline calls ---
+# Identical inputs submitted by any session return the stored result instead of calling the models again.
+# Exceptions are not cached, so a failed call is retried on the next attempt.
+# Arguments starting with an underscore are not part of the cache key (the progress callback and the
+# job's Deadline, through which it can be cancelled).
+def shared_result_cache(func):
+    """st.cache_data with the shared cache settings, or the function itself if R2G_RESULT_CACHE=0."""
+    if not RESULT_CACHE_ENABLED:
+        return func
+    return st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)(func)
+
+
+@shared_result_cache
+def cached_process_text(recipe_draft_text, project_id, _progress_callback=None, _deadline=None):
+    return process_text(recipe_draft_text=recipe_draft_text, project_id=project_id,
+                        progress_callback=_progress_callback, deadline=_deadline)
+
+
+@shared_result_cache
+def cached_revise_recipe(original_draft, current_standardised_recipe, user_feedback, project_id, _progress_callback=None,
+                         _deadline=None):
+    return revise_recipe(
+        original_draft=original_draft,
+        current_standardised_recipe=current_standardised_recipe,
+        user_feedback=user_feedback,
+        project_id=project_id,
+        progress_callback=_progress_callback,
+        deadline=_deadline
+    )
+
+
+@shared_result_cache
+def cached_text_to_graph(standardised_recipe, recipe_name, gcs_bucket_name, project_id, _progress_callback=None,
+                         _deadline=None):
+    return text_to_graph(
+        standardised_recipe=standardised_recipe,
+        recipe_name=recipe_name,
+        gcs_bucket_name=gcs_bucket_name,
+        project_id=project_id,
+        progress_callback=_progress_callback,
+        deadline=_deadline
+    )
+
+
+def run_video_job(video_source, project_id, gcs_bucket_name, recipe_name, video_options=None, _progress_callback=None,
+                  _deadline=None):
+    """Runs process_video; a local copy of an uploaded video is removed once it has been processed."""
+    result = process_video(video_source=video_source, project_id=project_id, gcs_bucket_name=gcs_bucket_name,
+                           recipe_name=recipe_name, progress_callback=_progress_callback, deadline=_deadline,
+                           video_options=video_options)
+    if not VIDEO_URL_PATTERN.match(video_source):
+        Path(video_source).unlink(missing_ok=True)
+    return result
+
+
+def video_options_for_job(selection):
+    """A preset name as is, or VideoOptions from the custom (start, end, fps, resolution) fields."""
+    if isinstance(selection, str):
+        return selection
+    start_offset, end_offset, video_fps, media_resolution = selection
+    return VideoOptions(start_offset_s=start_offset or None, end_offset_s=end_offset or None,
+                        fps=video_fps, media_resolution=media_resolution)
+
+
+def save_uploaded_video(uploaded_file):
+    """
+    Writes an uploaded video to a temporary file named after its content hash, so that retrying
+    a failed upload of the same video resumes it (see media_upload.py). Returns the file path.
+    """
+    data = uploaded_file.getbuffer()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    path = Path(tempfile.gettempdir()) / f"r2g_video_{digest}{Path(uploaded_file.name).suffix.lower()}"
+    if not path.exists() or path.stat().st_size != len(data):
+        path.write_bytes(data)
+    return str(path)
+
 
 # Helper function to create clickable GCS links (optional)
 def create_gcs_link(uri):
@@ -39,70 +169,256 @@ def create_gcs_link(uri):
         return f"https://console.cloud.google.com/storage/browser/{uri[5:]}"
     return None
 
+
+# --- Graph preview and downloads ---
+# Keyed by the artifacts' content hashes and shared by all sessions, so a graph's preview and zip
+# are built once. cache_resource returns the same immutable object instead of a copy per call.
+# The GraphResult argument is not part of the key (leading underscore).
+@st.cache_resource(max_entries=PREVIEW_CACHE_ENTRIES, show_spinner=False)
+def build_preview_html(html_sha256, css_sha256, js_sha256, _results):
+    """
+    Returns (preview HTML, complete): index.html with style.css and script.js inlined, or only the
+    HTML (complete=False) if either is missing. The preview is None if there is no HTML.
+    """
+    html_content = _results.html_content
+    if not html_content:
+        return None, False
+    # Remove the references to the separate files, which the iframe cannot load
+    preview_html = re.sub(r'<link\s+rel="stylesheet"\s+href="style\.css"\s*\/?>', '', html_content, flags=re.IGNORECASE)
+    preview_html = re.sub(r'<script\s+src="script\.js"\s*><\/script>', '', preview_html, flags=re.IGNORECASE)
+    css_content = _results.css_content
+    js_content = _results.js_content
+    if not (css_content and js_content):
+        return preview_html, False
+    return f"""
+        <html>
+        <head>
+        <style>
+        {css_content}
+        </style>
+        </head>
+        <body>
+        {preview_html}
+        <script>
+        {js_content}
+        </script>
+        </body>
+        </html>
+        """, True
+
+
+@st.cache_resource(max_entries=PREVIEW_CACHE_ENTRIES, show_spinner=False)
+def build_graph_zip(html_sha256, css_sha256, js_sha256, _results):
+    """Returns a zip archive (bytes) of the graph's index.html, style.css and script.js."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for file_name, content in _results.files().items():
+            archive.writestr(file_name, content)
+    return buffer.getvalue()
+
+
+# --- Background Job Helpers ---
+def submit_job(kind, fn, kwargs, context):
+    """Queues a pipeline call as a background job and remembers it for this session. Returns True on success."""
+    try:
+        job = get_job_queue().submit(kind, fn, kwargs, context=context, progress_arg="_progress_callback",
+                                     deadline_arg="_deadline", timeout_s=RUN_DEADLINE_SECONDS[kind],
+                                     abandon_after_s=JOB_ABANDON_SECONDS or None)
+    except JobQueueFullError as e:
+        st.session_state.processing_error = str(e)
+        return False
+    st.session_state.active_job_id = job.job_id
+    st.query_params["job"] = job.job_id
+    return True
+
+
+def clear_active_job():
+    st.session_state.active_job_id = None
+    if "job" in st.query_params:
+        del st.query_params["job"]
+
+
+def apply_finished_job(job):
+    """Copies a finished job's result (or error) into session state."""
+    context = job.context
+    # Restore the inputs the job was started with (needed after a reconnect, harmless otherwise)
+    if "original_recipe_draft" in context:
+        put_text(st.session_state, "original_recipe_draft", context["original_recipe_draft"])
+    st.session_state.recipe_name = context.get("recipe_name", st.session_state.recipe_name)
+    st.session_state.gcs_bucket_name = context.get("gcs_bucket_name", st.session_state.gcs_bucket_name)
+
+    if job.kind in ("process_text", "process_video"):
+        if job.status == JOB_SUCCEEDED:
+            put_text(st.session_state, "standardized_recipe_text", job.result)
+            st.session_state.processing_error = None
+        else:
+            st.session_state.processing_error = f"An error occurred during recipe processing: {job.error}"
+            put_text(st.session_state, "standardized_recipe_text", "") # Clear stale data
+        st.session_state.recipe_approved = False # Reset approval on new processing
+        st.session_state.graph_results = None # Clear previous results
+        st.session_state.user_feedback = "" # Clear previous feedback
+    elif job.kind == "revise_recipe":
+        if job.status == JOB_SUCCEEDED:
+            put_text(st.session_state, "standardized_recipe_text", job.result)
+        elif "standardized_recipe_text" in context:
+            put_text(st.session_state, "standardized_recipe_text", context["standardized_recipe_text"])
+        else:
+            st.session_state.processing_error = f"Failed to revise recipe: {job.error}"
+        st.session_state.user_feedback = "" # Clear feedback state, input field will clear via rerun + value binding
+    elif job.kind == "text_to_graph":
+        if "standardized_recipe_text" in context:
+            put_text(st.session_state, "standardized_recipe_text", context["standardized_recipe_text"])
+        if job.status == JOB_SUCCEEDED:
+            st.session_state.graph_results = job.result
+            # The uploaded recipe can be downloaded again if the text is evicted from the payload store
+            attach_uri(st.session_state, "standardized_recipe_text", job.result.recipe_uri)
+            st.session_state.recipe_approved = True
+            st.session_state.processing_error = None # Clear any previous errors
+        else:
+            st.session_state.processing_error = f"Failed to generate graph: {job.error}"
+            st.session_state.recipe_approved = False # Reset approval status
+            st.session_state.graph_results = None # Clear potentially partial results
+    if job.status == JOB_CANCELLED:
+        st.session_state.processing_error = f"{JOB_LABELS.get(job.kind, job.kind)} was cancelled."
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL_SECONDS)
+def render_job_status(job_id):
+    """
+    Status of the session's background job, redrawn every JOB_POLL_INTERVAL_SECONDS without rerunning
+    the page. Once the job is done (or gone) the whole page reruns, which applies its result; this also
+    covers a job that finished between the page's status check and the first refresh.
+    """
+    job = get_job_queue().get(job_id)
+    if job is None or job.done:
+        st.rerun(scope="app")
+    status_text = f"{JOB_LABELS.get(job.kind, job.kind)}... ({job.status})"
+    if job.cancel_requested:
+        status_text += " Cancelling after the current step..."
+    if job.latest_progress:
+        status_text += f"\n\n{job.latest_progress}"
+    st.info(status_text)
+    # The job stops before its next stage; the page reruns once it has
+    if st.button("Cancel", key="cancel_job", disabled=job.cancel_requested):
+        get_job_queue().cancel(job_id)
+        st.rerun(scope="fragment")
+
+
 st.title("Recipe Processor")
 
-recipe_draft = st.text_area("Recipe Draft", height=300, placeholder="Paste your recipe draft here...")
+job_in_progress = bool(st.session_state.active_job_id)
+
+recipe_draft = st.text_area("Recipe Draft", height=300, placeholder="Paste your recipe draft (or a YouTube / gs:// video link) here...")
+recipe_video = st.file_uploader("Or upload a recipe video", type=VIDEO_FILE_TYPES)
+with st.expander("Video options"):
+    # "auto" uses the cheap long_video preset for long local videos; "custom" exposes every setting
+    preset_names = ["auto", *VIDEO_PRESETS, "custom"]
+    video_preset = st.selectbox("Preset", preset_names,
+                                index=preset_names.index(VIDEO_PRESET) if VIDEO_PRESET in preset_names else 0,
+                                help="Lower frame rates and resolutions cut the tokens (and cost) of long videos.")
+    video_options = video_preset
+    if video_preset == "custom":
+        offset_cols = st.columns(2)
+        start_offset = offset_cols[0].number_input("Start (seconds)", min_value=0.0, value=0.0, step=10.0)
+        end_offset = offset_cols[1].number_input("End (seconds, 0 = end of video)", min_value=0.0, value=0.0, step=10.0)
+        sample_cols = st.columns(2)
+        video_fps = sample_cols[0].number_input("Frames per second", min_value=0.05, max_value=24.0, value=1.0, step=0.1)
+        media_resolution = sample_cols[1].selectbox("Media resolution", MEDIA_RESOLUTIONS, index=2)
+        video_options = (start_offset, end_offset, video_fps, media_resolution)
 recipe_name = st.text_input("Recipe Name", placeholder="e.g., chocolate_chip_cookies")
 gcs_bucket_name = st.text_input("GCS Bucket Name", placeholder="your-gcs-bucket-name")
 
-process_button = st.button("Process Recipe")
+process_button = st.button("Process Recipe", disabled=job_in_progress)
 
 # --- Display Processing Errors ---
 if st.session_state.processing_error:
     st.error(st.session_state.processing_error)
 
+# --- Display Background Job Status ---
+# A running job's status panel refreshes itself (render_job_status); the job runs on the shared
+# worker pool, so a refresh or reconnect does not lose it.
+active_job = get_job_queue().get(st.session_state.active_job_id) if job_in_progress else None
+if job_in_progress:
+    if active_job is None:
+        # Unknown job ID: expired, or served by another/restarted instance
+        st.session_state.processing_error = "The background job could not be found (it may have expired). Please try again."
+        clear_active_job()
+        st.rerun()
+    elif active_job.done:
+        apply_finished_job(active_job)
+        clear_active_job()
+        st.rerun()
+    else:
+        render_job_status(active_job.job_id)
+
 if process_button:
     # --- Input Validation ---
-    if not recipe_draft:
-        st.error("Recipe Draft cannot be empty.")
+    if not recipe_draft and recipe_video is None:
+        st.error("Recipe Draft cannot be empty (or upload a recipe video).")
     elif not recipe_name:
         st.error("Recipe Name cannot be empty.")
     elif not gcs_bucket_name:
         st.error("GCS Bucket Name cannot be empty.")
+    elif video_preset == "custom" and end_offset and end_offset <= start_offset:
+        st.error("The video end must be after its start.")
     else:
         # --- Process Recipe ---
-        st.session_state.original_recipe_draft = recipe_draft # Store original draft
+        # A video (uploaded file or a video link as the draft) goes through process_video instead
+        video_source = None
+        if recipe_video is not None:
+            video_source = save_uploaded_video(recipe_video)
+            recipe_draft = f"Recipe video: {recipe_video.name}"
+        elif VIDEO_URL_PATTERN.match(recipe_draft):
+            video_source = recipe_draft.strip()
+            recipe_draft = f"Recipe video: {video_source}"
+        put_text(st.session_state, "original_recipe_draft", recipe_draft) # Store original draft
         st.session_state.recipe_name = recipe_name # Store recipe name
         st.session_state.gcs_bucket_name = gcs_bucket_name # Store bucket name
         st.session_state.processing_error = None # Clear previous errors
 
-        try:
-            with st.spinner("Processing recipe text..."):
-                processed_text = process_text(
-                    recipe_draft_text=recipe_draft,
-                    project_id=PROJECT_ID
-                )
-            # --- Success ---
-            st.session_state.standardized_recipe_text = processed_text
-            st.session_state.recipe_approved = False # Reset approval on new processing
-            st.session_state.graph_results = None # Clear previous results
-            st.session_state.user_feedback = "" # Clear previous feedback
-            st.info("Recipe processed. Please review the standardized text below and approve or provide feedback.") # Inform user
-
-        except (ValueError, RuntimeError, Exception) as e:
-            # --- Error Handling ---
-            error_message = f"An error occurred during recipe processing: {e}"
-            st.session_state.processing_error = error_message
-            st.session_state.standardized_recipe_text = "" # Clear stale data
-            st.session_state.recipe_approved = False
-            st.session_state.graph_results = None
-            st.error(error_message) # Display error in the main area
-
-        # --- End Process Recipe (text only) ---
-        # Graph generation and display logic is removed from here and will be handled later based on session state.
+        # Runs in the background; the result is applied by the job status block on a later rerun
+        context = {"original_recipe_draft": recipe_draft, "recipe_name": recipe_name, "gcs_bucket_name": gcs_bucket_name}
+        if video_source:
+            submit_job(
+                "process_video",
+                run_video_job,
+                {"video_source": video_source, "project_id": PROJECT_ID, "gcs_bucket_name": gcs_bucket_name,
+                 "recipe_name": recipe_name, "video_options": video_options_for_job(video_options)},
+                context=context
+            )
+        else:
+            submit_job(
+                "process_text",
+                cached_process_text,
+                {"recipe_draft_text": recipe_draft, "project_id": PROJECT_ID},
+                context=context
+            )
+        st.rerun()
 
 
 # --- Review and Approval Section ---
-if st.session_state.standardized_recipe_text and not st.session_state.recipe_approved:
+# Large uploaded texts live in the shared payload store (see r2g_app/session_memory.py); None means
+# one was evicted and could not be downloaded again
+standardized_recipe_text = get_text(st.session_state, "standardized_recipe_text")
+original_recipe_draft = get_text(st.session_state, "original_recipe_draft")
+if standardized_recipe_text is None or original_recipe_draft is None:
+    st.session_state.processing_error = "This session's recipe was removed from memory while idle. Please process the draft again."
+    put_text(st.session_state, "standardized_recipe_text", "")
+    put_text(st.session_state, "original_recipe_draft", "")
+    st.session_state.recipe_approved = False
+    st.session_state.graph_results = None
+    st.rerun()
+
+if standardized_recipe_text and not st.session_state.recipe_approved:
     st.subheader("Review Standardized Recipe:")
-    st.text_area("Standardized Recipe Text", value=st.session_state.standardized_recipe_text, height=300, disabled=True, key="standardized_recipe_display")
+    st.text_area("Standardized Recipe Text", value=standardized_recipe_text, height=300, disabled=True, key="standardized_recipe_display")
 
-    approve_button = st.button("Generate Graph")
+    approve_button = st.button("Generate Graph", disabled=job_in_progress)
 
     st.subheader("Request Changes (Optional):")
     # Add value parameter to bind the text area to the user_feedback state
     st.text_area("Describe desired changes:", value=st.session_state.user_feedback, key="user_feedback_input", height=150)
-    submit_changes_button = st.button("Submit Changes")
+    submit_changes_button = st.button("Submit Changes", disabled=job_in_progress)
 
     # --- Handle Button Clicks ---
     if approve_button:
@@ -117,67 +433,68 @@ if st.session_state.standardized_recipe_text and not st.session_state.recipe_app
         if feedback_text and feedback_text.strip():
             st.session_state.user_feedback = feedback_text.strip()
             st.session_state.processing_error = None # Clear previous errors
-            try:
-                with st.spinner("Revising recipe based on feedback..."):
-                    revised_recipe_text = revise_recipe(
-                        original_draft=st.session_state.original_recipe_draft,
-                        current_standardised_recipe=st.session_state.standardized_recipe_text,
-                        user_feedback=st.session_state.user_feedback,
-                        project_id=PROJECT_ID # Pass PROJECT_ID
-                    )
-                # --- Revision Success ---
-                st.session_state.standardized_recipe_text = revised_recipe_text
-                st.session_state.user_feedback = "" # Clear feedback state, input field will clear via rerun + value binding
-                # Remove: st.session_state.user_feedback_input = ""
-                st.rerun() # Refresh to show revised recipe
-            except Exception as e:
-                # --- Revision Error ---
-                st.session_state.processing_error = f"Failed to revise recipe: {e}"
-                st.session_state.user_feedback = "" # Clear feedback state, but keep input
-                st.rerun() # Refresh to show error
+            submit_job(
+                "revise_recipe",
+                cached_revise_recipe,
+                {
+                    "original_draft": original_recipe_draft,
+                    "current_standardised_recipe": standardized_recipe_text,
+                    "user_feedback": st.session_state.user_feedback,
+                    "project_id": PROJECT_ID # Pass PROJECT_ID
+                },
+                context={
+                    "original_recipe_draft": original_recipe_draft,
+                    "standardized_recipe_text": standardized_recipe_text,
+                    "recipe_name": st.session_state.recipe_name,
+                    "gcs_bucket_name": st.session_state.gcs_bucket_name
+                }
+            )
+            st.rerun() # Refresh to show job status
         else:
             st.warning("Please enter your requested changes before submitting.")
 
 
 # --- Graph Generation Trigger ---
-# This block runs only when the recipe is approved but graph results are not yet generated
-if st.session_state.recipe_approved and not st.session_state.graph_results:
+# This block runs only when the recipe is approved but graph results are not yet generated or in progress
+if st.session_state.recipe_approved and not st.session_state.graph_results and not job_in_progress:
     # Check if required inputs are available (safety check)
     if not st.session_state.recipe_name or not st.session_state.gcs_bucket_name:
         st.session_state.processing_error = "Recipe Name or GCS Bucket Name is missing. Please re-enter details and process again."
         st.session_state.recipe_approved = False # Reset approval status
         st.rerun()
     else:
-        try:
-            with st.spinner("Generating graph and uploading results..."):
-                # Use stored recipe name and bucket name
-                results = text_to_graph(
-                    standardised_recipe=st.session_state.standardized_recipe_text,
-                    recipe_name=st.session_state.recipe_name,
-                    gcs_bucket_name=st.session_state.gcs_bucket_name,
-                    project_id=PROJECT_ID
-                )
-            st.session_state.graph_results = results
-            st.session_state.processing_error = None # Clear any previous errors
-            st.rerun() # Rerun to display results
-
-        except Exception as e:
-            st.session_state.processing_error = f"Failed to generate graph: {e}"
-            st.session_state.recipe_approved = False # Reset approval status
-            st.session_state.graph_results = None # Clear potentially partial results
-            st.rerun() # Rerun to display error
+        # Use stored recipe name and bucket name
+        if not submit_job(
+            "text_to_graph",
+            cached_text_to_graph,
+            {
+                "standardised_recipe": standardized_recipe_text,
+                "recipe_name": st.session_state.recipe_name,
+                "gcs_bucket_name": st.session_state.gcs_bucket_name,
+                "project_id": PROJECT_ID
+            },
+            context={
+                "original_recipe_draft": original_recipe_draft,
+                "standardized_recipe_text": standardized_recipe_text,
+                "recipe_name": st.session_state.recipe_name,
+                "gcs_bucket_name": st.session_state.gcs_bucket_name
+            }
+        ):
+            st.session_state.recipe_approved = False # Queue full: let the user retry
+        st.rerun() # Rerun to display job status
 
 
 # --- Display Final Results Section ---
-# This block now only displays results if they exist (generated by the block above)
-if st.session_state.recipe_approved and st.session_state.graph_results:
-    st.success("Recipe approved and graph generated successfully!")
-
-    results = st.session_state.graph_results # Get results from session state
-    recipe_uri = results.get("recipe_uri")
-    html_uri = results.get("html_uri") # Added
-    css_uri = results.get("css_uri")    # Added
-    js_uri = results.get("js_uri")      # Added
+@st.fragment
+def render_graph_results(results):
+    """
+    Results panel: GCS links, graph preview and downloads. Runs as a fragment, so interacting with
+    it reruns only this function, and the preview and zip are built once per graph (by content hash).
+    """
+    recipe_uri = results.recipe_uri
+    html_uri = results.html_gcs_uri
+    css_uri = results.css_gcs_uri
+    js_uri = results.js_gcs_uri
 
     if recipe_uri:
         recipe_link = create_gcs_link(recipe_uri)
@@ -217,64 +534,101 @@ if st.session_state.recipe_approved and st.session_state.graph_results:
         # This is not a warning as JS might be embedded or not always separate
         st.info("Recipe graph JS URI not found in results (it might be embedded in HTML).")
 
-
-    # --- Display HTML/CSS/JS Graph ---
-    html_content = results.get("html_content")
-    css_content = results.get("css_content")
-    js_content = results.get("js_content")
-    # print(f"DEBUG: js_content: {js_content}")
-
-    # --- For Graph Preview ---
-    preview_html_content = html_content # Start with original
-    if preview_html_content:
-        # Preprocess for preview: remove specific link and script tags
-        preview_html_content = re.sub(r'<link\s+rel="stylesheet"\s+href="style\.css"\s*\/?>', '', preview_html_content, flags=re.IGNORECASE)
-        preview_html_content = re.sub(r'<script\s+src="script\.js"\s*><\/script>', '', preview_html_content, flags=re.IGNORECASE)
-
-    # --- Display Graph Preview ---
-    if preview_html_content and css_content and js_content: # Check preview_html_content
+    # --- Graph Preview ---
+    # Built from the shared artifact cache (or GCS) once per graph, not kept in the session
+    preview_html, complete = build_preview_html(results.html_sha256, results.css_sha256, results.js_sha256, results)
+    if preview_html and complete:
         st.subheader("Graph Preview:")
-        constructed_html = f"""
-        <html>
-        <head>
-        <style>
-        {css_content}
-        </style>
-        </head>
-        <body>
-        {preview_html_content} # Use the processed version for preview
-        <script>
-        {js_content}
-        </script>
-        </body>
-        </html>
-        """
-        st.components.v1.html(constructed_html, height=600)
-    elif preview_html_content: # Fallback for preview if CSS or JS is missing
+        st.components.v1.html(preview_html, height=600)
+    elif preview_html: # Fallback for preview if CSS or JS is missing
         st.subheader("Graph Preview (HTML only):")
-        st.components.v1.html(preview_html_content, height=600) # Use processed for preview
+        st.components.v1.html(preview_html, height=600)
     else:
         st.warning("HTML content for graph preview is not available or was removed.")
 
-    # --- Add Download Buttons (using original html_content) ---
-    if html_content: # Original html_content for download
-        st.download_button(
-            label="Download HTML",
-            data=html_content,
-            file_name="index.html",
-            mime="text/html"
-        )
-    if css_content:
-        st.download_button(
-            label="Download CSS",
-            data=css_content,
-            file_name="style.css",
-            mime="text/css"
-        )
-    if js_content:
-        st.download_button(
-            label="Download JS",
-            data=js_content,
-            file_name="script.js",
-            mime="application/javascript"
+    # --- Downloads ---
+    # The callables run only when a button is clicked; "ignore" skips the rerun a download would trigger
+    zip_column, html_column, css_column, js_column = st.columns(4)
+    zip_column.download_button(
+        label="Download all (zip)",
+        data=lambda: build_graph_zip(results.html_sha256, results.css_sha256, results.js_sha256, results),
+        file_name=f"{st.session_state.recipe_name or 'recipe'}_graph.zip",
+        mime="application/zip",
+        on_click="ignore",
+        type="primary",
+    )
+    for column, digest, label, file_name, mime, attribute in (
+        (html_column, results.html_sha256, "Download HTML", "index.html", "text/html", "html_content"),
+        (css_column, results.css_sha256, "Download CSS", "style.css", "text/css", "css_content"),
+        (js_column, results.js_sha256, "Download JS", "script.js", "application/javascript", "js_content"),
+    ):
+        if digest:
+            column.download_button(
+                label=label,
+                data=lambda attribute=attribute: getattr(results, attribute) or "",
+                file_name=file_name,
+                mime=mime,
+                on_click="ignore",
+            )
+
+
+# This block now only displays results if they exist (generated by the block above)
+if st.session_state.recipe_approved and st.session_state.graph_results:
+    st.success("Recipe approved and graph generated successfully!")
+    render_graph_results(st.session_state.graph_results) # GraphResult (URIs and hashes only; see r2g_app/results.py)
+
+
+# --- Run History (from the local run catalog; no bucket listing) ---
+if CATALOG_ENABLED:
+    with st.sidebar:
+        st.header("Run History")
+        history_query = st.text_input("Search recipe name", key="history_query", placeholder="Name prefix")
+        if st.session_state.get("history_last_query") != history_query:
+            st.session_state.history_page = 0 # New search: back to the first page
+            st.session_state.history_last_query = history_query
+        history_page = st.session_state.get("history_page", 0)
+        catalog = get_catalog()
+        total_runs = catalog.count_runs(history_query)
+        page_count = max(1, -(-total_runs // HISTORY_PAGE_SIZE))
+        runs = catalog.search_runs(history_query, limit=HISTORY_PAGE_SIZE, offset=history_page * HISTORY_PAGE_SIZE)
+        if runs:
+            st.dataframe(
+                [
+                    {
+                        "Recipe": run.recipe_name,
+                        "Date": datetime.datetime.fromtimestamp(run.created_at).strftime("%Y-%m-%d %H:%M"),
+                        "Model": run.graph_model,
+                        "Tokens": run.total_tokens,
+                        "Duration (s)": round(run.duration_s, 1),
+                        "Graph": create_gcs_link(run.html_uri),
+                    }
+                    for run in runs
+                ],
+                column_config={"Graph": st.column_config.LinkColumn(display_text="Open")},
+                hide_index=True,
+            )
+        else:
+            st.caption("No runs found.")
+        previous_column, page_column, next_column = st.columns([1, 2, 1])
+        if previous_column.button("‹", key="history_previous", disabled=history_page == 0):
+            st.session_state.history_page = history_page - 1
+            st.rerun()
+        page_column.caption(f"Page {history_page + 1} of {page_count} ({total_runs} runs)")
+        if next_column.button("›", key="history_next", disabled=history_page + 1 >= page_count):
+            st.session_state.history_page = history_page + 1
+            st.rerun()
+
+
+# --- Session Memory ---
+# Record this session's state size for the per-instance accounting (see r2g_app/session_memory.py)
+script_run_ctx = get_script_run_ctx()
+track_session(script_run_ctx.session_id if script_run_ctx else "local", st.session_state)
+with st.sidebar:
+    with st.expander("Instance memory"):
+        memory_stats = instance_stats()
+        st.caption(
+            f"{memory_stats['sessions']} sessions, {memory_stats['session_state_bytes'] / 1024:.1f} KB session state "
+            f"(max {memory_stats['max_session_state_bytes'] / 1024:.1f} KB per session)"
         )
+        st.json(memory_stats, expanded=False)
+
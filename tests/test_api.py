@@ -0,0 +1,45 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from r2g_app import api, main
+from r2g_app.fake_backends import fake_backends
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "DEDUP_ENABLED", False)
+    with fake_backends(latency_scale=0.5), TestClient(api.app) as test_client:
+        yield test_client
+
+
+def _poll(client, job_id, timeout=10.0):
+    deadline = time.time() + timeout
+    while True:
+        job = client.get(f"/v1/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed", "cancelled") or time.time() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_job_runs_to_completion(client):
+    response = client.post("/v1/jobs/process_text", json={"recipe_draft_text": "Ingredients:\n- 2 eggs\n"})
+    assert response.status_code == 202
+    job = _poll(client, response.json()["job_id"])
+    assert job["status"] == "succeeded"
+    assert job["result"]
+
+
+def test_cancel_job(client):
+    job_id = client.post("/v1/jobs/process_text", json={"recipe_draft_text": "Ingredients:\n- 2 eggs\n"}).json()["job_id"]
+    response = client.post(f"/v1/jobs/{job_id}/cancel")
+    assert response.status_code == 202
+    assert response.json()["cancel_requested"]
+    job = _poll(client, job_id)
+    assert job["status"] == "cancelled"
+    assert job["result"] is None
+
+
+def test_cancel_unknown_job(client):
+    assert client.post("/v1/jobs/missing/cancel").status_code == 404
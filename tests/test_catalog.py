@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+from r2g_app.catalog import MAX_PAGE_SIZE, Catalog, RunRecord, content_hash
+
+
+@pytest.fixture
+def catalog():
+    catalog = Catalog(":memory:")
+    yield catalog
+    catalog.close()
+
+
+def _record(name, created_at, recipe="recipe", **kwargs):
+    return RunRecord(recipe_name=name, recipe_sha256=content_hash(recipe), created_at=created_at, **kwargs)
+
+
+def test_insert_and_get(catalog):
+    record = _record("Beef Stew", 100.0, models=["gemini-2.5-pro"], total_tokens=1234,
+                     html_uri="gs://bucket/beef_stew/index.html")
+    run_id = catalog.add_run(record)
+    assert record.run_id == run_id
+    stored = catalog.get_run(run_id)
+    assert stored == record
+    assert stored.models == ["gemini-2.5-pro"]
+    assert catalog.get_run(run_id + 1) is None
+
+
+def test_prefix_search_newest_first(catalog):
+    for created_at, name in enumerate(["beef_stew", "Beef_Wellington", "banana_bread", "beefy_chili"]):
+        catalog.add_run(_record(name, float(created_at)))
+    assert [r.recipe_name for r in catalog.search_runs("beef")] == ["beefy_chili", "Beef_Wellington", "beef_stew"]
+    assert [r.recipe_name for r in catalog.search_runs("BEEF_")] == ["Beef_Wellington", "beef_stew"]
+    assert catalog.count_runs("beef") == 3
+    assert catalog.count_runs("") == 4
+    assert catalog.search_runs("pizza") == []
+
+
+def test_wildcards_in_query_are_literal(catalog):
+    catalog.add_run(_record("50% rye", 1.0))
+    catalog.add_run(_record("500 g rye", 2.0))
+    assert [r.recipe_name for r in catalog.search_runs("50%")] == ["50% rye"]
+
+
+def test_pagination(catalog):
+    for i in range(25):
+        catalog.add_run(_record(f"soup_{i:02d}", float(i)))
+    first = catalog.search_runs("soup", limit=10)
+    second = catalog.search_runs("soup", limit=10, offset=10)
+    assert [r.recipe_name for r in first] == [f"soup_{i:02d}" for i in range(24, 14, -1)]
+    assert [r.recipe_name for r in second] == [f"soup_{i:02d}" for i in range(14, 4, -1)]
+    assert len(catalog.search_runs(limit=MAX_PAGE_SIZE + 100)) == 25
+
+
+def test_find_by_recipe_hash(catalog):
+    catalog.add_run(_record("a", 1.0, recipe="same"))
+    catalog.add_run(_record("b", 2.0, recipe="other"))
+    catalog.add_run(_record("c", 3.0, recipe="same"))
+    assert [r.recipe_name for r in catalog.find_by_recipe_hash(content_hash("same"))] == ["c", "a"]
+
+
+def test_content_hash_of_empty_text():
+    assert content_hash("") is None and content_hash(None) is None
+
+
+def test_wal_with_concurrent_writers(tmp_path):
+    path = str(tmp_path / "catalog.sqlite3")
+    catalogs = [Catalog(path) for _ in range(4)]  # One connection each, as separate processes would have
+    assert catalogs[0]._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    errors = []
+
+    def write(catalog, writer):
+        try:
+            for i in range(50):
+                catalog.add_run(_record(f"writer{writer}_{i}", float(i)))
+        except Exception as e:  # Reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(catalog, n)) for n, catalog in enumerate(catalogs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    reader = Catalog(path)
+    assert reader.count_runs() == 200
+    assert reader.count_runs("writer2_") == 50
+    for catalog in [*catalogs, reader]:
+        catalog.close()
@@ -0,0 +1,50 @@
+import io
+import json
+
+import pytest
+
+from r2g_app import main
+
+DRAFT = "Simple stew\n\n500 g beef, 2 carrots, 1 onion.\nBrown the beef, add the vegetables and simmer for 2 hours."
+
+
+def _run_cli(argv, capsys):
+    exit_code = main.main(["--dry-run", "--concurrency", "1", *argv])
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    return exit_code, {record["id"]: record for record in records}
+
+
+@pytest.fixture(autouse=True)
+def no_dedup(monkeypatch):
+    monkeypatch.setattr(main, "DEDUP_ENABLED", False)
+
+
+def test_process_file(tmp_path, capsys):
+    path = tmp_path / "stew.txt"
+    path.write_text(DRAFT, encoding="utf-8")
+    exit_code, records = _run_cli(["process", str(path)], capsys)
+    assert exit_code == 0
+    assert records[str(path)]["recipe_name"] == "stew"
+    assert records[str(path)]["standardised_recipe"]
+
+
+def test_missing_and_undecodable_files_do_not_stop_the_others(tmp_path, capsys):
+    valid, binary, missing = tmp_path / "stew.txt", tmp_path / "photo.txt", tmp_path / "missing.txt"
+    valid.write_text(DRAFT, encoding="utf-8")
+    binary.write_bytes(b"\xff\xfe\x00\x81")
+    exit_code, records = _run_cli(["process", str(missing), str(binary), str(valid)], capsys)
+    assert exit_code == 1
+    assert set(records) == {str(missing), str(binary), str(valid)}
+    assert "Cannot read file" in records[str(missing)]["error"]
+    assert "Cannot read file" in records[str(binary)]["error"]
+    assert records[str(valid)]["standardised_recipe"]
+
+
+def test_malformed_stdin_lines_do_not_stop_the_others(monkeypatch, capsys):
+    stdin = "\n".join([json.dumps({"id": "stew", "draft": DRAFT}), "{not json", json.dumps([1, 2]), ""])
+    monkeypatch.setattr(main.sys, "stdin", io.StringIO(stdin))
+    exit_code, records = _run_cli(["process"], capsys)
+    assert exit_code == 1
+    assert records["stew"]["standardised_recipe"]
+    assert "Invalid JSON" in records["stdin:2"]["error"]
+    assert "Expected a JSON object" in records["stdin:3"]["error"]
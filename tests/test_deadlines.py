@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+from r2g_app.deadlines import (
+    MIN_STAGE_BUDGET_S, STAGE_BUDGET_WEIGHTS, Deadline, DeadlineExceededError, as_deadline,
+)
+
+
+def test_no_time_limit():
+    deadline = Deadline(None)
+    assert deadline.remaining() is None
+    assert deadline.budget("generate", ["improve", "upload"]) is None
+
+
+def test_budget_is_weighted_share_of_remaining_time():
+    deadline = Deadline(100.0)
+    budget = deadline.budget("generate", ["improve", "upload"])
+    weights = STAGE_BUDGET_WEIGHTS["generate"] + STAGE_BUDGET_WEIGHTS["improve"] + STAGE_BUDGET_WEIGHTS["upload"]
+    assert budget == pytest.approx(100.0 * STAGE_BUDGET_WEIGHTS["generate"] / weights, abs=0.1)
+
+
+def test_last_stage_gets_all_remaining_time():
+    assert Deadline(30.0).budget("upload") == pytest.approx(30.0, abs=0.1)
+
+
+def test_unknown_stage_has_weight_one():
+    budget = Deadline(20.0).budget("unknown_stage", ["other_unknown_stage"])
+    assert budget == pytest.approx(10.0, abs=0.1)
+
+
+def test_budget_never_below_minimum():
+    deadline = Deadline(MIN_STAGE_BUDGET_S + 1.0)
+    assert deadline.budget("upload", ["generate", "improve"]) == MIN_STAGE_BUDGET_S
+
+
+def test_expired_deadline_raises():
+    deadline = Deadline(MIN_STAGE_BUDGET_S / 2)
+    with pytest.raises(DeadlineExceededError, match="reached before stage 'generate'"):
+        deadline.check("generate")
+
+
+def test_remaining_never_negative():
+    deadline = Deadline(0.001)
+    time.sleep(0.01)
+    assert deadline.remaining() == 0.0
+
+
+def test_cancel_stops_next_stage():
+    deadline = Deadline(None)
+    deadline.check("draft")
+    deadline.cancel()
+    assert deadline.cancelled
+    with pytest.raises(DeadlineExceededError, match="cancelled"):
+        deadline.budget("rewrite")
+
+
+def test_cancel_when_condition_is_met():
+    stop = []
+    deadline = Deadline(None, cancel_when=lambda: bool(stop))
+    deadline.check("draft")
+    stop.append(True)
+    with pytest.raises(DeadlineExceededError, match="cancelled"):
+        deadline.check("rewrite")
+    stop.clear()
+    assert deadline.cancelled  # Stays cancelled
+
+
+def test_deadline_exceeded_is_a_timeout_error():
+    assert issubclass(DeadlineExceededError, TimeoutError)
+
+
+def test_as_deadline():
+    shared = Deadline(10.0)
+    assert as_deadline(shared) is shared
+    assert as_deadline(5.0, 100.0).timeout_s == 5.0
+    assert as_deadline(None, 100.0).timeout_s == 100.0
+    assert as_deadline(None, 0).timeout_s is None
+    assert as_deadline(None, None).remaining() is None
@@ -0,0 +1,72 @@
+import pytest
+
+from r2g_app.dedup import DedupIndex, normalize_text
+
+RECIPE = """# Braised beef
+- 500 g beef chuck, cubed
+- 250 ml red wine
+- 500 ml beef broth
+- 2 sprigs thyme
+1. Brown the beef in batches, 8 minutes.
+2. Add the wine, broth and thyme and bring to a simmer.
+3. Cover and braise at 160 C for 2 hours.
+"""
+
+
+@pytest.fixture
+def index():
+    index = DedupIndex(threshold=0.9, max_entries=3)
+    index.add("draft", RECIPE, "standardized")
+    return index
+
+
+def test_normalize_text_removes_markup_and_punctuation():
+    assert normalize_text("# Title\n- 1.5 cups Flour,\n2) Mix!") == "title 1.5 cups flour mix"
+
+
+def test_reformatted_text_is_a_hit(index):
+    reformatted = RECIPE.upper().replace("- ", "* ").replace("\n", "\n\n")
+    match = index.lookup("draft", reformatted)
+    assert match is not None and match.result == "standardized"
+    assert match.similarity >= 0.9
+    assert index.stats()["draft"]["hits"] == 1
+
+
+def test_unrelated_text_is_a_miss(index):
+    assert index.lookup("draft", "Whisk two eggs with 100 g sugar and bake for 20 minutes.") is None
+    assert index.stats()["draft"]["hit_rate"] == 0
+
+
+@pytest.mark.parametrize("old, new", [
+    ("500 g beef chuck", "750 g beef chuck"),
+    ("red wine", "white wine"),
+    ("500 ml beef broth", "500 ml chicken broth"),
+    ("2 sprigs thyme", "2 sprigs rosemary"),
+    ("Cover and braise", "Braise uncovered"),
+])
+def test_edited_recipe_is_a_miss(index, old, new):
+    assert index.lookup("draft", RECIPE.replace(old, new)) is None
+
+
+def test_lookup_is_scoped(index):
+    index.add("graph", RECIPE, "graph", scope="bucket/braised_beef")
+    assert index.lookup("graph", RECIPE, scope="bucket/braised_beef").result == "graph"
+    assert index.lookup("graph", RECIPE, scope="bucket/beef_stew") is None
+    assert index.lookup("draft", RECIPE, scope="bucket/braised_beef") is None
+
+
+def test_oldest_entries_are_evicted(index):
+    for number in range(1, 4):
+        index.add("draft", RECIPE + f"\nServes {number}.", f"serves {number}")
+    assert index.stats()["draft"]["entries"] == 3
+    assert index.lookup("draft", RECIPE) is None
+    assert index.lookup("draft", RECIPE + "\nServes 3.").result == "serves 3"
+    indexed_ids = set().union(*index._buckets.values())
+    assert indexed_ids == set(index._entries["draft"])  # Evicted entries are gone from the LSH buckets
+
+
+def test_empty_text_is_not_indexed():
+    index = DedupIndex()
+    index.add("draft", "  - ", "nothing")
+    assert index.stats()["draft"]["entries"] == 0
+    assert index.lookup("draft", "") is None
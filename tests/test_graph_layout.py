@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from r2g_app.aux_funs import parse_code_string
+from r2g_app.fake_backends import FAKE_GRAPH_CODE
+from r2g_app.graph_layout import (
+    NODE_SEPARATION, POSITIONS_VARIABLE, RANK_SEPARATION, _acyclic_edges, _ranks, apply_preset_layout,
+    compute_layout, precompute_layout,
+)
+from r2g_app.graph_validation import ElementsExtractionError
+
+
+def _node(node_id, **data):
+    return {"group": "nodes", "data": {"id": node_id, **data}}
+
+
+def _edge(source, target):
+    return {"group": "edges", "data": {"id": f"{source}-{target}", "source": source, "target": target}}
+
+
+def test_acyclic_edges_drops_back_edges_loops_and_duplicates():
+    edges = [("a", "b"), ("b", "c"), ("c", "a"), ("a", "a"), ("a", "b")]
+    assert _acyclic_edges(["a", "b", "c"], edges) == [("a", "b"), ("b", "c")]
+
+
+def test_ranks_are_longest_paths():
+    edges = [("a", "b"), ("b", "c"), ("a", "c")]
+    assert _ranks(["a", "b", "c"], edges) == {"a": 0, "b": 1, "c": 2}
+
+
+def test_sources_move_down_to_their_first_use():
+    # "butter" is only used by the last step, so it sits one rank above it
+    edges = [("flour", "mix"), ("mix", "bake"), ("butter", "bake")]
+    assert _ranks(["flour", "mix", "bake", "butter"], edges)["butter"] == 1
+
+
+def test_chain_is_laid_out_top_down_in_one_column():
+    positions = compute_layout([_node("a"), _node("b"), _node("c"), _edge("a", "b"), _edge("b", "c")])
+    assert [positions[n]["y"] for n in "abc"] == [0.0, RANK_SEPARATION, 2 * RANK_SEPARATION]
+    assert len({positions[n]["x"] for n in "abc"}) == 1
+
+
+def test_nodes_of_a_rank_get_distinct_slots():
+    positions = compute_layout([_node("a"), _node("b"), _node("c"), _edge("a", "c"), _edge("b", "c")])
+    assert positions["a"]["y"] == positions["b"]["y"]
+    assert abs(positions["a"]["x"] - positions["b"]["x"]) == NODE_SEPARATION
+
+
+def test_only_leaves_get_positions_and_sections_do_not_overlap():
+    elements = [
+        _node("prep", type="section"), _node("bake_section", type="section"),
+        _node("mix", parent="prep"), _node("knead", parent="prep"),
+        _node("shape", parent="bake_section"), _node("bake", parent="bake_section"),
+        _node("flour"),
+        _edge("flour", "mix"), _edge("mix", "knead"), _edge("prep", "bake_section"), _edge("shape", "bake"),
+    ]
+    positions = compute_layout(elements)
+    assert set(positions) == {"mix", "knead", "shape", "bake", "flour"}
+    # The section edge maps to prep's exit step -> bake_section's entry step
+    assert positions["shape"]["y"] > positions["knead"]["y"]
+    # A loose ingredient joins the band of the section it feeds, left of the section's steps
+    assert positions["flour"]["x"] < positions["mix"]["x"]
+
+
+def test_cycles_and_dangling_edges_do_not_break_the_layout():
+    elements = [_node("a"), _node("b"), _edge("a", "b"), _edge("b", "a"), _edge("a", "missing")]
+    assert set(compute_layout(elements)) == {"a", "b"}
+
+
+def test_apply_preset_layout():
+    js = "cy.layout({ name: 'dagre', rankDir: 'TB' }).run();\nconst api = cy.expandCollapse({ layoutBy: { name: \"dagre\" } });"
+    laid_out = apply_preset_layout(js, {"a": {"x": 1.0, "y": 2.0}})
+    declaration, _, rest = laid_out.partition("\n")
+    assert declaration == f'const {POSITIONS_VARIABLE} = {json.dumps({"a": {"x": 1.0, "y": 2.0}}, separators=(",", ":"))};'
+    assert "dagre" not in rest
+    assert rest.count(f"name: 'preset', positions: {POSITIONS_VARIABLE}") == 2
+
+
+def test_apply_preset_layout_without_known_layout_is_a_no_op():
+    js = "cy.layout({ name: 'concentric' }).run();"
+    assert apply_preset_layout(js, {"a": {"x": 0.0, "y": 0.0}}) == js
+
+
+def test_precompute_layout_on_generated_script():
+    js = parse_code_string(FAKE_GRAPH_CODE)["script.js"]
+    laid_out = precompute_layout(js)
+    assert laid_out.startswith(f"const {POSITIONS_VARIABLE} = ")
+    with pytest.raises(ValueError, match="already"):
+        precompute_layout(laid_out)
+
+
+def test_precompute_layout_errors():
+    with pytest.raises(ElementsExtractionError):
+        precompute_layout("cy.layout({ name: 'dagre' });")
@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+from r2g_app.aux_funs import parse_code_string
+from r2g_app.fake_backends import FAKE_GRAPH_CODE, FAKE_GRAPH_PATCH
+from r2g_app.graph_patch import GraphPatch, PatchError, apply_patch, check_patched, format_graph_code, parse_patch
+from r2g_app.graph_validation import extract_elements
+
+
+def _files():
+    return parse_code_string(FAKE_GRAPH_CODE)
+
+
+def test_parse_bare_patch():
+    patch = parse_patch(FAKE_GRAPH_PATCH)
+    assert len(patch.css_rules) == 1
+    assert len(patch.style_entries) == 2
+    assert len(patch.node_classes) == 1
+    assert patch.edit_count == 4
+
+
+def test_parse_fenced_patch():
+    assert parse_patch(f"Here are the edits:\n```json\n{FAKE_GRAPH_PATCH}\n```").edit_count == 4
+
+
+def test_parse_patch_missing_kinds_are_empty():
+    patch = parse_patch('{"css_rules": [{"selector": "body", "declarations": "margin: 0"}]}')
+    assert patch.style_entries == [] and patch.node_classes == []
+
+
+@pytest.mark.parametrize("text", [
+    "not json",
+    "[]",
+    '{"css_rules": {"selector": "body"}}',
+    '{"css_rules": [{"selector": "body"}]}',
+    '{"style_entries": [{"selector": "node", "style": "shape: ellipse"}]}',
+])
+def test_parse_invalid_patch(text):
+    with pytest.raises(PatchError):
+        parse_patch(text)
+
+
+def test_apply_fake_patch():
+    files = _files()
+    patched, applied = apply_patch(files, parse_patch(FAKE_GRAPH_PATCH))
+    assert applied == {"css_rules": 1, "style_entries": 2, "node_classes": 1}
+    assert patched["index.html"] == files["index.html"]
+    assert "background-color: #fafafa" in patched["style.css"]
+    assert ".grain-ingredient" in patched["script.js"]
+    flour = next(element for element in extract_elements(patched["script.js"]) if element["data"].get("id") == "flour")
+    assert "grain-ingredient" in flour["classes"]
+    assert check_patched(files, patched) == []
+
+
+def test_css_rule_with_same_selector_is_replaced():
+    files = _files()
+    patch = GraphPatch(css_rules=[{"selector": "body", "declarations": "margin: 1px"}])
+    patched, _ = apply_patch(files, patch)
+    assert patched["style.css"].count("body {") == files["style.css"].count("body {")
+    assert "margin: 1px" in patched["style.css"]
+
+
+def test_empty_patch_changes_nothing():
+    files = _files()
+    patched, applied = apply_patch(files, GraphPatch())
+    assert patched == files
+    assert sum(applied.values()) == 0
+
+
+def test_unknown_node_class_edit_is_not_applied():
+    files = _files()
+    patched, applied = apply_patch(files, GraphPatch(node_classes=[{"id": "no_such_node", "classes": "x"}]))
+    assert applied["node_classes"] == 0
+    assert patched["script.js"] == files["script.js"]
+
+
+def test_check_patched_reports_broken_script():
+    files = _files()
+    broken = dict(files, **{"script.js": files["script.js"][:len(files["script.js"]) // 2]})
+    assert check_patched(files, broken)
+
+
+def test_check_patched_reports_changed_element_ids():
+    files = _files()
+    renamed = dict(files, **{"script.js": files["script.js"].replace("'flour'", "'wheat_flour'")
+                                                            .replace('"flour"', '"wheat_flour"')})
+    assert "the element ids changed" in check_patched(files, renamed)
+
+
+def test_format_graph_code_round_trips():
+    files = _files()
+    assert parse_code_string(format_graph_code(files)) == files
+
+
+def test_format_graph_code_skips_empty_files():
+    assert format_graph_code({"index.html": "<html></html>", "style.css": "", "script.js": ""}) == (
+        '```html filename="index.html"\n<html></html>\n```'
+    )
+
+
+def test_fake_patch_is_valid_json():
+    assert set(json.loads(FAKE_GRAPH_PATCH)) == {"css_rules", "style_entries", "node_classes"}
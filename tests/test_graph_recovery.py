@@ -0,0 +1,128 @@
+from r2g_app.aux_funs import parse_code_string
+from r2g_app.fake_backends import FAKE_GRAPH_CODE
+from r2g_app.graph_recovery import (
+    BLOCK_MISSING, BLOCK_OK, BLOCK_TRUNCATED, BlockState, _join_continuation, check_files,
+    incomplete_blocks, inspect_graph_code, merge_completion, truncated_graph_code,
+)
+
+HTML = '<!DOCTYPE html>\n<html>\n<body><div id="cy"></div></body>\n</html>'
+CSS = "#cy {\n  width: 100%;\n  height: 100%;\n}"
+JS = "const cy = cytoscape({\n  elements: [\n    { data: { id: 'a' } }\n  ]\n});"
+
+
+def _response(html=HTML, css=CSS, js=JS):
+    blocks = []
+    if html is not None:
+        blocks.append(f'```html filename="index.html"\n{html}\n```')
+    if css is not None:
+        blocks.append(f'```css filename="style.css"\n{css}\n```')
+    if js is not None:
+        blocks.append(f'```javascript filename="script.js"\n{js}\n```')
+    return "\n\n".join(blocks)
+
+
+def test_complete_response_is_ok():
+    states = inspect_graph_code(_response())
+    assert {name: state.status for name, state in states.items()} == {
+        "index.html": BLOCK_OK, "style.css": BLOCK_OK, "script.js": BLOCK_OK,
+    }
+    assert incomplete_blocks(states) == []
+
+
+def test_fake_graph_code_is_ok():
+    assert all(state.status == BLOCK_OK for state in inspect_graph_code(FAKE_GRAPH_CODE).values())
+
+
+def test_unclosed_last_block_is_truncated_and_keeps_complete_lines():
+    response = _response(js=None) + '\n\n```javascript filename="script.js"\nconst cy = cytoscape({\n  elem'
+    states = inspect_graph_code(response)
+    assert states["script.js"].status == BLOCK_TRUNCATED
+    assert states["script.js"].content == "const cy = cytoscape({"
+    assert states["index.html"].status == BLOCK_OK
+
+
+def test_unbalanced_closed_block_is_truncated():
+    states = inspect_graph_code(_response(css="#cy {\n  width: 100%;"))
+    assert states["style.css"].status == BLOCK_TRUNCATED
+
+
+def test_braces_in_strings_and_comments_are_ignored():
+    js = "// {\nconst label = '{[';\n/* { */\nconst cy = cytoscape({ elements: [] });"
+    assert inspect_graph_code(_response(js=js))["script.js"].status == BLOCK_OK
+
+
+def test_html_without_closing_tag_is_truncated():
+    assert inspect_graph_code(_response(html="<html>\n<body>"))["index.html"].status == BLOCK_TRUNCATED
+
+
+def test_missing_blocks():
+    states = inspect_graph_code(_response(css=None, js=None))
+    assert states["style.css"].status == BLOCK_MISSING
+    assert states["script.js"].status == BLOCK_MISSING
+    assert [state.file_name for state in incomplete_blocks(states)] == ["style.css", "script.js"]
+
+
+def test_empty_response_is_all_missing():
+    assert all(state.status == BLOCK_MISSING for state in inspect_graph_code("").values())
+
+
+def test_check_files():
+    states = check_files({"index.html": HTML, "style.css": "#cy {", "script.js": ""})
+    assert states["index.html"].status == BLOCK_OK
+    assert states["style.css"].status == BLOCK_TRUNCATED
+    assert states["script.js"].status == BLOCK_MISSING
+
+
+def test_join_continuation_drops_repeated_lines():
+    partial = "const cy = cytoscape({\n  container: document.getElementById('cy'),"
+    continuation = "  container: document.getElementById('cy'),\n  elements: []\n});"
+    assert _join_continuation(partial, continuation) == (
+        "const cy = cytoscape({\n  container: document.getElementById('cy'),\n  elements: []\n});"
+    )
+
+
+def test_join_continuation_keeps_short_matches():
+    assert _join_continuation("a {\n}", "}\nb {}") == "a {\n}\n}\nb {}"
+
+
+def test_join_continuation_without_overlap_appends():
+    assert _join_continuation("line one", "line two") == "line one\nline two"
+
+
+def test_merge_completion_appends_continuation_and_fills_missing():
+    states = {
+        "index.html": BlockState("index.html", BLOCK_OK, HTML),
+        "style.css": BlockState("style.css", BLOCK_MISSING, ""),
+        "script.js": BlockState("script.js", BLOCK_TRUNCATED, "const cy = cytoscape({"),
+    }
+    completion = _response(html=None, js="elements: []\n});")
+    merged = merge_completion(states, completion)
+    assert merged["index.html"] == HTML
+    assert merged["style.css"] == CSS
+    assert merged["script.js"] == "const cy = cytoscape({\nelements: []\n});"
+    assert all(state.status == BLOCK_OK for state in check_files(merged).values())
+
+
+def test_merge_completion_restated_file_replaces_partial():
+    states = {"script.js": BlockState("script.js", BLOCK_TRUNCATED, "const cy = cytoscape({")}
+    merged = merge_completion(states, _response(html=None, css=None))
+    assert merged["script.js"] == JS
+
+
+def test_merge_completion_without_answer_keeps_partial():
+    states = {"script.js": BlockState("script.js", BLOCK_TRUNCATED, "const cy = cytoscape({")}
+    assert merge_completion(states, "")["script.js"] == "const cy = cytoscape({"
+
+
+def test_truncated_graph_code_cuts_script_block():
+    truncated = truncated_graph_code(FAKE_GRAPH_CODE, fraction=0.5)
+    assert len(truncated) < len(FAKE_GRAPH_CODE)
+    assert not parse_code_string(truncated).get("script.js")
+    states = inspect_graph_code(truncated)
+    assert states["index.html"].status == BLOCK_OK
+    assert states["style.css"].status == BLOCK_OK
+    assert states["script.js"].status == BLOCK_TRUNCATED
+
+
+def test_truncated_graph_code_without_script_block():
+    assert truncated_graph_code("0123456789", fraction=0.3) == "012"
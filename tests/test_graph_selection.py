@@ -0,0 +1,53 @@
+import pytest
+
+from r2g_app.fake_backends import FAKE_GRAPH_CODE
+from r2g_app.graph_recovery import truncated_graph_code
+from r2g_app.graph_selection import MAX_TEMPERATURE, candidate_settings, score_graph_code, select_candidate
+
+
+def test_candidate_settings_spread_temperatures():
+    settings = candidate_settings(3, 1.0, spread=0.6)
+    assert [setting.temperature for setting in settings] == [1.0, 1.3, 1.6]
+    assert [setting.seed for setting in settings] == [1, 2, 3]
+
+
+def test_candidate_settings_cap_temperature():
+    assert candidate_settings(2, 1.8, spread=0.6)[-1].temperature == MAX_TEMPERATURE
+
+
+def test_single_candidate_uses_base_temperature():
+    assert [setting.temperature for setting in candidate_settings(1, 0.7)] == [0.7]
+
+
+def test_candidate_settings_reject_zero():
+    with pytest.raises(ValueError):
+        candidate_settings(0, 1.0)
+
+
+def test_score_of_complete_graph():
+    score = score_graph_code(FAKE_GRAPH_CODE)
+    assert score.complete_blocks == 3
+    assert score.elements_parsed
+    assert score.css_rules > 0 and score.style_entries > 0 and score.style_properties > 0
+    assert 0 < score.value <= 1
+
+
+def test_score_of_empty_response():
+    score = score_graph_code("")
+    assert score.complete_blocks == 0 and not score.elements_parsed
+    assert score.value == 0
+
+
+def test_select_candidate_prefers_complete_graph():
+    winner, scores = select_candidate([truncated_graph_code(FAKE_GRAPH_CODE), None, FAKE_GRAPH_CODE])
+    assert winner == 2
+    assert scores[1] is None
+    assert scores[0].value < scores[2].value
+
+
+def test_select_candidate_ties_go_to_earliest():
+    assert select_candidate([FAKE_GRAPH_CODE, FAKE_GRAPH_CODE])[0] == 0
+
+
+def test_select_candidate_all_failed():
+    assert select_candidate([None, ""]) == (None, [None, None])
@@ -0,0 +1,144 @@
+import pytest
+
+from r2g_app.fake_backends import FAKE_GRAPH_CODE
+from r2g_app.aux_funs import parse_code_string
+from r2g_app.graph_validation import (
+    MAX_REPORTED_ISSUES, ElementsExtractionError, ValidationIssue, _find_cycle, extract_elements,
+    extract_script_block, format_issues, validate_elements, validate_script,
+)
+
+
+def _script(elements_literal: str) -> str:
+    return f"document.addEventListener('DOMContentLoaded', () => {{\n  const elements = {elements_literal};\n}});"
+
+
+def _codes(issues):
+    return sorted(issue.code for issue in issues)
+
+
+# --- extract_elements ---
+
+def test_extracts_js_object_literals():
+    js = _script("""[
+        // comment
+        { data: { id: 'flour', label: "Flour", type: 'ingredient', weight: 1.5 } },
+        { group: 'nodes', data: { id: 'mix', label: `Mix it`, done: false, note: null } }, /* block */
+        { data: { id: 'e1', source: 'flour', target: 'mix', type: 'material' }, },
+    ]""")
+    elements = extract_elements(js)
+    assert [e["group"] for e in elements] == ["nodes", "nodes", "edges"]
+    assert elements[0]["data"] == {"id": "flour", "label": "Flour", "type": "ingredient", "weight": 1.5}
+    assert elements[1]["data"]["label"] == "Mix it"
+    assert elements[1]["data"]["done"] is False and elements[1]["data"]["note"] is None
+
+
+def test_expressions_are_omitted_from_data():
+    js = _script("[{ data: { id: 'a', label: 'A' + suffix, size: fn(2, [3]), count: 3 } }]")
+    assert extract_elements(js)[0]["data"] == {"id": "a", "count": 3}
+
+
+def test_escaped_quotes_in_strings():
+    js = _script(r"""[{ data: { id: 'baker\'s', label: "say \"hi\"" } }]""")
+    assert extract_elements(js)[0]["data"] == {"id": "baker's", "label": 'say "hi"'}
+
+
+def test_elements_through_a_variable():
+    js = "const graphData = [{ data: { id: 'a' } }];\nconst cy = cytoscape({ elements: graphData });"
+    assert extract_elements(js)[0]["data"]["id"] == "a"
+
+
+def test_nodes_and_edges_object():
+    js = "cytoscape({ elements: { nodes: [{ data: { id: 'a' } }, { data: { id: 'b' } }], " \
+         "edges: [{ data: { id: 'e', source: 'a', target: 'b' } }] } });"
+    assert [e["group"] for e in extract_elements(js)] == ["nodes", "nodes", "edges"]
+
+
+def test_fallback_to_array_that_looks_like_elements():
+    js = "const items = [{ data: { id: 'a' } }];"
+    assert extract_elements(js)[0]["data"]["id"] == "a"
+
+
+@pytest.mark.parametrize("js", ["", "console.log('no graph');", _script("[{ data: { id: 'a' }")])
+def test_extraction_errors(js):
+    with pytest.raises(ElementsExtractionError):
+        extract_elements(js)
+
+
+def test_fake_graph_code_is_valid():
+    assert validate_script(parse_code_string(FAKE_GRAPH_CODE)["script.js"]) == []
+
+
+# --- validate_elements ---
+
+def _node(node_id, **data):
+    return {"group": "nodes", "data": {"id": node_id, **data}}
+
+
+def _edge(edge_id, source, target, **data):
+    return {"group": "edges", "data": {"id": edge_id, "source": source, "target": target, **data}}
+
+
+def test_valid_graph_has_no_issues():
+    elements = [
+        _node("prep", type="section"),
+        _node("flour", type="ingredient", parent="prep"),
+        _node("mix", type="action", parent="prep"),
+        _edge("e1", "flour", "mix", type="material"),
+    ]
+    assert validate_elements(elements) == []
+
+
+def test_structural_issues():
+    elements = [
+        _node("prep", type="section"),
+        _node("flour", type="ingredient"),
+        _node("flour", type="action"),
+        _node("sugar", type="ingredient", parent="nowhere"),
+        {"group": "nodes", "data": {"label": "no id"}},
+        _edge("e1", "flour", "oven"),
+    ]
+    assert _codes(validate_elements(elements)) == [
+        "bad_parent", "dangling_edge", "duplicate_id", "missing_id", "orphan_ingredient",
+    ]
+
+
+def test_parent_must_be_a_section_when_sections_exist():
+    elements = [_node("prep", type="section"), _node("mix", type="action"), _node("stir", type="action", parent="mix")]
+    issues = validate_elements(elements)
+    assert _codes(issues) == ["bad_parent"] and issues[0].element_id == "stir"
+
+
+def test_material_cycle():
+    elements = [_node("a"), _node("b"), _node("c"),
+                _edge("e1", "a", "b", type="material"), _edge("e2", "b", "c", type="material"),
+                _edge("e3", "c", "a", type="material"), _edge("e4", "a", "c", type="sequence")]
+    issues = validate_elements(elements)
+    assert _codes(issues) == ["material_cycle"]
+
+
+def test_find_cycle():
+    assert _find_cycle({"a": ["b"], "b": ["c"], "c": []}) is None
+    cycle = _find_cycle({"a": ["b"], "b": ["c"], "c": ["b"]})
+    assert cycle[0] == cycle[-1] and set(cycle) == {"b", "c"}
+    assert _find_cycle({"a": ["a"]}) == ["a", "a"]
+
+
+def test_unparsable_script_is_one_issue():
+    assert _codes(validate_script("nothing here")) == ["extraction_failed"]
+    assert _codes(validate_script(_script("[]"))) == ["extraction_failed"]
+
+
+# --- formatting ---
+
+def test_extract_script_block_takes_the_last_block():
+    response = "```javascript\nfirst();\n```\ntext\n```js filename=\"script.js\"\nsecond();\n```"
+    assert extract_script_block(response) == "second();"
+    assert extract_script_block("no code") == ""
+
+
+def test_format_issues_truncates():
+    issues = [ValidationIssue("missing_id", f"issue {i}") for i in range(MAX_REPORTED_ISSUES + 5)]
+    lines = format_issues(issues).splitlines()
+    assert len(lines) == MAX_REPORTED_ISSUES + 1
+    assert lines[0] == "- [missing_id] issue 0"
+    assert "5 more issues" in lines[-1]
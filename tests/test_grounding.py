@@ -0,0 +1,51 @@
+import pytest
+
+from r2g_app.grounding import needs_grounding, should_ground
+
+
+@pytest.mark.parametrize("line", [
+    "2 leeks", "1/2 cup sugar", "½ tsp salt", "two onions", "a pinch of nutmeg", "salt to taste",
+    "half a lemon", "3-4 cloves garlic",
+])
+def test_quantities(line):
+    grounded, reasons = needs_grounding(f"Ingredients:\n- {line}\n")
+    assert not any("without quantity" in reason for reason in reasons), reasons
+
+
+@pytest.mark.parametrize("line", [
+    "some flour", "an onion, finely chopped", "a little butter for the pan", "few leaves of basil",
+])
+def test_prose_without_quantities(line):
+    grounded, reasons = needs_grounding(f"Ingredients:\n- {line}\n")
+    assert grounded
+    assert "1 ingredient(s) without quantity" in reasons
+
+
+def test_complete_draft_needs_no_grounding():
+    draft = "Ingredients:\n- 200 g flour\n- 2 eggs\n- 1 cup milk\n\nMethod:\n1. Whisk everything together.\n"
+    assert needs_grounding(draft) == (False, [])
+
+
+def test_unknown_ingredient():
+    grounded, reasons = needs_grounding("Ingredients:\n- 2 tbsp gochujang\n")
+    assert grounded and reasons == ["1 unknown ingredient(s): 2 tbsp gochujang"]
+
+
+def test_short_draft_without_list():
+    assert needs_grounding("Grandma's stew") == (True, ["no ingredient list in a short draft"])
+
+
+def test_long_prose_draft_without_list():
+    draft = " ".join(["Brown the beef in a heavy pot with some oil, then add the onions and wine."] * 5)
+    assert needs_grounding(draft) == (False, [])
+
+
+def test_policies(monkeypatch):
+    monkeypatch.setenv("R2G_GROUNDING_DRAFT", "auto")
+    assert should_ground("draft", "Grandma's stew")
+    assert not should_ground("draft", "Ingredients:\n- 200 g flour\n")
+    assert not should_ground("generate", "Grandma's stew", policy="auto")
+    assert should_ground("generate", policy="on")
+    monkeypatch.setenv("R2G_GROUNDING_DRAFT", "sometimes")
+    with pytest.raises(ValueError):
+        should_ground("draft", "text")
@@ -0,0 +1,65 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from r2g_app import genai_funs, metrics
+
+
+def _client(text, delay=0.0, calls=None):
+    def generate_content(model, contents, config):
+        if calls is not None:
+            calls.append(model)
+        time.sleep(delay)
+        return SimpleNamespace(text=text, usage_metadata=None)
+    return SimpleNamespace(models=SimpleNamespace(generate_content=generate_content))
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    secondary_calls = []
+    monkeypatch.setattr(genai_funs, "HEDGE_DEFAULT_DEADLINE_S", 0.2)
+    monkeypatch.setattr(genai_funs, "MODEL_SLO_SECONDS", {})
+    monkeypatch.setattr(genai_funs, "_get_genai_client",
+                        lambda project_id, location: _client("secondary", calls=secondary_calls))
+    return secondary_calls
+
+
+def test_deadline_ignores_other_regions(monkeypatch):
+    monkeypatch.setattr(genai_funs, "HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(genai_funs, "HEDGE_MIN_DEADLINE_S", 0.0)
+    for _ in range(10):
+        metrics.record_model_call("test_region_stage", "model-a", 1.0, location="region-primary")
+        metrics.record_model_call("test_region_stage", "model-a", 30.0, location="region-secondary")
+    assert genai_funs._hedge_deadline("test_region_stage", "model-a", "region-primary") == 1.0
+    assert genai_funs._hedge_deadline("test_region_stage", "model-a", "region-secondary") == 30.0
+    assert genai_funs._hedge_deadline("test_region_stage", "model-a", "region-other") == genai_funs.HEDGE_DEFAULT_DEADLINE_S
+
+
+def test_slow_primary_is_hedged(hedging):
+    text = genai_funs._hedged_generate_content(_client("primary", delay=1.0), "model-b", [], None,
+                                               "test_hedge_stage", "project", "region-primary")
+    assert text == "secondary"
+    assert hedging == ["model-b"]
+
+
+def test_fast_primary_is_not_hedged(hedging):
+    text = genai_funs._hedged_generate_content(_client("primary"), "model-c", [], None,
+                                               "test_hedge_stage", "project", "region-primary")
+    assert text == "primary"
+    assert hedging == []
+
+
+def test_time_queued_for_a_worker_does_not_trigger_hedge(hedging, monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(genai_funs, "_HEDGE_EXECUTOR", executor)
+    release = threading.Event()
+    executor.submit(release.wait, 5)  # Occupies the only worker for longer than the deadline
+    threading.Timer(0.5, release.set).start()
+    text = genai_funs._hedged_generate_content(_client("primary", delay=0.05), "model-d", [], None,
+                                               "test_hedge_stage", "project", "region-primary")
+    assert text == "primary"
+    assert hedging == []
+    executor.shutdown()
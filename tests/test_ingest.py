@@ -0,0 +1,125 @@
+import io
+import threading
+import time
+
+import pytest
+
+from r2g_app.ingest import MIN_CHUNK_CHARS, iter_recipe_chunks, map_ordered, recipe_slug, split_recipes
+
+COOKBOOK = """\
+Chapter 3: Soups
+
+Leek and Potato Soup
+
+Ingredients
+2 leeks
+3 medium potatoes
+1 litre stock
+
+Method
+1. Slice the leeks and dice the potatoes.
+2. Simmer everything in the stock for 25 minutes.
+3. Blend until smooth.
+
+## Tomato Soup
+- 6 large tomatoes
+- 1 onion
+- 500 ml stock
+
+Steps:
+1. Roast the tomatoes and onion.
+2. Blend with the stock and season.
+"""
+
+
+def test_splits_cookbook_before_each_title():
+    chunks = list(iter_recipe_chunks(io.StringIO(COOKBOOK)))
+    assert [chunk.title for chunk in chunks] == ["Leek and Potato Soup", "Tomato Soup"]
+    assert [chunk.index for chunk in chunks] == [0, 1]
+    # The chapter heading is part of the first recipe's chunk; the title comes from before the ingredients
+    assert chunks[0].text.startswith("Chapter 3: Soups")
+    assert "Blend until smooth." in chunks[0].text and "Tomato" not in chunks[0].text
+    assert chunks[1].text.startswith("## Tomato Soup")
+    assert chunks[1].start_line == COOKBOOK.splitlines().index("## Tomato Soup") + 1
+
+
+def test_single_recipe_is_one_chunk():
+    text = "Pancakes\n\nIngredients\n1 cup flour\n1 egg\n\nMethod\n1. Whisk.\n2. Fry.\n"
+    chunks = list(iter_recipe_chunks(text.splitlines()))
+    assert len(chunks) == 1
+    assert chunks[0].title == "Pancakes"
+    assert chunks[0].text == text
+
+
+def test_text_without_markers_is_cut_at_paragraphs():
+    paragraph = "Some prose about cooking that has no recipe markers at all. " * 3
+    text = "\n\n".join([paragraph] * 6)
+    chunks = list(iter_recipe_chunks(io.StringIO(text), max_chars=len(paragraph) * 2))
+    assert len(chunks) == 3
+    assert all(chunk.text.count(paragraph.strip()) == 2 for chunk in chunks)
+
+
+def test_short_fragments_are_merged_into_the_next_chunk():
+    text = "Notes\n\n" + ("Long enough paragraph of text for a chunk. " * 3 + "\n\n") * 2
+    chunks = list(iter_recipe_chunks(io.StringIO(text), max_chars=MIN_CHUNK_CHARS))
+    assert chunks[0].text.startswith("Notes")
+    assert all(len(chunk.text) >= MIN_CHUNK_CHARS for chunk in chunks)
+
+
+def test_empty_input():
+    assert list(iter_recipe_chunks([])) == []
+    assert list(iter_recipe_chunks(["\n", "  \n"])) == []
+
+
+def test_split_recipes_from_path_and_stream(tmp_path):
+    path = tmp_path / "cookbook.txt"
+    path.write_text(COOKBOOK, encoding="utf-8")
+    from_path = list(split_recipes(str(path)))
+    assert from_path == list(split_recipes(io.StringIO(COOKBOOK)))
+    assert len(from_path) == 2
+
+
+@pytest.mark.parametrize("title, slug", [
+    ("Leek & Potato Soup", "leek_potato_soup"),
+    ("  ## Crème brûlée!  ", "cr_me_br_l_e"),
+    ("???", "recipe"),
+    ("a" * 60, "a" * 40),
+])
+def test_recipe_slug(title, slug):
+    assert recipe_slug(title) == slug
+
+
+# --- map_ordered ---
+
+def test_map_ordered_keeps_input_order():
+    def slow_for_small(n):
+        time.sleep(0.02 * (5 - n))
+        return n * n
+    results = [(item, future.result()) for item, future in map_ordered(slow_for_small, range(5), max_workers=5)]
+    assert results == [(n, n * n) for n in range(5)]
+
+
+def test_map_ordered_leaves_errors_in_futures():
+    def fail_on_two(n):
+        if n == 2:
+            raise ValueError("two")
+        return n
+    futures = dict(map_ordered(fail_on_two, range(4), max_workers=2))
+    assert isinstance(futures[2].exception(), ValueError)
+    assert futures[3].result() == 3
+
+
+def test_map_ordered_reads_input_lazily():
+    consumed = []
+    lock = threading.Lock()
+
+    def items():
+        for n in range(100):
+            with lock:
+                consumed.append(n)
+            yield n
+
+    results = map_ordered(lambda n: n, items(), max_workers=2, window=4)
+    next(results)
+    assert len(consumed) <= 5
+    results.close()
@@ -0,0 +1,171 @@
+import threading
+import time
+
+import pytest
+
+from r2g_app.jobs import (
+    JOB_CANCELLED, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JobQueue, JobQueueFullError,
+)
+
+
+def _wait_done(job, timeout=5.0):
+    deadline = time.time() + timeout
+    while not job.done:
+        assert time.time() < deadline, f"job {job.kind} did not finish"
+        time.sleep(0.01)
+    return job
+
+
+def test_job_succeeds_with_progress_and_context():
+    def work(value, progress_callback):
+        progress_callback("halfway")
+        progress_callback("done")
+        return value * 2
+
+    queue = JobQueue(workers=1)
+    job = _wait_done(queue.submit("double", work, {"value": 21}, context={"recipe_name": "stew"}))
+    assert job.status == JOB_SUCCEEDED
+    assert job.result == 42
+    assert [message for _, message in job.progress] == ["halfway", "done"]
+    assert job.latest_progress == "done"
+    assert job.context == {"recipe_name": "stew"}
+    assert queue.get(job.job_id) is job
+    snapshot = job.to_dict()
+    assert snapshot["result"] == 42 and snapshot["progress"][-1]["message"] == "done"
+
+
+def test_job_without_progress_argument():
+    job = _wait_done(JobQueue(workers=1).submit("constant", lambda: "ok", progress_arg=None))
+    assert job.status == JOB_SUCCEEDED and job.result == "ok"
+
+
+def test_failed_job_records_error():
+    def fail(progress_callback):
+        raise RuntimeError("model unavailable")
+
+    job = _wait_done(JobQueue(workers=1).submit("fail", fail))
+    assert job.status == JOB_FAILED
+    assert job.error == "model unavailable"
+    assert job.finished_at >= job.started_at
+
+
+def test_full_queue_rejects_submissions():
+    release = threading.Event()
+    queue = JobQueue(workers=1, max_queue_depth=1)
+    running = queue.submit("block", lambda progress_callback: release.wait(5))
+    deadline = time.time() + 5
+    while running.status != JOB_RUNNING:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    waiting = queue.submit("wait", lambda progress_callback: None)
+    assert waiting.status == JOB_QUEUED
+    with pytest.raises(JobQueueFullError):
+        queue.submit("rejected", lambda progress_callback: None)
+    assert queue.stats()[JOB_QUEUED] == 1 and queue.stats()[JOB_RUNNING] == 1
+    release.set()
+    _wait_done(waiting)
+    _wait_done(queue.submit("accepted", lambda progress_callback: None))
+
+
+def test_finished_jobs_expire_after_retention():
+    queue = JobQueue(workers=1, retention_seconds=0.05)
+    old = _wait_done(queue.submit("old", lambda progress_callback: None))
+    time.sleep(0.1)
+    new = queue.submit("new", lambda progress_callback: None)  # Submitting prunes expired jobs
+    assert queue.get(old.job_id) is None
+    assert queue.get(new.job_id) is new
+
+
+def test_stats_counts_by_status():
+    queue = JobQueue(workers=2, max_queue_depth=5)
+    _wait_done(queue.submit("ok", lambda progress_callback: None))
+    _wait_done(queue.submit("fail", lambda progress_callback: 1 / 0))
+    stats = queue.stats()
+    assert stats[JOB_SUCCEEDED] == 1 and stats[JOB_FAILED] == 1
+    assert stats["workers"] == 2 and stats["max_queue_depth"] == 5
+
+
+def test_unknown_job_is_none():
+    assert JobQueue(workers=1).get("missing") is None
+
+
+def _wait_running(job, timeout=5.0):
+    deadline = time.time() + timeout
+    while job.status != JOB_RUNNING:
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def _staged_run(stages, started=None):
+    """A pipeline-like function checking its deadline before each of `stages` short stages."""
+    def run(progress_callback, deadline):
+        for stage in stages:
+            deadline.check(stage)
+            if started is not None:
+                started.set()
+            progress_callback(stage)
+            time.sleep(0.05)
+        return "finished"
+    return run
+
+
+def test_cancel_running_job_stops_before_next_stage():
+    started = threading.Event()
+    queue = JobQueue(workers=1)
+    job = queue.submit("staged", _staged_run(["a", "b", "c", "d"], started), deadline_arg="deadline", timeout_s=60)
+    started.wait(5)
+    assert queue.cancel(job.job_id) is job
+    _wait_done(job)
+    assert job.status == JOB_CANCELLED
+    assert job.result is None
+    assert "cancelled" in job.error.lower()
+    assert [message for _, message in job.progress] == ["a"]
+    assert queue.stats()[JOB_CANCELLED] == 1
+
+
+def test_cancel_queued_job_does_not_run():
+    release = threading.Event()
+    ran = []
+    queue = JobQueue(workers=1)
+    blocker = queue.submit("block", lambda progress_callback: release.wait(5))
+    _wait_running(blocker)
+    queued = queue.submit("queued", lambda progress_callback: ran.append(True))
+    queue.cancel(queued.job_id)
+    release.set()
+    _wait_done(queued)
+    assert queued.status == JOB_CANCELLED
+    assert ran == []
+
+
+def test_cancel_finished_or_unknown_job():
+    queue = JobQueue(workers=1)
+    job = _wait_done(queue.submit("ok", lambda progress_callback: 1))
+    assert queue.cancel(job.job_id).status == JOB_SUCCEEDED
+    assert queue.cancel("missing") is None
+
+
+def test_job_deadline_has_time_limit():
+    queue = JobQueue(workers=1)
+    job = _wait_done(queue.submit("limited", lambda progress_callback, deadline: deadline.remaining(),
+                                  deadline_arg="deadline", timeout_s=30))
+    assert 0 < job.result <= 30
+    unlimited = _wait_done(queue.submit("unlimited", lambda progress_callback, deadline: deadline.remaining(),
+                                        deadline_arg="deadline", timeout_s=0))
+    assert unlimited.result is None
+
+
+def test_abandoned_job_is_cancelled():
+    queue = JobQueue(workers=1)
+    job = queue.submit("staged", _staged_run(["stage"] * 20), deadline_arg="deadline", abandon_after_s=0.2)
+    _wait_done(job)  # Polls job.done directly, not through queue.get
+    assert job.status == JOB_CANCELLED
+    assert 1 < len(job.progress) < 20
+
+
+def test_polled_job_is_not_abandoned():
+    queue = JobQueue(workers=1)
+    job = queue.submit("staged", _staged_run(["stage"] * 8), deadline_arg="deadline", abandon_after_s=0.2)
+    while not job.done:
+        queue.get(job.job_id)
+        time.sleep(0.02)
+    assert job.status == JOB_SUCCEEDED
@@ -0,0 +1,137 @@
+import json
+import os
+
+import pytest
+
+from r2g_app import media_upload
+from r2g_app.fake_backends import FakeStorage
+from r2g_app.media_upload import MANIFEST_SUFFIX, PARTS_SUFFIX, ChecksumMismatchError, upload_media_file
+
+CHUNK = 1024
+
+
+class FaultyStorage(FakeStorage):
+    """FakeStorage that fails or corrupts the writes of the named objects."""
+
+    def __init__(self):
+        super().__init__()
+        self.fail_names = set()
+        self.corrupt_names = set()
+        self.writes = []
+
+    def put(self, bucket_name, blob_name, data):
+        if blob_name in self.fail_names:
+            raise ConnectionError(f"connection reset while writing {blob_name}")
+        if blob_name in self.corrupt_names:
+            data = bytes(data[:-1]) + b"\0"
+        self.writes.append(blob_name)
+        super().put(bucket_name, blob_name, data)
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = FaultyStorage()
+    monkeypatch.setattr(media_upload, "_get_bucket", storage.bucket)
+    monkeypatch.setattr(media_upload, "COMPOSITE_THRESHOLD_BYTES", 2 * CHUNK)
+    monkeypatch.setattr(media_upload, "CHUNK_RETRIES", 2)
+    return storage
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "recipe.mp4"
+    path.write_bytes(os.urandom(5 * CHUNK + 100))  # 6 parts, the last one short
+    return path
+
+
+def _part(index):
+    return f"videos/recipe.mp4{PARTS_SUFFIX}/{index:05d}"
+
+
+def _manifest_parts(video):
+    return {int(index) for index in json.loads(video.with_name(video.name + MANIFEST_SUFFIX).read_text())["parts"]}
+
+
+def _part_writes(storage):
+    return sorted(name for name in storage.writes if PARTS_SUFFIX in name)
+
+
+def test_small_file_is_uploaded_in_one_request(storage, tmp_path):
+    path = tmp_path / "short.mp4"
+    path.write_bytes(b"video" * 100)
+    result = upload_media_file(str(path), "bucket", "videos/short.mp4", chunk_size=CHUNK)
+    assert result.parts == 1 and result.resumed_parts == 0
+    assert result.uri == "gs://bucket/videos/short.mp4"
+    assert storage.get("bucket", "videos/short.mp4") == path.read_bytes()
+
+
+def test_composite_upload_reassembles_file_and_cleans_up(storage, video):
+    result = upload_media_file(str(video), "bucket", "videos/recipe.mp4", chunk_size=CHUNK, max_workers=3)
+    assert result.parts == 6 and result.resumed_parts == 0
+    assert storage.get("bucket", "videos/recipe.mp4") == video.read_bytes()
+    assert not [name for name in storage._objects if PARTS_SUFFIX in name]
+    assert not video.with_name(video.name + MANIFEST_SUFFIX).exists()
+
+
+def test_interrupted_upload_resumes_from_manifest(storage, video):
+    storage.fail_names = {_part(3)}
+    with pytest.raises(RuntimeError, match="part 3"):
+        upload_media_file(str(video), "bucket", "videos/recipe.mp4", chunk_size=CHUNK, max_workers=1)
+    uploaded = _manifest_parts(video)  # Parts already running when part 3 failed may have finished
+    assert {0, 1, 2} <= uploaded and 3 not in uploaded
+    assert storage.get("bucket", "videos/recipe.mp4") is None
+
+    storage.fail_names, storage.writes = set(), []
+    result = upload_media_file(str(video), "bucket", "videos/recipe.mp4", chunk_size=CHUNK, max_workers=1)
+    assert result.resumed_parts == len(uploaded)
+    assert _part_writes(storage) == [_part(index) for index in range(6) if index not in uploaded]
+    assert storage.get("bucket", "videos/recipe.mp4") == video.read_bytes()
+    assert not video.with_name(video.name + MANIFEST_SUFFIX).exists()
+
+
+def test_resume_reuploads_parts_changed_in_the_bucket(storage, video):
+    storage.fail_names = {_part(3)}
+    with pytest.raises(RuntimeError):
+        upload_media_file(str(video), "bucket", "videos/recipe.mp4", chunk_size=CHUNK, max_workers=1)
+    uploaded = _manifest_parts(video)
+    storage.put("bucket", _part(1), b"overwritten")
+
+    storage.fail_names, storage.writes = set(), []
+    result = upload_media_file(str(video), "bucket", "videos/recipe.mp4", chunk_size=CHUNK, max_workers=1)
+    assert result.resumed_parts == len(uploaded) - 1
+    assert _part(1) in _part_writes(storage)
+    assert storage.get("bucket", "videos/recipe.mp4") == video.read_bytes()
+
+
+def test_manifest_of_a_changed_file_is_ignored(storage, video):
+    storage.fail_names = {_part(3)}
+    with pytest.raises(RuntimeError):
+        upload_media_file(str(video), "bucket", "videos/recipe.mp4", chunk_size=CHUNK, max_workers=1)
+    video.write_bytes(os.urandom(5 * CHUNK + 100))
+
+    storage.fail_names = set()
+    result = upload_media_file(str(video), "bucket", "videos/recipe.mp4", chunk_size=CHUNK, max_workers=1)
+    assert result.resumed_parts == 0
+    assert storage.get("bucket", "videos/recipe.mp4") == video.read_bytes()
+
+
+def test_corrupted_part_fails_after_retries(storage, video):
+    storage.corrupt_names = {_part(2)}
+    with pytest.raises(RuntimeError, match="part 2") as excinfo:
+        upload_media_file(str(video), "bucket", "videos/recipe.mp4", chunk_size=CHUNK, max_workers=1)
+    assert isinstance(excinfo.value.__cause__, ChecksumMismatchError)
+    assert storage.get("bucket", "videos/recipe.mp4") is None
+
+
+def test_corrupted_composed_object_is_detected(storage, video):
+    storage.corrupt_names = {"videos/recipe.mp4"}
+    with pytest.raises(ChecksumMismatchError, match="composed"):
+        upload_media_file(str(video), "bucket", "videos/recipe.mp4", chunk_size=CHUNK)
+
+
+def test_corrupted_single_upload_is_detected(storage, tmp_path):
+    path = tmp_path / "short.mp4"
+    path.write_bytes(b"video" * 100)
+    storage.corrupt_names = {"videos/short.mp4"}
+    with pytest.raises(ChecksumMismatchError):
+        upload_media_file(str(path), "bucket", "videos/short.mp4", chunk_size=CHUNK)
@@ -0,0 +1,36 @@
+from r2g_app import aux_vars
+from r2g_app.aux_funs import parse_code_string
+from r2g_app.graph_validation import extract_elements
+from r2g_app.prompts import compress_prompt, get_prompt_variant, strip_worked_example
+
+
+def test_compress_normalizes_unicode_spaces():
+    assert compress_prompt("**Rules:**\n\u00a0\u00a0* one\u00a0\u00a0two\u2009three  \n\n\n* four") == (
+        "Rules:\n* one two three\n* four"
+    )
+
+
+def test_compress_strips_code_indentation():
+    text = '```javascript filename="script.js"\n  const a = {\n\u00a0\u00a0  b: "x  y"\n\n  };  \n```'
+    assert compress_prompt(text) == '```javascript filename="script.js"\nconst a = {\nb: "x  y"\n};\n```'
+
+
+def test_compress_keeps_layout_of_other_blocks():
+    text = "```text\n## Section\n  * indented item  \n```"
+    assert compress_prompt(text) == "```text\n## Section\n  * indented item\n```"
+
+
+def test_compressed_generate_prompt_is_smaller_and_keeps_example():
+    original = aux_vars.GENERATE_GRAPH_SYS_PROMPT
+    compressed = get_prompt_variant("generate", "compressed").text
+    assert "\u00a0" not in compressed
+    assert len(compressed) < 0.97 * len(original)
+    example = parse_code_string(compressed[compressed.index("Example:"):])
+    original_example = parse_code_string(original[original.index("**Example:**"):])
+    assert extract_elements(example["script.js"]) == extract_elements(original_example["script.js"])
+
+
+def test_no_example_variant_drops_example():
+    assert "**Example:**" not in strip_worked_example(aux_vars.GENERATE_GRAPH_SYS_PROMPT)
+    assert len(get_prompt_variant("generate", "no_example_compressed").text) < len(
+        get_prompt_variant("generate", "no_example").text)
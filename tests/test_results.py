@@ -0,0 +1,108 @@
+import hashlib
+
+import pytest
+
+from r2g_app import metrics, results
+from r2g_app.fake_backends import FakeStorage
+from r2g_app.results import ArtifactCache, GraphResult, load_artifact
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = FakeStorage()
+    monkeypatch.setattr(results, "_get_bucket", storage.bucket)
+    return storage
+
+
+def test_put_returns_sha256_and_get_returns_body():
+    cache = ArtifactCache(max_bytes=100)
+    digest = cache.put("body { margin: 0 }")
+    assert digest == _sha256("body { margin: 0 }")
+    assert cache.get(digest) == "body { margin: 0 }"
+    assert cache.get(_sha256("other")) is None
+
+
+def test_least_recently_used_is_evicted_first():
+    cache = ArtifactCache(max_bytes=30)
+    first, second = cache.put("a" * 10), cache.put("b" * 10)
+    cache.get(first)  # `second` is now the least recently used
+    third = cache.put("c" * 15)
+    assert cache.get(second) is None
+    assert cache.get(first) == "a" * 10 and cache.get(third) == "c" * 15
+    assert cache.stats() == {"entries": 2, "bytes": 25, "max_bytes": 30, "evictions": 1}
+
+
+def test_size_counts_utf8_bytes():
+    cache = ArtifactCache(max_bytes=10)
+    cache.put("é" * 4)
+    assert cache.stats()["bytes"] == 8
+
+
+def test_body_larger_than_cache_is_not_cached():
+    cache = ArtifactCache(max_bytes=10)
+    kept = cache.put("small")
+    digest = cache.put("x" * 11)
+    assert cache.get(digest) is None
+    assert cache.get(kept) == "small"
+    assert cache.stats()["evictions"] == 0
+
+
+def test_putting_cached_body_again_does_not_grow_cache():
+    cache = ArtifactCache(max_bytes=100)
+    cache.put("same")
+    cache.put("same")
+    assert cache.stats()["entries"] == 1 and cache.stats()["bytes"] == 4
+
+
+def test_cache_hit_does_not_download(storage):
+    cache = ArtifactCache(max_bytes=100)
+    digest = cache.put("<html></html>")
+    hits = metrics.get_counter("test_results_hit").get("hit", 0)
+    assert load_artifact(digest, "gs://bucket/missing.html", cache, counter="test_results_hit") == "<html></html>"
+    assert metrics.get_counter("test_results_hit")["hit"] == hits + 1
+
+
+def test_evicted_body_is_downloaded_and_verified(storage):
+    storage.put("bucket", "stew/index.html", "<html>stew</html>")
+    cache = ArtifactCache(max_bytes=100)
+    digest = _sha256("<html>stew</html>")
+    assert load_artifact(digest, "gs://bucket/stew/index.html", cache, counter="test_results_reload") == (
+        "<html>stew</html>"
+    )
+    assert cache.get(digest) == "<html>stew</html>"
+    assert metrics.get_counter("test_results_reload") == {"miss": 1, "downloaded": 1}
+
+
+def test_changed_file_is_not_used(storage):
+    storage.put("bucket", "stew/index.html", "<html>edited</html>")
+    cache = ArtifactCache(max_bytes=100)
+    digest = _sha256("<html>stew</html>")
+    assert load_artifact(digest, "gs://bucket/stew/index.html", cache, counter="test_results_changed") is None
+    assert cache.stats()["entries"] == 0
+    assert "downloaded" not in metrics.get_counter("test_results_changed")
+
+
+def test_missing_file_or_uri_is_none(monkeypatch):
+    def missing_bucket(bucket_name):
+        raise RuntimeError("404 No such object")
+
+    monkeypatch.setattr(results, "_get_bucket", missing_bucket)
+    cache = ArtifactCache(max_bytes=100)
+    assert load_artifact(_sha256("x"), "gs://bucket/missing.html", cache) is None
+    assert load_artifact(_sha256("x"), None, cache) is None
+    assert load_artifact(None, "gs://bucket/missing.html", cache) is None
+
+
+def test_graph_result_loads_contents_lazily(storage, monkeypatch):
+    cache = ArtifactCache(max_bytes=1000)
+    monkeypatch.setattr(results, "_cache", cache)
+    result = GraphResult.from_contents("<html></html>", "", "cytoscape({});", recipe_uri="gs://bucket/r.txt",
+                                       html_gcs_uri="gs://bucket/index.html", js_gcs_uri="gs://bucket/script.js")
+    assert result.css_sha256 is None
+    assert result.files() == {"index.html": "<html></html>", "script.js": "cytoscape({});"}
+    assert "html_content" not in result.to_dict()
+    assert result.to_dict(include_content=True)["js_content"] == "cytoscape({});"
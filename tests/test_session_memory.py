@@ -0,0 +1,53 @@
+from r2g_app.session_memory import (
+    INLINE_PAYLOAD_BYTES, PayloadRef, attach_uri, get_payload_store, get_text, put_text,
+)
+
+LARGE_TEXT = "x" * (INLINE_PAYLOAD_BYTES + 1)
+URI = "gs://bucket/recipe.txt"
+
+
+def test_small_text_stays_inline():
+    state = {}
+    put_text(state, "key", "short", uri=URI)
+    assert state["key"] == "short"
+    assert get_text(state, "key") == "short"
+
+
+def test_large_text_without_uri_stays_inline():
+    state = {}
+    put_text(state, "key", LARGE_TEXT)
+    assert state["key"] == LARGE_TEXT
+
+
+def test_large_text_with_uri_is_offloaded():
+    state = {}
+    put_text(state, "key", LARGE_TEXT, uri=URI)
+    assert isinstance(state["key"], PayloadRef)
+    assert state["key"].uri == URI
+    assert get_text(state, "key") == LARGE_TEXT
+
+
+def test_attach_uri_offloads_inline_text():
+    state = {}
+    put_text(state, "key", LARGE_TEXT)
+    attach_uri(state, "key", URI)
+    assert isinstance(state["key"], PayloadRef)
+    assert state["key"].uri == URI
+    assert get_text(state, "key") == LARGE_TEXT
+
+
+def test_attach_uri_without_uri_keeps_text():
+    state = {}
+    put_text(state, "key", LARGE_TEXT)
+    attach_uri(state, "key", None)
+    assert state["key"] == LARGE_TEXT
+
+
+def test_evicted_payload_without_copy_reads_as_none():
+    state = {"key": PayloadRef("0" * 64, 10, None)}
+    assert get_payload_store().get("0" * 64) is None
+    assert get_text(state, "key") is None
+
+
+def test_missing_key_returns_default():
+    assert get_text({}, "key", default="fallback") == "fallback"